@@ -0,0 +1,137 @@
+"""
+Benchmark: end-to-end ``NL2SQLOrchestrator.ask`` latency, fully offline.
+
+LLM calls are served by ``ReplayChatModel`` from a cassette, so runs are
+deterministic and need no API key. Without ``--cassette`` a synthetic
+cassette is recorded first from a scripted model (fixed chunking and
+per-token delay) against a temporary SQLite database.
+
+Record a real cassette by running the service with
+``llm.cassette.mode: record`` and pass it here together with the same
+database URI.
+
+Usage:
+    python -m benchmarks.bench_pipeline [--runs 20] [--speed 1.0]
+    python -m benchmarks.bench_pipeline --cassette data/cassettes/llm.jsonl \\
+        --database-uri sqlite:///example.db --questions questions.txt
+"""
+import argparse
+import os
+import sqlite3
+import statistics
+import tempfile
+import time
+from typing import Iterator, List
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from src.core.orchestrator import NL2SQLOrchestrator
+from src.generation.llm_replay import Cassette, RecordingChatModel, ReplayChatModel
+
+
+QUESTIONS = ["有多少用户?", "平均年龄是多少?", "年龄最大的用户是谁?"]
+SQL_BY_QUESTION = {
+    "有多少用户?": "SELECT COUNT(*) FROM users",
+    "平均年龄是多少?": "SELECT AVG(age) FROM users",
+    "年龄最大的用户是谁?": "SELECT name FROM users ORDER BY age DESC LIMIT 1",
+}
+
+
+class ScriptedModel(BaseChatModel):
+    """Answers with the scripted SQL for the question found in the prompt."""
+
+    token_delay: float = 0.01
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def _answer(self, messages) -> List[str]:
+        prompt = " ".join(str(m.content) for m in messages)
+        sql = next((s for q, s in SQL_BY_QUESTION.items() if q in prompt), "SELECT 1")
+        text = f"<thinking>分析问题，查询 users 表</thinking>\n<sql>\n{sql}\n</sql>"
+        return [text[i:i + 4] for i in range(0, len(text), 4)]
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        chunks = self._answer(messages)
+        time.sleep(self.token_delay * len(chunks))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(chunks)))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        for chunk in self._answer(messages):
+            time.sleep(self.token_delay)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=chunk))
+
+
+def build_database(path: str):
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT, age INTEGER);
+        INSERT INTO users (name, age) VALUES ('Alice', 25), ('Bob', 30), ('Carol', 35);
+    """)
+    conn.close()
+
+
+def build_orchestrator(llm, database_uri: str) -> NL2SQLOrchestrator:
+    return NL2SQLOrchestrator(llm=llm, database_uri=database_uri, config={"explanation_enabled": False})
+
+
+def run(orchestrator: NL2SQLOrchestrator, questions: List[str], runs: int) -> List[float]:
+    latencies = []
+    for i in range(runs):
+        question = questions[i % len(questions)]
+        start = time.perf_counter()
+        result = orchestrator.ask(question)
+        latencies.append(time.perf_counter() - start)
+        if result.status.value != "success":
+            print(f"  ! {question}: {result.status.value} {result.error_message}")
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end pipeline benchmark")
+    parser.add_argument("--cassette", help="Recorded cassette (default: record a synthetic one)")
+    parser.add_argument("--database-uri", help="Database the cassette was recorded against")
+    parser.add_argument("--questions", help="File with one question per line")
+    parser.add_argument("--runs", type=int, default=20, help="Number of ask() calls")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay speed (0 = no delays)")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_pipeline_")
+    database_uri = args.database_uri
+    if database_uri is None:
+        db_path = os.path.join(workdir, "bench.db")
+        build_database(db_path)
+        database_uri = f"sqlite:///{db_path}"
+
+    questions = QUESTIONS
+    if args.questions:
+        with open(args.questions, "r", encoding="utf-8") as f:
+            questions = [line.strip() for line in f if line.strip()]
+
+    cassette_path = args.cassette
+    if cassette_path is None:
+        cassette_path = os.path.join(workdir, "cassette.jsonl")
+        recording = Cassette(cassette_path)
+        recorder = RecordingChatModel(inner=ScriptedModel(), cassette=recording)
+        run(build_orchestrator(recorder, database_uri), questions, len(questions))
+        recording.close()
+        print(f"recorded synthetic cassette: {cassette_path}")
+
+    cassette = Cassette(cassette_path)
+    replay = ReplayChatModel(cassette=cassette, speed=args.speed)
+    latencies = run(build_orchestrator(replay, database_uri), questions, args.runs)
+
+    latencies.sort()
+    p95 = latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)]
+    print(f"{'runs':>6} {'recorded':>9} {'speed':>6} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9}")
+    print(
+        f"{len(latencies):>6} {len(cassette):>9} {args.speed:>6.1f} "
+        f"{statistics.median(latencies) * 1000:>9.2f} {p95 * 1000:>9.2f} {latencies[-1] * 1000:>9.2f}"
+    )
+
+
+if __name__ == "__main__":
+    main()
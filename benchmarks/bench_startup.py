@@ -0,0 +1,124 @@
+"""
+Benchmark: process startup cost of the entry point, per mode.
+
+Each measurement runs in a fresh interpreter. ``python -X importtime`` reports
+the cumulative import time of every module; the top entries show what a mode
+pulls in. Wall time of ``cli tables`` is measured end to end, against a
+temporary SQLite database unless ``--database-uri`` is given.
+
+Usage:
+    python -m benchmarks.bench_startup [--runs 5] [--top 15]
+    python -m benchmarks.bench_startup --database-uri sqlite:///example.db
+"""
+import argparse
+import os
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Statements whose import cost is compared; the first is what every CLI run pays
+IMPORT_TARGETS = {
+    "src.main": "import src.main",
+    "src.core.orchestrator": "import src.core.orchestrator",
+    "create_app()": "from src.main import create_app; create_app()",
+}
+
+
+def build_database(path: str):
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT, age INTEGER);
+        CREATE TABLE orders (id INTEGER PRIMARY KEY, user_id INTEGER, amount REAL);
+    """)
+    conn.commit()
+    conn.close()
+
+
+def import_times(statement: str) -> List[Tuple[str, int, int]]:
+    """(module, nesting depth, cumulative microseconds) for every import done by ``statement``."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        capture_output=True, text=True, cwd=ROOT, check=True
+    )
+    times = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Nested imports are indented by two spaces per level after "| "
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        times.append((name.strip(), depth, int(cumulative)))
+    return times
+
+
+def total_ms(times: List[Tuple[str, int, int]]) -> float:
+    return sum(cumulative for _, depth, cumulative in times if depth == 0) / 1000
+
+
+def heaviest_packages(times: List[Tuple[str, int, int]]) -> Dict[str, int]:
+    """Largest cumulative time per third-party/stdlib top-level package."""
+    packages: Dict[str, int] = {}
+    for name, _, cumulative in times:
+        package = name.split(".")[0]
+        if package in ("src", "site", "encodings"):
+            continue
+        packages[package] = max(packages.get(package, 0), cumulative)
+    return packages
+
+
+def wall_time(argv: List[str], env: Dict[str, str], runs: int) -> List[float]:
+    latencies = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(argv, capture_output=True, cwd=ROOT, env=env, check=True)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Entry point startup benchmark")
+    parser.add_argument("--database-uri", help="Database for `cli tables` (default: temporary SQLite)")
+    parser.add_argument("--runs", type=int, default=5, help="Runs per wall-time measurement")
+    parser.add_argument("--top", type=int, default=15, help="Heaviest top-level packages to list")
+    args = parser.parse_args()
+
+    database_uri = args.database_uri
+    if database_uri is None:
+        db_path = os.path.join(tempfile.mkdtemp(prefix="bench_startup_"), "bench.db")
+        build_database(db_path)
+        database_uri = f"sqlite:///{db_path}"
+    env = dict(os.environ, DATABASE_URI=database_uri)
+
+    print(f"{'import':<24} {'modules':>8} {'ms':>9}")
+    main_times = []
+    for label, statement in IMPORT_TARGETS.items():
+        times = import_times(statement)
+        if label == "src.main":
+            main_times = times
+        print(f"{label:<24} {len(times):>8} {total_ms(times):>9.1f}")
+
+    print("\nheaviest packages loaded by `import src.main`:")
+    for package, cumulative in sorted(heaviest_packages(main_times).items(), key=lambda p: -p[1])[:args.top]:
+        print(f"  {package:<30} {cumulative / 1000:>9.1f} ms")
+
+    print(f"\n{'command':<24} {'runs':>6} {'p50 ms':>9} {'max ms':>9}")
+    commands = {
+        "python -c pass": [sys.executable, "-c", "pass"],
+        "cli tables": [sys.executable, "-m", "src.main", "--log-level", "WARNING", "cli", "tables"],
+    }
+    for label, argv in commands.items():
+        latencies = wall_time(argv, env, args.runs)
+        print(
+            f"{label:<24} {len(latencies):>6} "
+            f"{statistics.median(latencies) * 1000:>9.1f} {max(latencies) * 1000:>9.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
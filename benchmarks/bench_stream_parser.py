@@ -0,0 +1,93 @@
+"""
+Benchmark: streamed thinking/SQL parsing over long thinking traces.
+
+Compares the incremental ThinkingStreamParser with the previous
+accumulate-and-rescan approach (re-running ``in``/``split`` on the whole
+buffer and re-sending the whole thinking text on every chunk).
+
+Usage:
+    python -m benchmarks.bench_stream_parser [--tokens 10000] [--repeat 5]
+"""
+import argparse
+import time
+from typing import Callable, List, Tuple
+
+from src.generation.stream_parser import ThinkingStreamParser
+
+
+def build_trace(tokens: int) -> List[str]:
+    """Build a streamed output of roughly ``tokens`` chunks (one token per chunk)."""
+    words = ["分析", " users", " 表", "，", "需要", " JOIN", " orders", "。", "\n"]
+    chunks = ["<thin", "king>"]
+    chunks.extend(words[i % len(words)] for i in range(tokens))
+    chunks.extend(["</thi", "nking>\n<s", "ql>\nSELECT COUNT(*) ", "FROM users;\n</s", "ql>"])
+    return chunks
+
+
+def run_incremental(chunks: List[str]) -> int:
+    parser = ThinkingStreamParser()
+    emitted = 0
+    for chunk in chunks:
+        for event in parser.feed(chunk):
+            emitted += len(event["content"])
+    for event in parser.finish():
+        emitted += len(event["content"])
+    return emitted
+
+
+def run_legacy(chunks: List[str]) -> int:
+    """Re-implementation of the old buffer-rescanning loop, for reference."""
+    in_thinking = False
+    done = False
+    thinking_content = ""
+    buffer = ""
+    emitted = 0
+    for chunk in chunks:
+        buffer += chunk
+        if not in_thinking and not done and "<thinking>" in buffer:
+            in_thinking = True
+            buffer = buffer.split("<thinking>", 1)[1]
+        if in_thinking:
+            if "</thinking>" in buffer:
+                parts = buffer.split("</thinking>", 1)
+                thinking_content += parts[0]
+                buffer = parts[1]
+                in_thinking = False
+                done = True
+            else:
+                thinking_content += chunk
+            emitted += len(thinking_content)
+    return emitted
+
+
+def measure(fn: Callable[[List[str]], int], chunks: List[str], repeat: int) -> Tuple[float, int]:
+    best = float("inf")
+    emitted = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        emitted = fn(chunks)
+        best = min(best, time.perf_counter() - start)
+    return best, emitted
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Streamed thinking parser benchmark")
+    parser.add_argument("--tokens", type=int, default=10000, help="Largest trace size in tokens")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per measurement (best is reported)")
+    args = parser.parse_args()
+
+    sizes = sorted({max(args.tokens // 10, 1), max(args.tokens // 2, 1), args.tokens})
+    print(f"{'tokens':>8} {'input B':>10} {'incr ms':>10} {'incr out B':>11} {'legacy ms':>10} {'legacy out B':>13}")
+    for size in sizes:
+        chunks = build_trace(size)
+        input_bytes = sum(len(c) for c in chunks)
+        incr_time, incr_out = measure(run_incremental, chunks, args.repeat)
+        legacy_time, legacy_out = measure(run_legacy, chunks, args.repeat)
+        print(
+            f"{size:>8} {input_bytes:>10} {incr_time * 1000:>10.2f} {incr_out:>11} "
+            f"{legacy_time * 1000:>10.2f} {legacy_out:>13}"
+        )
+
+
+if __name__ == "__main__":
+    main()
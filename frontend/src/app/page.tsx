@@ -9,7 +9,7 @@ import SQLPreview from '@/components/nl2sql/SQLPreview';
 import ResultsTable from '@/components/nl2sql/ResultsTable';
 import HybridLayout from '@/components/nl2sql/HybridLayout';
 import ThinkingDisplay from '@/components/nl2sql/ThinkingDisplay';
-import { nl2sqlApi, StreamChunk } from '@/lib/api';
+import { nl2sqlApi, StreamChunk, toRecords } from '@/lib/api';
 
 interface HistoryItem {
   id: string;
@@ -61,7 +61,7 @@ export default function Home() {
         },
         (chunk: StreamChunk) => {
           // Handle nested data structure from backend
-          const data = chunk.data as Record<string, unknown> | undefined;
+          const data = chunk.data;
           
           if (chunk.stage) {
             setStreamStage(chunk.stage);
@@ -90,45 +90,10 @@ export default function Home() {
             setSql(data.sql as string);
           }
           
-          // Handle execution_result from both execution and done stages
-          // execution_result is returned as a string in the format "[(...), (...)]"
-          // We need to parse it to display in the table
-          if (data?.execution_result && chunk.stage !== 'explained') {
-            const execResult = data.execution_result as string;
-            
-            // Get column names from data if available
-            const columns = data.columns as string[] | undefined;
-            
-            if (execResult && execResult.trim()) {
-              try {
-                // Parse the string representation of tuples
-                // First, convert single quotes to double quotes (but preserve escaped quotes)
-                const parsed = execResult
-                  .replace(/\(/g, '[')
-                  .replace(/\)/g, ']')
-                  .replace(/'/g, '"');
-                const rows = JSON.parse(parsed) as unknown[][];
-                if (Array.isArray(rows) && rows.length > 0) {
-                  // Use provided column names or generate generic ones
-                  const columnNames = columns && columns.length > 0 
-                    ? columns 
-                    : Array.from({ length: Math.max(...rows.map(r => Array.isArray(r) ? r.length : 0)) }, (_, i) => `column_${i}`);
-                  
-                  const formattedResults = rows.map(row => {
-                    const obj: Record<string, unknown> = {};
-                    if (Array.isArray(row)) {
-                      row.forEach((val, idx) => {
-                        obj[columnNames[idx]] = val;
-                      });
-                    }
-                    return obj;
-                  });
-                  setResults(formattedResults);
-                }
-              } catch (e) {
-                console.error('Failed to parse execution_result:', e);
-              }
-            }
+          // done 事件携带列式结果 {columns, types, rows, row_count, truncated}
+          const execResult = data?.execution_result;
+          if (execResult && Array.isArray(execResult.rows) && chunk.stage !== 'explained') {
+            setResults(toRecords(execResult));
           }
         },
         () => {
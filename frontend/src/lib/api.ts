@@ -6,24 +6,50 @@ export interface QueryRequest {
   include_sql?: boolean;
 }
 
+// 列式查询结果：columns/types 与 rows 中每行的值一一对应
+export interface ResultSetPayload {
+  columns: string[];
+  types: string[];
+  rows: unknown[][];
+  row_count: number;
+  truncated: boolean;
+}
+
 export interface QueryResponse {
   question: string;
-  result: unknown;
+  result: ResultSetPayload | null;
   sql?: string;
   status: string;
   error?: string;
 }
 
+export interface StreamData extends Record<string, unknown> {
+  sql?: string;
+  columns?: string[];
+  rows?: unknown[][];  // execution_rows 事件中的一批结果行
+  execution_result?: ResultSetPayload | null;  // done 事件中的完整结果
+}
+
 export interface StreamChunk {
   stage?: string;
   status?: string;
   sql?: string;
-  result?: unknown;
+  result?: ResultSetPayload | null;
   error?: string;
   explanation?: string;
   thinking?: string;  // 新增：AI 思考过程
   chunk?: string;    // 新增：流式数据片段
-  data?: Record<string, unknown>;  // For nested data from backend
+  data?: StreamData;  // For nested data from backend
+}
+
+export function toRecords(result: ResultSetPayload): Record<string, unknown>[] {
+  return result.rows.map(row => {
+    const record: Record<string, unknown> = {};
+    result.columns.forEach((column, idx) => {
+      record[column] = row[idx];
+    });
+    return record;
+  });
 }
 
 export type StreamCallback = (chunk: StreamChunk) => void;
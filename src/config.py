@@ -51,6 +51,45 @@ class Settings(BaseSettings):
     llm_thinking_enabled: bool = Field(default=False, alias="llm_thinking_enabled")
     # Thinking token budget
     llm_thinking_budget: int = Field(default=4096, alias="llm_thinking_budget")
+    # Close the generation stream as soon as the SQL block is complete
+    llm_early_stop: bool = Field(default=True, alias="llm_early_stop")
+    # Fast model for simple questions (empty disables difficulty routing)
+    llm_fast_model: str = Field(default="", alias="llm_fast_model")
+    # Fast model provider (empty means same as llm_provider)
+    llm_fast_provider: str = Field(default="", alias="llm_fast_provider")
+    # Complexity score at or above which questions go to the strong model
+    llm_router_threshold: float = Field(default=1.5, alias="llm_router_threshold")
+    # Queue LLM calls behind a per-provider gateway (concurrency + rate limits)
+    llm_gateway_enabled: bool = Field(default=True, alias="llm_gateway_enabled")
+    # Max concurrent requests per provider
+    llm_gateway_max_in_flight: int = Field(default=8, alias="llm_gateway_max_in_flight")
+    # Requests per minute per provider (0 means unlimited)
+    llm_gateway_requests_per_minute: int = Field(default=0, alias="llm_gateway_requests_per_minute")
+    # Tokens per minute per provider (0 means unlimited)
+    llm_gateway_tokens_per_minute: int = Field(default=0, alias="llm_gateway_tokens_per_minute")
+    # Seconds a request may wait in the gateway queue
+    llm_gateway_queue_timeout: float = Field(default=30.0, alias="llm_gateway_queue_timeout")
+    # Pooled HTTP connections per base URL (OpenAI-compatible providers)
+    llm_gateway_max_connections: int = Field(default=20, alias="llm_gateway_max_connections")
+    # Fallback provider for hedging/failover (empty model disables hedging)
+    llm_fallback_provider: str = Field(default="", alias="llm_fallback_provider")
+    llm_fallback_model: str = Field(default="", alias="llm_fallback_model")
+    llm_fallback_api_key: str = Field(default="", alias="llm_fallback_api_key")
+    llm_fallback_base_url: str = Field(default="", alias="llm_fallback_base_url")
+    # Percentile of primary first-token latency after which the fallback is fired
+    llm_hedging_percentile: float = Field(default=0.95, alias="llm_hedging_percentile")
+    # Hedge delay (seconds) used until enough latency samples are collected
+    llm_hedging_initial_delay: float = Field(default=2.0, alias="llm_hedging_initial_delay")
+    # Consecutive failures before a provider's circuit breaker opens
+    llm_hedging_failure_threshold: int = Field(default=3, alias="llm_hedging_failure_threshold")
+    # Seconds an open circuit breaker keeps a provider sidelined
+    llm_hedging_cooldown: float = Field(default=30.0, alias="llm_hedging_cooldown")
+    # LLM cassette mode: "" (off) / record / replay
+    llm_cassette_mode: str = Field(default="", alias="llm_cassette_mode")
+    # Cassette file storing recorded responses keyed by prompt hash
+    llm_cassette_path: str = Field(default="data/cassettes/llm.jsonl", alias="llm_cassette_path")
+    # Replay speed multiplier for recorded timings (0 means as fast as possible)
+    llm_cassette_speed: float = Field(default=1.0, alias="llm_cassette_speed")
     
     # MiniMax specific settings
     minimax_api_key: str = Field(default="", alias="minimax_api_key")
@@ -87,6 +126,16 @@ class Settings(BaseSettings):
         alias="security_forbidden_keywords"
     )
     security_max_rows: int = Field(default=1000, alias="security_max_rows")
+    # Pre-execution EXPLAIN cost guard (0 disables a threshold)
+    security_cost_guard_enabled: bool = Field(default=True, alias="security_cost_guard_enabled")
+    security_cost_guard_policy: str = Field(default="limit", alias="security_cost_guard_policy")
+    security_cost_guard_max_cost: float = Field(default=0.0, alias="security_cost_guard_max_cost")
+    security_cost_guard_max_rows: float = Field(default=1_000_000, alias="security_cost_guard_max_rows")
+    security_cost_guard_full_scan_rows: int = Field(default=100_000, alias="security_cost_guard_full_scan_rows")
+    security_cost_guard_limit_rows: int = Field(default=1000, alias="security_cost_guard_limit_rows")
+    security_cost_guard_queue_slots: int = Field(default=2, alias="security_cost_guard_queue_slots")
+    security_cost_guard_queue_timeout: float = Field(default=30.0, alias="security_cost_guard_queue_timeout")
+    security_cost_guard_plan_ttl: float = Field(default=300.0, alias="security_cost_guard_plan_ttl")
     
     # ===================
     # Paths Configuration
@@ -135,8 +184,75 @@ class Settings(BaseSettings):
     # ===================
     execution_enabled: bool = Field(default=True, alias="execution_enabled")
     execution_retries: int = Field(default=3, alias="execution_retries")
-    execution_retry_interval: int = Field(default=1, alias="execution_retry_interval")
+    execution_retry_interval: float = Field(default=1.0, alias="execution_retry_interval")
     execution_timeout: int = Field(default=60, alias="execution_timeout")
+    # Rows fetched per batch from the server-side cursor
+    execution_batch_size: int = Field(default=500, alias="execution_batch_size")
+    # Local schema-aware identifier check before execution
+    execution_schema_check: bool = Field(default=True, alias="execution_schema_check")
+    execution_schema_check_max_distance: int = Field(default=2, alias="execution_schema_check_max_distance")
+    # Ring buffer size for per-executor execution summaries
+    execution_history_size: int = Field(default=1000, alias="execution_history_size")
+    # Thread pool size for blocking work (database, schema) behind the async API
+    execution_async_workers: int = Field(default=16, alias="execution_async_workers")
+    # Thread pool size for pipeline stages that run alongside each other within one request
+    execution_stage_workers: int = Field(default=8, alias="execution_stage_workers")
+    # Questions processed at once by ask_many / POST /query/batch (also the per-request cap)
+    execution_batch_concurrency: int = Field(default=8, alias="execution_batch_concurrency")
+    # Slow-query log (empty path keeps entries in memory only)
+    execution_slow_query_threshold: float = Field(default=5.0, alias="execution_slow_query_threshold")
+    execution_slow_query_log: str = Field(default="", alias="execution_slow_query_log")
+    execution_slow_query_log_max_size: int = Field(default=10, alias="execution_slow_query_log_max_size")
+    execution_slow_query_log_backup_count: int = Field(default=5, alias="execution_slow_query_log_backup_count")
+    
+    # ===================
+    # Generation Configuration
+    # ===================
+    # Number of SQL candidates sampled per question (1 disables voting)
+    generation_candidates: int = Field(default=1, alias="generation_candidates")
+    # Per-candidate statement timeout in seconds; slower candidates are aborted
+    generation_candidate_timeout: float = Field(default=10.0, alias="generation_candidate_timeout")
+    
+    # ===================
+    # Cache Configuration
+    # ===================
+    # Answer repeated question shapes from parameterized SQL templates
+    cache_template_enabled: bool = Field(default=True, alias="cache_template_enabled")
+    # Minimum template confidence (successes / uses) required to reuse it
+    cache_template_confidence: float = Field(default=0.8, alias="cache_template_confidence")
+    # Max stored templates (LRU eviction)
+    cache_template_max_entries: int = Field(default=1000, alias="cache_template_max_entries")
+    # Max distinct values for a text column to be used as a literal dictionary
+    cache_dictionary_max_values: int = Field(default=100, alias="cache_dictionary_max_values")
+    # Reuse SQL of semantically similar past questions (needs an embedding model)
+    cache_semantic_enabled: bool = Field(default=False, alias="cache_semantic_enabled")
+    # Minimum cosine similarity for a semantic cache hit
+    cache_semantic_threshold: float = Field(default=0.92, alias="cache_semantic_threshold")
+    # Max cached questions (least recently hit are evicted first)
+    cache_semantic_max_entries: int = Field(default=1000, alias="cache_semantic_max_entries")
+    # Seconds before a cached question expires
+    cache_semantic_ttl: float = Field(default=3600.0, alias="cache_semantic_ttl")
+    # Re-execute cached SQL on hit for fresh data (false returns the stored result)
+    cache_semantic_reexecute: bool = Field(default=True, alias="cache_semantic_reexecute")
+    # Fraction of hits re-answered by the full pipeline to detect false hits
+    cache_semantic_audit_rate: float = Field(default=0.05, alias="cache_semantic_audit_rate")
+    # Reuse results of identical SQL while the data version is unchanged
+    # (unset: only for SQLite, whose data version reveals writes from other processes)
+    cache_result_enabled: Optional[bool] = Field(default=None, alias="cache_result_enabled")
+    # Max cached result sets (LRU eviction)
+    cache_result_max_entries: int = Field(default=500, alias="cache_result_max_entries")
+    # Max total bytes of cached results after compression (LRU eviction)
+    cache_result_max_bytes: int = Field(default=64 * 1024 * 1024, alias="cache_result_max_bytes")
+    # Seconds before a cached result expires regardless of data version
+    cache_result_ttl: float = Field(default=600.0, alias="cache_result_ttl")
+    # Seconds an expired result may still be served while it is refreshed in the background
+    cache_result_stale_while_revalidate: float = Field(default=0.0, alias="cache_result_stale_while_revalidate")
+    # Serialized results larger than this many bytes are stored zlib-compressed
+    cache_result_compress_threshold: int = Field(default=16 * 1024, alias="cache_result_compress_threshold")
+    # Share one pipeline run between identical concurrent questions
+    cache_coalesce_enabled: bool = Field(default=True, alias="cache_coalesce_enabled")
+    # Reuse the generated schema doc (columns, sample rows, row counts) for this many seconds; 0 disables
+    cache_schema_doc_ttl: float = Field(default=300.0, alias="cache_schema_doc_ttl")
     
     # ===================
     # Explanation Configuration
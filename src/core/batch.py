@@ -0,0 +1,101 @@
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, List, Optional
+import asyncio
+import copy
+import time
+import logging
+
+from .types import QueryResult, QueryStatus
+from ..semantic.semantic_cache import SemanticCache
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class BatchItem:
+    index: int
+    result: QueryResult
+    duplicate: bool = False
+
+
+class QueryBatch:
+    """批量问答（ask_many 的返回值）
+
+    异步迭代得到按完成顺序排列的 BatchItem，index 为问题在输入中的位置。
+    schema 只准备一次；归一化后相同的问题只执行一次，结果复制给每个重复项；
+    同时处理的问题数不超过 concurrency，数据库操作走编排器的有界线程池。
+    迭代结束后可读取 summary()。
+    """
+
+    def __init__(
+        self,
+        orchestrator: Any,
+        questions: List[str],
+        concurrency: int = 8,
+        scope: Optional[str] = None
+    ):
+        self.orchestrator = orchestrator
+        self.questions = list(questions)
+        self.concurrency = max(concurrency, 1)
+        self.scope = scope
+        self.unique = 0
+        self.completed = 0
+        self.statuses: Dict[str, int] = {}
+        self.elapsed = 0.0
+
+    async def __aiter__(self) -> AsyncIterator[BatchItem]:
+        started = time.monotonic()
+        groups: Dict[str, List[int]] = {}
+        for index, question in enumerate(self.questions):
+            groups.setdefault(SemanticCache.normalize(question), []).append(index)
+        self.unique = len(groups)
+
+        orchestrator = self.orchestrator
+        schema_doc = await orchestrator._run_blocking(orchestrator._prepare_schema)
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def run(indexes: List[int]):
+            async with semaphore:
+                question = self.questions[indexes[0]]
+                try:
+                    result = await orchestrator._ask_async(question, self.scope, schema_doc=schema_doc)
+                except Exception as e:
+                    logger.error(f"批量问答失败: {e}")
+                    result = QueryResult(
+                        status=QueryStatus.GENERATION_ERROR,
+                        question=question,
+                        error_message=str(e)
+                    )
+                return indexes, result
+
+        tasks = [asyncio.ensure_future(run(indexes)) for indexes in groups.values()]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                indexes, result = await next_done
+                for position, index in enumerate(indexes):
+                    item = BatchItem(index=index, result=result, duplicate=position > 0)
+                    if item.duplicate:
+                        item.result = copy.copy(result)
+                        item.result.question = self.questions[index]
+                    self.completed += 1
+                    status = item.result.status.value
+                    self.statuses[status] = self.statuses.get(status, 0) + 1
+                    self.elapsed = time.monotonic() - started
+                    yield item
+        finally:
+            # 调用方提前停止迭代时，取消尚未完成的问题
+            for task in tasks:
+                task.cancel()
+            self.elapsed = time.monotonic() - started
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "total": len(self.questions),
+            "unique": self.unique,
+            "completed": self.completed,
+            "succeeded": self.statuses.get(QueryStatus.SUCCESS.value, 0),
+            "statuses": dict(self.statuses),
+            "concurrency": self.concurrency,
+            "elapsed": self.elapsed,
+            "throughput": self.completed / self.elapsed if self.elapsed > 0 else 0.0,
+        }
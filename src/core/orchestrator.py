@@ -1,9 +1,20 @@
-from typing import Optional, Dict, Any, List, Generator
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List, AsyncGenerator, Callable, Generator
+import contextlib
+import copy
+import functools
+import hashlib
+import json
 import time
 import logging
 
 from langchain_community.utilities import SQLDatabase
+from sqlalchemy import inspect
 
+from .batch import QueryBatch
+from .single_flight import SingleFlight
+from .stage_runner import AsyncStageRunner, SyncStageRunner, iterate_sync, run_sync
+from .stage_timer import StageTimer
 from .types import (
     QueryResult,
     QueryStatus,
@@ -11,15 +22,28 @@ from .types import (
     SecurityResult,
     ExecutionResult,
 )
-from ..schema.database_connector import DatabaseConnector
+from ..schema.database_connector import DatabaseConnectorFactory
 from ..schema.schema_extractor import SchemaExtractor
 from ..schema.schema_doc_generator import SchemaDocGenerator
 from ..schema.schema_enhancer import SchemaEnhancer
 from ..generation.sql_generator import SQLGenerator
+from ..generation.candidate_voter import CandidateVoter
+from ..generation.model_router import ModelRouter, RouteDecision, FAST_ROUTE
+from ..generation.llm_gateway import get_all_gateway_metrics
+from ..generation.llm_hedging import HedgedChatModel
+from ..generation.template_cache import TemplateCache, TemplateMatch, load_column_values
+from ..semantic.semantic_cache import SemanticCache, SemanticCacheHit
+from ..execution.error_analyzer import RetryConfig
 from ..execution.query_executor import QueryExecutor
+from ..execution.query_monitor import QueryMonitor, SlowQueryLog
+from ..execution.query_timeout import CancelToken
+from ..execution.result_cache import ResultCache
+from ..execution.result_set import ResultSet, jsonable_rows, serialize_result
+from ..execution.schema_checker import SchemaChecker
 from ..semantic.semantic_mapper import SemanticMapper
 from ..semantic.config_manager import SemanticConfigManager
 from ..security.sql_validator import SQLSecurityValidator
+from ..security.cost_guard import QueryCostGuard, CostDecision
 from ..explanation.result_explainer import ResultExplainer
 
 
@@ -31,18 +55,20 @@ class NL2SQLOrchestrator:
         self,
         llm: Any,
         database_uri: str,
-        config: Optional[Dict[str, Any]] = None
+        config: Optional[Dict[str, Any]] = None,
+        fast_llm: Any = None,
+        embeddings: Any = None
     ):
         self.llm = llm
+        self.fast_llm = fast_llm
+        self.embeddings = embeddings
         self.database_uri = database_uri
         self.config = config or {}
 
         self._init_modules()
 
     def _init_modules(self):
-        db_path = self.database_uri.replace("sqlite:///", "") if self.database_uri.startswith("sqlite:///") else self.database_uri
-        
-        self.db_connector = DatabaseConnector(db_path=db_path, db_type="sqlite")
+        self.db_connector = DatabaseConnectorFactory.create_from_uri(self.database_uri)
         self.db = self.db_connector.db
         self.schema_extractor = SchemaExtractor(self.db)
         self.schema_doc_generator = SchemaDocGenerator(self.db)
@@ -52,13 +78,82 @@ class NL2SQLOrchestrator:
 
         self.sql_generator = SQLGenerator(
             llm=self.llm,
-            prompt_template=None
+            prompt_template=None,
+            early_stop=self.config.get("early_stop", True)
+        )
+
+        # 查询结果缓存：相同 SQL 在数据版本未变时直接返回缓存结果
+        self.result_cache = None
+        result_cache_enabled = self.config.get("result_cache_enabled", False)
+        if result_cache_enabled is None:
+            # 未显式配置时只对 SQLite 启用：其他数据库无法感知其他进程的写入
+            result_cache_enabled = self.db.dialect == "sqlite"
+        if result_cache_enabled:
+            self.result_cache = ResultCache(
+                database=self.db,
+                max_entries=self.config.get("result_cache_max_entries", 500),
+                max_bytes=self.config.get("result_cache_max_bytes", 64 * 1024 * 1024),
+                ttl=self.config.get("result_cache_ttl", 600.0),
+                stale_while_revalidate=self.config.get("result_cache_stale_while_revalidate", 0.0),
+                compress_threshold=self.config.get("result_cache_compress_threshold", 16 * 1024)
+            )
+
+        # 执行前的本地 schema 校验：近似拼写的表名 / 列名直接更正
+        self.schema_checker = None
+        if self.config.get("schema_check_enabled", False):
+            self.schema_checker = SchemaChecker(
+                database=self.db,
+                max_distance=self.config.get("schema_check_max_distance", 2)
+            )
+
+        # 按 SQL 指纹统计延迟分布，超过阈值的查询写入慢查询日志
+        self.query_monitor = QueryMonitor(
+            slow_query_threshold=self.config.get("slow_query_threshold", 5.0),
+            slow_log=SlowQueryLog(
+                path=self.config.get("slow_query_log") or None,
+                max_bytes=self.config.get("slow_query_log_max_bytes", 10 * 1024 * 1024),
+                backup_count=self.config.get("slow_query_log_backup_count", 5)
+            )
+        )
+
+        self.security_validator = SQLSecurityValidator(
+            allowed_tables=self.config.get("allowed_tables"),
+            allowed_columns=self.config.get("allowed_columns"),
+            read_only=self.config.get("read_only", True)
         )
 
+        # 执行前的代价守卫：按执行计划拒绝 / 限制行数 / 排队执行昂贵查询
+        self.cost_guard = None
+        if self.config.get("cost_guard_enabled", False):
+            self.cost_guard = QueryCostGuard(
+                database=self.db,
+                policy=self.config.get("cost_guard_policy", "limit"),
+                max_cost=self.config.get("cost_guard_max_cost"),
+                max_rows=self.config.get("cost_guard_max_rows"),
+                full_scan_rows=self.config.get("cost_guard_full_scan_rows"),
+                limit_rows=self.config.get("cost_guard_limit_rows", self.config.get("max_rows", 1000)),
+                queue_slots=self.config.get("cost_guard_queue_slots", 2),
+                queue_timeout=self.config.get("cost_guard_queue_timeout", 30.0),
+                plan_ttl=self.config.get("cost_guard_plan_ttl", 300.0)
+            )
+
         self.query_executor = QueryExecutor(
             database=self.db,
-            max_retries=self.config.get("max_retries", 3),
-            llm=self.llm
+            llm=self.llm,
+            result_cache=self.result_cache,
+            max_rows=self.config.get("max_rows", 1000),
+            batch_size=self.config.get("fetch_batch_size", 500),
+            query_timeout=self._query_timeout(),
+            execution_timeout=self.config.get("execution_timeout"),
+            schema_checker=self.schema_checker,
+            retry_config=RetryConfig(
+                max_retries=self.config.get("max_retries", 3),
+                base_delay=self.config.get("retry_interval", 1.0)
+            ),
+            history_size=self.config.get("execution_history_size", 1000),
+            monitor=self.query_monitor,
+            security_validator=self.security_validator,
+            cost_guard=self.cost_guard
         )
 
         self.semantic_mapper = SemanticMapper()
@@ -72,34 +167,221 @@ class NL2SQLOrchestrator:
             for expr, sql_expr in time_mappings.items():
                 self.semantic_mapper.add_time_mapping(expr, sql_expr)
 
-        self.security_validator = SQLSecurityValidator(
-            allowed_tables=self.config.get("allowed_tables"),
-            allowed_columns=self.config.get("allowed_columns"),
-            read_only=self.config.get("read_only", True)
+        self.result_explainer = ResultExplainer(llm=self.llm)
+
+        # 快速模型 / 强模型路由（提供 fast_llm 时启用）
+        self.model_router = None
+        if self.fast_llm is not None:
+            self.model_router = ModelRouter(
+                fast_generator=SQLGenerator(
+                    llm=self.fast_llm,
+                    early_stop=self.config.get("early_stop", True)
+                ),
+                strong_generator=self.sql_generator,
+                table_names=self.db.get_usable_table_names(),
+                threshold=self.config.get("router_threshold", 1.5)
+            )
+
+        # 多候选生成 + 执行投票（candidate_count > 1 时启用）
+        self.candidate_voter = None
+        candidate_count = self.config.get("candidate_count", 1)
+        if candidate_count > 1:
+            # 候选只执行一次：失败的候选直接落选，不重试也不交给 LLM 修复；
+            # candidate_timeout 作为每条候选语句在数据库端的超时
+            self.candidate_executor = QueryExecutor(
+                database=self.db,
+                result_cache=self.result_cache,
+                max_rows=self.config.get("max_rows", 1000),
+                batch_size=self.config.get("fetch_batch_size", 500),
+                query_timeout=self._query_timeout(),
+                execution_timeout=self.config.get("candidate_timeout", 10.0),
+                schema_checker=self.schema_checker,
+                retry_config=RetryConfig(max_retries=1),
+                history_size=self.config.get("execution_history_size", 1000),
+                monitor=self.query_monitor,
+                security_validator=self.security_validator,
+                cost_guard=self.cost_guard
+            )
+            self.candidate_voter = CandidateVoter(
+                sql_generator=self.sql_generator,
+                security_validator=self.security_validator,
+                execute=functools.partial(self._execute_sql, executor=self.candidate_executor),
+                candidate_count=candidate_count,
+                execution_timeout=self.config.get("candidate_timeout", 10.0)
+            )
+
+        # 问题模板缓存：相同句式、不同字面量的问题直接绑定参数执行
+        self.template_cache = None
+        if self.config.get("template_cache_enabled", False):
+            self.template_cache = TemplateCache(
+                value_loader=self._column_values_loader(),
+                confidence_threshold=self.config.get("template_confidence", 0.8),
+                max_entries=self.config.get("template_max_entries", 1000)
+            )
+
+        # 语义答案缓存：相似问题（改写、同义表达）复用已成功的 SQL
+        self.semantic_cache = None
+        if self.embeddings is not None and self.config.get("semantic_cache_enabled", False):
+            self.semantic_cache = SemanticCache(
+                embeddings_model=self.embeddings,
+                similarity_threshold=self.config.get("semantic_cache_threshold", 0.92),
+                max_entries=self.config.get("semantic_cache_max_entries", 1000),
+                ttl=self.config.get("semantic_cache_ttl", 3600),
+                audit_rate=self.config.get("semantic_cache_audit_rate", 0.05),
+                literal_extractor=self._literal_extractor()
+            )
+        self._schema_fingerprint_value = None
+        self._schema_fingerprint_at = 0.0
+        self._schema_doc: Optional[str] = None
+        self._schema_doc_at = 0.0
+
+        # 相同问题（归一化后）、相同 schema 版本和权限范围的并发请求共享一次执行
+        self.single_flight = SingleFlight() if self.config.get("coalesce_enabled", True) else None
+
+        # 异步入口中的数据库和其他阻塞操作在有界线程池中执行，不占用事件循环
+        self._blocking_pool = ThreadPoolExecutor(
+            max_workers=self.config.get("async_workers", 16),
+            thread_name_prefix="nl2sql-blocking"
+        )
+        # 同步入口中同一请求内互不依赖的阶段（schema 准备与语义映射、结果解释与缓存写入）并行执行；
+        # 与 _blocking_pool 分开，在后者中调用同步入口时不会因等待自身提交的任务而死锁
+        self._stage_pool = ThreadPoolExecutor(
+            max_workers=self.config.get("stage_workers", 8),
+            thread_name_prefix="nl2sql-stage"
         )
 
-        self.result_explainer = ResultExplainer(llm=self.llm)
+        # 同步与异步入口共用同一份流水线（_pipeline / _stream），只是执行方式不同
+        self._sync_runner = SyncStageRunner(self._stage_pool)
+        self._async_runner = AsyncStageRunner(self._blocking_pool)
 
         logger.info("All modules initialized")
 
-    def ask(self, question: str) -> QueryResult:
+    def ask(self, question: str, scope: Optional[str] = None) -> QueryResult:
+        if self.single_flight is None:
+            return self._ask(question, scope)
+
+        result, shared = self.single_flight.do(
+            self._flight_key(question, scope),
+            lambda: self._ask(question, scope)
+        )
+        if shared:
+            result = copy.copy(result)
+            result.question = question
+            result.metadata = {**result.metadata, "coalesced": True}
+        return result
+
+    async def ask_async(self, question: str, scope: Optional[str] = None) -> QueryResult:
+        """ask 的异步版本：SQL 生成和结果解释通过 ainvoke 调用模型，数据库操作在有界线程池中执行"""
+        if self.single_flight is None:
+            return await self._ask_async(question, scope)
+
+        key = await self._run_blocking(self._flight_key, question, scope)
+        result, shared = await self.single_flight.do_async(
+            key,
+            lambda: self._ask_async(question, scope)
+        )
+        if shared:
+            result = copy.copy(result)
+            result.question = question
+            result.metadata = {**result.metadata, "coalesced": True}
+        return result
+
+    def ask_many(
+        self,
+        questions: List[str],
+        concurrency: Optional[int] = None,
+        scope: Optional[str] = None
+    ) -> QueryBatch:
+        """批量问答：异步迭代返回值得到按完成顺序排列的结果，结束后读取 summary()"""
+        return QueryBatch(
+            self,
+            questions,
+            concurrency=concurrency or self.config.get("batch_concurrency", 8),
+            scope=scope
+        )
+
+    async def _run_blocking(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        return await self._async_runner.call(fn, *args, **kwargs)
+
+    def _ask(
+        self,
+        question: str,
+        scope: Optional[str] = None,
+        schema_doc: Optional[str] = None
+    ) -> QueryResult:
+        return run_sync(self._pipeline(self._sync_runner, question, scope, schema_doc))
+
+    async def _ask_async(
+        self,
+        question: str,
+        scope: Optional[str] = None,
+        schema_doc: Optional[str] = None
+    ) -> QueryResult:
+        """schema_doc 不为空时直接使用（批量问答预先准备一次），否则与映射并行准备"""
+        return await self._pipeline(self._async_runner, question, scope, schema_doc)
+
+    async def _pipeline(
+        self,
+        runner: Any,
+        question: str,
+        scope: Optional[str] = None,
+        schema_doc: Optional[str] = None
+    ) -> QueryResult:
+        """问答流水线，_ask 与 _ask_async 共用
+
+        runner 决定阻塞调用和模型调用的执行方式：SyncStageRunner 在当前线程中直接调用，
+        AsyncStageRunner 把阻塞调用放到线程池、通过异步接口调用模型。
+        """
         start_time = time.time()
+        timer = StageTimer()
 
         result = QueryResult(
             status=QueryStatus.SUCCESS,
             question=question
         )
+        decision = None
 
         try:
-            mapping = self._semantic_mapping(question)
+            answered, cache_scope, semantic_hit = await self._lookup_caches(runner, result, scope)
+            if answered:
+                result.explanation = await runner.model(
+                    self._explain_result,
+                    self.result_explainer.aexplain,
+                    question,
+                    result.execution.result
+                )
+                result.metadata["execution_time"] = time.time() - start_time
+                if semantic_hit is not None:
+                    self.semantic_cache.record_saved_latency(semantic_hit, result.metadata["execution_time"])
+                return result
+
+            # schema 准备不依赖映射结果，与映射并行
+            schema_task = None
+            if schema_doc is None:
+                schema_task = runner.spawn(timer, "schema", self._prepare_schema)
+            try:
+                with timer.stage("mapping"):
+                    mapping = self._semantic_mapping(question)
+            except BaseException:
+                if schema_task is not None:
+                    schema_task.cancel()
+                raise
             result.mapping = mapping
 
-            schema_doc = self._prepare_schema()
+            if schema_task is not None:
+                schema_doc = await runner.join(schema_task)
 
-            sql = self._generate_sql(mapping.enhanced_question, schema_doc)
+            decision = self._route(result, question, mapping)
+            with timer.stage("generation"):
+                sql, vote = await self._generate(runner, result, mapping, schema_doc, decision)
             result.sql = sql
 
-            security_result = self._validate_security(sql)
+            with timer.stage("security"):
+                security_result = self._validate_security(sql)
+
+            if not security_result.is_valid and self._can_escalate(decision):
+                sql, decision, security_result = await self._escalate(runner, result, mapping, schema_doc, decision)
+
             result.security = security_result
 
             if not security_result.is_valid:
@@ -108,20 +390,65 @@ class NL2SQLOrchestrator:
                 result.metadata["execution_time"] = time.time() - start_time
                 return result
 
-            execution_result = self._execute_sql(sql)
+            if vote is not None and vote.has_winner and vote.sql == sql:
+                # 胜出候选已经通过 _execute_sql 执行过，直接复用其结果
+                execution_result = vote.execution
+            else:
+                with timer.stage("execution"):
+                    execution_result = await runner.call(self._execute_sql, sql, question=question)
+
+            if (
+                not execution_result.success
+                and not execution_result.cancelled
+                and self._can_escalate(decision)
+            ):
+                sql, decision, security_result = await self._escalate(runner, result, mapping, schema_doc, decision)
+                result.security = security_result
+                if not security_result.is_valid:
+                    result.status = QueryStatus.SECURITY_REJECTED
+                    result.error_message = security_result.message
+                    result.metadata["execution_time"] = time.time() - start_time
+                    return result
+                with timer.stage("execution"):
+                    execution_result = await runner.call(self._execute_sql, sql, question=question)
+
             result.execution = execution_result
+            if execution_result.cost_guard is not None:
+                result.metadata["cost_guard"] = execution_result.cost_guard
 
             if not execution_result.success:
-                result.status = QueryStatus.EXECUTION_ERROR
+                result.status = self._execution_failure_status(execution_result)
                 result.error_message = execution_result.error
                 result.metadata["execution_time"] = time.time() - start_time
                 return result
 
-            explanation = self._explain_result(
+            # 解释需要调用 LLM，与缓存写入（语义缓存的向量化、审计重放）并行
+            explanation_task = runner.spawn(
+                timer,
+                "explanation",
+                self._explain_result,
+                self.result_explainer.aexplain,
                 question,
                 execution_result.result
             )
-            result.explanation = explanation
+
+            try:
+                with timer.stage("cache_store"):
+                    if self.template_cache is not None or self.semantic_cache is not None:
+                        await runner.call(
+                            self._store_caches,
+                            question,
+                            sql,
+                            execution_result,
+                            cache_scope,
+                            semantic_hit,
+                            start_time
+                        )
+            except BaseException:
+                explanation_task.cancel()
+                raise
+
+            result.explanation = await runner.join(explanation_task)
 
             result.metadata["execution_time"] = time.time() - start_time
 
@@ -131,58 +458,568 @@ class NL2SQLOrchestrator:
             result.error_message = str(e)
             result.metadata["execution_time"] = time.time() - start_time
 
+        finally:
+            if decision is not None:
+                self.model_router.record_outcome(
+                    decision.route,
+                    result.status == QueryStatus.SUCCESS
+                )
+            result.metadata["timings"] = timer.summary()
+
         return result
 
-    def ask_stream(self, question: str) -> Generator[Dict[str, Any], None, None]:
+    async def _lookup_caches(self, runner: Any, result: QueryResult, scope: Optional[str] = None):
+        """查模板缓存和语义缓存，命中时执行缓存的 SQL 并填入 result（解释除外）
+
+        返回 (是否已作答, 缓存作用域, 语义缓存命中)；被抽中审计的语义命中不直接作答，
+        继续走完整流程，结束后比对结果。
+        """
+        if self.template_cache is not None:
+            match = self.template_cache.lookup(result.question)
+            if match is not None and await runner.call(self._use_template, result, match):
+                return True, None, None
+
+        if self.semantic_cache is None:
+            return False, None, None
+
+        cache_scope = await runner.call(self._cache_scope, scope)
+        semantic_hit = await runner.call(self.semantic_cache.lookup, result.question, cache_scope)
+        if semantic_hit is not None and not semantic_hit.audit:
+            if await runner.call(self._use_semantic_cache, result, semantic_hit):
+                return True, cache_scope, semantic_hit
+        return False, cache_scope, semantic_hit
+
+    def _route(self, result: QueryResult, question: str, mapping: MappingResult) -> Optional[RouteDecision]:
+        if self.candidate_voter is not None or self.model_router is None:
+            return None
+        decision = self.model_router.route(
+            question,
+            mapping.field_mappings,
+            mapping.time_mappings
+        )
+        result.metadata["route"] = decision.route
+        result.metadata["route_score"] = decision.score
+        return decision
+
+    async def _generate(
+        self,
+        runner: Any,
+        result: QueryResult,
+        mapping: MappingResult,
+        schema_doc: str,
+        decision: Optional[RouteDecision]
+    ):
+        """生成 SQL：多候选投票、按路由选择的模型或默认生成器；返回 (sql, 投票结果)"""
+        if self.candidate_voter is not None:
+            vote = await runner.model(
+                self.candidate_voter.generate_candidates,
+                self.candidate_voter.agenerate_candidates,
+                schema_doc,
+                mapping.enhanced_question
+            )
+            vote = await runner.call(self.candidate_voter.execute_and_vote, vote, mapping.enhanced_question)
+            result.metadata["candidates"] = vote.summary()
+            return vote.sql, vote
+
+        if decision is not None:
+            sql = await runner.model(
+                self.model_router.generate,
+                self.model_router.agenerate,
+                schema_doc,
+                mapping.enhanced_question,
+                decision
+            )
+        else:
+            sql = await runner.model(
+                self.sql_generator.generate,
+                self.sql_generator.agenerate,
+                schema_doc,
+                mapping.enhanced_question
+            )
+        return sql, None
+
+    def _literal_extractor(self) -> TemplateCache:
+        """语义缓存比对字面量用的抽取器：优先复用模板缓存（同一份列字典）"""
+        if self.template_cache is not None:
+            return self.template_cache
+        return TemplateCache(value_loader=self._column_values_loader())
+
+    def _column_values_loader(self) -> Callable[[], Dict[str, str]]:
+        """列字典在第一次抽取字面量时才读取，不拖慢启动"""
+        return functools.partial(
+            load_column_values,
+            self.db,
+            self.config.get("template_dictionary_max_values", 100)
+        )
+
+    def _use_template(self, result: QueryResult, match: TemplateMatch) -> bool:
+        """用模板缓存命中的参数化 SQL 直接执行，失败时返回 False 走完整流程；解释由调用方生成"""
+        security_result = self._validate_security(match.template.sql)
+        if not security_result.is_valid:
+            self.template_cache.record_failure(match)
+            return False
+
+        execution_result = self._execute_sql(match.template.sql, match.parameters, result.question)
+        if not execution_result.success:
+            logger.info(f"模板缓存 SQL 执行失败，改用 LLM 生成: {execution_result.error}")
+            self.template_cache.record_failure(match)
+            return False
+        self.template_cache.record_success(match)
+
+        result.sql = match.display_sql
+        result.security = security_result
+        result.execution = execution_result
+        result.metadata["template_cache"] = {
+            "hit": True,
+            "template": match.template.key,
+            "parameters": match.parameters,
+            "confidence": match.template.confidence,
+        }
+        return True
+
+    def _use_semantic_cache(self, result: QueryResult, hit: SemanticCacheHit) -> bool:
+        """复用语义缓存中的 SQL；配置 semantic_cache_reexecute 时重新执行以获取最新数据；解释由调用方生成"""
+        sql = hit.entry.sql
+        security_result = self._validate_security(sql)
+        if not security_result.is_valid:
+            return False
+
+        if self.config.get("semantic_cache_reexecute", True):
+            execution_result = self._execute_sql(sql, question=result.question)
+            if not execution_result.success:
+                return False
+        else:
+            execution_result = ExecutionResult(success=True, result=hit.entry.result)
+
+        result.sql = sql
+        result.security = security_result
+        result.execution = execution_result
+        result.metadata["semantic_cache"] = {
+            "hit": True,
+            "cached_question": hit.entry.question,
+            "similarity": hit.similarity,
+        }
+        return True
+
+    def _store_caches(
+        self,
+        question: str,
+        sql: str,
+        execution_result: ExecutionResult,
+        cache_scope: Optional[str],
+        semantic_hit: Optional[SemanticCacheHit],
+        start_time: float
+    ):
+        """成功的查询写入模板缓存和语义缓存；审计命中时重放缓存 SQL 并比对结果"""
+        if self.template_cache is not None and execution_result.attempts == 1:
+            self.template_cache.store(question, sql)
+
+        if self.semantic_cache is not None:
+            if semantic_hit is not None:
+                cached = self._execute_sql(semantic_hit.entry.sql, question=question)
+                self.semantic_cache.record_audit(
+                    semantic_hit,
+                    question,
+                    sql,
+                    cached.success and cached.result == execution_result.result
+                )
+            self.semantic_cache.store(
+                question,
+                cache_scope,
+                sql,
+                execution_result.result,
+                time.time() - start_time
+            )
+
+    def _cache_scope(self, scope: Optional[str] = None) -> str:
+        """缓存作用域：schema 指纹 + 权限范围（安全配置与调用方传入的 scope）"""
+        permissions = json.dumps(
+            {
+                "allowed_tables": sorted(self.config.get("allowed_tables") or []),
+                "read_only": self.config.get("read_only", True),
+                "scope": scope,
+            },
+            sort_keys=True
+        )
+        return f"{self._schema_fingerprint()}:{hashlib.sha256(permissions.encode()).hexdigest()[:16]}"
+
+    def _schema_fingerprint(self) -> str:
+        now = time.time()
+        ttl = self.config.get("schema_fingerprint_ttl", 60)
+        if self._schema_fingerprint_value is None or now - self._schema_fingerprint_at > ttl:
+            inspector = inspect(self.db._engine)
+            schema = {
+                table: [(c["name"], str(c["type"])) for c in inspector.get_columns(table)]
+                for table in sorted(self.db.get_usable_table_names())
+            }
+            payload = json.dumps(schema, sort_keys=True)
+            self._schema_fingerprint_value = hashlib.sha256(payload.encode()).hexdigest()[:16]
+            self._schema_fingerprint_at = now
+        return self._schema_fingerprint_value
+
+    def _can_escalate(self, decision: Optional[RouteDecision]) -> bool:
+        return decision is not None and decision.route == FAST_ROUTE
+
+    async def _escalate(
+        self,
+        runner: Any,
+        result: QueryResult,
+        mapping: MappingResult,
+        schema_doc: str,
+        decision: RouteDecision
+    ):
+        """快速模型的 SQL 未通过校验或执行失败，改用强模型重新生成并校验"""
+        self.model_router.record_outcome(decision.route, False)
+        sql, decision = await runner.model(
+            self.model_router.escalate,
+            self.model_router.aescalate,
+            schema_doc,
+            mapping.enhanced_question,
+            decision
+        )
+        result.sql = sql
+        result.metadata["route"] = decision.route
+        result.metadata["escalated"] = True
+        return sql, decision, self._validate_security(sql)
+
+    def ask_stream(
+        self,
+        question: str,
+        scope: Optional[str] = None,
+        cancel: Optional[CancelToken] = None
+    ) -> Generator[Dict[str, Any], None, None]:
+        """流式问答；相同问题的并发订阅者共享同一条事件流（先回放已产生的事件）
+
+        cancel 被触发时（如客户端断开）当前订阅者立即结束；共享的执行只在
+        所有订阅者都离开后才取消，正在执行的查询会被数据库中止。
+        """
+        if self.single_flight is None:
+            yield from self._ask_stream(question, scope, cancel)
+            return
+
+        shared = CancelToken()
+        yield from self.single_flight.stream(
+            self._flight_key(question, scope),
+            lambda: self._ask_stream(question, scope, shared),
+            cancel=cancel,
+            on_abandon=shared.cancel
+        )
+
+    def _flight_key(self, question: str, scope: Optional[str] = None) -> str:
+        return f"{SemanticCache.normalize(question)}|{self._cache_scope(scope)}"
+
+    def _ask_stream(
+        self,
+        question: str,
+        scope: Optional[str] = None,
+        cancel: Optional[CancelToken] = None
+    ) -> Generator[Dict[str, Any], None, None]:
+        return iterate_sync(self._stream(self._sync_runner, question, scope, cancel))
+
+    async def astream(
+        self,
+        question: str,
+        scope: Optional[str] = None,
+        cancel: Optional[CancelToken] = None
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """ask_stream 的异步版本，事件格式相同
+
+        模型输出通过 astream 读取，结果行在有界线程池中逐批读取；
+        相同问题的并发订阅者同样共享一条事件流。
+        """
+        if self.single_flight is None:
+            async with contextlib.aclosing(self._stream(self._async_runner, question, scope, cancel)) as events:
+                async for event in events:
+                    yield event
+            return
+
+        key = await self._run_blocking(self._flight_key, question, scope)
+        shared = CancelToken()
+        async for event in self.single_flight.astream(
+            key,
+            lambda: self._stream(self._async_runner, question, scope, shared),
+            cancel=cancel,
+            on_abandon=shared.cancel
+        ):
+            yield event
+
+    async def _stream(
+        self,
+        runner: Any,
+        question: str,
+        scope: Optional[str] = None,
+        cancel: Optional[CancelToken] = None
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """流式问答流水线，ask_stream 与 astream 共用（runner 的含义同 _pipeline）
+
+        缓存命中、模型路由和多候选投票与 _pipeline 一致；未使用多候选时逐段转发
+        thinking 和 SQL，结果行按批次转发。
+        """
         start_time = time.time()
+        timer = StageTimer()
+        result = QueryResult(
+            status=QueryStatus.SUCCESS,
+            question=question
+        )
+        decision = None
+        succeeded = False
 
         try:
-            mapping = self._semantic_mapping(question)
+            try:
+                answered, cache_scope, semantic_hit = await self._lookup_caches(runner, result, scope)
+            except Exception as e:
+                yield {"stage": "cache", "status": "error", "error": str(e)}
+                return
+
+            if answered:
+                yield {
+                    "stage": "cache",
+                    "status": "hit",
+                    "data": result.metadata.get("template_cache") or result.metadata.get("semantic_cache"),
+                    "timestamp": time.time() - start_time
+                }
+                yield self._sql_event(result.sql, start_time)
+                yield self._rows_event(result.execution.result, start_time)
+            else:
+                # schema 准备不依赖映射结果，在映射期间提前开始
+                schema_task = runner.spawn(timer, "schema", self._prepare_schema)
+
+                try:
+                    mapping = self._semantic_mapping(question)
+                    yield {
+                        "stage": "mapping",
+                        "status": "success",
+                        "data": {
+                            "enhanced_question": mapping.enhanced_question,
+                            "field_mappings": mapping.field_mappings,
+                        },
+                        "timestamp": time.time() - start_time
+                    }
+                except Exception as e:
+                    schema_task.cancel()
+                    yield {"stage": "mapping", "status": "error", "error": str(e)}
+                    return
+
+                try:
+                    schema_doc = await runner.join(schema_task)
+                    yield {
+                        "stage": "schema",
+                        "status": "success",
+                        "data": {"schema": schema_doc[:500] + "..."},
+                        "timestamp": time.time() - start_time
+                    }
+                except Exception as e:
+                    yield {"stage": "schema", "status": "error", "error": str(e)}
+                    return
+
+                vote = None
+                try:
+                    decision = self._route(result, question, mapping)
+                    if self.candidate_voter is not None:
+                        sql, vote = await self._generate(runner, result, mapping, schema_doc, decision)
+                        yield {
+                            "stage": "candidates",
+                            "status": "success",
+                            "data": result.metadata["candidates"],
+                            "timestamp": time.time() - start_time
+                        }
+                        yield self._sql_event(sql, start_time)
+                    else:
+                        async with contextlib.aclosing(
+                            self._stream_generation(runner, result, mapping, schema_doc, decision, start_time)
+                        ) as events:
+                            async for event in events:
+                                yield event
+                                if event["status"] == "error":
+                                    return
+                        sql = result.sql
+                except Exception as e:
+                    yield {"stage": "thinking", "status": "error", "error": str(e)}
+                    return
+
+                try:
+                    security_result = self._validate_security(sql)
+                    if not security_result.is_valid and self._can_escalate(decision):
+                        sql, decision, security_result = await self._escalate(
+                            runner, result, mapping, schema_doc, decision
+                        )
+                        yield self._sql_event(sql, start_time, route=decision.route, escalated=True)
+                    yield self._security_event(security_result, start_time)
+
+                    if not security_result.is_valid:
+                        yield self._rejected_event(security_result, start_time)
+                        return
+                except Exception as e:
+                    yield {"stage": "security", "status": "error", "error": str(e)}
+                    return
+
+                try:
+                    if vote is not None and vote.has_winner and vote.sql == sql:
+                        # 胜出候选已经执行过，直接转发其结果
+                        result.sql = sql
+                        result.execution = vote.execution
+                        yield self._rows_event(vote.execution.result, start_time)
+                    else:
+                        async with contextlib.aclosing(
+                            self._stream_execution(runner, result, sql, question, cancel, start_time)
+                        ) as events:
+                            async for event in events:
+                                yield event
+
+                    if (
+                        not result.execution.success
+                        and not result.execution.cancelled
+                        and self._can_escalate(decision)
+                    ):
+                        sql, decision, security_result = await self._escalate(
+                            runner, result, mapping, schema_doc, decision
+                        )
+                        yield self._sql_event(sql, start_time, route=decision.route, escalated=True)
+                        yield self._security_event(security_result, start_time)
+                        if not security_result.is_valid:
+                            yield self._rejected_event(security_result, start_time)
+                            return
+                        async with contextlib.aclosing(
+                            self._stream_execution(runner, result, sql, question, cancel, start_time)
+                        ) as events:
+                            async for event in events:
+                                yield event
+                except Exception as e:
+                    yield {"stage": "execution", "status": "error", "error": str(e)}
+                    return
+
+            execution_result = result.execution
+            result_set = execution_result.result if isinstance(execution_result.result, ResultSet) else None
             yield {
-                "stage": "mapping",
-                "status": "success",
+                "stage": "execution",
+                "status": "success" if execution_result.success else "error",
                 "data": {
-                    "enhanced_question": mapping.enhanced_question,
-                    "field_mappings": mapping.field_mappings,
+                    "success": execution_result.success,
+                    "error": execution_result.error,
+                    "columns": result_set.columns if result_set else [],
+                    "types": result_set.types if result_set else [],
+                    "row_count": result_set.row_count if result_set else 0,
+                    "truncated": result_set.truncated if result_set else False,
                 },
                 "timestamp": time.time() - start_time
             }
-        except Exception as e:
-            yield {"stage": "mapping", "status": "error", "error": str(e)}
-            return
 
-        try:
-            schema_doc = self._prepare_schema()
+            if not execution_result.success:
+                yield {
+                    "stage": "done",
+                    "status": self._execution_failure_status(execution_result).value,
+                    "error": execution_result.error,
+                    "timestamp": time.time() - start_time
+                }
+                return
+
+            # 缓存写入与解释并行
+            store_task = None
+            if not answered and (self.template_cache is not None or self.semantic_cache is not None):
+                store_task = runner.spawn(
+                    timer,
+                    "cache_store",
+                    self._store_caches,
+                    None,
+                    question,
+                    result.sql,
+                    execution_result,
+                    cache_scope,
+                    semantic_hit,
+                    start_time
+                )
+
+            explanation = None
+            try:
+                explanation_chunks = []
+                async with contextlib.aclosing(runner.stream(
+                    self.result_explainer.explain_stream,
+                    self.result_explainer.aexplain_stream,
+                    question,
+                    execution_result.result
+                )) as chunks:
+                    async for chunk in chunks:
+                        if cancel is not None and cancel.cancelled:
+                            # 订阅者都已离开，不再继续生成解释
+                            return
+                        explanation_chunks.append(chunk)
+                        yield {
+                            "stage": "explaining",
+                            "status": "streaming",
+                            "chunk": chunk,
+                            "timestamp": time.time() - start_time
+                        }
+
+                explanation = "".join(explanation_chunks)
+
+                yield {
+                    "stage": "explained",
+                    "status": "success",
+                    "data": {"explanation": explanation},
+                    "timestamp": time.time() - start_time
+                }
+            except Exception as e:
+                yield {"stage": "explaining", "status": "error", "error": str(e)}
+
+            if store_task is not None:
+                try:
+                    await runner.join(store_task)
+                except Exception as e:
+                    logger.warning(f"缓存写入失败: {e}")
+            if answered and semantic_hit is not None:
+                self.semantic_cache.record_saved_latency(semantic_hit, time.time() - start_time)
+
+            succeeded = True
             yield {
-                "stage": "schema",
+                "stage": "done",
                 "status": "success",
-                "data": {"schema": schema_doc[:500] + "..."},
+                "data": {
+                    "question": question,
+                    "sql": result.sql,
+                    "execution_result": serialize_result(execution_result.result),
+                    "columns": result_set.columns if result_set else None,
+                    "explanation": explanation,
+                },
                 "timestamp": time.time() - start_time
             }
-        except Exception as e:
-            yield {"stage": "schema", "status": "error", "error": str(e)}
-            return
+        finally:
+            if decision is not None:
+                self.model_router.record_outcome(decision.route, succeeded)
 
-        try:
-            sql_chunks = []
-            thinking_chunks = []
-            
-            # 使用 generate_with_thinking_stream 获取 thinking 和 SQL
-            for item in self.sql_generator.generate_with_thinking_stream(schema_doc, mapping.enhanced_question):
+    async def _stream_generation(
+        self,
+        runner: Any,
+        result: QueryResult,
+        mapping: MappingResult,
+        schema_doc: str,
+        decision: Optional[RouteDecision],
+        start_time: float
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """逐段转发所选模型输出的 thinking 和 SQL，生成的 SQL 写入 result.sql；模型报错时以 error 事件结束"""
+        generator = self.sql_generator if decision is None else self.model_router.generator_for(decision)
+        sql_chunks = []
+        thinking_chunks = []
+        generation_stats = {}
+
+        async with contextlib.aclosing(runner.stream(
+            generator.generate_with_thinking_stream,
+            generator.agenerate_with_thinking_stream,
+            schema_doc,
+            mapping.enhanced_question
+        )) as items:
+            async for item in items:
                 item_type = item.get("type")
-                logger.info(f"[DEBUG] orchestrator received item: type={item_type}, content={repr(item.get('content', '')[:50])}...")
                 if item_type == "thinking":
-                    # 流式输出 thinking
-                    thinking_content = item.get("content", "")
-                    thinking_chunks.append(thinking_content)
+                    # 流式输出 thinking 增量
+                    thinking_chunks.append(item.get("content", ""))
                     yield {
                         "stage": "thinking",
                         "status": "streaming",
-                        "chunk": thinking_content,
+                        "chunk": item.get("content", ""),
                         "timestamp": time.time() - start_time
                     }
                 elif item_type == "sql":
-                    # 流式输出 SQL
+                    # 流式输出 SQL 增量
                     sql_chunks.append(item.get("content", ""))
                     yield {
                         "stage": "sql_generating",
@@ -190,6 +1027,13 @@ class NL2SQLOrchestrator:
                         "chunk": item.get("content", ""),
                         "timestamp": time.time() - start_time
                     }
+                elif item_type == "stats":
+                    generation_stats = item.get("data", {})
+                    logger.info(
+                        f"SQL 生成流: early_stopped={generation_stats.get('early_stopped')}, "
+                        f"chunks_after_sql={generation_stats.get('chunks_after_sql')}, "
+                        f"chars_after_sql={generation_stats.get('chars_after_sql')}"
+                    )
                 elif item_type == "error":
                     yield {
                         "stage": "thinking",
@@ -198,118 +1042,134 @@ class NL2SQLOrchestrator:
                         "timestamp": time.time() - start_time
                     }
                     return
-            
-            # 完成 thinking 阶段
-            thinking = "".join(thinking_chunks)
-            if thinking:
-                yield {
-                    "stage": "thinking_done",
-                    "status": "success",
-                    "data": {"thinking": thinking},
-                    "timestamp": time.time() - start_time
-                }
-            
-            sql = "".join(sql_chunks)
-            sql = self.sql_generator._clean_sql(sql)
 
+        # 完成 thinking 阶段
+        thinking = "".join(thinking_chunks)
+        if thinking:
             yield {
-                "stage": "sql_generated",
+                "stage": "thinking_done",
                 "status": "success",
-                "data": {"sql": sql},
+                "data": {"thinking": thinking},
                 "timestamp": time.time() - start_time
             }
-        except Exception as e:
-            yield {"stage": "thinking", "status": "error", "error": str(e)}
-            return
 
-        try:
-            security_result = self._validate_security(sql)
+        result.sql = generator._clean_sql("".join(sql_chunks))
+        extra = {"route": decision.route} if decision is not None else {}
+        yield self._sql_event(result.sql, start_time, generation_stats=generation_stats, **extra)
+
+    async def _stream_execution(
+        self,
+        runner: Any,
+        result: QueryResult,
+        sql: str,
+        question: str,
+        cancel: Optional[CancelToken],
+        start_time: float
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """经代价守卫流式执行 SQL，按批次转发结果行；执行结果写入 result.execution"""
+        cost = await runner.call(self._check_cost, sql)
+        if cost is not None:
             yield {
-                "stage": "security",
-                "status": "success" if security_result.is_valid else "rejected",
-                "data": {
-                    "is_valid": security_result.is_valid,
-                    "message": security_result.message,
-                },
+                "stage": "cost_guard",
+                "status": cost.action.value,
+                "data": cost.summary(),
                 "timestamp": time.time() - start_time
             }
-
-            if not security_result.is_valid:
-                yield {
-                    "stage": "done",
-                    "status": "security_rejected",
-                    "error": security_result.message,
-                    "timestamp": time.time() - start_time
-                }
+            if cost.rejected:
+                result.execution = self._cost_rejection(cost)
                 return
-        except Exception as e:
-            yield {"stage": "security", "status": "error", "error": str(e)}
-            return
+            sql = cost.sql
 
+        admission = self._admit(cost)
+        admitted = await runner.call(admission.__enter__)
         try:
-            execution_result = self._execute_sql(sql)
-            
-            # Get column names for the query
-            columns = self._get_column_names(sql)
-            
-            yield {
-                "stage": "execution",
-                "status": "success" if execution_result.success else "error",
-                "data": {
-                    "success": execution_result.success,
-                    "result": execution_result.result,
-                    "error": execution_result.error,
-                    "columns": columns,
-                },
-                "timestamp": time.time() - start_time
-            }
-
-            if not execution_result.success:
-                yield {
-                    "stage": "done",
-                    "status": "execution_error",
-                    "error": execution_result.error,
-                    "timestamp": time.time() - start_time
-                }
+            if not admitted:
+                result.execution = self._cost_rejection(cost, "昂贵查询排队超时，已拒绝执行")
                 return
-        except Exception as e:
-            yield {"stage": "execution", "status": "error", "error": str(e)}
-            return
 
-        try:
-            explanation_chunks = []
-            for chunk in self.result_explainer.explain_stream(
-                question,
-                execution_result.result
-            ):
-                explanation_chunks.append(chunk)
-                yield {
-                    "stage": "explaining",
-                    "status": "streaming",
-                    "chunk": chunk,
-                    "timestamp": time.time() - start_time
-                }
+            # 按批次转发结果行，内存占用受 max_rows 约束
+            stream = self.query_executor.execute_stream(sql, cancel=cancel, question=question)
+            batches = iter(stream)
+            rows = []
+            try:
+                while True:
+                    batch = await runner.call(next, batches, None)
+                    if batch is None:
+                        break
+                    offset = len(rows)
+                    rows.extend(batch)
+                    yield {
+                        "stage": "execution_rows",
+                        "status": "streaming",
+                        "data": {
+                            "columns": stream.columns,
+                            "offset": offset,
+                            "rows": jsonable_rows(batch),
+                        },
+                        "timestamp": time.time() - start_time
+                    }
+            finally:
+                # 订阅者离开时读取可能仍在工作线程中进行，由 cancel 中止，这里只关闭空闲的游标
+                with contextlib.suppress(ValueError):
+                    await runner.call(batches.close)
+        finally:
+            admission.__exit__(None, None, None)
 
-            explanation = "".join(explanation_chunks)
+        result.sql = stream.sql
+        result.execution = ExecutionResult(
+            success=stream.success,
+            result=stream.to_result_set(rows) if stream.success else None,
+            error=stream.error,
+            attempts=stream.attempts,
+            cached=stream.cached,
+            stale=stream.stale,
+            timed_out=stream.timed_out,
+            cancelled=stream.cancelled,
+            rejected=stream.rejected,
+            cost_guard=stream.cost_guard or (cost.summary() if cost else None)
+        )
 
-            yield {
-                "stage": "explained",
-                "status": "success",
-                "data": {"explanation": explanation},
-                "timestamp": time.time() - start_time
-            }
-        except Exception as e:
-            yield {"stage": "explaining", "status": "error", "error": str(e)}
+    @staticmethod
+    def _sql_event(sql: str, start_time: float, **data: Any) -> Dict[str, Any]:
+        return {
+            "stage": "sql_generated",
+            "status": "success",
+            "data": {"sql": sql, **data},
+            "timestamp": time.time() - start_time
+        }
 
-        yield {
+    @staticmethod
+    def _security_event(security_result: SecurityResult, start_time: float) -> Dict[str, Any]:
+        return {
+            "stage": "security",
+            "status": "success" if security_result.is_valid else "rejected",
+            "data": {
+                "is_valid": security_result.is_valid,
+                "message": security_result.message,
+            },
+            "timestamp": time.time() - start_time
+        }
+
+    @staticmethod
+    def _rejected_event(security_result: SecurityResult, start_time: float) -> Dict[str, Any]:
+        return {
             "stage": "done",
-            "status": "success",
+            "status": "security_rejected",
+            "error": security_result.message,
+            "timestamp": time.time() - start_time
+        }
+
+    @staticmethod
+    def _rows_event(result: Any, start_time: float) -> Dict[str, Any]:
+        """一次性转发已执行完的结果（缓存命中、多候选胜出）"""
+        result_set = result if isinstance(result, ResultSet) else ResultSet()
+        return {
+            "stage": "execution_rows",
+            "status": "streaming",
             "data": {
-                "question": question,
-                "sql": sql,
-                "execution_result": execution_result.result,
-                "columns": columns,
-                "explanation": explanation if 'explanation' in locals() else None,
+                "columns": result_set.columns,
+                "offset": 0,
+                "rows": jsonable_rows(result_set.rows),
             },
             "timestamp": time.time() - start_time
         }
@@ -325,6 +1185,12 @@ class NL2SQLOrchestrator:
         )
 
     def _prepare_schema(self) -> str:
+        # schema 文档包含样例行和行数，生成需要逐表查询；配置 schema_doc_ttl 时在有效期内复用
+        ttl = self.config.get("schema_doc_ttl", 0)
+        now = time.time()
+        if ttl > 0 and self._schema_doc is not None and now - self._schema_doc_at <= ttl:
+            return self._schema_doc
+
         tables = self.db.get_usable_table_names()
 
         if hasattr(self.schema_enhancer, 'enhance_tables'):
@@ -332,6 +1198,8 @@ class NL2SQLOrchestrator:
 
         schema_doc = self.schema_doc_generator.generate_full_doc(tables)
 
+        if ttl > 0:
+            self._schema_doc, self._schema_doc_at = schema_doc, now
         return schema_doc
 
     def _generate_sql(self, enhanced_question: str, schema_doc: str) -> str:
@@ -348,99 +1216,117 @@ class NL2SQLOrchestrator:
             details=validation.details
         )
 
-    def _execute_sql(self, sql: str) -> ExecutionResult:
-        exec_result = self.query_executor.execute(sql)
+    def _execute_sql(
+        self,
+        sql: str,
+        parameters: Optional[Dict[str, Any]] = None,
+        question: Optional[str] = None,
+        cancel: Optional[CancelToken] = None,
+        executor: Optional[QueryExecutor] = None
+    ) -> ExecutionResult:
+        """经代价守卫执行 SQL；executor 默认为 query_executor（多候选执行使用不修复的执行器）"""
+        executor = executor or self.query_executor
+        cost = self._check_cost(sql, parameters)
+        if cost is not None and cost.rejected:
+            return self._cost_rejection(cost)
+
+        with self._admit(cost) as admitted:
+            if not admitted:
+                return self._cost_rejection(cost, "昂贵查询排队超时，已拒绝执行")
+            exec_result = executor.execute(
+                cost.sql if cost else sql, parameters, cancel=cancel, question=question
+            )
 
         return ExecutionResult(
             success=exec_result["success"],
             result=exec_result.get("result"),
             error=exec_result.get("error", ""),
             attempts=exec_result.get("attempts", 1),
-            execution_time=0.0
+            execution_time=0.0,
+            cached=exec_result.get("cached", False),
+            stale=exec_result.get("stale", False),
+            timed_out=exec_result.get("timed_out", False),
+            cancelled=exec_result.get("cancelled", False),
+            rejected=exec_result.get("rejected", False),
+            cost_guard=exec_result.get("cost_guard") or (cost.summary() if cost else None)
         )
 
-    def _get_column_names(self, sql: str) -> List[str]:
-        """Extract column names from SQL query result."""
-        try:
-            # Simple table name extraction from SELECT query
-            # Handle: SELECT * FROM table, SELECT col1, col2 FROM table, etc.
-            sql_lower = sql.lower()
-            
-            # Find table name after FROM keyword
-            from_idx = sql_lower.find(" from ")
-            if from_idx == -1:
-                return []
-            
-            # Get the part after FROM
-            after_from = sql[from_idx + 6:].strip()
-            
-            # Handle JOINs - get first table name
-            join_idx = after_from.find(" join ")
-            if join_idx > 0:
-                table_part = after_from[:join_idx].strip()
-            else:
-                # Handle WHERE, ORDER BY, etc.
-                for delimiter in [" where ", " order by ", " group by ", " limit ", " having "]:
-                    delim_idx = table_part.lower().find(delimiter) if 'table_part' in locals() else after_from.lower().find(delimiter)
-                    if delim_idx > 0:
-                        table_part = after_from[:delim_idx].strip()
-                        break
-                else:
-                    table_part = after_from.split()[0] if after_from else ""
-            
-            # Clean table name (remove aliases, quotes, and semicolons)
-            table_name = table_part.split()[0].strip('"`[];')
-            
-            # Get column info from database
-            if table_name:
-                # Use SQLDatabase's get_table_info to get columns
-                table_info = self.db.get_table_info([table_name])
-                # Parse DDL to extract column names
-                columns = self._parse_columns_from_ddl(table_info)
-                return columns
-            
-            return []
-        except Exception as e:
-            logging.warning(f"Failed to get column names: {e}")
-            return []
+    def _check_cost(self, sql: str, parameters: Optional[Dict[str, Any]] = None) -> Optional[CostDecision]:
+        if self.cost_guard is None:
+            return None
+        return self.cost_guard.check(sql, parameters)
 
-    def _parse_columns_from_ddl(self, ddl: str) -> List[str]:
-        """Parse column names from DDL string."""
-        import re
-        columns = []
-        
-        # Find the CREATE TABLE section (before comments)
-        # DDL format: CREATE TABLE ... ( columns ) /* comments */
-        create_table_match = re.search(r'CREATE TABLE.*?\((.*?)\)', ddl, re.DOTALL | re.IGNORECASE)
-        if not create_table_match:
-            return columns
-        
-        columns_section = create_table_match.group(1)
-        
-        # Match column definitions: column_name DATA_TYPE
-        # Pattern: identifier followed by type (at the start of a line)
-        pattern = r'^\s*(\w+)\s+\w+'
-        
-        for line in columns_section.split('\n'):
-            line = line.strip()
-            if not line:
-                continue
-            
-            # Skip constraint definitions
-            if line.lower().startswith(('primary key', 'foreign key', 'unique', 'check', 'constraint')):
-                continue
-            
-            match = re.match(pattern, line)
-            if match:
-                col_name = match.group(1)
-                columns.append(col_name)
-        
-        return columns
+    def _admit(self, cost: Optional[CostDecision]):
+        if self.cost_guard is None:
+            return contextlib.nullcontext(True)
+        return self.cost_guard.admit(cost)
+
+    @staticmethod
+    def _cost_rejection(cost: CostDecision, message: str = "") -> ExecutionResult:
+        summary = cost.summary()
+        summary["action"] = "reject"
+        return ExecutionResult(
+            success=False,
+            error=message or cost.message,
+            attempts=0,
+            cost_guard=summary
+        )
+
+    def _query_timeout(self) -> Optional[float]:
+        """单条查询的超时：database.query_timeout 与 security.timeout 中较小的正值"""
+        limits = [
+            t for t in (self.config.get("query_timeout"), self.config.get("timeout"))
+            if t and t > 0
+        ]
+        return min(limits) if limits else None
+
+    @staticmethod
+    def _execution_failure_status(execution_result: ExecutionResult) -> QueryStatus:
+        if execution_result.rejected or (
+            execution_result.cost_guard and execution_result.cost_guard["action"] == "reject"
+        ):
+            return QueryStatus.SECURITY_REJECTED
+        if execution_result.timed_out:
+            return QueryStatus.EXECUTION_TIMEOUT
+        if execution_result.cancelled:
+            return QueryStatus.CANCELLED
+        return QueryStatus.EXECUTION_ERROR
 
     def _explain_result(self, question: str, result: Any) -> str:
         explanation = self.result_explainer.explain(question, result)
         return explanation
 
+    def get_routing_stats(self) -> Dict[str, Any]:
+        if self.model_router is None:
+            return {"enabled": False}
+        return {"enabled": True, "routes": self.model_router.get_stats()}
+
+    def get_gateway_stats(self) -> Dict[str, Any]:
+        stats = {"providers": get_all_gateway_metrics()}
+        if isinstance(self.llm, HedgedChatModel):
+            stats["hedging"] = self.llm.get_stats()
+        return stats
+
+    def get_execution_stats(self, limit: Optional[int] = 50) -> Dict[str, Any]:
+        return {
+            "errors": self.query_executor.get_error_stats(),
+            "queries": self.query_monitor.snapshot(limit),
+        }
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        stats = {}
+        if self.template_cache is not None:
+            stats["template"] = self.template_cache.get_stats()
+        if self.semantic_cache is not None:
+            stats["semantic"] = self.semantic_cache.get_stats()
+        if self.result_cache is not None:
+            stats["result"] = self.result_cache.get_stats()
+        if self.single_flight is not None:
+            stats["coalescing"] = self.single_flight.get_stats()
+        if self.cost_guard is not None:
+            stats["cost_guard"] = self.cost_guard.get_stats()
+        return stats
+
     def get_table_names(self) -> List[str]:
         return self.db.get_usable_table_names()
 
@@ -0,0 +1,255 @@
+from threading import Condition, Lock, Thread
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class _Flight:
+    """一次进行中的调用：结果或按顺序产生的事件，以及等待它的订阅者"""
+
+    def __init__(self, cond: Any = None):
+        self.cond = cond if cond is not None else Condition()
+        self.events: List[Any] = []
+        self.done = False
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.followers = 0
+        self.subscribers = 0
+        self.on_abandon: Optional[Callable[[], None]] = None
+        self.task: Optional["asyncio.Task"] = None
+
+
+class SingleFlight:
+    """合并相同 key 的并发调用
+
+    - do(): 第一个调用者执行 fn，其余调用者等待并共享同一结果（或异常）
+    - stream(): 事件流在后台线程中只运行一次，每个订阅者先收到已产生事件的
+      回放，再接着收到后续事件；订阅者中途断开不会影响其他订阅者，
+      最后一个订阅者离开而事件流仍未结束时调用 on_abandon（用于取消执行）
+    - do_async() / astream(): 上面两者的协程版本，共享的执行是事件循环中的
+      一个任务；单个调用者被取消只会让它自己退出，不影响其他等待者
+
+    调用结束后 key 即被移除，之后的调用会重新执行。
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._calls: Dict[str, _Flight] = {}
+        self._streams: Dict[str, _Flight] = {}
+        self._async_calls: Dict[str, "asyncio.Task"] = {}
+        self._async_streams: Dict[str, _Flight] = {}
+        self._stats = {
+            "calls": 0,
+            "coalesced_calls": 0,
+            "streams": 0,
+            "coalesced_streams": 0,
+        }
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """返回 (结果, 是否共享了其他调用的结果)"""
+        with self._lock:
+            flight = self._calls.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._calls[key] = flight
+                self._stats["calls"] += 1
+            else:
+                flight.followers += 1
+                self._stats["coalesced_calls"] += 1
+
+        if not leader:
+            with flight.cond:
+                while not flight.done:
+                    flight.cond.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, True
+
+        try:
+            flight.result = fn()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            with flight.cond:
+                flight.done = True
+                flight.cond.notify_all()
+        return flight.result, False
+
+    def stream(
+        self,
+        key: str,
+        gen_fn: Callable[[], Iterator[Any]],
+        cancel: Any = None,
+        on_abandon: Optional[Callable[[], None]] = None
+    ) -> Iterator[Any]:
+        """cancel 为带 cancelled 属性的取消标记，被触发后当前订阅者立即结束"""
+        with self._lock:
+            flight = self._streams.get(key)
+            if flight is None:
+                flight = _Flight()
+                flight.on_abandon = on_abandon
+                self._streams[key] = flight
+                self._stats["streams"] += 1
+                Thread(target=self._pump, args=(key, flight, gen_fn), daemon=True).start()
+            else:
+                flight.followers += 1
+                self._stats["coalesced_streams"] += 1
+            flight.subscribers += 1
+
+        try:
+            cursor = 0
+            while True:
+                with flight.cond:
+                    while cursor >= len(flight.events) and not flight.done:
+                        if cancel is not None and cancel.cancelled:
+                            return
+                        flight.cond.wait(timeout=0.1 if cancel is not None else None)
+                    pending = flight.events[cursor:]
+                    cursor = len(flight.events)
+                    finished = flight.done
+                for event in pending:
+                    yield event
+                if finished:
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+        finally:
+            with self._lock:
+                flight.subscribers -= 1
+                abandoned = flight.subscribers == 0 and not flight.done
+                # 被放弃的执行不再接收新订阅者，之后的相同请求重新执行
+                if abandoned and self._streams.get(key) is flight:
+                    del self._streams[key]
+            if abandoned and flight.on_abandon is not None:
+                logger.info("合并的事件流已无订阅者，取消执行")
+                flight.on_abandon()
+
+    def _pump(self, key: str, flight: _Flight, gen_fn: Callable[[], Iterator[Any]]):
+        try:
+            for event in gen_fn():
+                with flight.cond:
+                    flight.events.append(event)
+                    flight.cond.notify_all()
+        except BaseException as e:
+            logger.error(f"合并的事件流执行失败: {e}")
+            flight.error = e
+        finally:
+            with self._lock:
+                if self._streams.get(key) is flight:
+                    del self._streams[key]
+            with flight.cond:
+                flight.done = True
+                flight.cond.notify_all()
+
+    async def do_async(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """do() 的协程版本，返回 (结果, 是否共享了其他调用的结果)"""
+        with self._lock:
+            task = self._async_calls.get(key)
+            shared = task is not None
+            if shared:
+                self._stats["coalesced_calls"] += 1
+            else:
+                task = asyncio.ensure_future(fn())
+                self._async_calls[key] = task
+                self._stats["calls"] += 1
+                task.add_done_callback(lambda done: self._finish_call(key, done))
+        # shield：等待者被取消时共享的任务继续执行
+        return await asyncio.shield(task), shared
+
+    def _finish_call(self, key: str, task: "asyncio.Task"):
+        with self._lock:
+            if self._async_calls.get(key) is task:
+                del self._async_calls[key]
+        if not task.cancelled():
+            # 所有等待者都已离开时，避免事件循环报告未读取的异常
+            task.exception()
+
+    async def astream(
+        self,
+        key: str,
+        gen_fn: Callable[[], AsyncIterator[Any]],
+        cancel: Any = None,
+        on_abandon: Optional[Callable[[], None]] = None
+    ) -> AsyncIterator[Any]:
+        """stream() 的协程版本；最后一个订阅者离开时同时取消共享的任务"""
+        with self._lock:
+            flight = self._async_streams.get(key)
+            if flight is None:
+                flight = _Flight(cond=asyncio.Condition())
+                flight.on_abandon = on_abandon
+                self._async_streams[key] = flight
+                self._stats["streams"] += 1
+                flight.task = asyncio.ensure_future(self._apump(key, flight, gen_fn))
+            else:
+                flight.followers += 1
+                self._stats["coalesced_streams"] += 1
+            flight.subscribers += 1
+
+        try:
+            cursor = 0
+            while True:
+                async with flight.cond:
+                    while cursor >= len(flight.events) and not flight.done:
+                        if cancel is not None and cancel.cancelled:
+                            return
+                        if cancel is None:
+                            await flight.cond.wait()
+                        else:
+                            try:
+                                await asyncio.wait_for(flight.cond.wait(), timeout=0.1)
+                            except asyncio.TimeoutError:
+                                pass
+                    pending = flight.events[cursor:]
+                    cursor = len(flight.events)
+                    finished = flight.done
+                for event in pending:
+                    yield event
+                if finished:
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+        finally:
+            with self._lock:
+                flight.subscribers -= 1
+                abandoned = flight.subscribers == 0 and not flight.done
+                if abandoned and self._async_streams.get(key) is flight:
+                    del self._async_streams[key]
+            if abandoned:
+                logger.info("合并的事件流已无订阅者，取消执行")
+                if flight.on_abandon is not None:
+                    flight.on_abandon()
+                flight.task.cancel()
+
+    async def _apump(self, key: str, flight: _Flight, gen_fn: Callable[[], AsyncIterator[Any]]):
+        try:
+            async for event in gen_fn():
+                async with flight.cond:
+                    flight.events.append(event)
+                    flight.cond.notify_all()
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"合并的事件流执行失败: {e}")
+            flight.error = e
+        finally:
+            with self._lock:
+                if self._async_streams.get(key) is flight:
+                    del self._async_streams[key]
+            async with flight.cond:
+                flight.done = True
+                flight.cond.notify_all()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["in_flight"] = (
+                len(self._calls) + len(self._streams)
+                + len(self._async_calls) + len(self._async_streams)
+            )
+        return stats
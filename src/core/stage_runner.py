@@ -0,0 +1,108 @@
+from concurrent.futures import Executor
+from typing import Any, AsyncIterator, Callable, Coroutine, Iterator, Optional
+import asyncio
+import functools
+
+from .stage_timer import StageTimer
+
+
+class AsyncStageRunner:
+    """问答流水线的异步执行方式
+
+    阻塞调用（数据库、向量化、本地计算较重的阶段）放到有界线程池；模型调用
+    直接 await 异步接口，等待期间不占用线程。
+    """
+
+    def __init__(self, blocking_pool: Executor):
+        self._pool = blocking_pool
+
+    async def call(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, functools.partial(fn, *args, **kwargs))
+
+    async def model(self, fn: Callable[..., Any], afn: Callable[..., Any], *args: Any) -> Any:
+        return await afn(*args)
+
+    def stream(self, fn: Callable[..., Iterator[Any]], afn: Callable[..., AsyncIterator[Any]], *args: Any) -> AsyncIterator[Any]:
+        return afn(*args)
+
+    def spawn(
+        self,
+        timer: StageTimer,
+        name: str,
+        fn: Callable[..., Any],
+        afn: Optional[Callable[..., Any]] = None,
+        *args: Any
+    ) -> "asyncio.Future[Any]":
+        """后台开始一个计时阶段；提供 afn 时按模型调用处理，否则按阻塞调用处理"""
+        if afn is not None:
+            return asyncio.ensure_future(timer.run(name, afn(*args)))
+        return asyncio.ensure_future(self.call(timer.wrap(name, fn, *args)))
+
+    async def join(self, handle: Any) -> Any:
+        return await handle
+
+
+class SyncStageRunner:
+    """问答流水线的同步执行方式
+
+    所有方法都在调用线程中直接完成，协程不会真正挂起，因此可以由
+    run_sync / iterate_sync 在没有事件循环的线程中驱动；并行阶段提交到线程池。
+    """
+
+    def __init__(self, stage_pool: Executor):
+        self._pool = stage_pool
+
+    async def call(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        return fn(*args, **kwargs)
+
+    async def model(self, fn: Callable[..., Any], afn: Callable[..., Any], *args: Any) -> Any:
+        return fn(*args)
+
+    def stream(self, fn: Callable[..., Iterator[Any]], afn: Callable[..., AsyncIterator[Any]], *args: Any) -> AsyncIterator[Any]:
+        return _iterate(fn(*args))
+
+    def spawn(
+        self,
+        timer: StageTimer,
+        name: str,
+        fn: Callable[..., Any],
+        afn: Optional[Callable[..., Any]] = None,
+        *args: Any
+    ) -> Any:
+        return self._pool.submit(timer.wrap(name, fn, *args))
+
+    async def join(self, handle: Any) -> Any:
+        return handle.result()
+
+
+async def _iterate(iterator: Iterator[Any]) -> AsyncIterator[Any]:
+    try:
+        for item in iterator:
+            yield item
+    finally:
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            close()
+
+
+def run_sync(coro: Coroutine[Any, Any, Any]) -> Any:
+    """在当前线程中驱动只经过 SyncStageRunner 的协程，返回其结果"""
+    try:
+        coro.send(None)
+    except StopIteration as stop:
+        return stop.value
+    coro.close()
+    raise RuntimeError("同步执行的流水线不应挂起")
+
+
+def iterate_sync(agen: AsyncIterator[Any]) -> Iterator[Any]:
+    """把只经过 SyncStageRunner 的异步生成器转为普通生成器"""
+    try:
+        while True:
+            try:
+                yield run_sync(agen.__anext__())
+            except StopAsyncIteration:
+                return
+    finally:
+        run_sync(agen.aclose())
@@ -0,0 +1,69 @@
+from contextlib import contextmanager
+from threading import Lock
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Tuple
+import time
+
+
+class StageTimer:
+    """记录一次请求中各阶段的起止时间（相对请求开始，秒）
+
+    可以并行的阶段在不同线程中计时，时间段互相重叠；summary() 给出关键路径：
+    从最后结束的阶段开始，每一步取在它开始之前最后结束的阶段，
+    即决定总耗时的那条阶段链。
+    """
+
+    def __init__(self):
+        self._origin = time.perf_counter()
+        self._lock = Lock()
+        self._spans: List[Tuple[str, float, float]] = []
+
+    def _now(self) -> float:
+        return time.perf_counter() - self._origin
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = self._now()
+        try:
+            yield
+        finally:
+            end = self._now()
+            with self._lock:
+                self._spans.append((name, start, end))
+
+    def wrap(self, name: str, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Callable[[], Any]:
+        """把 fn 包装成计时的无参调用，便于提交到线程池"""
+        def timed():
+            with self.stage(name):
+                return fn(*args, **kwargs)
+        return timed
+
+    async def run(self, name: str, awaitable: Awaitable[Any]) -> Any:
+        """计时地 await，便于用 ensure_future 与其他阶段并行"""
+        with self.stage(name):
+            return await awaitable
+
+    def critical_path(self) -> List[str]:
+        with self._lock:
+            spans = sorted(self._spans, key=lambda span: span[2])
+        if not spans:
+            return []
+        path = [spans[-1]]
+        while True:
+            start = path[-1][1]
+            earlier = [span for span in spans if span[2] <= start]
+            if not earlier:
+                break
+            path.append(earlier[-1])
+        return [name for name, _, _ in reversed(path)]
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            spans = sorted(self._spans, key=lambda span: span[1])
+        return {
+            "stages": [
+                {"stage": name, "start": start, "end": end, "duration": end - start}
+                for name, start, end in spans
+            ],
+            "critical_path": self.critical_path(),
+            "total": self._now(),
+        }
@@ -9,6 +9,8 @@ class QueryStatus(Enum):
     GENERATION_ERROR = "generation_error"
     SECURITY_REJECTED = "security_rejected"
     EXECUTION_ERROR = "execution_error"
+    EXECUTION_TIMEOUT = "execution_timeout"
+    CANCELLED = "cancelled"
     EXPLANATION_ERROR = "explanation_error"
 
 
@@ -42,6 +44,13 @@ class ExecutionResult:
     error: str = ""
     attempts: int = 1
     execution_time: float = 0.0
+    cached: bool = False
+    stale: bool = False
+    timed_out: bool = False
+    cancelled: bool = False
+    # 修复后的 SQL 未通过安全校验或代价守卫
+    rejected: bool = False
+    cost_guard: Optional[Dict[str, Any]] = None
 
 
 @dataclass
@@ -1,4 +1,24 @@
-from src.execution.query_executor import QueryExecutor
-from src.execution.result_handler import ResultHandler
+"""SQL 执行模块（导出的类在首次访问时才导入，结果集等轻量模块可单独使用）"""
+import importlib
+from typing import TYPE_CHECKING, Any
 
-__all__ = ["QueryExecutor", "ResultHandler"]
+if TYPE_CHECKING:
+    from src.execution.query_executor import QueryExecutor
+    from src.execution.result_handler import ResultHandler
+    from src.execution.result_set import ResultSet
+
+_EXPORTS = {
+    "QueryExecutor": "src.execution.query_executor",
+    "ResultHandler": "src.execution.result_handler",
+    "ResultSet": "src.execution.result_set",
+}
+
+__all__ = ["QueryExecutor", "ResultHandler", "ResultSet"]
+
+
+def __getattr__(name: str) -> Any:
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name]), name)
+    globals()[name] = value
+    return value
@@ -1,9 +1,27 @@
-from typing import Tuple, Dict
+from typing import Tuple, Dict, Optional
 import re
 
 
 class ErrorAnalyzer:
+    # 按顺序匹配：连接类错误的信息里常带 "unexpected"，需要先于语法错误判断
     ERROR_PATTERNS = {
+        "connection": [
+            r"database is locked",
+            r"connection (?:refused|reset|timed out)",
+            r"server closed the connection",
+            r"lost connection",
+            r"could not connect",
+            r"too many connections",
+            r"deadlock",
+            r"broken pipe"
+        ],
+        "permission": [
+            r"permission denied",
+            r"access denied",
+            r"not authorized",
+            r"readonly database",
+            r"insufficient privilege"
+        ],
         "syntax": [
             r"syntax error",
             r"near .*",
@@ -11,11 +29,14 @@ class ErrorAnalyzer:
         ],
         "no_table": [
             r"no such table",
-            r"table .* doesn't exist"
+            r"table .* doesn't exist",
+            r"relation .* does not exist"
         ],
         "no_column": [
             r"no such column",
-            r"column .* not found"
+            r"column .* not found",
+            r"column .* does not exist",
+            r"unknown column"
         ],
         "type_mismatch": [
             r"cannot convert",
@@ -38,6 +59,29 @@ class ErrorAnalyzer:
 
         return "unknown", {"message": "未知错误类型", "fix_suggestion": "请检查 SQL 语法"}
 
+    # 只需等待后原样重试的错误
+    TRANSIENT = {"connection"}
+    # 修改 SQL 也无法解决，直接失败
+    FAIL_FAST = {"constraint", "permission"}
+    # 可以用 schema 目录在本地更正的错误
+    LOCAL_FIXABLE = {"no_table", "no_column"}
+
+    _IDENTIFIER_PATTERNS = [
+        r"no such (?:table|column):\s*([\w.]+)",
+        r"(?:relation|column) \"([^\"]+)\" does not exist",
+        r"unknown column '([^']+)'",
+        r"table '([^']+)' doesn't exist",
+        r"column ([\w.]+) not found",
+    ]
+
+    def extract_identifier(self, error_msg: str) -> Optional[str]:
+        """从 no_table / no_column 错误信息中取出缺失的标识符（去掉限定前缀）"""
+        for pattern in self._IDENTIFIER_PATTERNS:
+            match = re.search(pattern, error_msg, re.IGNORECASE)
+            if match:
+                return match.group(1).split(".")[-1]
+        return None
+
     def _get_suggestion(self, error_type: str) -> Dict:
         suggestions = {
             "syntax": {
@@ -59,6 +103,14 @@ class ErrorAnalyzer:
             "constraint": {
                 "message": "约束冲突",
                 "fix_suggestion": "检查数据是否违反约束条件"
+            },
+            "connection": {
+                "message": "数据库连接异常",
+                "fix_suggestion": "稍后重试"
+            },
+            "permission": {
+                "message": "权限不足",
+                "fix_suggestion": "确认当前账号有访问该对象的权限"
             }
         }
         return suggestions.get(error_type, {})
@@ -1,28 +1,151 @@
-from typing import Dict, Any, Optional, List
+from collections import deque
+from contextlib import ExitStack, nullcontext
+from typing import ContextManager, Deque, Dict, Any, Iterator, Optional, List, Tuple
 from langchain_community.utilities import SQLDatabase
+from sqlalchemy import text
+from threading import Lock
 import logging
+import re
+import time
+
+from .error_analyzer import ErrorAnalyzer, RetryConfig
+from .query_monitor import QueryMonitor
+from .query_timeout import CancelToken, QueryCancelledError, QueryTimeoutError, query_deadline
+from .result_cache import ResultCache, is_read_query, referenced_tables
+from .result_set import ResultSet, infer_types
+from .schema_checker import SchemaChecker
+from ..security.cost_guard import CostDecision, QueryCostGuard
+from ..security.sql_validator import SQLSecurityValidator
 
 logger = logging.getLogger(__name__)
 
+# 执行历史中 SQL / 错误信息保留的最大长度
+_HISTORY_TEXT_LIMIT = 2000
+
+
+def _replace_identifier(sql: str, name: str, replacement: str) -> str:
+    """替换 SQL 中的标识符，单引号字符串内的内容保持不变"""
+    parts = re.split(r"('(?:[^']|'')*')", sql)
+    pattern = re.compile(rf"\b{re.escape(name)}\b", re.IGNORECASE)
+    return "".join(
+        part if part.startswith("'") else pattern.sub(replacement, part)
+        for part in parts
+    )
+
 
 class QueryExecutor:
     def __init__(
         self,
         database: SQLDatabase,
         max_retries: int = 3,
-        llm: Optional[Any] = None
+        llm: Optional[Any] = None,
+        result_cache: Optional[ResultCache] = None,
+        max_rows: Optional[int] = None,
+        batch_size: int = 500,
+        query_timeout: Optional[float] = None,
+        execution_timeout: Optional[float] = None,
+        schema_checker: Optional[SchemaChecker] = None,
+        retry_config: Optional[RetryConfig] = None,
+        history_size: int = 1000,
+        monitor: Optional[QueryMonitor] = None,
+        security_validator: Optional[SQLSecurityValidator] = None,
+        cost_guard: Optional[QueryCostGuard] = None
     ):
         self.database = database
-        self.max_retries = max_retries
+        # retry_config 同时决定尝试次数和连接类错误的退避间隔
+        self.retry_config = retry_config or RetryConfig(max_retries=max_retries)
+        self.max_retries = self.retry_config.max_retries
         self.llm = llm
-        self.execution_history: List[Dict] = []
+        self.result_cache = result_cache
+        self.max_rows = max_rows
+        self.batch_size = batch_size
+        self.query_timeout = query_timeout
+        self.execution_timeout = execution_timeout
+        self.schema_checker = schema_checker
+        self.error_analyzer = ErrorAnalyzer()
+        self.monitor = monitor
+        # 修复（LLM 或本地更正）产生的新 SQL 执行前重新经过安全校验和代价守卫
+        self.security_validator = security_validator
+        self.cost_guard = cost_guard
+        self._history: Deque[Dict] = deque(maxlen=history_size)
+        self._error_stats: Dict[str, Dict[str, float]] = {}
+        self._stats_lock = Lock()
+
+    def execute(
+        self,
+        sql: str,
+        parameters: Optional[Dict[str, Any]] = None,
+        cancel: Optional[CancelToken] = None,
+        question: Optional[str] = None
+    ) -> Dict[str, Any]:
+        # 调用方已校验过 sql；之后任何改写都要在执行前重新校验
+        checked = sql
+        cost = None
+        sql, schema_errors = self._precheck(sql)
+        if sql != checked:
+            sql, cost, rejection = self._guard(sql, parameters)
+            if rejection is not None:
+                return self._rejected(sql, rejection, cost, attempts=0)
+            checked = sql
+
+        if self.result_cache is not None and is_read_query(sql):
+            cached = self.result_cache.get(
+                sql, parameters, loader=lambda: self._run(sql, parameters, self.query_timeout)
+            )
+            if cached is not None:
+                return {
+                    "success": True,
+                    "result": cached.result,
+                    "sql": sql,
+                    "attempts": 1,
+                    "cached": True,
+                    "stale": cached.stale
+                }
 
-    def execute(self, sql: str) -> Dict[str, Any]:
+        started = time.monotonic()
+        error_type = None
         for attempt in range(self.max_retries):
+            if schema_errors and self._can_fix(attempt, parameters):
+                # 本地已确定的错误直接交给 LLM 修复，省去一次数据库往返
+                error_msg = "; ".join(schema_errors)
+                error_type = self._schema_error_type(schema_errors)
+                logger.warning(f"SQL 本地校验失败 (尝试 {attempt + 1}/{self.max_retries}): {error_msg}")
+                self._record_execution(sql, success=False, error=error_msg)
+                sql, schema_errors = self._precheck(
+                    self._repair(sql, error_msg, error_type, attempt, parameters, started) or sql
+                )
+                logger.info(f"修复后的 SQL: {sql}")
+                continue
+
+            if sql != checked:
+                sql, cost, rejection = self._guard(sql, parameters)
+                if rejection is not None:
+                    return self._rejected(sql, rejection, cost, attempts=attempt + 1)
+                checked = sql
+
+            attempt_started = time.monotonic()
             try:
-                result = self.database.run(sql)
+                version = None
+                if self.result_cache is not None and is_read_query(sql):
+                    version = self.result_cache.snapshot(sql)
 
-                self._record_execution(sql, success=True, result=result)
+                with self._admit(cost) as admitted:
+                    if not admitted:
+                        return self._rejected(sql, "昂贵查询排队超时，已拒绝执行", cost, attempts=attempt + 1)
+                    result = self._run(sql, parameters, self._statement_timeout(started), cancel)
+
+                self._record_execution(
+                    sql, success=True, result=result, duration=time.monotonic() - attempt_started,
+                    question=question, parameters=parameters
+                )
+                if error_type is not None:
+                    self._record_recovery(error_type)
+
+                if self.result_cache is not None:
+                    if version is not None:
+                        self.result_cache.put(sql, result, parameters, version)
+                    elif not is_read_query(sql):
+                        self.result_cache.record_write(sql)
 
                 return {
                     "success": True,
@@ -31,22 +154,46 @@ class QueryExecutor:
                     "attempts": attempt + 1
                 }
 
+            except (QueryTimeoutError, QueryCancelledError) as e:
+                # 超时和取消不重试，也不交给 LLM 修复
+                error_msg = str(e)
+                logger.warning(f"SQL 执行中止: {error_msg}")
+                self._record_execution(
+                    sql, success=False, error=error_msg, duration=time.monotonic() - attempt_started,
+                    question=question, parameters=parameters
+                )
+                self._record_error("timeout" if isinstance(e, QueryTimeoutError) else "cancelled")
+                return {
+                    "success": False,
+                    "error": error_msg,
+                    "sql": sql,
+                    "attempts": attempt + 1,
+                    "timed_out": isinstance(e, QueryTimeoutError),
+                    "cancelled": isinstance(e, QueryCancelledError)
+                }
+
             except Exception as e:
                 error_msg = str(e)
                 logger.warning(f"SQL 执行失败 (尝试 {attempt + 1}/{self.max_retries}): {error_msg}")
 
-                self._record_execution(sql, success=False, error=error_msg)
+                self._record_execution(
+                    sql, success=False, error=error_msg, duration=time.monotonic() - attempt_started,
+                    question=question, parameters=parameters
+                )
 
-                if attempt < self.max_retries - 1 and self.llm:
-                    sql = self._fix_sql(sql, error_msg)
-                    logger.info(f"修复后的 SQL: {sql}")
-                else:
+                error_type, _ = self.error_analyzer.analyze(error_msg)
+                fixed = self._repair(sql, error_msg, error_type, attempt, parameters, started)
+                if fixed is None:
                     return {
                         "success": False,
                         "error": error_msg,
+                        "error_type": error_type,
                         "sql": sql,
                         "attempts": attempt + 1
                     }
+                if fixed != sql:
+                    logger.info(f"修复后的 SQL: {fixed}")
+                sql, schema_errors = self._precheck(fixed)
 
         return {
             "success": False,
@@ -55,24 +202,300 @@ class QueryExecutor:
             "attempts": self.max_retries
         }
 
+    def execute_stream(
+        self,
+        sql: str,
+        parameters: Optional[Dict[str, Any]] = None,
+        cancel: Optional[CancelToken] = None,
+        question: Optional[str] = None
+    ) -> "RowStream":
+        """按批次流式读取结果，迭代返回值得到每批行，结束后可读取执行信息"""
+        return RowStream(self, sql, parameters, cancel, question)
+
+    def _guard(
+        self,
+        sql: str,
+        parameters: Optional[Dict[str, Any]] = None
+    ) -> Tuple[str, Optional[CostDecision], Optional[str]]:
+        """改写后的 SQL 重新做安全校验和代价估算
+
+        Returns:
+            (实际执行的 SQL（LIMIT 策略下已改写）, 代价决定, 拒绝原因；None 表示放行)
+        """
+        if self.security_validator is not None:
+            validation = self.security_validator.validate(sql)
+            if not validation.is_valid:
+                logger.warning(f"修复后的 SQL 未通过安全校验: {validation.message}")
+                return sql, None, f"修复后的 SQL 未通过安全校验: {validation.message}"
+        if self.cost_guard is None:
+            return sql, None, None
+        decision = self.cost_guard.check(sql, parameters)
+        if decision.rejected:
+            return sql, decision, decision.message
+        return decision.sql, decision, None
+
+    def _admit(self, cost: Optional[CostDecision]) -> ContextManager[bool]:
+        if self.cost_guard is None or cost is None:
+            return nullcontext(True)
+        return self.cost_guard.admit(cost)
+
+    @staticmethod
+    def _rejected(sql: str, error: str, cost: Optional[CostDecision], attempts: int) -> Dict[str, Any]:
+        outcome = {
+            "success": False,
+            "error": error,
+            "sql": sql,
+            "attempts": attempts,
+            "rejected": True
+        }
+        if cost is not None:
+            summary = cost.summary()
+            summary["action"] = "reject"
+            outcome["cost_guard"] = summary
+        return outcome
+
+    def _precheck(self, sql: str) -> Tuple[str, List[str]]:
+        """本地 schema 校验：返回确定性更正后的 SQL 和无法更正的错误"""
+        if self.schema_checker is None:
+            return sql, []
+        check = self.schema_checker.check(sql)
+        return check.sql, check.errors
+
+    def _can_fix(self, attempt: int, parameters: Optional[Dict[str, Any]]) -> bool:
+        # 参数化 SQL 不交给 LLM 修复，修复结果无法保证仍使用同样的参数
+        return attempt < self.max_retries - 1 and self.llm is not None and not parameters
+
+    @staticmethod
+    def _schema_error_type(errors: List[str]) -> str:
+        return "no_table" if any(error.startswith("未知表") for error in errors) else "no_column"
+
+    def _repair(
+        self,
+        sql: str,
+        error: str,
+        error_type: str,
+        attempt: int,
+        parameters: Optional[Dict[str, Any]],
+        started: float
+    ) -> Optional[str]:
+        """按错误类别决定下一次尝试的 SQL，返回 None 表示不再重试
+
+        - connection: 按 retry_config 退避后原样重试
+        - constraint / permission: 修改 SQL 也无济于事，直接失败
+        - no_table / no_column: 先用 schema 目录在本地更正，不行再交给 LLM
+        - 其他: 附上相关表结构交给 LLM 修复
+        """
+        began = time.monotonic()
+        fixed = None
+        if attempt < self.max_retries - 1 and error_type not in ErrorAnalyzer.FAIL_FAST:
+            if error_type in ErrorAnalyzer.TRANSIENT:
+                delay = self.retry_config.get_delay(attempt)
+                if self.execution_timeout and self.execution_timeout > 0:
+                    delay = min(delay, max(self.execution_timeout - (began - started), 0))
+                time.sleep(delay)
+                fixed = sql
+            else:
+                if error_type in ErrorAnalyzer.LOCAL_FIXABLE:
+                    fixed = self._fix_identifier(sql, error, error_type)
+                if fixed is None and self.llm is not None and not parameters:
+                    fixed = self._fix_sql(sql, error, error_type)
+        self._record_error(error_type, retried=fixed is not None, repair_time=time.monotonic() - began)
+        return fixed
+
+    def _fix_identifier(self, sql: str, error: str, error_type: str) -> Optional[str]:
+        """把错误信息里缺失的表 / 列替换为 schema 中唯一近似的名字"""
+        if self.schema_checker is None:
+            return None
+        name = self.error_analyzer.extract_identifier(error)
+        if not name:
+            return None
+        if error_type == "no_table":
+            replacement = self.schema_checker.suggest_table(name)
+        else:
+            replacement = self.schema_checker.suggest_column(name, referenced_tables(sql))
+        if replacement is None or replacement.lower() == name.lower():
+            return None
+        fixed = _replace_identifier(sql, name, replacement)
+        if fixed == sql:
+            return None
+        logger.info(f"本地更正 {name} -> {replacement}")
+        return fixed
+
+    def _record_error(self, error_type: str, retried: bool = False, repair_time: float = 0.0):
+        with self._stats_lock:
+            stats = self._error_stats.setdefault(
+                error_type, {"errors": 0, "retries": 0, "recovered": 0, "repair_time": 0.0}
+            )
+            stats["errors"] += 1
+            stats["retries"] += 1 if retried else 0
+            stats["repair_time"] += repair_time
+
+    def _record_recovery(self, error_type: str):
+        with self._stats_lock:
+            if error_type in self._error_stats:
+                self._error_stats[error_type]["recovered"] += 1
+
+    def get_error_stats(self) -> Dict[str, Dict[str, Any]]:
+        """按错误类别统计的错误数、重试数、重试后成功数和修复耗时"""
+        with self._stats_lock:
+            stats = {error_type: dict(values) for error_type, values in self._error_stats.items()}
+        for values in stats.values():
+            values["avg_repair_time"] = values["repair_time"] / values["retries"] if values["retries"] else 0.0
+        return stats
+
+    def _statement_timeout(self, started: float) -> Optional[float]:
+        """单条语句的超时：query_timeout 与 execution_timeout 剩余预算中较小者"""
+        limits = []
+        if self.query_timeout and self.query_timeout > 0:
+            limits.append(self.query_timeout)
+        if self.execution_timeout and self.execution_timeout > 0:
+            remaining = self.execution_timeout - (time.monotonic() - started)
+            if remaining <= 0:
+                raise QueryTimeoutError(f"执行超时 ({self.execution_timeout}s)")
+            limits.append(remaining)
+        return min(limits) if limits else None
+
+    def _run(
+        self,
+        sql: str,
+        parameters: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = None,
+        cancel: Optional[CancelToken] = None
+    ) -> ResultSet:
+        result = ResultSet()
+        for batch in self._iter_batches(sql, parameters, timeout, cancel):
+            result.columns, result.types = batch.columns, batch.types
+            result.rows.extend(batch.rows)
+            result.row_count = batch.row_count if not batch.columns else len(result.rows)
+            result.truncated = batch.truncated
+        return result
+
+    def _iter_batches(
+        self,
+        sql: str,
+        parameters: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = None,
+        cancel: Optional[CancelToken] = None
+    ) -> Iterator[ResultSet]:
+        """从服务端游标按 batch_size 分批读取，读满 max_rows 后停止并标记截断
+
+        直接读取游标，保留列名、类型和原始值，而不是 database.run 的字符串；
+        内存占用只与 batch_size 有关。不返回行的语句只产生一个记录受影响行数的批次。
+        timeout 覆盖执行和读取的全过程，cancel 在批次之间也会检查。
+        """
+        with self.database._engine.begin() as conn, query_deadline(conn, timeout, cancel):
+            cursor = conn.execution_options(
+                stream_results=True, yield_per=self.batch_size
+            ).execute(text(sql), parameters or {})
+
+            if not cursor.returns_rows:
+                yield ResultSet(row_count=max(cursor.rowcount, 0))
+                return
+
+            columns = list(cursor.keys())
+            types: Optional[List[str]] = None
+            fetched = 0
+            while True:
+                if cancel is not None:
+                    cancel.raise_if_cancelled()
+                limit = self.batch_size
+                if self.max_rows:
+                    limit = min(limit, self.max_rows - fetched)
+                rows = [tuple(row) for row in cursor.fetchmany(limit)] if limit > 0 else []
+                fetched += len(rows)
+
+                done = len(rows) < limit
+                truncated = False
+                if not done and self.max_rows and fetched >= self.max_rows:
+                    truncated = cursor.fetchone() is not None
+                    done = True
+                    if truncated:
+                        logger.warning(f"查询结果超过 {self.max_rows} 行，已截断")
+
+                if types is None:
+                    types = infer_types(cursor, columns, rows)
+                elif rows and "null" in types:
+                    # 前几批全为空值的列，用后续批次补全类型
+                    types = [
+                        inferred if known == "null" else known
+                        for known, inferred in zip(types, infer_types(cursor, columns, rows))
+                    ]
+                if rows or done:
+                    yield ResultSet(
+                        columns=columns,
+                        types=types,
+                        rows=rows,
+                        row_count=len(rows),
+                        truncated=truncated
+                    )
+                if done:
+                    return
+
+    @property
+    def execution_history(self) -> List[Dict]:
+        return list(self._history)
+
     def _record_execution(
         self,
         sql: str,
         success: bool,
         result: Any = None,
-        error: str = None
+        error: str = None,
+        row_count: Optional[int] = None,
+        duration: Optional[float] = None,
+        question: Optional[str] = None,
+        parameters: Optional[Dict[str, Any]] = None
     ):
-        self.execution_history.append({
-            "sql": sql,
+        """记录执行摘要（不保存结果本身），只保留最近 history_size 条
+
+        deque.append 本身是线程安全的，记录时不需要加锁。
+        给出 duration（实际访问了数据库）时同时计入 monitor。
+        """
+        if row_count is None and isinstance(result, ResultSet):
+            row_count = result.row_count
+        self._history.append({
+            "sql": sql[:_HISTORY_TEXT_LIMIT],
             "success": success,
-            "result": result,
-            "error": error
+            "row_count": row_count,
+            "truncated": bool(getattr(result, "truncated", False)),
+            "error": error[:_HISTORY_TEXT_LIMIT] if error else error,
+            "duration": duration,
+            "timestamp": time.time()
         })
+        if self.monitor is not None and duration is not None:
+            self.monitor.record_query(
+                sql,
+                duration,
+                success,
+                row_count=row_count,
+                question=question,
+                plan_loader=lambda: self._explain(sql, parameters)
+            )
+
+    def _explain(self, sql: str, parameters: Optional[Dict[str, Any]] = None) -> Optional[List[str]]:
+        """慢查询日志用的执行计划，每行一个字符串"""
+        dialect = self.database._engine.dialect.name
+        prefixes = {
+            "sqlite": "EXPLAIN QUERY PLAN",
+            "postgresql": "EXPLAIN",
+            "mysql": "EXPLAIN",
+            "mariadb": "EXPLAIN",
+        }
+        if dialect not in prefixes or not is_read_query(sql):
+            return None
+        with self.database._engine.connect() as conn:
+            rows = conn.execute(text(f"{prefixes[dialect]} {sql}"), parameters or {}).fetchall()
+        return [" | ".join(str(value) for value in row) for row in rows]
 
-    def _fix_sql(self, sql: str, error: str) -> str:
+    def _fix_sql(self, sql: str, error: str, error_type: str = "unknown") -> str:
         if not self.llm:
             return sql
 
+        hint = self.error_analyzer._get_suggestion(error_type)
+        hint_text = f"{hint['message']}：{hint['fix_suggestion']}\n\n" if hint else ""
+        context = self._schema_context(sql, error_type)
+        context_text = f"相关表结构:\n{context}\n\n" if context else ""
+
         fix_prompt = f"""SQL 执行失败，请修复以下 SQL 语句。
 
 原始 SQL:
@@ -81,7 +504,7 @@ class QueryExecutor:
 错误信息:
 {error}
 
-请直接返回修复后的 SQL，不要解释。"""
+{hint_text}{context_text}请直接返回修复后的 SQL，不要解释。"""
 
         try:
             response = self.llm.invoke(fix_prompt)
@@ -94,6 +517,21 @@ class QueryExecutor:
             logger.error(f"SQL 修复失败: {e}")
             return sql
 
+    def _schema_context(self, sql: str, error_type: str) -> str:
+        """修复提示只附上 SQL 涉及的表结构；表不存在时附上可用表名"""
+        try:
+            usable = {name.lower(): name for name in self.database.get_usable_table_names()}
+            tables = [usable[name] for name in referenced_tables(sql) if name in usable]
+            parts = []
+            if tables:
+                parts.append(self.database.get_table_info(table_names=tables))
+            if error_type == "no_table" or not tables:
+                parts.append("可用的表: " + ", ".join(usable.values()))
+            return "\n\n".join(parts)
+        except Exception as e:
+            logger.debug(f"读取表结构失败: {e}")
+            return ""
+
     def _clean_sql(self, sql: str) -> str:
         sql = sql.strip()
         sql = sql.replace("```sql", "").replace("```", "")
@@ -101,3 +539,221 @@ class QueryExecutor:
 
     def get_history(self) -> List[Dict]:
         return self.execution_history
+
+
+class RowStream:
+    """QueryExecutor.execute_stream 的返回值
+
+    迭代得到每批行（List[Tuple]）；第一批产生之前的失败按 execute 的规则
+    重试（必要时交给 LLM 修复），之后的失败结束迭代并记录在 error 中。
+    超时和取消不重试，分别记为 timed_out / cancelled；修复后的 SQL 未通过
+    安全校验或代价守卫时记为 rejected。
+    迭代结束后可读取 success / columns / types / row_count / truncated / cached。
+    计入 monitor 的耗时从执行语句开始到读完最后一批，包含调用方消费各批的时间。
+    """
+
+    def __init__(
+        self,
+        executor: QueryExecutor,
+        sql: str,
+        parameters: Optional[Dict[str, Any]] = None,
+        cancel: Optional[CancelToken] = None,
+        question: Optional[str] = None
+    ):
+        self.executor = executor
+        self.sql = sql
+        self.parameters = parameters
+        self.cancel = cancel
+        self.question = question
+        self.success = False
+        self.error = ""
+        self.timed_out = False
+        self.cancelled = False
+        self.attempts = 0
+        self.columns: List[str] = []
+        self.types: List[str] = []
+        self.row_count = 0
+        self.truncated = False
+        self.cached = False
+        self.stale = False
+        self.rejected = False
+        self.cost_guard: Optional[Dict[str, Any]] = None
+        self.error_type: Optional[str] = None
+        self._schema_errors: List[str] = []
+        self._attempt_started = 0.0
+        self._checked = sql
+        self._cost: Optional[CostDecision] = None
+        # 重新估算后需要排队的语句，在整个读取期间占用重查询通道
+        self._admission = ExitStack()
+
+    def __iter__(self) -> Iterator[List[Tuple]]:
+        try:
+            yield from self._iterate()
+        finally:
+            self._admission.close()
+
+    def _iterate(self) -> Iterator[List[Tuple]]:
+        executor = self.executor
+        self.sql, self._schema_errors = executor._precheck(self.sql)
+        if not self._recheck():
+            return
+        cache = executor.result_cache if is_read_query(self.sql) else None
+
+        if cache is not None:
+            hit = cache.get(
+                self.sql,
+                self.parameters,
+                loader=lambda: executor._run(self.sql, self.parameters, executor.query_timeout)
+            )
+            if hit is not None:
+                self.cached, self.stale, self.attempts = True, hit.stale, 1
+                yield from self._replay(hit.result)
+                return
+
+        opened = self._open()
+        if opened is None:
+            return
+
+        rest, version, first = opened
+        kept: Optional[List[Tuple]] = [] if cache is not None else None
+        try:
+            for batch in self._chain(first, rest):
+                if batch.columns:
+                    self.columns, self.types = batch.columns, batch.types
+                self.row_count += batch.row_count
+                self.truncated = batch.truncated
+                if kept is not None:
+                    kept.extend(batch.rows)
+                if batch.rows:
+                    yield batch.rows
+        except Exception as e:
+            self._fail(e)
+            logger.warning(f"SQL 流式读取失败: {self.error}")
+            self._record(success=False)
+            return
+        finally:
+            # 调用方提前停止迭代时及时关闭游标、归还连接
+            rest.close()
+
+        self.success = True
+        self._record(success=True)
+        if executor.result_cache is not None:
+            if kept is not None:
+                result = ResultSet(
+                    columns=self.columns,
+                    types=self.types,
+                    rows=kept,
+                    truncated=self.truncated
+                )
+                cache.put(self.sql, result, self.parameters, version)
+            elif not is_read_query(self.sql):
+                executor.result_cache.record_write(self.sql)
+
+    def _open(self):
+        """执行语句并取得第一批；失败时按 execute 的规则重试或修复"""
+        executor = self.executor
+        started = time.monotonic()
+        for attempt in range(executor.max_retries):
+            self.attempts = attempt + 1
+            if self._schema_errors and executor._can_fix(attempt, self.parameters):
+                self.error = "; ".join(self._schema_errors)
+                self.error_type = executor._schema_error_type(self._schema_errors)
+                logger.warning(f"SQL 本地校验失败 (尝试 {attempt + 1}/{executor.max_retries}): {self.error}")
+                executor._record_execution(self.sql, success=False, error=self.error)
+                fixed = executor._repair(
+                    self.sql, self.error, self.error_type, attempt, self.parameters, started
+                )
+                self.sql, self._schema_errors = executor._precheck(fixed or self.sql)
+                logger.info(f"修复后的 SQL: {self.sql}")
+                continue
+            if not self._recheck():
+                return None
+            self._admission.close()
+            if not self._admission.enter_context(executor._admit(self._cost)):
+                self._reject("昂贵查询排队超时，已拒绝执行")
+                return None
+            version = None
+            if executor.result_cache is not None and is_read_query(self.sql):
+                version = executor.result_cache.snapshot(self.sql)
+            self._attempt_started = time.monotonic()
+            try:
+                batches = executor._iter_batches(
+                    self.sql, self.parameters, executor._statement_timeout(started), self.cancel
+                )
+                first = next(batches)
+                if self.error_type is not None:
+                    executor._record_recovery(self.error_type)
+                return batches, version, first
+            except Exception as e:
+                self._fail(e)
+                logger.warning(f"SQL 执行失败 (尝试 {attempt + 1}/{executor.max_retries}): {self.error}")
+                self._record(success=False)
+                if self.timed_out or self.cancelled:
+                    executor._record_error("timeout" if self.timed_out else "cancelled")
+                    return None
+                self.error_type, _ = executor.error_analyzer.analyze(self.error)
+                fixed = executor._repair(
+                    self.sql, self.error, self.error_type, attempt, self.parameters, started
+                )
+                if fixed is None:
+                    return None
+                if fixed != self.sql:
+                    logger.info(f"修复后的 SQL: {fixed}")
+                self.sql, self._schema_errors = executor._precheck(fixed)
+        return None
+
+    def _recheck(self) -> bool:
+        """SQL 被改写过时重新校验，拒绝时返回 False"""
+        if self.sql == self._checked:
+            return True
+        self.sql, self._cost, rejection = self.executor._guard(self.sql, self.parameters)
+        if rejection is not None:
+            self._reject(rejection)
+            return False
+        self._checked = self.sql
+        return True
+
+    def _reject(self, error: str):
+        self.error = error
+        self.rejected = True
+        outcome = self.executor._rejected(self.sql, error, self._cost, self.attempts)
+        self.cost_guard = outcome.get("cost_guard")
+
+    def _record(self, success: bool):
+        self.executor._record_execution(
+            self.sql,
+            success=success,
+            error=None if success else self.error,
+            row_count=self.row_count if success else None,
+            duration=time.monotonic() - self._attempt_started,
+            question=self.question,
+            parameters=self.parameters
+        )
+
+    def _fail(self, error: Exception):
+        self.error = str(error)
+        self.timed_out = isinstance(error, QueryTimeoutError)
+        self.cancelled = isinstance(error, QueryCancelledError)
+
+    @staticmethod
+    def _chain(first: ResultSet, rest: Iterator[ResultSet]) -> Iterator[ResultSet]:
+        yield first
+        yield from rest
+
+    def _replay(self, result: ResultSet) -> Iterator[List[Tuple]]:
+        self.columns, self.types = result.columns, result.types
+        self.row_count, self.truncated = result.row_count, result.truncated
+        self.success = True
+        size = self.executor.batch_size
+        for start in range(0, len(result.rows), size):
+            yield result.rows[start:start + size]
+
+    def to_result_set(self, rows: List[Tuple]) -> ResultSet:
+        """用调用方收集的行组装 ResultSet"""
+        return ResultSet(
+            columns=self.columns,
+            types=self.types,
+            rows=rows,
+            row_count=self.row_count,
+            truncated=self.truncated
+        )
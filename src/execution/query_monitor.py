@@ -1,51 +1,317 @@
+import json
+import logging
+import logging.handlers
+import math
+import os
+import re
 import time
-from typing import Dict, List
+import zlib
+from collections import OrderedDict, deque
+from threading import Lock
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from .result_cache import normalize_sql
+
+logger = logging.getLogger(__name__)
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?\b")
+_VALUE_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+
+
+def fingerprint_sql(sql: str) -> str:
+    """SQL 指纹：折叠空白，字符串和数字字面量替换为 ?，IN 列表折叠为 (?)
+
+    只有字面量不同的语句得到同一个指纹，统计按指纹聚合。
+    """
+    fingerprint = _STRING_LITERAL.sub("?", normalize_sql(sql))
+    fingerprint = _NUMBER_LITERAL.sub("?", fingerprint)
+    return _VALUE_LIST.sub("(?)", fingerprint)
+
+
+class LatencyHistogram:
+    """对数-线性分桶的延迟直方图
+
+    以微秒计，每个 2 的幂区间再线性切成 sub_buckets 个桶，相对误差不超过
+    1 / sub_buckets；只保存出现过的桶，内存与样本数无关。
+    """
+
+    __slots__ = ("sub_buckets", "buckets", "count", "max")
+
+    def __init__(self, sub_buckets: int = 16):
+        self.sub_buckets = sub_buckets
+        self.buckets: Dict[int, int] = {}
+        self.count = 0
+        self.max = 0.0
+
+    def _index(self, micros: float) -> int:
+        if micros < 1:
+            return 0
+        exponent = int(math.log2(micros))
+        sub = int((micros / (1 << exponent) - 1) * self.sub_buckets)
+        return exponent * self.sub_buckets + min(sub, self.sub_buckets - 1) + 1
+
+    def _upper_bound(self, index: int) -> float:
+        """桶的上界（秒）"""
+        if index == 0:
+            return 1e-6
+        exponent, sub = divmod(index - 1, self.sub_buckets)
+        return (1 << exponent) * (1 + (sub + 1) / self.sub_buckets) / 1e6
+
+    def record(self, seconds: float):
+        index = self._index(seconds * 1e6)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, p: float) -> float:
+        """第 p 百分位（秒）；返回所在桶的上界，不超过实际最大值"""
+        if self.count == 0:
+            return 0.0
+        rank = math.ceil(self.count * p / 100)
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                return min(self._upper_bound(index), self.max)
+        return self.max
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "max": self.max,
+        }
+
+
+class SlowQueryLog:
+    """慢查询日志：最近的记录保存在内存中，配置了 path 时同时按大小轮转写入 JSON 行"""
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        max_bytes: int = 10 * 1024 * 1024,
+        backup_count: int = 5,
+        keep: int = 100
+    ):
+        self.path = path
+        self.recent: Deque[Dict[str, Any]] = deque(maxlen=keep)
+        self._logger = None
+        if path:
+            log_dir = os.path.dirname(path)
+            if log_dir:
+                os.makedirs(log_dir, exist_ok=True)
+            handler = logging.handlers.RotatingFileHandler(
+                path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"
+            )
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self._logger = logging.getLogger(f"nl2sql.slow_query.{os.path.abspath(path)}")
+            self._logger.setLevel(logging.INFO)
+            self._logger.propagate = False
+            self._logger.handlers.clear()
+            self._logger.addHandler(handler)
+
+    def write(self, entry: Dict[str, Any]):
+        self.recent.append(entry)
+        if self._logger is not None:
+            self._logger.info(json.dumps(entry, ensure_ascii=False, default=str))
+
+    def close(self):
+        if self._logger is not None:
+            for handler in list(self._logger.handlers):
+                handler.close()
+                self._logger.removeHandler(handler)
+
+
+class _Shard:
+    __slots__ = ("lock", "stats", "evictions")
+
+    def __init__(self):
+        self.lock = Lock()
+        self.stats: "OrderedDict[str, Dict]" = OrderedDict()
+        self.evictions = 0
 
 
 class QueryMonitor:
-    def __init__(self, slow_query_threshold: float = 5.0):
+    """按 SQL 指纹聚合的查询统计
+
+    统计分散在多个分片中，每个分片一把锁，并发记录只在同一分片上竞争；
+    每个分片按 LRU 保留有限数量的指纹，内存占用与查询总数无关。
+    """
+
+    def __init__(
+        self,
+        slow_query_threshold: float = 5.0,
+        max_fingerprints: int = 10000,
+        shards: int = 16,
+        slow_log: Optional[SlowQueryLog] = None
+    ):
         self.slow_query_threshold = slow_query_threshold
-        self.query_stats: Dict[str, Dict] = {}
-
-    def record_query(self, sql: str, duration: float, success: bool):
-        if sql not in self.query_stats:
-            self.query_stats[sql] = {
-                "count": 0,
-                "total_duration": 0,
-                "success_count": 0,
-                "failure_count": 0
-            }
-
-        stats = self.query_stats[sql]
-        stats["count"] += 1
-        stats["total_duration"] += duration
-
-        if success:
-            stats["success_count"] += 1
-        else:
-            stats["failure_count"] += 1
+        self.max_fingerprints = max_fingerprints
+        self.slow_log = slow_log or SlowQueryLog()
+        self._shards = [_Shard() for _ in range(max(shards, 1))]
+        self._per_shard = max(max_fingerprints // len(self._shards), 1)
+
+    @property
+    def evictions(self) -> int:
+        """因超过 max_fingerprints 被淘汰的指纹数"""
+        return sum(shard.evictions for shard in self._shards)
+
+    @property
+    def query_stats(self) -> Dict[str, Dict]:
+        """所有指纹统计的快照"""
+        snapshot = {}
+        for shard in self._shards:
+            with shard.lock:
+                snapshot.update((key, self._public(stats)) for key, stats in shard.stats.items())
+        return snapshot
+
+    @staticmethod
+    def _public(stats: Dict) -> Dict:
+        public = {key: value for key, value in stats.items() if key != "histogram"}
+        public.update(stats["histogram"].summary())
+        return public
+
+    def _shard(self, fingerprint: str) -> _Shard:
+        # crc32 在各进程间稳定，便于比对分片分布
+        return self._shards[zlib.crc32(fingerprint.encode("utf-8")) % len(self._shards)]
+
+    def record_query(
+        self,
+        sql: str,
+        duration: float,
+        success: bool,
+        row_count: Optional[int] = None,
+        question: Optional[str] = None,
+        plan_loader: Optional[Callable[[], Any]] = None
+    ):
+        """
+        记录一次查询
+
+        Args:
+            sql: 执行的 SQL
+            duration: 耗时（秒）
+            success: 是否成功
+            row_count: 返回 / 影响的行数
+            question: 产生该 SQL 的自然语言问题
+            plan_loader: 慢查询时调用，返回执行计划
+        """
+        fingerprint = fingerprint_sql(sql)
+        shard = self._shard(fingerprint)
+
+        with shard.lock:
+            stats = shard.stats.get(fingerprint)
+            if stats is None:
+                stats = shard.stats[fingerprint] = {
+                    "count": 0,
+                    "total_duration": 0,
+                    "success_count": 0,
+                    "failure_count": 0,
+                    "last_seen": 0.0,
+                    "histogram": LatencyHistogram()
+                }
+                if len(shard.stats) > self._per_shard:
+                    shard.stats.popitem(last=False)
+                    shard.evictions += 1
+            else:
+                shard.stats.move_to_end(fingerprint)
+
+            stats["count"] += 1
+            stats["total_duration"] += duration
+            stats["last_seen"] = time.time()
+            stats["histogram"].record(duration)
+
+            if success:
+                stats["success_count"] += 1
+            else:
+                stats["failure_count"] += 1
+
+            if duration > self.slow_query_threshold:
+                stats["is_slow"] = True
+                stats["slow_duration"] = max(duration, stats.get("slow_duration", 0))
 
         if duration > self.slow_query_threshold:
-            stats["is_slow"] = True
-            stats["slow_duration"] = duration
+            # 执行计划在锁外获取，不阻塞同分片的其他记录
+            self._log_slow(sql, fingerprint, duration, success, row_count, question, plan_loader)
+
+    def _log_slow(
+        self,
+        sql: str,
+        fingerprint: str,
+        duration: float,
+        success: bool,
+        row_count: Optional[int],
+        question: Optional[str],
+        plan_loader: Optional[Callable[[], Any]]
+    ):
+        plan = None
+        if plan_loader is not None:
+            try:
+                plan = plan_loader()
+            except Exception as e:
+                logger.debug(f"获取慢查询执行计划失败: {e}")
+        self.slow_log.write({
+            "timestamp": time.time(),
+            "fingerprint": fingerprint,
+            "sql": sql,
+            "duration": duration,
+            "success": success,
+            "row_count": row_count,
+            "question": question,
+            "plan": plan,
+        })
+        logger.warning(f"慢查询 ({duration:.2f}s): {fingerprint}")
+
+    def snapshot(self, limit: Optional[int] = None) -> Dict[str, Any]:
+        """导出当前统计（按总耗时降序，可只取前 limit 个指纹）和最近的慢查询
+
+        逐个分片加锁复制，记录不会因此停顿。
+        """
+        fingerprints = sorted(
+            self.query_stats.items(), key=lambda item: item[1]["total_duration"], reverse=True
+        )
+        if limit is not None:
+            fingerprints = fingerprints[:limit]
+        return {
+            "generated_at": time.time(),
+            "slow_query_threshold": self.slow_query_threshold,
+            "evictions": self.evictions,
+            "fingerprints": dict(fingerprints),
+            "slow_queries": list(self.slow_log.recent),
+        }
+
+    def export(self, path: str, limit: Optional[int] = None):
+        """把 snapshot 写入 JSON 文件（先写临时文件再替换，读者不会看到半个文件）"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(limit), f, ensure_ascii=False, default=str, indent=2)
+        os.replace(tmp_path, path)
 
     def get_slow_queries(self) -> List[str]:
         return [
-            sql for sql, stats in self.query_stats.items()
+            fingerprint for fingerprint, stats in self.query_stats.items()
             if stats.get("is_slow")
         ]
 
     def get_query_stats(self, sql: str) -> Dict:
-        return self.query_stats.get(sql, {})
+        fingerprint = fingerprint_sql(sql)
+        shard = self._shard(fingerprint)
+        with shard.lock:
+            stats = shard.stats.get(fingerprint)
+            return self._public(stats) if stats is not None else {}
 
     def get_all_stats(self) -> Dict[str, Dict]:
         return self.query_stats
 
     def clear_stats(self):
-        self.query_stats = {}
+        for shard in self._shards:
+            with shard.lock:
+                shard.stats.clear()
 
     def get_success_rate(self, sql: str) -> float:
-        stats = self.query_stats.get(sql, {})
+        stats = self.get_query_stats(sql)
         count = stats.get("count", 0)
         if count == 0:
             return 0.0
@@ -53,7 +319,7 @@ class QueryMonitor:
         return (success / count) * 100
 
     def get_average_duration(self, sql: str) -> float:
-        stats = self.query_stats.get(sql, {})
+        stats = self.get_query_stats(sql)
         count = stats.get("count", 0)
         if count == 0:
             return 0.0
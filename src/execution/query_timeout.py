@@ -0,0 +1,158 @@
+from contextlib import contextmanager
+from threading import Event, Lock
+from typing import Any, Callable, Iterator, List, Optional
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# SQLite 每执行这么多条虚拟机指令检查一次截止时间和取消标记
+_SQLITE_PROGRESS_STEPS = 1000
+
+
+class QueryTimeoutError(TimeoutError):
+    """查询超过截止时间被数据库中止"""
+
+
+class QueryCancelledError(RuntimeError):
+    """查询被调用方取消（例如客户端断开连接）"""
+
+
+class CancelToken:
+    """跨线程的取消标记；cancel() 时依次调用已注册的回调（如驱动的 cancel()）"""
+
+    def __init__(self):
+        self._event = Event()
+        self._lock = Lock()
+        self._callbacks: List[Callable[[], None]] = []
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks = list(self._callbacks)
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.warning(f"取消查询回调失败: {e}")
+
+    def add_callback(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """注册回调，返回注销函数；已取消时立即调用"""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return lambda: self._remove(callback)
+        callback()
+        return lambda: None
+
+    def _remove(self, callback: Callable[[], None]):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def raise_if_cancelled(self):
+        if self.cancelled:
+            raise QueryCancelledError("查询已取消")
+
+
+@contextmanager
+def query_deadline(
+    conn: Any,
+    timeout: Optional[float] = None,
+    cancel: Optional[CancelToken] = None
+) -> Iterator[None]:
+    """在 conn 上为接下来的语句设置截止时间并接入取消
+
+    按方言使用原生机制：
+    - SQLite: progress handler 检查截止时间 / 取消标记，取消时调用 interrupt()
+    - PostgreSQL: SET LOCAL statement_timeout，取消时调用驱动的 cancel()
+    - MySQL: 会话级 max_execution_time（只作用于 SELECT；MariaDB 为 max_statement_time），
+      取消时 KILL QUERY
+    - Oracle: 连接的 call_timeout，取消时调用驱动的 cancel()
+
+    块内抛出的异常在超时或取消后分别转换为 QueryTimeoutError / QueryCancelledError。
+    """
+    if cancel is not None:
+        cancel.raise_if_cancelled()
+
+    deadline = time.monotonic() + timeout if timeout and timeout > 0 else None
+    dialect = conn.dialect.name
+    dbapi_conn = conn.connection.dbapi_connection
+    restore: Optional[Callable[[], None]] = None
+    on_cancel: Optional[Callable[[], None]] = None
+
+    if dialect == "sqlite":
+        def check() -> int:
+            expired = deadline is not None and time.monotonic() >= deadline
+            return 1 if expired or (cancel is not None and cancel.cancelled) else 0
+
+        dbapi_conn.set_progress_handler(check, _SQLITE_PROGRESS_STEPS)
+        restore = lambda: dbapi_conn.set_progress_handler(None, 0)
+        on_cancel = dbapi_conn.interrupt
+
+    elif dialect == "postgresql":
+        if deadline is not None:
+            # SET LOCAL 在事务结束时自动恢复
+            conn.exec_driver_sql(f"SET LOCAL statement_timeout = {int(timeout * 1000)}")
+        on_cancel = getattr(dbapi_conn, "cancel", None)
+
+    elif dialect in ("mysql", "mariadb"):
+        if deadline is not None:
+            # 直接恢复为全局默认值，省去先读取会话原值的往返
+            if getattr(conn.dialect, "is_mariadb", False):
+                variable, value = "max_statement_time", f"{timeout:.3f}"
+            else:
+                variable, value = "max_execution_time", str(int(timeout * 1000))
+            conn.exec_driver_sql(f"SET SESSION {variable} = {value}")
+            restore = lambda: conn.exec_driver_sql(f"SET SESSION {variable} = DEFAULT")
+        if cancel is not None:
+            connection_id = _mysql_connection_id(conn, dbapi_conn)
+
+            def kill_query():
+                with conn.engine.connect() as killer:
+                    killer.exec_driver_sql(f"KILL QUERY {int(connection_id)}")
+
+            on_cancel = kill_query
+
+    elif dialect == "oracle":
+        if deadline is not None and hasattr(dbapi_conn, "call_timeout"):
+            previous = dbapi_conn.call_timeout
+            dbapi_conn.call_timeout = int(timeout * 1000)
+            restore = lambda: setattr(dbapi_conn, "call_timeout", previous)
+        on_cancel = getattr(dbapi_conn, "cancel", None)
+
+    else:
+        logger.debug(f"方言 {dialect} 没有原生查询超时，只在批次之间检查取消")
+
+    unregister = cancel.add_callback(on_cancel) if cancel is not None and on_cancel else None
+    try:
+        yield
+    except Exception as e:
+        if cancel is not None and cancel.cancelled:
+            raise QueryCancelledError("查询已取消") from e
+        # 留一点余量：驱动 / 服务端的计时与本地计时存在误差
+        if deadline is not None and time.monotonic() >= deadline - 0.1:
+            raise QueryTimeoutError(f"查询超时 ({timeout}s)") from e
+        raise
+    finally:
+        if unregister is not None:
+            unregister()
+        if restore is not None:
+            try:
+                restore()
+            except Exception as e:
+                logger.warning(f"恢复查询超时设置失败: {e}")
+
+
+def _mysql_connection_id(conn: Any, dbapi_conn: Any) -> int:
+    """服务端连接 id；PyMySQL / mysqlclient 在握手时已拿到，无需查询"""
+    thread_id = getattr(dbapi_conn, "thread_id", None)
+    if callable(thread_id):
+        return thread_id()
+    return conn.exec_driver_sql("SELECT CONNECTION_ID()").scalar()
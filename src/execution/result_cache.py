@@ -0,0 +1,324 @@
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from threading import Lock, Thread
+from typing import Any, Callable, Dict, Optional, Set, Tuple
+import json
+import logging
+import os
+import pickle
+import re
+import sqlite3
+import time
+import zlib
+
+from .schema_checker import table_names
+
+logger = logging.getLogger(__name__)
+
+_READ_PREFIXES = ("SELECT", "WITH")
+_TABLE_PATTERN = re.compile(
+    r'\b(?:FROM|JOIN|INTO|UPDATE)\s+[`"\[]?([\w.]+)[`"\]]?',
+    re.IGNORECASE
+)
+_DDL_PREFIXES = ("CREATE", "DROP", "ALTER", "TRUNCATE", "RENAME")
+
+
+def normalize_sql(sql: str) -> str:
+    """折叠空白、去掉末尾分号；引号内的内容保持不变"""
+    parts = re.split(r"('(?:[^']|'')*')", sql.strip().rstrip(";").strip())
+    return "".join(
+        part if part.startswith("'") else re.sub(r"\s+", " ", part)
+        for part in parts
+    )
+
+
+def is_read_query(sql: str) -> bool:
+    return sql.lstrip().upper().startswith(_READ_PREFIXES)
+
+
+def referenced_tables(sql: str) -> Set[str]:
+    """SQL 引用的表名：按子句解析（含逗号连接），再并上关键字后的名字，
+    以便括号不配对等无法完整解析的 SQL 也能找到表；多出的名字只会多失效缓存"""
+    matched = {name.split(".")[-1].lower() for name in _TABLE_PATTERN.findall(sql)}
+    return table_names(sql) | matched
+
+
+@dataclass
+class DataVersion:
+    """数据版本快照：全库版本令牌 + 所涉及表的修改计数"""
+    token: Any
+    tables: Dict[str, int] = field(default_factory=dict)
+
+
+@dataclass
+class CachedResult:
+    """结果缓存命中；stale 为 True 表示返回的是过期结果，后台正在刷新"""
+    result: Any
+    stale: bool = False
+    age: float = 0.0
+
+
+@dataclass
+class _Entry:
+    payload: bytes
+    compressed: bool
+    size: int
+    version: DataVersion
+    created_at: float
+    hits: int = 0
+
+
+class DataVersionTracker:
+    """获取数据库当前的数据版本令牌
+
+    - SQLite 文件库：用一条独立连接读取 PRAGMA data_version，任何其他连接
+      提交写入后该值都会变化；连接失败时退回到数据库文件（含 WAL）的 mtime
+    - 其他数据库 / 内存库：没有全库令牌（返回 None），依靠表级修改计数和 TTL
+    """
+
+    def __init__(self, database: Any):
+        self._lock = Lock()
+        self._path: Optional[str] = None
+        self._conn: Optional[sqlite3.Connection] = None
+
+        engine = getattr(database, "_engine", None)
+        if engine is not None and engine.dialect.name == "sqlite":
+            path = engine.url.database
+            if path and path != ":memory:" and not path.startswith("file::memory:"):
+                self._path = path
+                try:
+                    self._conn = sqlite3.connect(
+                        f"file:{path}?mode=ro", uri=True, check_same_thread=False
+                    )
+                except sqlite3.Error as e:
+                    logger.warning(f"无法打开 data_version 连接，改用文件 mtime: {e}")
+
+    @property
+    def kind(self) -> str:
+        if self._conn is not None:
+            return "data_version"
+        if self._path is not None:
+            return "mtime"
+        return "none"
+
+    def token(self) -> Any:
+        if self._conn is not None:
+            try:
+                with self._lock:
+                    return ("data_version", self._conn.execute("PRAGMA data_version").fetchone()[0])
+            except sqlite3.Error as e:
+                logger.warning(f"读取 PRAGMA data_version 失败，改用文件 mtime: {e}")
+                self._conn = None
+        if self._path is not None:
+            stamps = []
+            for suffix in ("", "-wal"):
+                try:
+                    stat = os.stat(self._path + suffix)
+                    stamps.append((stat.st_mtime_ns, stat.st_size))
+                except OSError:
+                    stamps.append(None)
+            return ("mtime", tuple(stamps))
+        return None
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+class ResultCache:
+    """按 (归一化 SQL, 参数) 缓存查询结果，并随数据版本失效
+
+    - 失效：条目记录写入时的数据版本（全库令牌 + 所涉及表的修改计数），
+      版本变化或超过 ttl 秒即视为过期；本进程执行的写语句通过 record_write
+      递增对应表的计数（DDL 会使全部条目失效）
+    - 淘汰：超过 max_entries 条或 max_bytes 字节时按 LRU 淘汰
+    - 压缩：序列化后超过 compress_threshold 字节的结果用 zlib 压缩存储
+    - stale-while-revalidate：过期不超过 stale_while_revalidate 秒的条目
+      仍直接返回（标记 stale），同时在后台线程中用 loader 重新执行并回填
+    """
+
+    def __init__(
+        self,
+        database: Any,
+        max_entries: int = 500,
+        max_bytes: int = 64 * 1024 * 1024,
+        ttl: float = 600.0,
+        stale_while_revalidate: float = 0.0,
+        compress_threshold: int = 16 * 1024
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.stale_while_revalidate = stale_while_revalidate
+        self.compress_threshold = compress_threshold
+        self.tracker = DataVersionTracker(database)
+        self._lock = Lock()
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._table_versions: Dict[str, int] = {}
+        self._schema_version = 0
+        self._refreshing: Set[str] = set()
+        self._bytes = 0
+        self._stats = {
+            "lookups": 0,
+            "hits": 0,
+            "stale_hits": 0,
+            "stores": 0,
+            "invalidations": 0,
+            "evictions": 0,
+            "refreshes": 0,
+            "compressed": 0,
+        }
+
+    @staticmethod
+    def key(sql: str, parameters: Optional[Dict[str, Any]] = None) -> str:
+        params = json.dumps(parameters, sort_keys=True, default=str) if parameters else ""
+        return f"{normalize_sql(sql)}|{params}"
+
+    def snapshot(self, sql: str) -> DataVersion:
+        """在执行查询之前取版本快照，避免把新版本号记到旧数据上"""
+        token = self.tracker.token()
+        with self._lock:
+            tables = {
+                table: self._table_versions.get(table, 0)
+                for table in referenced_tables(sql)
+            }
+            tables["*"] = self._schema_version
+        return DataVersion(token=token, tables=tables)
+
+    def get(
+        self,
+        sql: str,
+        parameters: Optional[Dict[str, Any]] = None,
+        loader: Optional[Callable[[], Any]] = None
+    ) -> Optional[CachedResult]:
+        key = self.key(sql, parameters)
+        current = self.snapshot(sql)
+        now = time.time()
+
+        with self._lock:
+            self._stats["lookups"] += 1
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            age = now - entry.created_at
+            fresh = entry.version == current and (self.ttl <= 0 or age < self.ttl)
+            if not fresh:
+                stale_for = age - self.ttl if entry.version == current else 0.0
+                if (
+                    loader is None
+                    or self.stale_while_revalidate <= 0
+                    or stale_for >= self.stale_while_revalidate
+                ):
+                    self._drop(key)
+                    self._stats["invalidations"] += 1
+                    return None
+
+            self._entries.move_to_end(key)
+            entry.hits += 1
+            self._stats["hits"] += 1
+            if not fresh:
+                self._stats["stale_hits"] += 1
+            result = self._decode(entry)
+
+        if not fresh:
+            self._revalidate(key, sql, parameters, loader)
+        return CachedResult(result=result, stale=not fresh, age=age)
+
+    def put(
+        self,
+        sql: str,
+        result: Any,
+        parameters: Optional[Dict[str, Any]] = None,
+        version: Optional[DataVersion] = None
+    ):
+        key = self.key(sql, parameters)
+        version = version or self.snapshot(sql)
+        payload = pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+        compressed = len(payload) > self.compress_threshold
+        if compressed:
+            payload = zlib.compress(payload)
+        size = len(payload)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = _Entry(
+                payload=payload,
+                compressed=compressed,
+                size=size,
+                version=version,
+                created_at=time.time()
+            )
+            self._bytes += size
+            self._stats["stores"] += 1
+            if compressed:
+                self._stats["compressed"] += 1
+            while self._entries and (
+                len(self._entries) > self.max_entries or self._bytes > self.max_bytes
+            ):
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self._stats["evictions"] += 1
+
+    def record_write(self, sql: str):
+        """本进程执行了写语句：递增相关表的修改计数"""
+        with self._lock:
+            if sql.lstrip().upper().startswith(_DDL_PREFIXES):
+                self._schema_version += 1
+                return
+            for table in referenced_tables(sql):
+                self._table_versions[table] = self._table_versions.get(table, 0) + 1
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+            stats["bytes"] = self._bytes
+        stats["version_source"] = self.tracker.kind
+        stats["hit_rate"] = stats["hits"] / stats["lookups"] * 100 if stats["lookups"] else 0.0
+        return stats
+
+    def _revalidate(
+        self,
+        key: str,
+        sql: str,
+        parameters: Optional[Dict[str, Any]],
+        loader: Callable[[], Any]
+    ):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+            self._stats["refreshes"] += 1
+
+        def refresh():
+            try:
+                version = self.snapshot(sql)
+                self.put(sql, loader(), parameters, version)
+            except Exception as e:
+                logger.warning(f"结果缓存后台刷新失败: {e}")
+                with self._lock:
+                    self._drop(key)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        Thread(target=refresh, daemon=True).start()
+
+    def _drop(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+
+    @staticmethod
+    def _decode(entry: _Entry) -> Any:
+        payload = zlib.decompress(entry.payload) if entry.compressed else entry.payload
+        return pickle.loads(payload)
@@ -1,6 +1,8 @@
 from typing import Any, Dict, List, Union
 import json
 
+from .result_set import ResultSet
+
 
 class ResultHandler:
     def __init__(self):
@@ -22,6 +24,9 @@ class ResultHandler:
         return formatter(parsed)
 
     def _parse_result(self, result: Any) -> List[Dict]:
+        if isinstance(result, ResultSet):
+            return result.to_records()
+
         if isinstance(result, str):
             try:
                 return json.loads(result)
@@ -53,7 +58,7 @@ class ResultHandler:
         return "\n".join(lines)
 
     def _format_json(self, data: List[Dict]) -> str:
-        return json.dumps(data, ensure_ascii=False, indent=2)
+        return json.dumps(data, ensure_ascii=False, indent=2, default=str)
 
     def _format_text(self, data: List[Dict]) -> str:
         if not data:
@@ -0,0 +1,101 @@
+from dataclasses import dataclass, field
+from datetime import date, datetime, time as dt_time
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Tuple
+
+
+def _jsonable(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date, dt_time)):
+        return value.isoformat()
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return bytes(value).hex()
+    return value
+
+
+def jsonable_rows(rows: List[Tuple]) -> List[List[Any]]:
+    return [[_jsonable(v) for v in row] for row in rows]
+
+
+def _type_name(values: List[Any], type_code: Any) -> str:
+    for value in values:
+        if value is not None:
+            return type(value).__name__
+    return str(type_code) if type_code is not None else "null"
+
+
+def infer_types(cursor: Any, columns: List[str], rows: List[Tuple]) -> List[str]:
+    """按列取第一个非空值的 Python 类型；全为空时退回游标 description 的类型码"""
+    description = cursor.cursor.description if cursor.cursor is not None else None
+    type_codes = [d[1] for d in description] if description else [None] * len(columns)
+    return [
+        _type_name([row[i] for row in rows], type_codes[i])
+        for i in range(len(columns))
+    ]
+
+
+@dataclass
+class ResultSet:
+    """直接从游标得到的列式查询结果
+
+    columns/types 与每行元组一一对应；row_count 为返回的行数（写语句为
+    受影响行数）；truncated 为 True 表示超过 max_rows 的行已被丢弃。
+    """
+    columns: List[str] = field(default_factory=list)
+    types: List[str] = field(default_factory=list)
+    rows: List[Tuple] = field(default_factory=list)
+    row_count: Optional[int] = None
+    truncated: bool = False
+
+    def __post_init__(self):
+        if self.row_count is None:
+            self.row_count = len(self.rows)
+
+    @classmethod
+    def from_cursor(cls, cursor: Any, max_rows: Optional[int] = None) -> "ResultSet":
+        """由 SQLAlchemy CursorResult 构造；不返回行的语句记录受影响行数"""
+        if not cursor.returns_rows:
+            return cls(row_count=max(cursor.rowcount, 0))
+
+        columns = list(cursor.keys())
+        fetched = cursor.fetchmany(max_rows + 1) if max_rows else cursor.fetchall()
+        rows = [tuple(row) for row in fetched]
+        truncated = bool(max_rows) and len(rows) > max_rows
+        if truncated:
+            rows = rows[:max_rows]
+        return cls(
+            columns=columns,
+            types=infer_types(cursor, columns, rows),
+            rows=rows,
+            truncated=truncated
+        )
+
+    @property
+    def is_scalar(self) -> bool:
+        return len(self.columns) == 1 and len(self.rows) == 1
+
+    @property
+    def scalar(self) -> Any:
+        return self.rows[0][0] if self.rows and self.rows[0] else None
+
+    def to_records(self) -> List[Dict[str, Any]]:
+        return [dict(zip(self.columns, row)) for row in self.rows]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON 可序列化的列式表示，供 API 和流式事件使用"""
+        return {
+            "columns": self.columns,
+            "types": self.types,
+            "rows": jsonable_rows(self.rows),
+            "row_count": self.row_count,
+            "truncated": self.truncated,
+        }
+
+    def __str__(self) -> str:
+        return str(self.rows)
+
+
+def serialize_result(result: Any) -> Any:
+    """ResultSet 转为列式字典，其他结果原样返回"""
+    return result.to_dict() if isinstance(result, ResultSet) else result
@@ -0,0 +1,457 @@
+from dataclasses import dataclass, field
+from threading import Lock
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+import logging
+
+import sqlparse
+from sqlalchemy import inspect
+from sqlparse import tokens as T
+
+logger = logging.getLogger(__name__)
+
+# 进入 FROM 子句（后面的名字是表）的关键字；以 JOIN 结尾的关键字也算
+_TABLE_KEYWORDS = {"FROM", "INTO", "UPDATE", "TABLE"}
+# 离开 FROM 子句的关键字
+_EXPR_KEYWORDS = {
+    "WHERE", "ON", "GROUP BY", "ORDER BY", "HAVING", "SET", "LIMIT", "OFFSET",
+    "VALUES", "USING", "UNION", "UNION ALL", "INTERSECT", "EXCEPT", "RETURNING", "WINDOW",
+}
+# 不会被当作表名 / 列名的关键字
+_STRUCTURAL_KEYWORDS = _TABLE_KEYWORDS | _EXPR_KEYWORDS | {
+    "AS", "AND", "OR", "NOT", "IN", "IS", "NULL", "BY", "ASC", "DESC", "DISTINCT", "ALL", "ANY",
+    "CASE", "WHEN", "THEN", "ELSE", "END", "BETWEEN", "LIKE", "EXISTS",
+}
+# 各数据库的隐式列
+_IMPLICIT_COLUMNS = {"rowid", "oid", "_rowid_", "ctid", "rownum"}
+
+
+@dataclass
+class IdentifierFix:
+    """一次确定性的标识符更正"""
+    kind: str
+    original: str
+    replacement: str
+
+    def __str__(self) -> str:
+        return f"{self.kind} {self.original} -> {self.replacement}"
+
+
+@dataclass
+class SchemaCheckResult:
+    """本地校验结果：sql 为应用更正后的语句，errors 为无法确定性更正的错误"""
+    sql: str
+    fixes: List[IdentifierFix] = field(default_factory=list)
+    errors: List[str] = field(default_factory=list)
+
+    @property
+    def is_valid(self) -> bool:
+        return not self.errors
+
+
+@dataclass
+class _Reference:
+    token: Any
+    qualifier: Optional[Any] = None
+
+
+@dataclass
+class _Scan:
+    tables: List[Any] = field(default_factory=list)
+    aliases: Dict[str, Optional[str]] = field(default_factory=dict)
+    select_aliases: Set[str] = field(default_factory=set)
+    derived: Set[str] = field(default_factory=set)
+    qualified: List[_Reference] = field(default_factory=list)
+    columns: List[Any] = field(default_factory=list)
+    has_derived: bool = False
+
+
+def _keyword(token: Any) -> str:
+    """关键字的规范形式（GROUP  BY / ORDER\n BY 中的空白折叠为一个空格）"""
+    return " ".join(token.normalized.upper().split())
+
+
+def _unquote(value: str) -> Tuple[str, bool]:
+    if len(value) >= 2 and (value[0], value[-1]) in (('"', '"'), ("`", "`"), ("[", "]")):
+        return value[1:-1], True
+    return value, False
+
+
+def _requote(token: Any, name: str):
+    _, quoted = _unquote(token.value)
+    token.value = f"{token.value[0]}{name}{token.value[-1]}" if quoted else name
+
+
+def table_names(sql: str) -> Set[str]:
+    """SQL 引用的表名（小写、去掉引号和 schema 前缀），含逗号连接和子查询中的表"""
+    names = set()
+    for statement in sqlparse.parse(sql):
+        scan = SchemaChecker._scan(list(statement.flatten()), set())
+        names.update(_unquote(token.value)[0].lower() for token in scan.tables)
+        names -= scan.derived
+    return names
+
+
+def edit_distance(a: str, b: str) -> int:
+    """带相邻换位的编辑距离（OSA）"""
+    previous2: List[int] = []
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        previous2, previous = previous, current
+    return previous[len(b)]
+
+
+def _plural_forms(name: str) -> Set[str]:
+    forms = {name + "s", name + "es"}
+    if name.endswith("ies"):
+        forms.add(name[:-3] + "y")
+    if name.endswith("es"):
+        forms.add(name[:-2])
+    if name.endswith("s"):
+        forms.add(name[:-1])
+    if name.endswith("y"):
+        forms.add(name[:-1] + "ies")
+    return forms
+
+
+class SchemaChecker:
+    """执行前基于 schema 目录的本地 SQL 校验
+
+    用 sqlparse 切分标识符，按 FROM / JOIN 解析表和别名，再把限定列（u.name）
+    和非限定列与内存中的表 / 列目录比对。与目录只差大小写、单复数或少量编辑距离、
+    且候选唯一的标识符直接更正；无法确定的才作为错误交给 LLM 修复。
+
+    含子查询派生表或 CTE 的语句无法得知派生列，对非限定列不做判断。
+    """
+
+    def __init__(
+        self,
+        database: Any = None,
+        catalog: Optional[Dict[str, Iterable[str]]] = None,
+        max_distance: int = 2
+    ):
+        """
+        初始化校验器
+
+        Args:
+            database: SQLDatabase 实例，首次校验时读取表 / 列目录
+            catalog: 直接指定的目录 {表名: [列名]}，优先于 database
+            max_distance: 自动更正允许的最大编辑距离
+        """
+        self.database = database
+        self.max_distance = max_distance
+        self._lock = Lock()
+        self._catalog: Optional[Dict[str, Dict[str, str]]] = None
+        if catalog is not None:
+            self._catalog = self._index(catalog)
+        self._stats = {"checks": 0, "fixed": 0, "rejected": 0}
+
+    @property
+    def catalog(self) -> Dict[str, Dict[str, str]]:
+        """{小写表名: {小写列名: 列名}}，表的原始名称存放在键 "" 下"""
+        with self._lock:
+            if self._catalog is None:
+                self._catalog = self._index(self._load_catalog())
+            return self._catalog
+
+    def refresh(self):
+        """schema 变化后重新读取目录"""
+        with self._lock:
+            if self.database is not None:
+                self._catalog = None
+
+    def check(self, sql: str) -> SchemaCheckResult:
+        """
+        校验 SQL 中的表名和列名
+
+        Args:
+            sql: 待执行的 SQL
+
+        Returns:
+            SchemaCheckResult: 更正后的 SQL、更正列表和剩余错误
+        """
+        result = SchemaCheckResult(sql=sql)
+        try:
+            statements = sqlparse.parse(sql)
+            catalog = self.catalog
+        except Exception as e:
+            logger.debug(f"本地 schema 校验跳过: {e}")
+            return result
+
+        for statement in statements:
+            tokens = [t for t in statement.flatten()]
+            self._check_statement(tokens, catalog, result)
+        if result.fixes:
+            result.sql = "".join(str(t) for statement in statements for t in statement.flatten())
+
+        with self._lock:
+            self._stats["checks"] += 1
+            if result.fixes:
+                self._stats["fixed"] += 1
+            if result.errors:
+                self._stats["rejected"] += 1
+        if result.fixes:
+            logger.info(f"本地更正标识符: {', '.join(str(f) for f in result.fixes)}")
+        return result
+
+    def suggest_table(self, name: str) -> Optional[str]:
+        """与 name 唯一近似的表名"""
+        return self._closest(name, [entry[""] for entry in self.catalog.values()])
+
+    def suggest_column(self, name: str, tables: Iterable[str]) -> Optional[str]:
+        """tables 的列中与 name 唯一近似的列名"""
+        catalog = self.catalog
+        columns = {
+            key: column
+            for table in tables if table.lower() in catalog
+            for key, column in catalog[table.lower()].items() if key
+        }
+        return self._closest(name, list(columns.values()))
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._stats)
+
+    def _load_catalog(self) -> Dict[str, List[str]]:
+        engine = self.database._engine
+        inspector = inspect(engine)
+        catalog = {}
+        for table in self.database.get_usable_table_names():
+            try:
+                catalog[table] = [column["name"] for column in inspector.get_columns(table)]
+            except Exception as e:
+                logger.debug(f"读取表 {table} 的列失败: {e}")
+        return catalog
+
+    @staticmethod
+    def _index(catalog: Dict[str, Iterable[str]]) -> Dict[str, Dict[str, str]]:
+        index = {}
+        for table, columns in catalog.items():
+            entry = {column.lower(): column for column in columns}
+            entry[""] = table
+            index[table.lower()] = entry
+        return index
+
+    @staticmethod
+    def _scan(tokens: List[Any], identifiers: Set[str]) -> _Scan:
+        """按子句状态把名字归类为表、别名、限定列和非限定列"""
+        scan = _Scan()
+        significant = [t for t in tokens if not t.is_whitespace and t.ttype not in T.Comment]
+        state = "select"
+        stack: List[str] = []
+        # 各层 SELECT / UPDATE 等语句所在的括号深度；只有与最内层语句同深度的
+        # FROM 才开始表子句，EXTRACT(YEAR FROM x)、SUBSTRING(x FROM 2) 中的不算
+        statement_depths: List[int] = [0]
+        last_table: Optional[str] = None
+        names: Set[int] = set()
+
+        def is_name(index: int) -> bool:
+            token = significant[index]
+            if token.ttype is T.Name or token.ttype is T.Literal.String.Symbol:
+                return True
+            # user / order / type 这类被 sqlparse 当作关键字的表名、列名
+            if token.ttype is not T.Keyword or _keyword(token) in _STRUCTURAL_KEYWORDS:
+                return False
+            if token.value.lower() in identifiers:
+                return True
+            prev = significant[index - 1] if index > 0 else None
+            if prev is None:
+                return False
+            if prev.match(T.Punctuation, "."):
+                return True
+            # FROM / JOIN 之后应当是表名
+            return state == "from" and (
+                prev.match(T.Punctuation, ",")
+                or (prev.ttype is T.Keyword and (
+                    _keyword(prev) in _TABLE_KEYWORDS or _keyword(prev).endswith("JOIN")
+                ))
+            )
+
+        for i, token in enumerate(significant):
+            prev = significant[i - 1] if i > 0 else None
+            nxt = significant[i + 1] if i + 1 < len(significant) else None
+
+            if token.ttype in T.Keyword and not is_name(i):
+                keyword = _keyword(token)
+                if token.ttype is T.Keyword.CTE:
+                    state = "cte"
+                elif token.ttype is T.Keyword.DML:
+                    state = "from" if keyword == "UPDATE" else "select"
+                    if statement_depths[-1] != len(stack):
+                        statement_depths.append(len(stack))
+                elif keyword in _TABLE_KEYWORDS or keyword.endswith("JOIN"):
+                    if statement_depths[-1] == len(stack):
+                        state = "from"
+                elif keyword in _EXPR_KEYWORDS:
+                    state = "expr"
+                continue
+
+            if token.match(T.Punctuation, "("):
+                if state == "from" and nxt is not None and nxt.ttype is T.Keyword.DML:
+                    scan.has_derived = True
+                    last_table = None
+                stack.append(state)
+                state = "expr"
+                continue
+            if token.match(T.Punctuation, ")"):
+                state = stack.pop() if stack else state
+                if len(statement_depths) > 1 and statement_depths[-1] > len(stack):
+                    statement_depths.pop()
+                continue
+
+            if not is_name(i):
+                continue
+            names.add(i)
+            into = prev is not None and prev.match(T.Keyword, "INTO")
+            if nxt is not None and nxt.match(T.Punctuation, "(") and not into:
+                continue  # 函数名（INSERT INTO t (...) 中的是表名）
+            if prev is not None and prev.match(T.Punctuation, "::"):
+                continue  # 类型转换
+
+            name, _ = _unquote(token.value)
+            # 紧跟在操作数（名字、字面量、右括号）之后的名字是省略 AS 的别名
+            after_operand = prev is not None and (
+                i - 1 in names or prev.ttype in T.Literal or prev.match(T.Punctuation, ")")
+            )
+            is_alias = (prev is not None and prev.match(T.Keyword, "AS")) or after_operand
+
+            if state == "cte":
+                scan.derived.add(name.lower())
+                scan.has_derived = True
+            elif state == "from":
+                if nxt is not None and nxt.match(T.Punctuation, "."):
+                    continue  # schema 限定
+                if is_alias:
+                    scan.aliases[name.lower()] = last_table
+                else:
+                    scan.tables.append(token)
+                    last_table = name.lower()
+            elif is_alias:
+                scan.select_aliases.add(name.lower())
+            elif nxt is not None and nxt.match(T.Punctuation, "."):
+                column = i + 2 if i + 2 < len(significant) and is_name(i + 2) else None
+                scan.qualified.append(_Reference(
+                    token=significant[column] if column is not None else None,
+                    qualifier=token
+                ))
+            elif prev is not None and prev.match(T.Punctuation, "."):
+                continue  # 已作为限定列记录
+            else:
+                scan.columns.append(token)
+
+        # 以 "表名" 作为别名引用的表（没有起别名时）
+        for token in scan.tables:
+            name = _unquote(token.value)[0].lower()
+            scan.aliases.setdefault(name, name)
+        for name in scan.derived:
+            scan.aliases[name] = None
+        return scan
+
+    def _check_statement(self, tokens: List[Any], catalog: Dict[str, Dict[str, str]], result: SchemaCheckResult):
+        identifiers = set(catalog)
+        for columns in catalog.values():
+            identifiers.update(k for k in columns if k)
+        scan = self._scan(tokens, identifiers)
+        if not scan.tables and not scan.qualified:
+            return
+
+        # 1. 表名
+        renamed: Dict[str, str] = {}
+        for token in scan.tables:
+            name, quoted = _unquote(token.value)
+            key = name.lower()
+            if key in scan.derived:
+                continue
+            if key in catalog:
+                canonical = catalog[key][""]
+                if quoted and canonical != name:
+                    self._apply(result, token, "table", name, canonical)
+                continue
+            match = self._closest(name, [entry[""] for entry in catalog.values()])
+            if match is None:
+                result.errors.append(f"未知表: {name}")
+                continue
+            self._apply(result, token, "table", name, match)
+            renamed[key] = match.lower()
+        for alias, table in list(scan.aliases.items()):
+            if table in renamed:
+                scan.aliases[alias] = renamed[table]
+        for table in renamed.values():
+            scan.aliases.setdefault(table, table)
+
+        # 2. 限定列
+        for ref in scan.qualified:
+            qualifier, _ = _unquote(ref.qualifier.value)
+            key = qualifier.lower()
+            if key in renamed:
+                self._apply(result, ref.qualifier, "table", qualifier, catalog[renamed[key]][""])
+                key = renamed[key]
+            elif key not in scan.aliases:
+                match = self._closest(qualifier, list(scan.aliases))
+                if match is None:
+                    if key not in catalog:
+                        result.errors.append(f"未知表或别名: {qualifier}")
+                    continue
+                self._apply(result, ref.qualifier, "alias", qualifier, match)
+                key = match.lower()
+            table = scan.aliases.get(key, key)
+            if table is None or table not in catalog or ref.token is None:
+                continue
+            self._check_column(ref.token, catalog[table], result, f"表 {catalog[table]['']} 没有列")
+
+        # 3. 非限定列：在语句涉及的所有表中查找
+        if scan.has_derived:
+            return
+        columns: Dict[str, str] = {}
+        for table in set(scan.aliases.values()):
+            if table in catalog:
+                columns.update({k: v for k, v in catalog[table].items() if k})
+        if not columns:
+            return
+        for alias in scan.select_aliases | _IMPLICIT_COLUMNS:
+            columns.setdefault(alias, alias)
+        for token in scan.columns:
+            self._check_column(token, columns, result, "未知列")
+
+    def _check_column(self, token: Any, columns: Dict[str, str], result: SchemaCheckResult, message: str):
+        name, quoted = _unquote(token.value)
+        key = name.lower()
+        if key in columns:
+            if quoted and columns[key] != name:
+                self._apply(result, token, "column", name, columns[key])
+            return
+        match = self._closest(name, [v for k, v in columns.items() if k])
+        if match is None:
+            # SQLite 把无法解析的双引号标识符当作字符串，交给数据库判断
+            if not quoted:
+                result.errors.append(f"{message}: {name}")
+        else:
+            self._apply(result, token, "column", name, match)
+
+    def _closest(self, name: str, candidates: List[str]) -> Optional[str]:
+        """唯一的近似候选：先比较单复数变体，再比较编辑距离"""
+        key = name.lower()
+        lowered = {candidate.lower(): candidate for candidate in candidates}
+
+        forms = [lowered[form] for form in _plural_forms(key) if form in lowered]
+        if len(forms) == 1:
+            return forms[0]
+
+        limit = min(self.max_distance, max(1, len(key) // 4))
+        scored = sorted(
+            (edit_distance(key, lower), candidate) for lower, candidate in lowered.items()
+        )
+        scored = [(distance, candidate) for distance, candidate in scored if distance <= limit]
+        if not scored or (len(scored) > 1 and scored[0][0] == scored[1][0]):
+            return None
+        return scored[0][1]
+
+    @staticmethod
+    def _apply(result: SchemaCheckResult, token: Any, kind: str, original: str, replacement: str):
+        _requote(token, replacement)
+        result.fixes.append(IdentifierFix(kind=kind, original=original, replacement=replacement))
@@ -1,6 +1,11 @@
+import asyncio
 import json
 import logging
-from typing import Any, Dict, List, Optional, Union, Generator
+from typing import Any, AsyncGenerator, Dict, List, Optional, Union, Generator
+
+from langchain_core.runnables import Runnable
+
+from ..execution.result_set import ResultSet
 
 logger = logging.getLogger(__name__)
 
@@ -52,7 +57,67 @@ class ResultExplainer:
             logger.error(f"结果解释流式生成失败: {e}")
             yield self._fallback_explain(parsed_result)
 
+    async def aexplain(
+        self,
+        question: str,
+        result: Any,
+        format: str = "text"
+    ) -> str:
+        """explain 的异步版本；非 LangChain 模型的调用放到线程中执行"""
+        parsed_result = self._parse_result(result)
+
+        if self._is_simple_result(parsed_result):
+            return self._explain_simple(question, parsed_result)
+
+        if self.llm is None:
+            return self._fallback_explain(parsed_result)
+
+        prompt = self._build_explain_prompt(question, parsed_result, format)
+        try:
+            if isinstance(self.llm, Runnable):
+                response = await self.llm.ainvoke(prompt)
+            else:
+                response = await asyncio.to_thread(self.llm.invoke, prompt)
+            return response.content if hasattr(response, 'content') else str(response)
+        except Exception as e:
+            return self._fallback_explain(parsed_result)
+
+    async def aexplain_stream(
+        self,
+        question: str,
+        result: Any,
+        format: str = "text"
+    ) -> AsyncGenerator[str, None]:
+        """explain_stream 的异步版本，通过 astream 逐段返回解释"""
+        parsed_result = self._parse_result(result)
+
+        if self._is_simple_result(parsed_result):
+            yield self._explain_simple(question, parsed_result)
+            return
+
+        if self.llm is None:
+            yield self._fallback_explain(parsed_result)
+            return
+
+        try:
+            prompt = self._build_explain_prompt(question, parsed_result, format)
+
+            if isinstance(self.llm, Runnable):
+                async for chunk in self.llm.astream(prompt):
+                    yield chunk.content if hasattr(chunk, 'content') else str(chunk)
+            else:
+                chunks = await asyncio.to_thread(lambda: list(self.llm.stream(prompt)))
+                for chunk in chunks:
+                    yield chunk.content if hasattr(chunk, 'content') else str(chunk)
+
+        except Exception as e:
+            logger.error(f"结果解释流式生成失败: {e}")
+            yield self._fallback_explain(parsed_result)
+
     def _parse_result(self, result: Any) -> Union[List[Dict], Dict, str]:
+        if isinstance(result, ResultSet):
+            return result.to_records()
+
         if isinstance(result, str):
             try:
                 return json.loads(result)
@@ -134,7 +199,7 @@ class ResultExplainer:
         result: List[Dict],
         format: str
     ) -> str:
-        result_str = json.dumps(result, ensure_ascii=False, indent=2)
+        result_str = json.dumps(result, ensure_ascii=False, indent=2, default=str)
 
         templates = {
             "text": f"""基于以下查询结果，用简洁的自然语言回答用户问题。
@@ -1,7 +1,56 @@
-from src.generation.llm_factory import LLMFactory
-from src.generation.sql_generator import SQLGenerator
-from src.generation.few_shot_manager import FewShotManager
-from src.generation.sql_validator import SQLValidator
-from src.generation import prompts
+"""SQL 生成模块
 
-__all__ = ["LLMFactory", "SQLGenerator", "FewShotManager", "SQLValidator", "prompts"]
+导出的类在首次访问时才导入所在模块，避免只用到其中一部分（或只需要数据库连接）
+时加载模型供应商 SDK。
+"""
+import importlib
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from src.generation.llm_factory import LLMFactory
+    from src.generation.sql_generator import SQLGenerator
+    from src.generation.few_shot_manager import FewShotManager
+    from src.generation.sql_validator import SQLValidator
+    from src.generation.stream_parser import ThinkingStreamParser, NativeThinkingStreamParser
+    from src.generation.candidate_voter import CandidateVoter
+    from src.generation.llm_gateway import ProviderGateway, GatewayChatModel
+    from src.generation.llm_hedging import HedgedChatModel, CircuitBreaker
+    from src.generation.llm_replay import Cassette, ReplayChatModel, RecordingChatModel
+    from src.generation.template_cache import TemplateCache
+    from src.generation import prompts
+
+_EXPORTS = {
+    "LLMFactory": "src.generation.llm_factory",
+    "SQLGenerator": "src.generation.sql_generator",
+    "FewShotManager": "src.generation.few_shot_manager",
+    "SQLValidator": "src.generation.sql_validator",
+    "ThinkingStreamParser": "src.generation.stream_parser",
+    "NativeThinkingStreamParser": "src.generation.stream_parser",
+    "CandidateVoter": "src.generation.candidate_voter",
+    "ProviderGateway": "src.generation.llm_gateway",
+    "GatewayChatModel": "src.generation.llm_gateway",
+    "HedgedChatModel": "src.generation.llm_hedging",
+    "CircuitBreaker": "src.generation.llm_hedging",
+    "Cassette": "src.generation.llm_replay",
+    "ReplayChatModel": "src.generation.llm_replay",
+    "RecordingChatModel": "src.generation.llm_replay",
+    "TemplateCache": "src.generation.template_cache",
+}
+
+__all__ = ["LLMFactory", "SQLGenerator", "FewShotManager", "SQLValidator",
+           "ThinkingStreamParser", "NativeThinkingStreamParser", "CandidateVoter",
+           "ProviderGateway", "GatewayChatModel",
+           "HedgedChatModel", "CircuitBreaker",
+           "Cassette", "ReplayChatModel", "RecordingChatModel",
+           "TemplateCache", "prompts"]
+
+
+def __getattr__(name: str) -> Any:
+    if name == "prompts":
+        value = importlib.import_module("src.generation.prompts")
+    elif name in _EXPORTS:
+        value = getattr(importlib.import_module(_EXPORTS[name]), name)
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    globals()[name] = value
+    return value
@@ -0,0 +1,272 @@
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import asyncio
+import logging
+import re
+import time
+
+from ..execution.query_timeout import CancelToken
+from ..execution.result_set import ResultSet
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SQLCandidate:
+    """单个候选 SQL 及其校验、执行情况"""
+    index: int
+    sql: str = ""
+    is_valid: bool = False
+    message: str = ""
+    executed: bool = False
+    rows: Optional[List[Tuple]] = None
+    result_set: Optional[ResultSet] = None
+    execution: Any = None
+    error: str = ""
+    cluster: Optional[int] = None
+
+
+@dataclass
+class VoteResult:
+    """多候选投票结果"""
+    sql: str = ""
+    rows: Optional[List[Tuple]] = None
+    result_set: Optional[ResultSet] = None
+    execution: Any = None
+    votes: int = 0
+    candidates: List[SQLCandidate] = field(default_factory=list)
+    timings: Dict[str, float] = field(default_factory=dict)
+
+    @property
+    def has_winner(self) -> bool:
+        return self.rows is not None
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "candidate_count": len(self.candidates),
+            "valid_count": sum(1 for c in self.candidates if c.is_valid),
+            "executed_count": sum(1 for c in self.candidates if c.executed),
+            "votes": self.votes,
+            "timings": self.timings,
+        }
+
+
+class CandidateVoter:
+    """并行生成多个候选 SQL，执行后按结果聚类，返回多数派答案
+
+    每次投票使用自己的线程池（candidate_count 个线程），并发请求之间互不排队。
+    候选通过 execute 执行（编排器传入，走代价守卫、schema 校验、结果缓存、监控
+    和 query_deadline），每条语句各带一个 CancelToken：超过 execution_timeout
+    或多数派已确定时，其余仍在执行的候选被取消，数据库随即中止语句。
+    结果按行集合（忽略顺序与列别名）聚类，票数相同时取序号最小的候选。
+    """
+
+    def __init__(
+        self,
+        sql_generator: Any,
+        security_validator: Any,
+        execute: Callable[..., Any],
+        candidate_count: int = 3,
+        execution_timeout: float = 10.0
+    ):
+        self.sql_generator = sql_generator
+        self.security_validator = security_validator
+        # execute(sql, cancel=..., question=...) -> ExecutionResult
+        self.execute = execute
+        self.candidate_count = candidate_count
+        self.execution_timeout = execution_timeout
+
+    def generate_and_vote(self, schema: str, question: str) -> VoteResult:
+        return self.execute_and_vote(self.generate_candidates(schema, question), question)
+
+    def generate_candidates(self, schema: str, question: str) -> VoteResult:
+        """在线程池中并发生成候选，之后调用 execute_and_vote"""
+        start_time = time.time()
+        result = VoteResult()
+        pool = self._new_pool()
+        try:
+            result.candidates = self._generate(pool, schema, question)
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+        result.timings["generation"] = time.time() - start_time
+        return result
+
+    async def agenerate_candidates(self, schema: str, question: str) -> VoteResult:
+        """generate_candidates 的异步版本：并发 agenerate，不占用线程"""
+        start_time = time.time()
+        result = VoteResult()
+        outcomes = await asyncio.gather(
+            *(self.sql_generator.agenerate(schema, question) for _ in range(self.candidate_count)),
+            return_exceptions=True
+        )
+        for index, outcome in enumerate(outcomes):
+            candidate = SQLCandidate(index=index)
+            if isinstance(outcome, BaseException):
+                if not isinstance(outcome, Exception):
+                    raise outcome
+                candidate.error = str(outcome)
+            else:
+                candidate.sql = outcome
+            result.candidates.append(candidate)
+        result.timings["generation"] = time.time() - start_time
+        return result
+
+    def execute_and_vote(self, result: VoteResult, question: str) -> VoteResult:
+        """校验、执行已生成的候选并投票（阻塞直到投票结束）"""
+        start_time = time.time() - result.timings.get("generation", 0.0)
+
+        self._validate(result.candidates)
+        result.timings["validation"] = time.time() - start_time
+
+        pool = self._new_pool()
+        try:
+            self._execute(pool, result.candidates, question)
+        finally:
+            # 被取消的语句由数据库中止后自行退出，不在这里等待
+            pool.shutdown(wait=False, cancel_futures=True)
+        result.timings["execution"] = time.time() - start_time
+
+        self._vote(result)
+        result.timings["total"] = time.time() - start_time
+
+        logger.info(
+            f"多候选生成: {len(result.candidates)} 个候选, "
+            f"{result.summary()['executed_count']} 个执行成功, 胜出票数 {result.votes}"
+        )
+        return result
+
+    def _new_pool(self) -> ThreadPoolExecutor:
+        return ThreadPoolExecutor(
+            max_workers=max(self.candidate_count, 1),
+            thread_name_prefix="sql-candidate"
+        )
+
+    def _generate(self, pool: ThreadPoolExecutor, schema: str, question: str) -> List[SQLCandidate]:
+        futures = [
+            pool.submit(self.sql_generator.generate, schema, question)
+            for _ in range(self.candidate_count)
+        ]
+        candidates = []
+        for index, future in enumerate(futures):
+            candidate = SQLCandidate(index=index)
+            try:
+                candidate.sql = future.result()
+            except Exception as e:
+                candidate.error = str(e)
+            candidates.append(candidate)
+        return candidates
+
+    def _validate(self, candidates: List[SQLCandidate]):
+        # 安全校验是本地正则匹配，不值得占用线程
+        for candidate in candidates:
+            if candidate.sql:
+                validation = self.security_validator.validate(candidate.sql)
+                candidate.is_valid = validation.is_valid
+                candidate.message = validation.message
+
+    def _execute(self, pool: ThreadPoolExecutor, candidates: List[SQLCandidate], question: str):
+        # 相同的 SQL 只执行一次，票数仍按候选个数计算
+        unique: Dict[str, List[SQLCandidate]] = {}
+        for candidate in candidates:
+            if candidate.is_valid:
+                unique.setdefault(self._normalize_sql(candidate.sql), []).append(candidate)
+
+        running: Dict[Future, Tuple[List[SQLCandidate], CancelToken]] = {}
+        for group in unique.values():
+            token = CancelToken()
+            future = pool.submit(self.execute, group[0].sql, cancel=token, question=question)
+            running[future] = (group, token)
+
+        deadline = time.monotonic() + self.execution_timeout
+        tallies: Dict[Tuple, int] = {}
+        pending = set(running)
+        reason = f"执行超时 ({self.execution_timeout}s)"
+        while pending:
+            done, pending = wait(
+                pending,
+                timeout=max(deadline - time.monotonic(), 0),
+                return_when=FIRST_COMPLETED
+            )
+            if not done:
+                break
+            for future in done:
+                group, _ = running[future]
+                key = self._collect(future, group)
+                if key is not None:
+                    tallies[key] = tallies.get(key, 0) + len(group)
+            if self._decided(tallies, sum(len(running[f][0]) for f in pending)):
+                reason = "多数结果已确定，取消执行"
+                break
+
+        for future in pending:
+            group, token = running[future]
+            token.cancel()
+            for candidate in group:
+                candidate.error = reason
+
+    def _collect(self, future: Future, group: List[SQLCandidate]) -> Optional[Tuple]:
+        """记录执行结果，成功时返回用于聚类的结果键"""
+        try:
+            execution = future.result()
+        except Exception as e:
+            execution = None
+            error = str(e)
+        else:
+            error = execution.error
+        if execution is None or not execution.success:
+            for candidate in group:
+                candidate.error = error
+            return None
+        for candidate in group:
+            candidate.execution = execution
+            candidate.result_set = execution.result
+            candidate.rows = execution.result.rows
+            candidate.executed = True
+        return self._result_key(execution.result.rows)
+
+    @staticmethod
+    def _decided(tallies: Dict[Tuple, int], remaining: int) -> bool:
+        """剩余候选全部投给第二名也追不上第一名时，多数派已确定"""
+        if not tallies or remaining == 0:
+            return False
+        counts = sorted(tallies.values(), reverse=True) + [0]
+        return counts[0] > counts[1] + remaining
+
+    def _vote(self, result: VoteResult):
+        clusters: Dict[Tuple, List[SQLCandidate]] = {}
+        for candidate in result.candidates:
+            if candidate.executed:
+                clusters.setdefault(self._result_key(candidate.rows), []).append(candidate)
+
+        if not clusters:
+            valid = [c for c in result.candidates if c.is_valid]
+            fallback = valid[0] if valid else (result.candidates[0] if result.candidates else None)
+            result.sql = fallback.sql if fallback else ""
+            return
+
+        ranked = sorted(clusters.values(), key=lambda group: (-len(group), group[0].index))
+        for cluster_id, group in enumerate(ranked):
+            for candidate in group:
+                candidate.cluster = cluster_id
+
+        winner = ranked[0][0]
+        result.sql = winner.sql
+        result.rows = winner.rows
+        result.result_set = winner.result_set
+        result.execution = winner.execution
+        result.votes = len(ranked[0])
+
+    @staticmethod
+    def _normalize_sql(sql: str) -> str:
+        return re.sub(r"\s+", " ", sql.strip().rstrip(";")).lower()
+
+    @staticmethod
+    def _result_key(rows: List[Tuple]) -> Tuple:
+        def normalize(value: Any) -> Any:
+            if isinstance(value, (int, float, Decimal)) and not isinstance(value, bool):
+                return round(float(value), 6)
+            return value
+
+        return tuple(sorted(repr(tuple(normalize(v) for v in row)) for row in rows))
@@ -1,5 +1,67 @@
-from typing import Any, Literal
-from langchain_openai import ChatOpenAI
+from functools import lru_cache
+from threading import Lock
+from typing import Any, Literal, Optional, Tuple
+import asyncio
+import weakref
+
+import httpx
+
+
+class _LoopLocalAsyncClient(httpx.AsyncClient):
+    """按事件循环各持有一个连接池的 httpx.AsyncClient
+
+    httpx 的异步连接池绑定在首次使用它的事件循环上，不能跨循环共享；
+    请求转发给当前运行循环的客户端，循环结束后其客户端随之释放。
+    """
+
+    def __init__(self, limits: httpx.Limits):
+        super().__init__(limits=limits)
+        self._limits = limits
+        self._loop_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self._loop_lock = Lock()
+
+    def _loop_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        with self._loop_lock:
+            client = self._loop_clients.get(loop)
+            if client is None:
+                client = httpx.AsyncClient(limits=self._limits)
+                self._loop_clients[loop] = client
+        return client
+
+    async def send(self, request: httpx.Request, **kwargs: Any) -> httpx.Response:
+        return await self._loop_client().send(request, **kwargs)
+
+    async def aclose(self):
+        loop = asyncio.get_running_loop()
+        with self._loop_lock:
+            client = self._loop_clients.pop(loop, None)
+        if client is not None:
+            await client.aclose()
+        await super().aclose()
+
+
+@lru_cache(maxsize=None)
+def _shared_http_clients(base_url: Optional[str], max_connections: int) -> Tuple[Any, Any]:
+    """同一 base_url 的 OpenAI 兼容模型共用带连接上限的 httpx 客户端
+
+    连接在请求之间保持复用，避免每次调用重新握手 TLS；异步客户端按事件循环
+    各建一个连接池。
+    """
+    limits = httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_connections
+    )
+    return httpx.Client(limits=limits), _LoopLocalAsyncClient(limits)
+
+
+def _with_http_pool(kwargs: dict, base_url: Optional[str], max_connections: Optional[int]) -> dict:
+    if max_connections and "http_client" not in kwargs and "http_async_client" not in kwargs:
+        http_client, http_async_client = _shared_http_clients(base_url, max_connections)
+        kwargs = {**kwargs, "http_client": http_client, "http_async_client": http_async_client}
+    return kwargs
 
 
 def create_llm(
@@ -11,8 +73,12 @@ def create_llm(
     stream: bool = False,
     thinking: bool = False,
     thinking_budget: int = 4096,
+    max_connections: Optional[int] = None,
     **kwargs: Any
 ) -> Any:
+    # Anthropic 兼容的提供商（minimax / anthropic）由 langchain_anthropic 按
+    # base_url 缓存 httpx 客户端，已天然共享连接池；max_connections 只作用于
+    # OpenAI 兼容的提供商
     if provider == "minimax":
         from langchain_anthropic import ChatAnthropic
         
@@ -40,12 +106,13 @@ def create_llm(
         return ChatAnthropic(**llm_kwargs)
 
     elif provider == "openai":
+        from langchain_openai import ChatOpenAI
         return ChatOpenAI(
             model=model or "gpt-4",
             api_key=api_key,
             temperature=temperature,
             streaming=stream,
-            **kwargs
+            **_with_http_pool(kwargs, None, max_connections)
         )
 
     elif provider == "anthropic":
@@ -81,19 +148,47 @@ def create_llm(
         )
 
     elif provider == "custom":
+        from langchain_openai import ChatOpenAI
         return ChatOpenAI(
             model=model,
             api_key=api_key,
             base_url=base_url,
             temperature=temperature,
             streaming=stream,
-            **kwargs
+            **_with_http_pool(kwargs, base_url, max_connections)
         )
 
     else:
         raise ValueError(f"不支持的 LLM 提供商: {provider}")
 
 
+def create_embeddings(
+    provider: Literal["openai", "sentence-transformers"],
+    model: str = None,
+    api_key: str = None,
+    base_url: str = None,
+    **kwargs: Any
+) -> Any:
+    if provider == "openai":
+        from langchain_openai import OpenAIEmbeddings
+        return OpenAIEmbeddings(
+            model=model or "text-embedding-3-small",
+            api_key=api_key,
+            base_url=base_url,
+            **kwargs
+        )
+
+    elif provider == "sentence-transformers":
+        from langchain_community.embeddings import HuggingFaceEmbeddings
+        return HuggingFaceEmbeddings(
+            model_name=model or "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2",
+            **kwargs
+        )
+
+    else:
+        raise ValueError(f"不支持的向量模型提供商: {provider}")
+
+
 class LLMFactory:
     PROVIDERS = Literal["minimax", "openai", "anthropic", "ollama", "custom"]
 
@@ -107,6 +202,7 @@ class LLMFactory:
         stream: bool = False,
         thinking: bool = False,
         thinking_budget: int = 4096,
+        max_connections: Optional[int] = None,
         **kwargs: Any
     ) -> Any:
         return create_llm(
@@ -118,5 +214,6 @@ class LLMFactory:
             stream=stream,
             thinking=thinking,
             thinking_budget=thinking_budget,
+            max_connections=max_connections,
             **kwargs
         )
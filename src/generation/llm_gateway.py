@@ -0,0 +1,419 @@
+from threading import Condition, Lock
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+import asyncio
+import logging
+import time
+
+from langchain_core.callbacks import CallbackManager
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableConfig
+from pydantic import ConfigDict
+
+logger = logging.getLogger(__name__)
+
+
+class GatewayTimeoutError(TimeoutError):
+    """请求在排队截止时间之前没有拿到发送配额"""
+
+
+class TokenBucket:
+    """按分钟速率补充的令牌桶，per_minute <= 0 表示不限速
+
+    允许余额为负：实际用量超过预估时补扣，后续请求会相应多等。
+    非线程安全，由 ProviderGateway 在锁内调用。
+    """
+
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        self.per_minute = per_minute
+        self.capacity = capacity if capacity is not None else per_minute
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+
+    @property
+    def unlimited(self) -> bool:
+        return self.per_minute <= 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.per_minute / 60.0)
+        self._updated = now
+
+    def time_until(self, amount: float) -> float:
+        """距离可以取出 amount 个令牌还需等待的秒数"""
+        if self.unlimited:
+            return 0.0
+        self._refill()
+        # 单次请求超过桶容量时，按桶满处理，避免永远等不到
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) * 60.0 / self.per_minute
+
+    def consume(self, amount: float):
+        if self.unlimited:
+            return
+        self._refill()
+        self.tokens -= amount
+
+
+class ProviderGateway:
+    """单个 LLM 提供商的发送闸门
+
+    - 最大并发请求数（in-flight）
+    - 每分钟请求数、每分钟 token 数两个令牌桶
+    - 排队请求带截止时间，超时抛出 GatewayTimeoutError
+    - 记录排队深度、等待时间等指标
+    """
+
+    def __init__(
+        self,
+        provider: str,
+        max_in_flight: int = 8,
+        requests_per_minute: float = 0,
+        tokens_per_minute: float = 0,
+        queue_timeout: float = 30.0
+    ):
+        self.provider = provider
+        self.max_in_flight = max_in_flight
+        self.queue_timeout = queue_timeout
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self._cond = Condition()
+        self._in_flight = 0
+        self._waiting = 0
+        self._metrics = {
+            "requests": 0,
+            "timeouts": 0,
+            "rate_limited": 0,
+            "max_queue_depth": 0,
+            "total_wait": 0.0,
+            "max_wait": 0.0,
+            "tokens_used": 0,
+        }
+        self._paused_until = 0.0
+        self._async_waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+
+    def _try_take(self, estimated_tokens: int) -> Optional[float]:
+        """在锁内尝试拿发送配额：拿到返回 0，否则返回需等待的秒数，None 表示等并发名额释放"""
+        now = time.monotonic()
+        if now < self._paused_until:
+            return self._paused_until - now
+        if self._in_flight >= self.max_in_flight:
+            return None
+        delay = max(
+            self.request_bucket.time_until(1),
+            self.token_bucket.time_until(estimated_tokens)
+        )
+        if delay == 0:
+            self.request_bucket.consume(1)
+            self.token_bucket.consume(estimated_tokens)
+            self._in_flight += 1
+        return delay
+
+    def _enqueue(self):
+        self._waiting += 1
+        self._metrics["max_queue_depth"] = max(self._metrics["max_queue_depth"], self._waiting)
+
+    def _record_wait(self, start: float) -> float:
+        waited = time.monotonic() - start
+        self._metrics["requests"] += 1
+        self._metrics["total_wait"] += waited
+        self._metrics["max_wait"] = max(self._metrics["max_wait"], waited)
+        return waited
+
+    def _timeout_error(self, start: float) -> GatewayTimeoutError:
+        self._metrics["timeouts"] += 1
+        return GatewayTimeoutError(f"{self.provider} 请求排队超时 ({time.monotonic() - start:.1f}s)")
+
+    def acquire(self, estimated_tokens: int = 0, timeout: Optional[float] = None) -> float:
+        """排队等待发送配额，返回等待的秒数"""
+        start = time.monotonic()
+        deadline = start + (self.queue_timeout if timeout is None else timeout)
+
+        with self._cond:
+            self._enqueue()
+            try:
+                while True:
+                    delay = self._try_take(estimated_tokens)
+                    if delay == 0:
+                        return self._record_wait(start)
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise self._timeout_error(start)
+                    self._cond.wait(remaining if delay is None else min(delay, remaining))
+            finally:
+                self._waiting -= 1
+
+    async def acquire_async(self, estimated_tokens: int = 0, timeout: Optional[float] = None) -> float:
+        """acquire 的协程版本：在事件循环上等待，不占用线程
+
+        名额只在锁内、两次 await 之间取得，取消只会发生在等待期间，
+        因此被取消的排队请求不会带走名额。
+        """
+        start = time.monotonic()
+        deadline = start + (self.queue_timeout if timeout is None else timeout)
+        loop = asyncio.get_running_loop()
+
+        with self._cond:
+            self._enqueue()
+        try:
+            while True:
+                with self._cond:
+                    delay = self._try_take(estimated_tokens)
+                    if delay == 0:
+                        return self._record_wait(start)
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise self._timeout_error(start)
+                    waiter = loop.create_future()
+                    self._async_waiters.append((loop, waiter))
+                try:
+                    await asyncio.wait({waiter}, timeout=remaining if delay is None else min(delay, remaining))
+                finally:
+                    with self._cond:
+                        if (loop, waiter) in self._async_waiters:
+                            self._async_waiters.remove((loop, waiter))
+        finally:
+            with self._cond:
+                self._waiting -= 1
+
+    def _notify_all(self):
+        """唤醒同步与异步排队者，须在锁内调用"""
+        self._cond.notify_all()
+        waiters, self._async_waiters = self._async_waiters, []
+        for loop, waiter in waiters:
+            try:
+                loop.call_soon_threadsafe(_resolve, waiter)
+            except RuntimeError:
+                # 事件循环已关闭，排队者随之消失
+                pass
+
+    def release(self, estimated_tokens: int = 0, actual_tokens: Optional[int] = None):
+        with self._cond:
+            self._in_flight -= 1
+            used = estimated_tokens if actual_tokens is None else actual_tokens
+            self._metrics["tokens_used"] += used
+            if used > estimated_tokens:
+                self.token_bucket.consume(used - estimated_tokens)
+            self._notify_all()
+
+    def pause(self, seconds: float):
+        """收到提供商的 429 后暂停发送"""
+        with self._cond:
+            self._metrics["rate_limited"] += 1
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        with self._cond:
+            metrics = dict(self._metrics)
+            metrics["provider"] = self.provider
+            metrics["in_flight"] = self._in_flight
+            metrics["queue_depth"] = self._waiting
+            metrics["avg_wait"] = metrics["total_wait"] / metrics["requests"] if metrics["requests"] else 0.0
+            return metrics
+
+
+def _resolve(waiter: asyncio.Future):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+_gateways: Dict[str, ProviderGateway] = {}
+_gateways_lock = Lock()
+
+
+def get_gateway(provider: str, **limits: Any) -> ProviderGateway:
+    """按提供商共享 ProviderGateway，同一提供商的多个模型共用配额"""
+    with _gateways_lock:
+        if provider not in _gateways:
+            _gateways[provider] = ProviderGateway(provider, **limits)
+        return _gateways[provider]
+
+
+def get_all_gateway_metrics() -> Dict[str, Dict[str, Any]]:
+    with _gateways_lock:
+        gateways = list(_gateways.values())
+    return {gateway.provider: gateway.get_metrics() for gateway in gateways}
+
+
+def _is_rate_limited(error: Exception) -> bool:
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    return status == 429 or "ratelimit" in type(error).__name__.lower()
+
+
+def _retry_after(error: Exception, default: float = 1.0) -> float:
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after", default))
+    except (TypeError, ValueError):
+        return default
+
+
+class GatewayChatModel(BaseChatModel):
+    """把 ChatModel 的每次调用都放到 ProviderGateway 后面
+
+    对链路透明：仍是 BaseChatModel，bind(stop=...)、stream、invoke 都照常工作。
+    流式调用在整个流期间占用一个并发名额。收到 429 时按 Retry-After
+    暂停该提供商，并在排队截止时间内重试（流式调用只在尚未产出内容时重试）。
+    异步调用在事件循环上排队，不占线程；排队中被取消不会占用名额。
+    内层模型通过 invoke / stream 调用，作为子运行保留自身的回调和追踪。
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    inner: BaseChatModel
+    gateway: ProviderGateway
+    # 粗略估算：平均每个 token 约 2 个字符（中英文混合）
+    chars_per_token: float = 2.0
+
+    @property
+    def _llm_type(self) -> str:
+        return f"gateway-{self.inner._llm_type}"
+
+    def _estimate_tokens(self, messages: List[BaseMessage]) -> int:
+        chars = sum(len(str(message.content)) for message in messages)
+        return int(chars / self.chars_per_token) + 1
+
+    @staticmethod
+    def _child_config(run_manager: Any) -> RunnableConfig:
+        """内层模型的运行配置：挂在本次运行之下，继承其回调、标签和元数据"""
+        if run_manager is None:
+            return {}
+        # LLM 运行的 run_manager 没有 get_child，按 ParentRunManager.get_child 构造
+        callbacks = CallbackManager(handlers=[], parent_run_id=run_manager.run_id)
+        callbacks.set_handlers(run_manager.inheritable_handlers)
+        callbacks.add_tags(run_manager.inheritable_tags)
+        callbacks.add_metadata(run_manager.inheritable_metadata)
+        return {"callbacks": callbacks}
+
+    def _pause_for_retry(self, error: Exception, deadline: float) -> bool:
+        """429 且仍在排队截止时间内时，按 Retry-After 暂停该提供商并返回 True 让调用方重试"""
+        if not _is_rate_limited(error) or time.monotonic() >= deadline:
+            return False
+        logger.warning(f"{self.gateway.provider} 返回 429，暂停后重试")
+        self.gateway.pause(_retry_after(error))
+        return True
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any
+    ) -> ChatResult:
+        estimate = self._estimate_tokens(messages)
+        deadline = time.monotonic() + self.gateway.queue_timeout
+        while True:
+            self.gateway.acquire(estimate, timeout=deadline - time.monotonic())
+            actual = None
+            try:
+                message = self.inner.invoke(messages, self._child_config(run_manager), stop=stop, **kwargs)
+                result = ChatResult(generations=[ChatGeneration(message=message)])
+                actual = self._usage_from_result(result)
+                return result
+            except Exception as e:
+                if not self._pause_for_retry(e, deadline):
+                    raise
+            finally:
+                self.gateway.release(estimate, actual)
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any
+    ) -> Iterator[ChatGenerationChunk]:
+        estimate = self._estimate_tokens(messages)
+        deadline = time.monotonic() + self.gateway.queue_timeout
+        while True:
+            self.gateway.acquire(estimate, timeout=deadline - time.monotonic())
+            actual = None
+            started = False
+            try:
+                config = self._child_config(run_manager)
+                for message in self.inner.stream(messages, config, stop=stop, **kwargs):
+                    chunk = ChatGenerationChunk(message=message)
+                    started = True
+                    actual = self._usage_from_chunk(chunk, actual)
+                    yield chunk
+                return
+            except Exception as e:
+                if started or not self._pause_for_retry(e, deadline):
+                    raise
+            finally:
+                self.gateway.release(estimate, actual)
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any
+    ) -> ChatResult:
+        estimate = self._estimate_tokens(messages)
+        deadline = time.monotonic() + self.gateway.queue_timeout
+        while True:
+            await self.gateway.acquire_async(estimate, timeout=deadline - time.monotonic())
+            actual = None
+            try:
+                message = await self.inner.ainvoke(messages, self._child_config(run_manager), stop=stop, **kwargs)
+                result = ChatResult(generations=[ChatGeneration(message=message)])
+                actual = self._usage_from_result(result)
+                return result
+            except Exception as e:
+                if not self._pause_for_retry(e, deadline):
+                    raise
+            finally:
+                self.gateway.release(estimate, actual)
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        estimate = self._estimate_tokens(messages)
+        deadline = time.monotonic() + self.gateway.queue_timeout
+        while True:
+            await self.gateway.acquire_async(estimate, timeout=deadline - time.monotonic())
+            actual = None
+            started = False
+            try:
+                config = self._child_config(run_manager)
+                async for message in self.inner.astream(messages, config, stop=stop, **kwargs):
+                    chunk = ChatGenerationChunk(message=message)
+                    started = True
+                    actual = self._usage_from_chunk(chunk, actual)
+                    yield chunk
+                return
+            except Exception as e:
+                if started or not self._pause_for_retry(e, deadline):
+                    raise
+            finally:
+                self.gateway.release(estimate, actual)
+
+    @staticmethod
+    def _usage_from_result(result: ChatResult) -> Optional[int]:
+        for generation in result.generations:
+            usage = getattr(generation.message, "usage_metadata", None)
+            if usage:
+                return usage.get("total_tokens")
+        return None
+
+    @staticmethod
+    def _usage_from_chunk(chunk: ChatGenerationChunk, current: Optional[int]) -> Optional[int]:
+        usage = getattr(chunk.message, "usage_metadata", None)
+        if usage and usage.get("total_tokens"):
+            return (current or 0) + usage["total_tokens"]
+        return current
+
+
+def with_gateway(llm: Any, gateway: ProviderGateway) -> Any:
+    """给 ChatModel 加上 ProviderGateway；非 ChatModel（如测试替身）原样返回"""
+    if isinstance(llm, BaseChatModel):
+        return GatewayChatModel(inner=llm, gateway=gateway)
+    return llm
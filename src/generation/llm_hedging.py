@@ -0,0 +1,419 @@
+from collections import deque
+from contextlib import aclosing
+from queue import Empty, Queue
+from threading import Event, Lock, Thread
+from typing import Any, AsyncIterator, Deque, Dict, Iterator, List, Optional, Tuple
+import asyncio
+import logging
+import time
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from pydantic import ConfigDict, PrivateAttr
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreaker:
+    """连续失败 failure_threshold 次后熔断 cooldown 秒
+
+    熔断期间 allow() 返回 False；冷却结束后进入半开状态，放行一次试探请求，
+    成功则恢复，失败则重新熔断。
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 3, cooldown: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._lock = Lock()
+        self._failures = 0
+        self._opened_at = 0.0
+        self._state = self.CLOSED
+        self._trial_running = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.cooldown:
+            self._state = self.HALF_OPEN
+            self._trial_running = False
+        return self._state
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._state = self.CLOSED
+            self._trial_running = False
+
+    def record_cancelled(self):
+        """试探请求被取消（对冲输掉）时，允许下一次试探"""
+        with self._lock:
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._trial_running = False
+
+
+class _Attempt:
+    """在线程中运行的一次提供商调用，产出的内容写入共享队列"""
+
+    def __init__(self, index: int, output: Queue):
+        self.index = index
+        self.output = output
+        self.cancelled = Event()
+        self.started_at = time.monotonic()
+
+
+_CHUNK = "chunk"
+_END = "end"
+_ERROR = "error"
+
+
+class HedgedChatModel(BaseChatModel):
+    """对冲请求 + 多提供商故障切换
+
+    先调用主提供商；若在对冲截止时间内没有产出首个 token，就把同一请求发给
+    下一个提供商，谁先产出首个 token 就用谁，其余调用被取消。对冲截止时间取
+    主提供商近期延迟的 hedge_percentile 分位数（样本不足时用 initial_hedge_delay）：
+    流式调用按首 token 延迟，非流式调用按完整响应延迟，两类样本分开统计。
+    提供商报错会立即切换到下一个；连续失败的提供商由熔断器暂时摘除。
+
+    同步调用在线程中竞速；异步调用（ainvoke / astream）是事件循环中的任务，
+    输掉的调用直接取消。
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    providers: List[BaseChatModel]
+    provider_names: List[str] = []
+    hedge_percentile: float = 0.95
+    initial_hedge_delay: float = 2.0
+    min_hedge_delay: float = 0.2
+    sample_size: int = 100
+    min_samples: int = 10
+    failure_threshold: int = 3
+    cooldown: float = 30.0
+
+    _breakers: List[CircuitBreaker] = PrivateAttr(default_factory=list)
+    _first_token_latencies: List[Deque[float]] = PrivateAttr(default_factory=list)
+    _completion_latencies: List[Deque[float]] = PrivateAttr(default_factory=list)
+    _stats: Dict[str, Dict[str, int]] = PrivateAttr(default_factory=dict)
+    _lock: Any = PrivateAttr(default_factory=Lock)
+
+    def model_post_init(self, __context: Any):
+        if not self.provider_names:
+            self.provider_names = [f"provider_{i}" for i in range(len(self.providers))]
+        self._breakers = [CircuitBreaker(self.failure_threshold, self.cooldown) for _ in self.providers]
+        self._first_token_latencies = [deque(maxlen=self.sample_size) for _ in self.providers]
+        self._completion_latencies = [deque(maxlen=self.sample_size) for _ in self.providers]
+        self._stats = {
+            name: {"calls": 0, "wins": 0, "failures": 0, "cancelled": 0, "hedges": 0, "skipped": 0}
+            for name in self.provider_names
+        }
+
+    @property
+    def _llm_type(self) -> str:
+        return "hedged"
+
+    def hedge_delay(self, streaming: bool = True) -> float:
+        """主提供商延迟的分位数，作为发起对冲请求前的等待时间
+
+        streaming 为 True 时取首 token 延迟，否则取完整响应延迟。
+        """
+        latencies = self._first_token_latencies if streaming else self._completion_latencies
+        with self._lock:
+            samples = sorted(latencies[0]) if latencies else []
+        if len(samples) < self.min_samples:
+            return self.initial_hedge_delay
+        index = min(int(self.hedge_percentile * (len(samples) - 1)), len(samples) - 1)
+        return max(samples[index], self.min_hedge_delay)
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any
+    ) -> ChatResult:
+        def call(provider: BaseChatModel) -> Iterator[ChatResult]:
+            yield provider._generate(messages, stop=stop, **kwargs)
+
+        return list(self._race(call, streaming=False))[0]
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any
+    ) -> ChatResult:
+        async def call(provider: BaseChatModel) -> AsyncIterator[ChatResult]:
+            yield await provider._agenerate(messages, stop=stop, **kwargs)
+
+        return [result async for result in self._arace(call, streaming=False)][0]
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any
+    ) -> Iterator[ChatGenerationChunk]:
+        def call(provider: BaseChatModel) -> Iterator[ChatGenerationChunk]:
+            return provider._stream(messages, stop=stop, **kwargs)
+
+        for chunk in self._race(call, streaming=True):
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        def call(provider: BaseChatModel) -> AsyncIterator[ChatGenerationChunk]:
+            return provider._astream(messages, stop=stop, **kwargs)
+
+        async with aclosing(self._arace(call, streaming=True)) as chunks:
+            async for chunk in chunks:
+                if run_manager:
+                    await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+                yield chunk
+
+    def _race(self, call: Any, streaming: bool) -> Iterator[Any]:
+        """按顺序（必要时并发）调用各提供商，产出第一个出结果的调用的全部内容"""
+        output: Queue = Queue()
+        attempts: List[_Attempt] = []
+        candidates = list(range(len(self.providers)))
+        running = 0
+        last_error: Optional[Exception] = None
+        winner: Optional[_Attempt] = None
+
+        def launch_next() -> bool:
+            nonlocal running
+            while candidates:
+                index = candidates.pop(0)
+                if not self._breakers[index].allow():
+                    self._count(index, "skipped")
+                    continue
+                attempt = _Attempt(index, output)
+                attempts.append(attempt)
+                self._count(index, "calls")
+                Thread(
+                    target=self._run,
+                    args=(attempt, call, self.providers[index]),
+                    daemon=True
+                ).start()
+                running += 1
+                return True
+            return False
+
+        if not launch_next():
+            raise RuntimeError("所有 LLM 提供商均已熔断")
+
+        try:
+            while winner is None:
+                timeout = self.hedge_delay(streaming) if candidates else None
+                try:
+                    attempt, kind, payload = output.get(timeout=timeout)
+                except Empty:
+                    # 截止时间内没有首 token：对冲到下一个提供商
+                    if launch_next():
+                        self._count(attempts[-1].index, "hedges")
+                        logger.info(f"首 token 超时，对冲请求到 {self.provider_names[attempts[-1].index]}")
+                    continue
+
+                if kind == _ERROR:
+                    running -= 1
+                    last_error = payload
+                    self._breakers[attempt.index].record_failure()
+                    self._count(attempt.index, "failures")
+                    logger.warning(f"{self.provider_names[attempt.index]} 调用失败: {payload}")
+                    if not launch_next() and running == 0:
+                        raise last_error
+                    continue
+
+                winner = attempt
+                self._record_latency(attempt.index, streaming, attempt.started_at)
+                for other in attempts:
+                    if other is not attempt:
+                        other.cancelled.set()
+                        self._lose(other.index)
+                if kind == _CHUNK:
+                    yield payload
+                else:
+                    self._breakers[attempt.index].record_success()
+                    self._count(attempt.index, "wins")
+                    return
+
+            while True:
+                attempt, kind, payload = output.get()
+                if attempt is not winner:
+                    continue
+                if kind == _CHUNK:
+                    yield payload
+                elif kind == _END:
+                    if streaming:
+                        self._record_latency(winner.index, False, winner.started_at)
+                    self._breakers[winner.index].record_success()
+                    self._count(winner.index, "wins")
+                    return
+                else:
+                    self._breakers[winner.index].record_failure()
+                    self._count(winner.index, "failures")
+                    raise payload
+        finally:
+            for attempt in attempts:
+                attempt.cancelled.set()
+
+    @staticmethod
+    def _run(attempt: _Attempt, call: Any, provider: BaseChatModel):
+        iterator = None
+        try:
+            iterator = iter(call(provider))
+            for item in iterator:
+                if attempt.cancelled.is_set():
+                    return
+                attempt.output.put((attempt, _CHUNK, item))
+            attempt.output.put((attempt, _END, None))
+        except Exception as e:
+            if not attempt.cancelled.is_set():
+                attempt.output.put((attempt, _ERROR, e))
+        finally:
+            close = getattr(iterator, "close", None)
+            if close:
+                close()
+
+    async def _arace(self, call: Any, streaming: bool) -> AsyncIterator[Any]:
+        """_race 的异步版本：每个提供商的首个产出是一个任务，asyncio.wait 等待最先完成的"""
+        candidates = list(range(len(self.providers)))
+        # 等待首个产出的任务 -> (提供商序号, 调用的异步迭代器, 开始时间)
+        pending: Dict[asyncio.Future, Tuple[int, AsyncIterator[Any], float]] = {}
+        last_error: Optional[Exception] = None
+        winner: Optional[Tuple[int, AsyncIterator[Any], float]] = None
+        first: Any = None
+        finished = False
+
+        def launch_next() -> bool:
+            while candidates:
+                index = candidates.pop(0)
+                if not self._breakers[index].allow():
+                    self._count(index, "skipped")
+                    continue
+                self._count(index, "calls")
+                iterator = call(self.providers[index]).__aiter__()
+                pending[asyncio.ensure_future(iterator.__anext__())] = (index, iterator, time.monotonic())
+                return True
+            return False
+
+        if not launch_next():
+            raise RuntimeError("所有 LLM 提供商均已熔断")
+
+        try:
+            while winner is None:
+                timeout = self.hedge_delay(streaming) if candidates else None
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # 截止时间内没有首 token：对冲到下一个提供商
+                    if launch_next():
+                        index = list(pending.values())[-1][0]
+                        self._count(index, "hedges")
+                        logger.info(f"首 token 超时，对冲请求到 {self.provider_names[index]}")
+                    continue
+
+                for task in done:
+                    attempt = pending.pop(task)
+                    index = attempt[0]
+                    if winner is not None:
+                        # 同一轮中已有胜者，迟到的调用按输家处理
+                        self._lose(index)
+                        continue
+                    try:
+                        first = task.result()
+                    except StopAsyncIteration:
+                        finished = True
+                    except Exception as e:
+                        last_error = e
+                        self._breakers[index].record_failure()
+                        self._count(index, "failures")
+                        logger.warning(f"{self.provider_names[index]} 调用失败: {e}")
+                        launch_next()
+                        continue
+                    winner = attempt
+
+                if winner is None and not pending:
+                    raise last_error
+
+            index, iterator, started_at = winner
+            self._record_latency(index, streaming, started_at)
+            for task, (other, _, _) in pending.items():
+                task.cancel()
+                self._lose(other)
+
+            if not finished:
+                yield first
+                try:
+                    async for item in iterator:
+                        yield item
+                except Exception:
+                    self._breakers[index].record_failure()
+                    self._count(index, "failures")
+                    raise
+            if streaming:
+                self._record_latency(index, False, started_at)
+            self._breakers[index].record_success()
+            self._count(index, "wins")
+        finally:
+            for task in pending:
+                task.cancel()
+            aclose = getattr(winner[1], "aclose", None) if winner is not None else None
+            if aclose is not None:
+                await aclose()
+
+    def _lose(self, index: int):
+        self._breakers[index].record_cancelled()
+        self._count(index, "cancelled")
+
+    def _record_latency(self, index: int, streaming: bool, started_at: float):
+        latencies = self._first_token_latencies if streaming else self._completion_latencies
+        with self._lock:
+            latencies[index].append(time.monotonic() - started_at)
+
+    def _count(self, index: int, key: str):
+        with self._lock:
+            self._stats[self.provider_names[index]][key] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = {name: dict(values) for name, values in self._stats.items()}
+        for index, name in enumerate(self.provider_names):
+            stats[name]["state"] = self._breakers[index].state
+        return {
+            "hedge_delay": {"first_token": self.hedge_delay(True), "completion": self.hedge_delay(False)},
+            "providers": stats,
+        }
@@ -0,0 +1,210 @@
+from threading import Lock
+from typing import Any, Dict, Iterator, List, Optional, TextIO
+import hashlib
+import json
+import logging
+import os
+import time
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import ConfigDict
+
+logger = logging.getLogger(__name__)
+
+
+class CassetteMissError(KeyError):
+    """回放模式下 cassette 中没有该提示词的录制"""
+
+
+class Cassette:
+    """按提示词哈希保存 LLM 响应的录制文件
+
+    文件格式（JSONL，首行为版本头，之后每次调用追加一行）::
+
+        {"version": 1}
+        {"key": "<sha256>", "chunks": [...], "delays": [...]}
+
+    录制时每条响应只追加一行并 flush，写入开销与已录制条数无关。
+    同一提示词可以有多条录制（例如多候选生成），回放时依次轮换。
+    delays[i] 是第 i 个分块相对上一分块（首块相对请求开始）的间隔秒数。
+    """
+
+    VERSION = 1
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = Lock()
+        self._cursor: Dict[str, int] = {}
+        self._file: Optional[TextIO] = None
+        self.entries: Dict[str, List[Dict[str, Any]]] = {}
+        if os.path.exists(path):
+            self._load()
+
+    def _load(self):
+        with open(self.path, "r", encoding="utf-8") as f:
+            lines = f.read().splitlines()
+        for number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # 录制进程被中断时最后一行可能不完整
+                logger.warning(f"cassette {self.path} 第 {number} 行无法解析，已跳过")
+                continue
+            if "key" in record:
+                self.entries.setdefault(record["key"], []).append(
+                    {"chunks": record["chunks"], "delays": record["delays"]}
+                )
+
+    @staticmethod
+    def key(messages: List[BaseMessage], stop: Optional[List[str]] = None) -> str:
+        payload = json.dumps(
+            {"messages": [[m.type, m.content] for m in messages], "stop": stop or []},
+            ensure_ascii=False,
+            sort_keys=True
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def next_response(self, key: str) -> Dict[str, Any]:
+        with self._lock:
+            responses = self.entries.get(key)
+            if not responses:
+                raise CassetteMissError(f"cassette {self.path} 中没有该提示词的录制: {key[:12]}")
+            cursor = self._cursor.get(key, 0)
+            self._cursor[key] = cursor + 1
+            return responses[cursor % len(responses)]
+
+    def add(self, key: str, chunks: List[Any], delays: List[float]):
+        line = json.dumps({"key": key, "chunks": chunks, "delays": delays}, ensure_ascii=False)
+        with self._lock:
+            writer = self._writer()
+            self.entries.setdefault(key, []).append({"chunks": chunks, "delays": delays})
+            writer.write(line + "\n")
+            writer.flush()
+
+    def _writer(self) -> TextIO:
+        """打开追加写入的文件句柄；新文件先写版本头"""
+        if self._file is not None:
+            return self._file
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        new_file = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        self._file = open(self.path, "a", encoding="utf-8")
+        if new_file:
+            self._file.write(json.dumps({"version": self.VERSION}) + "\n")
+        return self._file
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def __len__(self) -> int:
+        return sum(len(responses) for responses in self.entries.values())
+
+
+def _merge_chunks(chunks: List[Any]) -> AIMessage:
+    merged = None
+    for content in chunks:
+        chunk = AIMessageChunk(content=content)
+        merged = chunk if merged is None else merged + chunk
+    return AIMessage(content=merged.content if merged is not None else "")
+
+
+class ReplayChatModel(BaseChatModel):
+    """从 cassette 回放录制的响应，复现分块方式和 token 间隔
+
+    speed > 0 时按录制间隔 / speed 休眠（1.0 为原速）；speed == 0 时不休眠，
+    尽可能快地回放。没有录制的提示词抛出 CassetteMissError。
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    cassette: Cassette
+    speed: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "replay"
+
+    def _sleep(self, delay: float):
+        if self.speed > 0 and delay > 0:
+            time.sleep(delay / self.speed)
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any
+    ) -> ChatResult:
+        response = self.cassette.next_response(Cassette.key(messages, stop))
+        self._sleep(sum(response["delays"]))
+        return ChatResult(generations=[ChatGeneration(message=_merge_chunks(response["chunks"]))])
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any
+    ) -> Iterator[ChatGenerationChunk]:
+        response = self.cassette.next_response(Cassette.key(messages, stop))
+        for content, delay in zip(response["chunks"], response["delays"]):
+            self._sleep(delay)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=content))
+
+
+class RecordingChatModel(BaseChatModel):
+    """透传调用到真实模型，同时把响应分块和时间间隔写入 cassette"""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    inner: BaseChatModel
+    cassette: Cassette
+
+    @property
+    def _llm_type(self) -> str:
+        return f"recording-{self.inner._llm_type}"
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any
+    ) -> ChatResult:
+        start_time = time.monotonic()
+        result = self.inner._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        content = result.generations[0].message.content
+        self.cassette.add(Cassette.key(messages, stop), [content], [time.monotonic() - start_time])
+        return result
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any
+    ) -> Iterator[ChatGenerationChunk]:
+        chunks: List[Any] = []
+        delays: List[float] = []
+        last = time.monotonic()
+        completed = False
+        try:
+            for chunk in self.inner._stream(messages, stop=stop, run_manager=run_manager, **kwargs):
+                now = time.monotonic()
+                chunks.append(chunk.message.content)
+                delays.append(now - last)
+                last = now
+                yield chunk
+            completed = True
+        finally:
+            # 调用方提前关闭流（如 SQL 块结束即停止）时，录下已消费的部分
+            if chunks or completed:
+                self.cassette.add(Cassette.key(messages, stop), chunks, delays)
@@ -0,0 +1,188 @@
+from dataclasses import dataclass, field
+from threading import Lock
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+FAST_ROUTE = "fast"
+STRONG_ROUTE = "strong"
+
+
+@dataclass
+class RouteDecision:
+    """路由决策：复杂度得分、命中的特征和选择的模型"""
+    route: str
+    score: float
+    features: Dict[str, Any] = field(default_factory=dict)
+
+
+class ModelRouter:
+    """按问题复杂度在快速模型和强模型之间路由 SQL 生成
+
+    复杂度只用本地特征打分，不额外调用 LLM：
+    - 问题中涉及的表数量（表名、语义映射字段所属的表）
+    - 聚合词、时间词
+    - 对比意图
+
+    得分低于 threshold 的问题交给快速模型，其余交给强模型；快速模型的
+    SQL 校验或执行失败时，由调用方通过 escalate() 升级到强模型。
+    """
+
+    AGGREGATION_WORDS = [
+        "平均", "总和", "合计", "求和", "总额", "占比", "比例", "分组", "每个", "各个",
+        "分别", "累计", "中位数", "去重", "sum", "avg", "average", "group", "per ", "each",
+    ]
+    TIME_WORDS = [
+        "今年", "去年", "每年", "年度", "本月", "上月", "每月", "月份", "季度",
+        "每周", "每天", "每日", "趋势", "期间", "以来",
+        "year", "month", "week", "quarter", "daily", "trend",
+    ]
+    COMPARISON_WORDS = [
+        "对比", "比较", "相比", "同比", "环比", "增长", "下降", "高于", "低于", "超过",
+        "排名", "差异", "多于", "少于", "compare", "versus", " vs", "than", "rank",
+    ]
+
+    WEIGHTS = {
+        "extra_tables": 1.0,
+        "aggregation": 0.5,
+        "time": 0.5,
+        "comparison": 1.0,
+    }
+
+    def __init__(
+        self,
+        fast_generator: Any,
+        strong_generator: Any,
+        table_names: Optional[List[str]] = None,
+        threshold: float = 1.5
+    ):
+        self.fast_generator = fast_generator
+        self.strong_generator = strong_generator
+        self.table_names = table_names or []
+        self.threshold = threshold
+        self._lock = Lock()
+        self._stats: Dict[str, Dict[str, float]] = {
+            FAST_ROUTE: self._empty_stats(),
+            STRONG_ROUTE: self._empty_stats(),
+        }
+
+    def score(
+        self,
+        question: str,
+        field_mappings: Optional[List[Dict[str, Any]]] = None,
+        time_mappings: Optional[List[Dict[str, Any]]] = None
+    ) -> Tuple[float, Dict[str, Any]]:
+        question_lower = question.lower()
+
+        tables = set()
+        for table in self.table_names:
+            singular = table[:-1] if table.endswith("s") else table
+            if table.lower() in question_lower or singular.lower() in question_lower:
+                tables.add(table)
+        for mapping in field_mappings or []:
+            for field_name in mapping.get("fields", []):
+                if "." in field_name:
+                    tables.add(field_name.split(".", 1)[0])
+
+        features = {
+            "tables": sorted(tables),
+            "aggregation": self._count_hits(question_lower, self.AGGREGATION_WORDS),
+            "time": self._count_hits(question_lower, self.TIME_WORDS) + len(time_mappings or []),
+            "comparison": self._count_hits(question_lower, self.COMPARISON_WORDS),
+        }
+
+        score = (
+            self.WEIGHTS["extra_tables"] * max(len(tables) - 1, 0)
+            + self.WEIGHTS["aggregation"] * min(features["aggregation"], 3)
+            + self.WEIGHTS["time"] * min(features["time"], 2)
+            + self.WEIGHTS["comparison"] * min(features["comparison"], 2)
+        )
+        return score, features
+
+    def route(
+        self,
+        question: str,
+        field_mappings: Optional[List[Dict[str, Any]]] = None,
+        time_mappings: Optional[List[Dict[str, Any]]] = None
+    ) -> RouteDecision:
+        score, features = self.score(question, field_mappings, time_mappings)
+        route = FAST_ROUTE if score < self.threshold else STRONG_ROUTE
+        return RouteDecision(route=route, score=score, features=features)
+
+    def generator_for(self, decision: RouteDecision) -> Any:
+        return self.fast_generator if decision.route == FAST_ROUTE else self.strong_generator
+
+    def generate(self, schema: str, question: str, decision: RouteDecision) -> str:
+        generator = self.generator_for(decision)
+        start_time = time.time()
+        try:
+            return generator.generate(schema, question)
+        finally:
+            self._record_latency(decision.route, time.time() - start_time)
+
+    async def agenerate(self, schema: str, question: str, decision: RouteDecision) -> str:
+        """generate 的异步版本，通过所选生成器的 agenerate 调用模型"""
+        generator = self.generator_for(decision)
+        start_time = time.time()
+        try:
+            return await generator.agenerate(schema, question)
+        finally:
+            self._record_latency(decision.route, time.time() - start_time)
+
+    def escalate(self, schema: str, question: str, decision: RouteDecision) -> Tuple[str, RouteDecision]:
+        """快速模型失败后改用强模型重新生成"""
+        escalated = self._escalated(decision)
+        return self.generate(schema, question, escalated), escalated
+
+    async def aescalate(self, schema: str, question: str, decision: RouteDecision) -> Tuple[str, RouteDecision]:
+        """escalate 的异步版本"""
+        escalated = self._escalated(decision)
+        return await self.agenerate(schema, question, escalated), escalated
+
+    def _escalated(self, decision: RouteDecision) -> RouteDecision:
+        with self._lock:
+            self._stats[FAST_ROUTE]["escalations"] += 1
+        logger.info(f"快速模型生成失败，升级到强模型 (score={decision.score:.2f})")
+        return RouteDecision(route=STRONG_ROUTE, score=decision.score, features=decision.features)
+
+    def record_outcome(self, route: str, success: bool):
+        with self._lock:
+            key = "success" if success else "failure"
+            self._stats[route][key] += 1
+
+    def get_stats(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            stats = {}
+            for route, values in self._stats.items():
+                route_stats = dict(values)
+                calls = route_stats["calls"]
+                route_stats["avg_latency"] = route_stats["total_latency"] / calls if calls else 0.0
+                outcomes = route_stats["success"] + route_stats["failure"]
+                route_stats["success_rate"] = route_stats["success"] / outcomes * 100 if outcomes else 0.0
+                stats[route] = route_stats
+            return stats
+
+    def _record_latency(self, route: str, latency: float):
+        with self._lock:
+            stats = self._stats[route]
+            stats["calls"] += 1
+            stats["total_latency"] += latency
+            stats["max_latency"] = max(stats["max_latency"], latency)
+
+    @staticmethod
+    def _count_hits(text: str, words: List[str]) -> int:
+        return sum(1 for word in words if word in text)
+
+    @staticmethod
+    def _empty_stats() -> Dict[str, float]:
+        return {
+            "calls": 0,
+            "total_latency": 0.0,
+            "max_latency": 0.0,
+            "success": 0,
+            "failure": 0,
+            "escalations": 0,
+        }
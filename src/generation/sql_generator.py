@@ -1,30 +1,60 @@
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from typing import List, Dict, Optional, Any, Generator
+from langchain_core.language_models import BaseLanguageModel
+from typing import List, Dict, Optional, Any, AsyncGenerator, Generator
 import logging
+import time
+
+from src.generation.stream_parser import ThinkingStreamParser, NativeThinkingStreamParser
 
 logger = logging.getLogger(__name__)
 
 
 class SQLGenerator:
+    DEFAULT_STOP_SEQUENCES = ["</sql>"]
+
     def __init__(
         self,
         llm: Any,
-        prompt_template: Optional[ChatPromptTemplate] = None
+        prompt_template: Optional[ChatPromptTemplate] = None,
+        stop_sequences: Optional[List[str]] = None,
+        early_stop: bool = True
     ):
         self.llm = llm
         self.prompt_template = prompt_template or self._get_default_template()
         self.output_parser = StrOutputParser()
+        self.stop_sequences = self.DEFAULT_STOP_SEQUENCES if stop_sequences is None else stop_sequences
+        self.early_stop = early_stop
+
+    def _supports_stop(self) -> bool:
+        """LangChain 的模型（ChatAnthropic/ChatOpenAI/ChatOllama 等）都接受 stop 参数"""
+        return bool(self.stop_sequences) and isinstance(self.llm, BaseLanguageModel)
+
+    def _llm_with_stop(self) -> Any:
+        """在支持的模型上绑定停止序列，</sql> 之后的内容不再生成"""
+        if self._supports_stop():
+            return self.llm.bind(stop=self.stop_sequences)
+        return self.llm
 
     def generate(self, schema: str, question: str) -> str:
         try:
-            chain = self.prompt_template | self.llm | self.output_parser
+            chain = self.prompt_template | self._llm_with_stop() | self.output_parser
             sql = chain.invoke({"schema": schema, "question": question})
             return self._clean_sql(sql)
         except Exception as e:
             logger.error(f"SQL 生成失败: {e}")
             raise
 
+    async def agenerate(self, schema: str, question: str) -> str:
+        """generate 的异步版本，通过 ainvoke 调用模型，不占用事件循环"""
+        try:
+            chain = self.prompt_template | self._llm_with_stop() | self.output_parser
+            sql = await chain.ainvoke({"schema": schema, "question": question})
+            return self._clean_sql(sql)
+        except Exception as e:
+            logger.error(f"SQL 生成失败: {e}")
+            raise
+
     def generate_stream(self, schema: str, question: str) -> Generator[str, None, None]:
         """流式生成 SQL
         
@@ -67,11 +97,11 @@ SELECT * FROM products;
 """)
     def _clean_sql(self, sql: str) -> str:
         sql = sql.strip()
-        # 如果包含 <sql> 标签，提取 SQL 内容
-        if "<sql>" in sql and "</sql>" in sql:
+        # 如果包含 <sql> 标签，提取 SQL 内容（命中停止序列时没有 </sql>）
+        if "<sql>" in sql:
             start = sql.find("<sql>") + len("<sql>")
-            end = sql.find("</sql>")
-            sql = sql[start:end]
+            end = sql.find("</sql>", start)
+            sql = sql[start:end] if end != -1 else sql[start:]
         sql = sql.replace("```sql", "").replace("```", "")
         return sql.strip()
     def _extract_thinking(self, output: str) -> str:
@@ -84,65 +114,102 @@ SELECT * FROM products;
         
         return ""
 
-    def generate_with_thinking_stream(self, schema: str, question: str) -> Generator[Dict[str, str], None, None]:
-        """流式生成 thinking 和 SQL，分阶段返回
+    def generate_with_thinking_stream(self, schema: str, question: str) -> Generator[Dict[str, Any], None, None]:
+        """流式生成 thinking 和 SQL，分阶段返回增量片段
+
+        使用 ThinkingStreamParser 增量解析，每个字符只处理一次，
+        标签被切分在两个片段之间时也能正确识别。模型支持时传入停止序列；
+        early_stop 为 True 时，</sql> 出现后立即关闭底层流。
+
         Args:
             schema: 数据库 Schema 文档
             question: 用户问题
-            Dict with keys: 'type' ('thinking' or 'sql'), 'content'
+
+        Yields:
+            Dict with keys: 'type' ('thinking' or 'sql'), 'content'（本次新增的内容）
+            最后一个事件为 {'type': 'stats', 'data': {...}}，记录 SQL 结束后仍消耗的片段
         """
+        start_time = time.time()
+        stream = None
         try:
-            chain = self.prompt_template | self.llm | self.output_parser
-            in_thinking = False
-            in_sql = False
-            thinking_content = ""
-            sql_content = ""
-            buffer = ""
-            
-            for chunk in chain.stream({"schema": schema, "question": question}):
-                buffer += chunk
-                
-                # 检查是否进入 thinking 阶段
-                if not in_thinking and not in_sql:
-                    if "<thinking>" in buffer:
-                        in_thinking = True
-                        # 提取 <thinking> 之后的内容
-                        parts = buffer.split("<thinking>", 1)
-                        buffer = parts[1] if len(parts) > 1 else ""
-                
-                # 处理 thinking 阶段
-                if in_thinking and not in_sql:
-                    if "</thinking>" in buffer:
-                        # thinking 结束
-                        parts = buffer.split("</thinking>", 1)
-                        thinking_content += parts[0]
-                        buffer = parts[1] if len(parts) > 1 else ""
-                        in_thinking = False
-                        in_sql = True
-                        # 发送完整的 thinking
-                        yield {"type": "thinking", "content": thinking_content}
-                    else:
-                        # 继续累加 thinking
-                        thinking_content += chunk
-                        yield {"type": "thinking", "content": thinking_content}
-                
-                # 处理 SQL 阶段
-                if in_sql and buffer.strip():
-                    sql_content += chunk
-                    # 提取 <sql>...</sql> 之间的内容
-                    if "<sql>" in buffer:
-                        parts = buffer.split("<sql>", 1)
-                        buffer = parts[1] if len(parts) > 1 else buffer
-                    if "</sql>" in buffer:
-                        parts = buffer.split("</sql>", 1)
-                        sql_content = parts[0]
-                        buffer = parts[1] if len(parts) > 1 else ""
-                    yield {"type": "sql", "content": sql_content.strip()}
-                    in_sql = False  # 完成 SQL 输出
-                    
+            chain = self.prompt_template | self._llm_with_stop() | self.output_parser
+            # 默认模板以 <thinking> 结尾，模型输出直接从思考内容开始
+            parser = ThinkingStreamParser(initial_state="thinking")
+            sql_closed_at = None
+            chunks_after_sql = 0
+
+            stream = chain.stream({"schema": schema, "question": question})
+            for chunk in stream:
+                if parser.done:
+                    chunks_after_sql += 1
+                yield from parser.feed(chunk)
+                if parser.done and sql_closed_at is None:
+                    sql_closed_at = time.time() - start_time
+                    if self.early_stop:
+                        break
+            yield from parser.finish()
+
+            yield {
+                "type": "stats",
+                "data": {
+                    "stop_sequences": self.stop_sequences if self._supports_stop() else [],
+                    "early_stopped": self.early_stop and sql_closed_at is not None,
+                    "sql_closed_at": sql_closed_at,
+                    "elapsed": time.time() - start_time,
+                    "chunks_after_sql": chunks_after_sql,
+                    "chars_after_sql": parser.trailing_chars,
+                }
+            }
+
+        except Exception as e:
+            logger.error(f"Thinking + SQL 流式生成失败: {e}")
+            yield {"type": "error", "content": str(e)}
+        finally:
+            # 关闭生成器会一路关闭到模型的 HTTP 流，不再接收 </sql> 之后的 token
+            if stream is not None:
+                stream.close()
+
+    async def agenerate_with_thinking_stream(self, schema: str, question: str) -> AsyncGenerator[Dict[str, Any], None]:
+        """generate_with_thinking_stream 的异步版本，通过 astream 读取模型输出，事件格式相同"""
+        start_time = time.time()
+        stream = None
+        try:
+            chain = self.prompt_template | self._llm_with_stop() | self.output_parser
+            parser = ThinkingStreamParser(initial_state="thinking")
+            sql_closed_at = None
+            chunks_after_sql = 0
+
+            stream = chain.astream({"schema": schema, "question": question})
+            async for chunk in stream:
+                if parser.done:
+                    chunks_after_sql += 1
+                for event in parser.feed(chunk):
+                    yield event
+                if parser.done and sql_closed_at is None:
+                    sql_closed_at = time.time() - start_time
+                    if self.early_stop:
+                        break
+            for event in parser.finish():
+                yield event
+
+            yield {
+                "type": "stats",
+                "data": {
+                    "stop_sequences": self.stop_sequences if self._supports_stop() else [],
+                    "early_stopped": self.early_stop and sql_closed_at is not None,
+                    "sql_closed_at": sql_closed_at,
+                    "elapsed": time.time() - start_time,
+                    "chunks_after_sql": chunks_after_sql,
+                    "chars_after_sql": parser.trailing_chars,
+                }
+            }
+
         except Exception as e:
             logger.error(f"Thinking + SQL 流式生成失败: {e}")
             yield {"type": "error", "content": str(e)}
+        finally:
+            if stream is not None:
+                await stream.aclose()
 
     def _parse_thinking_output(self, output: str) -> str:
         """解析 thinking 输出，支持多种分隔符
@@ -194,31 +261,6 @@ SELECT * FROM products;
         # 格式 4: 没有标签，返回空字符串
         return ""
 
-    def _contains_sql_start(self, text: str) -> bool:
-        """检测文本中是否包含 SQL 开始标记
-        
-        Args:
-            text: 待检测文本
-            
-        Returns:
-            True if SQL 开始标记被检测到
-        """
-        text_lower = text.lower().strip()
-        
-        # 检测各种 SQL 开始标记
-        sql_starters = [
-            "<sql>",
-            "```sql",
-            "sql:",
-            "select ",
-            "===",  # ===SQL=== 格式
-        ]
-        
-        return any(text_lower.startswith(starter) or 
-                   f"\n{starter}" in f"\n{text_lower}" or 
-                   f" {starter}" in f" {text_lower}"
-                   for starter in sql_starters)
-
     def _get_native_thinking_template(self) -> ChatPromptTemplate:
         """获取不强制 thinking 标签的简化模板，让模型自由使用原生 thinking"""
         return ChatPromptTemplate.from_template("""你是一个 SQL 专家。请根据以下数据库结构和用户问题生成 SQL 查询。
@@ -234,62 +276,31 @@ SELECT * FROM products;
         """使用简化模板的流式生成方法
         
         这个方法使用简化的 Prompt 模板，不强制要求模型输出 thinking 标签，
-        让模型可以自由使用原生 thinking 能力。
+        让模型可以自由使用原生 thinking 能力。SQL 开始标记之前的内容作为
+        thinking 增量输出，之后的内容作为 SQL 增量输出。
         
         Args:
             schema: 数据库 Schema 文档
             question: 用户问题
             
         Yields:
-            Dict with keys: 'type' ('thinking' or 'sql'), 'content'
+            Dict with keys: 'type' ('thinking' or 'sql'), 'content'（本次新增的内容）
         """
         try:
             # 使用简化模板，让模型自由决定是否使用 thinking
             simple_template = self._get_native_thinking_template()
             chain = simple_template | self.llm | self.output_parser
-            
-            in_thinking = True
-            thinking_content = ""
-            sql_content = ""
-            buffer = ""
+            parser = NativeThinkingStreamParser()
             has_sent_thinking = False
-            
+
             for chunk in chain.stream({"schema": schema, "question": question}):
-                buffer += chunk
-                
-                # 尝试检测是否进入 SQL 阶段
-                if in_thinking:
-                    # 检查是否包含 SQL 开始标记
-                    if self._contains_sql_start(buffer):
-                        # 提取 thinking 内容
-                        thinking_content = buffer
-                        for sql_starter in ["<sql>", "```sql", "SQL:", "select "]:
-                            if sql_starter.lower() in buffer.lower():
-                                parts = buffer.split(sql_starter, 1)
-                                if len(parts) > 1:
-                                    thinking_content = parts[0].strip()
-                                    sql_content = parts[1].strip()
-                                    break
-                        in_thinking = False
-                        
-                        # 发送 thinking 内容
-                        if thinking_content.strip():
-                            yield {"type": "thinking", "content": thinking_content}
-                            has_sent_thinking = True
-                        
-                        # 发送 SQL 内容
-                        if sql_content.strip():
-                            yield {"type": "sql", "content": self._clean_sql(sql_content)}
-                    else:
-                        # 还在 thinking 阶段，继续累积
-                        if chunk:
-                            yield {"type": "thinking", "content": buffer}
-                            has_sent_thinking = True
-                else:
-                    # SQL 阶段
-                    sql_content += chunk
-                    yield {"type": "sql", "content": self._clean_sql(sql_content)}
-            
+                for event in parser.feed(chunk):
+                    has_sent_thinking = has_sent_thinking or event["type"] == "thinking"
+                    yield event
+            for event in parser.finish():
+                has_sent_thinking = has_sent_thinking or event["type"] == "thinking"
+                yield event
+
             # 如果没有发送过 thinking，发送一个空 thinking 表示开始
             if not has_sent_thinking:
                 yield {"type": "thinking", "content": ""}
@@ -0,0 +1,215 @@
+from typing import Dict, List, Optional, Tuple
+
+
+# 只对 ASCII 字母做小写转换，保证转换前后字符串长度一致，索引可以直接复用
+_ASCII_LOWER = str.maketrans(
+    "ABCDEFGHIJKLMNOPQRSTUVWXYZ",
+    "abcdefghijklmnopqrstuvwxyz"
+)
+
+# (标记, 下一状态, 标记本身是否计入下一状态的内容)
+Transition = Tuple[str, str, bool]
+
+
+class StreamParser:
+    """增量式流解析器（状态机）
+
+    每次 feed() 只扫描新到达的片段，再加上上一次保留的、长度不超过最长
+    标记的尾部，因此总耗时与输出长度成线性关系。跨片段边界被截断的标记
+    会暂存到下一次 feed() 再判断。
+
+    子类通过 TRANSITIONS 声明每个状态关注的标记及跳转，通过 EMIT 声明
+    每个状态下的文本以什么类型的增量事件输出（None 表示丢弃）。
+    """
+
+    TRANSITIONS: Dict[str, List[Transition]] = {}
+    EMIT: Dict[str, Optional[str]] = {}
+    INITIAL_STATE = ""
+    DONE_STATE = "done"
+    # 需要位于行首或空白之后才算命中的标记
+    BOUNDARY_MARKERS: Tuple[str, ...] = ()
+
+    def __init__(self, initial_state: Optional[str] = None):
+        self.state = initial_state or self.INITIAL_STATE
+        self._pending = ""
+        self._prev_char = "\n"
+        self._events: List[Dict[str, str]] = []
+        self.consumed_chars = 0
+        self.discarded_chars = 0
+        # 进入结束状态之后收到的字符数
+        self.trailing_chars = 0
+
+    @property
+    def done(self) -> bool:
+        return self.state == self.DONE_STATE
+
+    def feed(self, chunk: str) -> List[Dict[str, str]]:
+        """处理一个新片段，返回本次产生的增量事件
+
+        Args:
+            chunk: LLM 输出的新片段
+
+        Returns:
+            [{"type": ..., "content": 增量文本}, ...]
+        """
+        if not chunk:
+            return []
+
+        self.consumed_chars += len(chunk)
+        text = self._pending + chunk
+        self._pending = ""
+
+        # 快速路径：片段中不含当前状态任何标记的首字符，整段直接输出
+        if not self._may_contain_marker(text):
+            self._emit(text)
+            self._prev_char = text[-1]
+            return self._drain()
+
+        lowered = text.translate(_ASCII_LOWER)
+        pos = 0
+
+        while True:
+            match = self._find_next_marker(lowered, pos)
+            if match is None:
+                break
+            index, marker, next_state, keep_marker = match
+            self._emit(text[pos:index])
+            pos = index + len(marker)
+            self.state = next_state
+            if keep_marker:
+                self._emit(text[index:pos])
+
+        hold = self._partial_marker_length(lowered, pos)
+        cut = len(text) - hold
+        self._emit(text[pos:cut])
+        if cut > 0:
+            self._prev_char = text[cut - 1]
+        self._pending = text[cut:]
+
+        return self._drain()
+
+    def finish(self) -> List[Dict[str, str]]:
+        """流结束时调用，输出仍被暂存的尾部文本"""
+        self._emit(self._pending)
+        self._pending = ""
+        return self._drain()
+
+    def _may_contain_marker(self, text: str) -> bool:
+        for marker, _, _ in self.TRANSITIONS.get(self.state, []):
+            first = marker[0]
+            if first in text or first.upper() in text:
+                return True
+        return False
+
+    def _find_next_marker(
+        self,
+        lowered: str,
+        pos: int
+    ) -> Optional[Tuple[int, str, str, bool]]:
+        best = None
+        for marker, next_state, keep_marker in self.TRANSITIONS.get(self.state, []):
+            index = lowered.find(marker, pos)
+            while index != -1 and not self._at_boundary(lowered, index, marker):
+                index = lowered.find(marker, index + 1)
+            if index != -1 and (best is None or index < best[0]):
+                best = (index, marker, next_state, keep_marker)
+        return best
+
+    def _at_boundary(self, lowered: str, index: int, marker: str) -> bool:
+        if marker not in self.BOUNDARY_MARKERS:
+            return True
+        prev = lowered[index - 1] if index > 0 else self._prev_char
+        return prev.isspace()
+
+    def _partial_marker_length(self, lowered: str, pos: int) -> int:
+        """尾部可能是某个标记前缀的最大长度，这部分需要等下一个片段再判断"""
+        tail = lowered[pos:]
+        hold = 0
+        for marker, _, _ in self.TRANSITIONS.get(self.state, []):
+            for size in range(min(len(marker) - 1, len(tail)), hold, -1):
+                if tail.endswith(marker[:size]):
+                    hold = size
+                    break
+        return hold
+
+    def _emit(self, content: str):
+        if not content:
+            return
+        event_type = self.EMIT.get(self.state)
+        if event_type is None:
+            self.discarded_chars += len(content)
+            if self.done:
+                self.trailing_chars += len(content)
+            return
+        if self._events and self._events[-1]["type"] == event_type:
+            self._events[-1]["content"] += content
+        else:
+            self._events.append({"type": event_type, "content": content})
+
+    def _drain(self) -> List[Dict[str, str]]:
+        events, self._events = self._events, []
+        return events
+
+
+class ThinkingStreamParser(StreamParser):
+    """解析 <thinking>...</thinking><sql>...</sql> 格式的输出
+
+    默认 Prompt 以 "<thinking>" 结尾，模型可能不再重复开标签，所以
+    SQLGenerator 会以 "thinking" 状态启动解析器；重复出现的开标签会被丢弃。
+    </sql> 之后的内容全部丢弃，此时 done 为 True。
+    """
+
+    INITIAL_STATE = "preamble"
+    TRANSITIONS = {
+        "preamble": [
+            ("<thinking>", "thinking", False),
+            ("<sql>", "sql", False),
+        ],
+        "thinking": [
+            ("<thinking>", "thinking", False),
+            ("</thinking>", "between", False),
+            ("<sql>", "sql", False),
+        ],
+        "between": [
+            ("<sql>", "sql", False),
+        ],
+        "sql": [
+            ("</sql>", "done", False),
+        ],
+    }
+    EMIT = {
+        "preamble": None,
+        "thinking": "thinking",
+        "between": None,
+        "sql": "sql",
+        "done": None,
+    }
+
+
+class NativeThinkingStreamParser(StreamParser):
+    """解析不带 thinking 标签的输出：SQL 开始标记之前的文本视为 thinking
+
+    支持的 SQL 开始标记: <sql>、```sql、SQL:、===SQL===，以及直接出现的
+    SELECT 语句（保留 SELECT 本身）。``` 或 </sql> 视为 SQL 结束。
+    """
+
+    INITIAL_STATE = "thinking"
+    TRANSITIONS = {
+        "thinking": [
+            ("<sql>", "sql", False),
+            ("```sql", "sql", False),
+            ("===sql===", "sql", False),
+            ("sql:", "sql", False),
+            ("select ", "sql", True),
+        ],
+        "sql": [
+            ("</sql>", "done", False),
+            ("```", "done", False),
+        ],
+    }
+    EMIT = {
+        "thinking": "thinking",
+        "sql": "sql",
+        "done": None,
+    }
+    BOUNDARY_MARKERS = ("sql:", "select ")
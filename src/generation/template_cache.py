@@ -0,0 +1,305 @@
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from threading import Lock
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import logging
+import re
+
+from sqlalchemy import column, inspect, select, table
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Literal:
+    """问题中抽取出的字面量"""
+    kind: str
+    value: str
+    start: int
+    end: int
+
+
+@dataclass
+class SQLTemplate:
+    """参数化后的 SQL 模板
+
+    slots[i] 描述第 i 个问题字面量绑定到 SQL 的方式：
+    (参数名, 前缀, 后缀, 是否按数字绑定)，例如 LIKE '%上海%' 的前后缀为 "%"。
+    """
+    key: str
+    sql: str
+    kinds: List[str]
+    slots: List[Tuple[str, str, str, bool]]
+    source_question: str
+    successes: int = 1
+    failures: int = 0
+    hits: int = 0
+
+    @property
+    def confidence(self) -> float:
+        return self.successes / (self.successes + self.failures)
+
+
+@dataclass
+class TemplateMatch:
+    """模板命中：SQL 模板和本次问题的绑定参数"""
+    template: SQLTemplate
+    parameters: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def display_sql(self) -> str:
+        """把参数内联后的 SQL，仅用于展示"""
+        def render(match):
+            value = self.parameters[match.group(1)]
+            if isinstance(value, str):
+                return "'" + value.replace("'", "''") + "'"
+            return str(value)
+
+        return re.sub(r":(p\d+)\b", render, self.template.sql)
+
+
+_QUOTED_PATTERN = re.compile(r"[\"'“”‘’「『]([^\"'“”‘’「」『』]+)[\"'“”‘’」』]")
+_DATE_PATTERN = re.compile(
+    r"(\d{4})\s*(?:[-/]|年)\s*(\d{1,2})\s*(?:(?:[-/]|月)\s*(\d{1,2})\s*日?|月)?"
+)
+# 中文字符也属于 \w，所以这里只要求数字两侧不是数字或小数点
+_NUMBER_PATTERN = re.compile(r"(?<![\d.])\d+(?:\.\d+)?(?![\d.])")
+_SQL_STRING_PATTERN = re.compile(r"'(?:[^']|'')*'")
+
+
+class TemplateCache:
+    """问题模板 → 参数化 SQL 的缓存
+
+    把问题中的字面量（引号字符串、日期、数字、列字典中的取值）替换为槽位，
+    得到问题模板。首次成功执行后，把 SQL 中对应的字面量替换为绑定参数并保存；
+    之后相同模板的问题直接绑定新字面量执行，不再调用 LLM。
+
+    只有问题中的每个字面量都能在 SQL 中唯一定位时才会保存模板；命中后执行
+    失败会降低模板置信度，低于 confidence_threshold 的模板不再使用。
+
+    列字典可以直接传入 value_dictionary，也可以传入 value_loader，在第一次
+    抽取字面量时才读取（避免启动时扫描数据库）。
+    """
+
+    def __init__(
+        self,
+        value_dictionary: Optional[Dict[str, str]] = None,
+        confidence_threshold: float = 0.8,
+        max_entries: int = 1000,
+        value_loader: Optional[Callable[[], Dict[str, str]]] = None
+    ):
+        self.confidence_threshold = confidence_threshold
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, SQLTemplate]" = OrderedDict()
+        self._lock = Lock()
+        self._value_loader = value_loader
+        self._load_lock = Lock()
+        # 取值 -> 所属列（table.column）
+        self._value_dictionary: Optional[Dict[str, str]] = None
+        self._values_by_length: List[str] = []
+        if value_dictionary is not None or value_loader is None:
+            self._set_values(value_dictionary or {})
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "rejected": 0,
+            "low_confidence": 0,
+            "failures": 0,
+        }
+
+    @property
+    def value_dictionary(self) -> Dict[str, str]:
+        if self._value_dictionary is None:
+            with self._load_lock:
+                if self._value_dictionary is None:
+                    self._set_values(self._value_loader())
+        return self._value_dictionary
+
+    def _set_values(self, values: Dict[str, str]):
+        self._values_by_length = sorted(values, key=len, reverse=True)
+        self._value_dictionary = values
+
+    def extract(self, question: str) -> Tuple[str, List[Literal]]:
+        """抽取问题中的字面量，返回 (模板 key, 字面量列表)"""
+        literals: List[Literal] = []
+        taken = [False] * len(question)
+
+        def add(kind: str, value: str, start: int, end: int):
+            if any(taken[start:end]):
+                return
+            for i in range(start, end):
+                taken[i] = True
+            literals.append(Literal(kind=kind, value=value, start=start, end=end))
+
+        for match in _QUOTED_PATTERN.finditer(question):
+            add("str", match.group(1), match.start(), match.end())
+
+        for match in _DATE_PATTERN.finditer(question):
+            year, month, day = match.groups()
+            if not 1 <= int(month) <= 12:
+                continue
+            value = f"{year}-{int(month):02d}" + (f"-{int(day):02d}" if day else "")
+            add("date" if day else "month", value, match.start(), match.end())
+
+        value_dictionary = self.value_dictionary
+        for value in self._values_by_length:
+            start = question.find(value)
+            while start != -1:
+                add(f"value:{value_dictionary[value]}", value, start, start + len(value))
+                start = question.find(value, start + len(value))
+
+        for match in _NUMBER_PATTERN.finditer(question):
+            add("number", match.group(0), match.start(), match.end())
+
+        literals.sort(key=lambda literal: literal.start)
+        parts = []
+        cursor = 0
+        for literal in literals:
+            parts.append(question[cursor:literal.start])
+            parts.append("{" + literal.kind + "}")
+            cursor = literal.end
+        parts.append(question[cursor:])
+        key = re.sub(r"\s+", " ", "".join(parts)).strip().lower()
+        return key, literals
+
+    def lookup(self, question: str) -> Optional[TemplateMatch]:
+        key, literals = self.extract(question)
+        with self._lock:
+            template = self._entries.get(key)
+            if template is None:
+                self._stats["misses"] += 1
+                return None
+            if [literal.kind for literal in literals] != template.kinds:
+                self._stats["misses"] += 1
+                return None
+            if template.confidence < self.confidence_threshold:
+                self._stats["low_confidence"] += 1
+                return None
+            self._entries.move_to_end(key)
+            template.hits += 1
+            self._stats["hits"] += 1
+
+        parameters = {}
+        for literal, (name, prefix, suffix, numeric) in zip(literals, template.slots):
+            parameters[name] = _to_number(literal.value) if numeric else f"{prefix}{literal.value}{suffix}"
+        return TemplateMatch(template=template, parameters=parameters)
+
+    def store(self, question: str, sql: str) -> Optional[SQLTemplate]:
+        """参数化成功执行的 SQL 并保存；无法可靠参数化时返回 None"""
+        key, literals = self.extract(question)
+        parameterized = _parameterize(sql, literals)
+        if parameterized is None:
+            with self._lock:
+                self._stats["rejected"] += 1
+            logger.debug(f"无法参数化 SQL，跳过模板缓存: {question}")
+            return None
+
+        template_sql, slots = parameterized
+        template = SQLTemplate(
+            key=key,
+            sql=template_sql,
+            kinds=[literal.kind for literal in literals],
+            slots=slots,
+            source_question=question
+        )
+        with self._lock:
+            self._entries[key] = template
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._stats["stores"] += 1
+        return template
+
+    def record_success(self, match: TemplateMatch):
+        with self._lock:
+            match.template.successes += 1
+
+    def record_failure(self, match: TemplateMatch):
+        with self._lock:
+            match.template.failures += 1
+            self._stats["failures"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        lookups = stats["hits"] + stats["misses"] + stats["low_confidence"]
+        stats["hit_rate"] = stats["hits"] / lookups * 100 if lookups else 0.0
+        return stats
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def _to_number(value: str) -> Any:
+    return float(value) if "." in value else int(value)
+
+
+def _parameterize(sql: str, literals: List[Literal]) -> Optional[Tuple[str, List[Tuple[str, str, str, bool]]]]:
+    """把问题字面量在 SQL 中的出现替换为 :pN，每个字面量必须恰好定位到一处"""
+    if len({literal.value for literal in literals}) != len(literals):
+        return None
+
+    slots = []
+    for index, literal in enumerate(literals):
+        name = f"p{index}"
+        # 字符串字面量内：'上海'、'%上海%'、'2024-01%'
+        string_pattern = re.compile(r"'(%?)" + re.escape(literal.value.replace("'", "''")) + r"(%?)'")
+        string_hits = [m for m in string_pattern.finditer(sql)]
+        number_hits = []
+        if literal.kind == "number":
+            number_pattern = re.compile(r"(?<![\w.:])" + re.escape(literal.value) + r"(?![\w.])")
+            number_hits = [m for m in number_pattern.finditer(sql) if not _inside_string(sql, m.start())]
+
+        if len(string_hits) + len(number_hits) != 1:
+            return None
+
+        if string_hits:
+            match = string_hits[0]
+            slots.append((name, match.group(1), match.group(2), False))
+        else:
+            match = number_hits[0]
+            slots.append((name, "", "", True))
+        sql = sql[:match.start()] + f":{name}" + sql[match.end():]
+
+    return sql, slots
+
+
+def _inside_string(sql: str, position: int) -> bool:
+    return any(m.start() < position < m.end() for m in _SQL_STRING_PATTERN.finditer(sql))
+
+
+def load_column_values(database: Any, max_values: int = 100) -> Dict[str, str]:
+    """读取低基数文本列的取值，作为字面量识别用的列字典（取值 -> table.column）"""
+    values: Dict[str, str] = {}
+    try:
+        inspector = inspect(database._engine)
+    except Exception as e:
+        logger.warning(f"无法读取列字典: {e}")
+        return values
+
+    with database._engine.connect() as conn:
+        for table_name in database.get_usable_table_names():
+            for column_info in inspector.get_columns(table_name):
+                type_name = str(column_info["type"]).upper()
+                if not any(t in type_name for t in ("CHAR", "TEXT", "STRING")):
+                    continue
+                name = column_info["name"]
+                try:
+                    rows = conn.execute(distinct_values_query(table_name, name, max_values + 1)).fetchall()
+                except Exception as e:
+                    logger.debug(f"读取 {table_name}.{name} 取值失败: {e}")
+                    continue
+                if len(rows) > max_values:
+                    continue
+                for (value,) in rows:
+                    if isinstance(value, str) and len(value) >= 2:
+                        values.setdefault(value, f"{table_name}.{name}")
+    return values
+
+
+def distinct_values_query(table_name: str, column_name: str, limit: int):
+    """SELECT DISTINCT column FROM table 限制行数；标识符引用和行数限制由方言编译"""
+    source = table(table_name, column(column_name))
+    return select(source.c[column_name]).distinct().limit(limit)
@@ -2,22 +2,28 @@
 NL2SQL Main Entry Point.
 
 Provides CLI and FastAPI dual-mode entry.
+
+Heavy dependencies (the orchestrator, LLM provider SDKs, FastAPI) are imported
+by the code paths that need them, so `cli tables` / `cli schema` only load the
+database layer and `python -X importtime -m src.main` stays cheap.
 """
 import argparse
+import asyncio
 import logging
 import sys
 import json
+import time
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
 
-from fastapi import FastAPI, HTTPException, Request
-from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
 from .config import Settings, get_settings
-from .core.orchestrator import NL2SQLOrchestrator
-from .generation.llm_factory import create_llm
+
+if TYPE_CHECKING:
+    from fastapi import FastAPI
+    from .core.orchestrator import NL2SQLOrchestrator
+    from .generation.llm_replay import Cassette
 
 
 logger = logging.getLogger(__name__)
@@ -33,6 +39,12 @@ class StreamQueryRequest(BaseModel):
     include_sql: bool = False
 
 
+class BatchQueryRequest(BaseModel):
+    questions: List[str]
+    include_sql: bool = False
+    concurrency: Optional[int] = None
+
+
 class QueryResponse(BaseModel):
     question: str
     result: Any
@@ -41,16 +53,94 @@ class QueryResponse(BaseModel):
     error: Optional[str] = None
 
 
-_orchestrator_instance: Optional[NL2SQLOrchestrator] = None
+_orchestrator_instance: Optional["NL2SQLOrchestrator"] = None
+
+
+def _format_result(result: Any) -> str:
+    """Render a serialized result set as a plain-text table for the CLI."""
+    from .execution.result_handler import ResultHandler
+    
+    if isinstance(result, dict) and "columns" in result:
+        result = [dict(zip(result["columns"], row)) for row in result["rows"]]
+    return ResultHandler().handle(result, "table")
+
+
+def _apply_gateway(llm: Any, provider: str, settings: Settings) -> Any:
+    """Queue LLM calls behind the shared per-provider gateway."""
+    if llm is None or not settings.llm_gateway_enabled:
+        return llm
+    from .generation.llm_gateway import get_gateway, with_gateway
+    
+    gateway = get_gateway(
+        provider,
+        max_in_flight=settings.llm_gateway_max_in_flight,
+        requests_per_minute=settings.llm_gateway_requests_per_minute,
+        tokens_per_minute=settings.llm_gateway_tokens_per_minute,
+        queue_timeout=settings.llm_gateway_queue_timeout,
+    )
+    return with_gateway(llm, gateway)
+
+
+def _apply_hedging(llm: Any, settings: Settings) -> Any:
+    """Hedge slow first tokens and fail over to the fallback provider."""
+    if llm is None or not settings.llm_fallback_model:
+        return llm
+    from .generation.llm_factory import create_llm
+    from .generation.llm_hedging import HedgedChatModel
+    
+    provider = settings.llm_fallback_provider or settings.llm_provider
+    try:
+        fallback = create_llm(
+            provider=provider,
+            model=settings.llm_fallback_model,
+            api_key=settings.llm_fallback_api_key or None,
+            base_url=settings.llm_fallback_base_url or None,
+            temperature=settings.llm_temperature,
+            max_connections=settings.llm_gateway_max_connections,
+        )
+    except ImportError as e:
+        logger.warning(f"Failed to create fallback LLM (dependency missing): {e}")
+        return llm
+    fallback = _apply_gateway(fallback, provider, settings)
+    return HedgedChatModel(
+        providers=[llm, fallback],
+        provider_names=[settings.llm_provider, f"{provider}:{settings.llm_fallback_model}"],
+        hedge_percentile=settings.llm_hedging_percentile,
+        initial_hedge_delay=settings.llm_hedging_initial_delay,
+        failure_threshold=settings.llm_hedging_failure_threshold,
+        cooldown=settings.llm_hedging_cooldown,
+    )
+
+
+def _apply_cassette(llm: Any, cassette: Optional["Cassette"], settings: Settings) -> Any:
+    """Record LLM traffic into, or replay it from, the configured cassette."""
+    if cassette is None:
+        return llm
+    from .generation.llm_replay import RecordingChatModel, ReplayChatModel
+    
+    if settings.llm_cassette_mode == "replay":
+        return ReplayChatModel(cassette=cassette, speed=settings.llm_cassette_speed)
+    if llm is not None:
+        return RecordingChatModel(inner=llm, cassette=cassette)
+    return llm
 
 
-def create_orchestrator(settings: Settings) -> NL2SQLOrchestrator:
+def create_orchestrator(settings: Settings) -> "NL2SQLOrchestrator":
     """Create NL2SQLOrchestrator instance from settings."""
     global _orchestrator_instance
     
     if _orchestrator_instance is not None:
         return _orchestrator_instance
     
+    from .core.orchestrator import NL2SQLOrchestrator
+    from .generation.llm_factory import create_embeddings, create_llm
+    from .generation.llm_replay import Cassette
+    
+    cassette = None
+    if settings.llm_cassette_mode in ("record", "replay"):
+        cassette = Cassette(settings.llm_cassette_path)
+        logger.info(f"LLM cassette {settings.llm_cassette_mode}: {settings.llm_cassette_path}")
+    
     try:
         llm = create_llm(
             provider=settings.llm_provider,
@@ -60,52 +150,369 @@ def create_orchestrator(settings: Settings) -> NL2SQLOrchestrator:
             temperature=settings.llm_temperature,
             thinking=settings.llm_thinking_enabled,
             thinking_budget=settings.llm_thinking_budget,
+            max_connections=settings.llm_gateway_max_connections,
         )
     except ImportError as e:
         logger.warning(f"Failed to create LLM (dependency missing): {e}")
         llm = None
+    llm = _apply_gateway(llm, settings.llm_provider, settings)
+    llm = _apply_hedging(llm, settings)
+    llm = _apply_cassette(llm, cassette, settings)
+    
+    fast_llm = None
+    if llm is not None and settings.llm_fast_model:
+        try:
+            fast_llm = create_llm(
+                provider=settings.llm_fast_provider or settings.llm_provider,
+                model=settings.llm_fast_model,
+                api_key=settings.llm_api_key or settings.minimax_api_key,
+                base_url=settings.llm_base_url or settings.minimax_base_url,
+                temperature=settings.llm_temperature,
+                max_connections=settings.llm_gateway_max_connections,
+            )
+        except ImportError as e:
+            logger.warning(f"Failed to create fast LLM (dependency missing): {e}")
+        fast_llm = _apply_gateway(fast_llm, settings.llm_fast_provider or settings.llm_provider, settings)
+        fast_llm = _apply_cassette(fast_llm, cassette, settings)
     
     config = {
         "field_descriptions_path": settings.path_field_descriptions,
         "semantic_mappings_path": settings.path_semantic_mappings,
         "security_policy_path": settings.path_security_policy,
         "max_retries": settings.security_max_retries,
+        "retry_interval": settings.execution_retry_interval,
         "timeout": settings.security_timeout,
+        "query_timeout": settings.database_query_timeout,
+        "execution_timeout": settings.execution_timeout,
         "read_only": settings.security_read_only,
         "allowed_tables": settings.security_allowed_tables,
         "max_rows": settings.security_max_rows,
+        "cost_guard_enabled": settings.security_cost_guard_enabled,
+        "cost_guard_policy": settings.security_cost_guard_policy,
+        "cost_guard_max_cost": settings.security_cost_guard_max_cost,
+        "cost_guard_max_rows": settings.security_cost_guard_max_rows,
+        "cost_guard_full_scan_rows": settings.security_cost_guard_full_scan_rows,
+        "cost_guard_limit_rows": settings.security_cost_guard_limit_rows,
+        "cost_guard_queue_slots": settings.security_cost_guard_queue_slots,
+        "cost_guard_queue_timeout": settings.security_cost_guard_queue_timeout,
+        "cost_guard_plan_ttl": settings.security_cost_guard_plan_ttl,
+        "fetch_batch_size": settings.execution_batch_size,
+        "schema_check_enabled": settings.execution_schema_check,
+        "schema_check_max_distance": settings.execution_schema_check_max_distance,
+        "execution_history_size": settings.execution_history_size,
+        "async_workers": settings.execution_async_workers,
+        "stage_workers": settings.execution_stage_workers,
+        "batch_concurrency": settings.execution_batch_concurrency,
+        "slow_query_threshold": settings.execution_slow_query_threshold,
+        "slow_query_log": settings.execution_slow_query_log,
+        "slow_query_log_max_bytes": settings.execution_slow_query_log_max_size * 1024 * 1024,
+        "slow_query_log_backup_count": settings.execution_slow_query_log_backup_count,
         "explanation_enabled": settings.explanation_enabled,
         "explanation_mode": settings.explanation_mode,
         "explanation_format": settings.explanation_format,
         "explanation_language": settings.explanation_language,
         "semantic_enabled": settings.semantic_enabled,
+        "early_stop": settings.llm_early_stop,
+        "candidate_count": settings.generation_candidates,
+        "candidate_timeout": settings.generation_candidate_timeout,
+        "router_threshold": settings.llm_router_threshold,
+        "template_cache_enabled": settings.cache_template_enabled,
+        "template_confidence": settings.cache_template_confidence,
+        "template_max_entries": settings.cache_template_max_entries,
+        "template_dictionary_max_values": settings.cache_dictionary_max_values,
+        "semantic_cache_enabled": settings.cache_semantic_enabled,
+        "semantic_cache_threshold": settings.cache_semantic_threshold,
+        "semantic_cache_max_entries": settings.cache_semantic_max_entries,
+        "semantic_cache_ttl": settings.cache_semantic_ttl,
+        "semantic_cache_reexecute": settings.cache_semantic_reexecute,
+        "semantic_cache_audit_rate": settings.cache_semantic_audit_rate,
+        "result_cache_enabled": settings.cache_result_enabled,
+        "result_cache_max_entries": settings.cache_result_max_entries,
+        "result_cache_max_bytes": settings.cache_result_max_bytes,
+        "result_cache_ttl": settings.cache_result_ttl,
+        "result_cache_stale_while_revalidate": settings.cache_result_stale_while_revalidate,
+        "result_cache_compress_threshold": settings.cache_result_compress_threshold,
+        "coalesce_enabled": settings.cache_coalesce_enabled,
+        "schema_doc_ttl": settings.cache_schema_doc_ttl,
     }
     
+    embeddings = None
+    if settings.cache_semantic_enabled:
+        try:
+            embeddings = create_embeddings(
+                provider=settings.semantic_vector_provider,
+                model=settings.semantic_vector_model,
+            )
+        except Exception as e:
+            logger.warning(f"Failed to create embeddings, semantic cache disabled: {e}")
+    
     _orchestrator_instance = NL2SQLOrchestrator(
         llm=llm,
         database_uri=settings.database_uri,
-        config=config
+        config=config,
+        fast_llm=fast_llm,
+        embeddings=embeddings
     )
     
     return _orchestrator_instance
 
 
+def _read_questions(source: str) -> List[str]:
+    """Read one question per line from a file or stdin ("-"), skipping blanks and # comments."""
+    if source == "-":
+        lines = sys.stdin.read().splitlines()
+    else:
+        lines = Path(source).read_text(encoding="utf-8").splitlines()
+    return [line.strip() for line in lines if line.strip() and not line.lstrip().startswith("#")]
+
+
+def _load_checkpoint(path: str) -> Dict[int, str]:
+    """Indexes already answered in an existing JSONL output, mapped to their question."""
+    done: Dict[int, str] = {}
+    if path == "-" or not Path(path).exists():
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A line cut short by an interrupted run is simply redone
+                continue
+            if isinstance(record, dict) and "index" in record:
+                done[record["index"]] = record.get("question")
+    return done
+
+
+def _trim_partial_line(path: str) -> None:
+    """Drop a trailing line left unfinished by an interrupted run before appending."""
+    if path == "-" or not Path(path).exists():
+        return
+    with open(path, "rb+") as f:
+        data = f.read()
+        if data and not data.endswith(b"\n"):
+            f.truncate(data.rfind(b"\n") + 1)
+
+
+def _batch_record(index: int, item: Any) -> Dict[str, Any]:
+    from .execution.result_set import serialize_result
+    
+    result = item.result
+    return {
+        "index": index,
+        "question": result.question,
+        "status": result.status.value,
+        "sql": result.sql or None,
+        "result": serialize_result(result.execution.result) if result.execution else None,
+        "explanation": result.explanation or None,
+        "error": result.error_message or None,
+        "duplicate": item.duplicate,
+        "elapsed": result.metadata.get("execution_time"),
+        "timings": result.metadata.get("timings"),
+    }
+
+
+def run_batch(args: argparse.Namespace, orchestrator: "NL2SQLOrchestrator", settings: Settings) -> None:
+    """Answer a file of questions with one warm orchestrator, streaming JSONL results."""
+    from .execution.query_monitor import LatencyHistogram
+    
+    questions = _read_questions(args.input)
+    done = {}
+    if args.resume:
+        done = _load_checkpoint(args.output)
+        _trim_partial_line(args.output)
+    pending = [
+        (index, question) for index, question in enumerate(questions)
+        if done.get(index) != question
+    ]
+    
+    out = sys.stdout if args.output == "-" else open(
+        args.output, "a" if args.resume else "w", encoding="utf-8"
+    )
+    histogram = LatencyHistogram()
+    statuses: Dict[str, int] = {}
+    started = time.monotonic()
+    
+    async def consume():
+        batch = orchestrator.ask_many(
+            [question for _, question in pending],
+            concurrency=args.concurrency or settings.execution_batch_concurrency
+        )
+        async for item in batch:
+            record = _batch_record(pending[item.index][0], item)
+            # Flushing every line makes the output file the resume checkpoint
+            out.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+            out.flush()
+            statuses[record["status"]] = statuses.get(record["status"], 0) + 1
+            if record["elapsed"] is not None:
+                histogram.record(record["elapsed"])
+    
+    try:
+        if pending:
+            asyncio.run(consume())
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    
+    elapsed = time.monotonic() - started
+    answered = sum(statuses.values())
+    latency = histogram.summary()
+    print(
+        f"Batch: {answered} answered, {len(questions) - len(pending)} skipped (checkpoint), "
+        f"{statuses.get('success', 0)} succeeded in {elapsed:.1f}s "
+        f"({answered / elapsed if elapsed > 0 else 0.0:.2f} q/s)",
+        file=sys.stderr
+    )
+    print(
+        f"Latency: p50={latency['p50']:.2f}s p90={latency['p90']:.2f}s "
+        f"p99={latency['p99']:.2f}s max={latency['max']:.2f}s",
+        file=sys.stderr
+    )
+    if statuses:
+        print(f"Statuses: {json.dumps(statuses, ensure_ascii=False)}", file=sys.stderr)
+
+
+REPL_HELP = """Commands:
+  \\timing [on|off]   Show total and per-stage latency after each question
+  \\sql [on|off]      Show the generated SQL
+  \\tables            List tables
+  \\schema <table>    Show a table's schema
+  \\stats             Show cache statistics
+  \\help              Show this help
+  \\q                 Quit (also: quit, exit, Ctrl-D)
+Anything else is asked as a question."""
+
+
+def _toggle(value: bool, argument: str) -> bool:
+    if argument in ("on", "off"):
+        return argument == "on"
+    return not value
+
+
+def _format_timings(result: Any) -> str:
+    """One line for the total, one for the stages, one for the critical path."""
+    timings = result.metadata.get("timings") or {}
+    lines = [f"Time: {timings.get('total', result.metadata.get('execution_time', 0.0)) * 1000:.1f} ms"]
+    hits = [name for name in ("template_cache", "semantic_cache") if name in result.metadata]
+    if result.execution is not None and result.execution.cached:
+        hits.append("result_cache")
+    if hits:
+        lines[0] += f" (cache hit: {', '.join(hits)})"
+    stages = timings.get("stages") or []
+    if stages:
+        lines.append("  " + ", ".join(f"{s['stage']} {s['duration'] * 1000:.1f} ms" for s in stages))
+    if timings.get("critical_path"):
+        lines.append("  critical path: " + " -> ".join(timings["critical_path"]))
+    return "\n".join(lines)
+
+
+def run_repl(
+    orchestrator: "NL2SQLOrchestrator",
+    history_path: Optional[str] = None,
+    input_fn: Any = input
+) -> None:
+    """Interactive session that keeps one orchestrator (caches, connections, schema) warm."""
+    from .execution.result_set import serialize_result
+    
+    try:
+        import readline
+    except ImportError:
+        readline = None
+    history = Path(history_path).expanduser() if history_path else None
+    if readline is not None and history is not None and history.exists():
+        readline.read_history_file(str(history))
+    
+    started = time.monotonic()
+    orchestrator._prepare_schema()
+    print(f"NL2SQL REPL - schema ready in {(time.monotonic() - started) * 1000:.0f} ms. Type \\help for commands.")
+    
+    show_timing = False
+    show_sql = True
+    try:
+        while True:
+            try:
+                line = input_fn("nl2sql> ").strip()
+            except EOFError:
+                print()
+                break
+            except KeyboardInterrupt:
+                print()
+                continue
+            if not line:
+                continue
+            if line in ("quit", "exit"):
+                break
+            
+            if line.startswith("\\"):
+                command, _, argument = line[1:].partition(" ")
+                argument = argument.strip()
+                if command in ("q", "quit"):
+                    break
+                elif command == "timing":
+                    show_timing = _toggle(show_timing, argument)
+                    print(f"Timing is {'on' if show_timing else 'off'}.")
+                elif command == "sql":
+                    show_sql = _toggle(show_sql, argument)
+                    print(f"SQL display is {'on' if show_sql else 'off'}.")
+                elif command == "tables":
+                    for table in orchestrator.get_table_names():
+                        print(f"  - {table}")
+                elif command == "schema" and argument:
+                    print(orchestrator.get_schema(argument))
+                elif command == "stats":
+                    print(json.dumps(orchestrator.get_cache_stats(), ensure_ascii=False, indent=2, default=str))
+                elif command in ("help", "?"):
+                    print(REPL_HELP)
+                else:
+                    print(f"Unknown command: \\{command}. Type \\help for commands.")
+                continue
+            
+            try:
+                result = orchestrator.ask(line)
+            except KeyboardInterrupt:
+                print("Cancelled.")
+                continue
+            
+            if show_sql and result.sql:
+                print(f"SQL: {result.sql}")
+            if result.status.value == "success":
+                if result.execution and result.execution.result:
+                    print(_format_result(serialize_result(result.execution.result)))
+                if result.explanation:
+                    print(result.explanation)
+            else:
+                print(f"Error: {result.status.value}")
+                if result.error_message:
+                    print(f"Details: {result.error_message}")
+            if show_timing:
+                print(_format_timings(result))
+    finally:
+        if readline is not None and history is not None:
+            history.parent.mkdir(parents=True, exist_ok=True)
+            readline.write_history_file(str(history))
+
+
 def run_cli(args: argparse.Namespace, settings: Settings) -> None:
     """Run CLI mode."""
-    orchestrator = create_orchestrator(settings)
-    
-    if args.command == "tables":
-        tables = orchestrator.get_table_names()
-        print("Available tables:")
-        for table in tables:
-            print(f"  - {table}")
+    if args.command in ("tables", "schema"):
+        # Metadata commands only need the database, not the LLM stack
+        from .schema.database_connector import DatabaseConnectorFactory
+        
+        connector = DatabaseConnectorFactory.create_from_uri(settings.database_uri)
+        if args.command == "tables":
+            print("Available tables:")
+            for table in connector.get_usable_tables():
+                print(f"  - {table}")
+        else:
+            from .schema.schema_extractor import SchemaExtractor
+            
+            schema = SchemaExtractor(connector.db).get_table_schema(args.table)
+            print(f"Schema for table '{args.table}':")
+            print(schema)
         return
     
-    if args.command == "schema":
-        schema = orchestrator.get_schema(args.table)
-        print(f"Schema for table '{args.table}':")
-        print(schema)
-        return
+    from .execution.result_set import serialize_result
+    
+    orchestrator = create_orchestrator(settings)
     
     if args.command == "query":
         if orchestrator.llm is None:
@@ -117,6 +524,7 @@ def run_cli(args: argparse.Namespace, settings: Settings) -> None:
             print(f"\nQuestion: {args.question}")
             print("-" * 50)
             
+            rows = []
             for chunk in orchestrator.ask_stream(args.question):
                 stage = chunk.get("stage")
                 status = chunk.get("status")
@@ -138,10 +546,15 @@ def run_cli(args: argparse.Namespace, settings: Settings) -> None:
                 elif stage == "security" and status == "success":
                     print(f"[4/6] 安全验证: ✓")
                     
+                elif stage == "execution_rows":
+                    rows.extend(chunk['data']['rows'])
+                    
                 elif stage == "execution" and status == "success":
                     print(f"[5/6] SQL 执行: ✓")
-                    if chunk['data'].get('result'):
-                        print(f"结果: {chunk['data']['result']}")
+                    if rows:
+                        print(f"结果:\n{_format_result({'columns': chunk['data']['columns'], 'rows': rows})}")
+                    if chunk['data'].get('truncated'):
+                        print(f"(结果已截断为 {chunk['data']['row_count']} 行)")
                     
                 elif stage == "explaining" and status == "streaming":
                     print(f"[6/6] 解释: {chunk.get('chunk')}", end="", flush=True)
@@ -160,7 +573,7 @@ def run_cli(args: argparse.Namespace, settings: Settings) -> None:
                 if args.show_sql and result.sql:
                     print(f"\nSQL: {result.sql}")
                 if result.execution and result.execution.result:
-                    print(f"\nResult: {result.execution.result}")
+                    print(f"\nResult:\n{_format_result(serialize_result(result.execution.result))}")
                 if result.explanation:
                     print(f"\nExplanation: {result.explanation}")
             else:
@@ -170,12 +583,36 @@ def run_cli(args: argparse.Namespace, settings: Settings) -> None:
                 sys.exit(1)
         return
     
+    if args.command == "batch":
+        if orchestrator.llm is None:
+            print("Error: LLM not available. Please install required dependencies.")
+            print("Run: pip install langchain-anthropic")
+            sys.exit(1)
+        run_batch(args, orchestrator, settings)
+        return
+    
+    if args.command == "repl":
+        if orchestrator.llm is None:
+            print("Error: LLM not available. Please install required dependencies.")
+            print("Run: pip install langchain-anthropic")
+            sys.exit(1)
+        run_repl(orchestrator, history_path=args.history or None)
+        return
+    
     print(f"Unknown command: {args.command}")
     sys.exit(1)
 
 
-def create_app(settings: Optional[Settings] = None) -> FastAPI:
+def create_app(settings: Optional[Settings] = None) -> "FastAPI":
     """Create FastAPI application."""
+    from fastapi import FastAPI, HTTPException, Request
+    from fastapi.middleware.cors import CORSMiddleware
+    from fastapi.responses import StreamingResponse
+    from starlette.concurrency import run_in_threadpool
+    
+    from .execution.query_timeout import CancelToken
+    from .execution.result_set import serialize_result
+    
     if settings is None:
         settings = get_settings()
     
@@ -197,17 +634,37 @@ def create_app(settings: Optional[Settings] = None) -> FastAPI:
     async def health_check() -> Dict[str, str]:
         return {"status": "healthy", "service": "nl2sql"}
     
+    @app.get("/metrics/routing")
+    async def routing_metrics() -> Dict[str, Any]:
+        orchestrator = create_orchestrator(settings)
+        return orchestrator.get_routing_stats()
+    
+    @app.get("/metrics/llm")
+    async def llm_metrics() -> Dict[str, Any]:
+        orchestrator = create_orchestrator(settings)
+        return orchestrator.get_gateway_stats()
+    
+    @app.get("/metrics/execution")
+    async def execution_metrics() -> Dict[str, Any]:
+        orchestrator = create_orchestrator(settings)
+        return orchestrator.get_execution_stats()
+    
+    @app.get("/metrics/cache")
+    async def cache_metrics() -> Dict[str, Any]:
+        orchestrator = create_orchestrator(settings)
+        return orchestrator.get_cache_stats()
+    
     @app.get("/tables")
     async def list_tables() -> Dict[str, List[str]]:
         orchestrator = create_orchestrator(settings)
-        tables = orchestrator.get_table_names()
+        tables = await run_in_threadpool(orchestrator.get_table_names)
         return {"tables": tables}
     
     @app.get("/schema/{table_name}")
     async def get_table_schema(table_name: str) -> Dict[str, Any]:
         try:
             orchestrator = create_orchestrator(settings)
-            schema = orchestrator.get_schema(table_name)
+            schema = await run_in_threadpool(orchestrator.get_schema, table_name)
             
             if not schema:
                 raise HTTPException(status_code=404, detail=f"Table '{table_name}' not found")
@@ -224,11 +681,11 @@ def create_app(settings: Optional[Settings] = None) -> FastAPI:
         try:
             orchestrator = create_orchestrator(settings)
             
-            result = orchestrator.ask(request.question)
+            result = await orchestrator.ask_async(request.question)
             
             return QueryResponse(
                 question=result.question,
-                result=result.execution.result if result.execution else None,
+                result=serialize_result(result.execution.result) if result.execution else None,
                 sql=result.sql if request.include_sql else None,
                 status=result.status.value,
                 error=result.error_message
@@ -237,13 +694,49 @@ def create_app(settings: Optional[Settings] = None) -> FastAPI:
             logger.exception("Query execution failed")
             raise HTTPException(status_code=500, detail=str(e))
     
+    @app.post("/query/batch")
+    async def query_batch(request: BatchQueryRequest) -> StreamingResponse:
+        async def line_generator():
+            try:
+                orchestrator = create_orchestrator(settings)
+                batch = orchestrator.ask_many(
+                    request.questions,
+                    concurrency=min(
+                        request.concurrency or settings.execution_batch_concurrency,
+                        settings.execution_batch_concurrency
+                    )
+                )
+                # One JSON line per question in completion order, then the summary
+                async for item in batch:
+                    result = item.result
+                    line = {
+                        "index": item.index,
+                        "question": result.question,
+                        "status": result.status.value,
+                        "result": serialize_result(result.execution.result) if result.execution else None,
+                        "error": result.error_message or None,
+                        "duplicate": item.duplicate,
+                    }
+                    if request.include_sql:
+                        line["sql"] = result.sql
+                    yield json.dumps(line, ensure_ascii=False, default=str) + "\n"
+                yield json.dumps({"summary": batch.summary()}, ensure_ascii=False) + "\n"
+            except Exception as e:
+                logger.exception("批量查询失败")
+                yield json.dumps({"error": str(e)}, ensure_ascii=False) + "\n"
+        
+        return StreamingResponse(line_generator(), media_type="application/x-ndjson")
+    
     @app.post("/query/stream")
     async def query_stream(request: StreamQueryRequest, http_request: Request) -> StreamingResponse:
         async def event_generator():
+            cancel = CancelToken()
             try:
                 orchestrator = create_orchestrator(settings)
                 
-                for chunk in orchestrator.ask_stream(request.question):
+                # LLM output is streamed natively; database batches are read on the
+                # orchestrator's bounded pool, so the event loop stays free.
+                async for chunk in orchestrator.astream(request.question, cancel=cancel):
                     data = {
                         "stage": chunk.get("stage"),
                         "status": chunk.get("status"),
@@ -270,6 +763,9 @@ def create_app(settings: Optional[Settings] = None) -> FastAPI:
                     "error": str(e)
                 }, ensure_ascii=False)
                 yield f"data: {error_data}\n\n"
+            finally:
+                # Client went away or the response was aborted: stop the running query
+                cancel.cancel()
         
         return StreamingResponse(
             event_generator(),
@@ -321,6 +817,17 @@ def main():
     query_parser.add_argument("--stream", action="store_true", help="Stream output results")
     query_parser.set_defaults(command="query")
     
+    batch_parser = cli_subparsers.add_parser("batch", help="Answer a file of questions to JSONL")
+    batch_parser.add_argument("input", type=str, nargs="?", default="-", help="Question file, one per line (default: stdin)")
+    batch_parser.add_argument("-o", "--output", type=str, default="-", help="JSONL output file (default: stdout)")
+    batch_parser.add_argument("--concurrency", type=int, default=None, help="Questions processed at once")
+    batch_parser.add_argument("--resume", action="store_true", help="Skip questions already answered in the output file")
+    batch_parser.set_defaults(command="batch")
+    
+    repl_parser = cli_subparsers.add_parser("repl", help="Interactive session with a warm orchestrator")
+    repl_parser.add_argument("--history", type=str, default="~/.nl2sql_history", help="History file (empty to disable)")
+    repl_parser.set_defaults(command="repl")
+    
     api_parser = subparsers.add_parser("api", help="API mode")
     api_parser.add_argument("--host", type=str, default=None, help="API host")
     api_parser.add_argument("--port", type=int, default=None, help="API port")
@@ -341,7 +848,7 @@ def main():
     
     if args.mode == "cli":
         if not hasattr(args, "command"):
-            print("Error: CLI mode requires a command (tables, schema, or query)")
+            print("Error: CLI mode requires a command (tables, schema, query, batch, or repl)")
             sys.exit(1)
         run_cli(args, settings)
     
@@ -79,6 +79,12 @@ class DatabaseConnectorFactory:
     def create_sqlite(db_path: str) -> DatabaseConnector:
         return DatabaseConnector(db_type="sqlite", db_path=db_path)
 
+    @staticmethod
+    def create_from_uri(database_uri: str) -> DatabaseConnector:
+        """按配置中的 database_uri 创建 SQLite 连接（sqlite:/// 前缀可省略）"""
+        db_path = database_uri.replace("sqlite:///", "") if database_uri.startswith("sqlite:///") else database_uri
+        return DatabaseConnectorFactory.create_sqlite(db_path)
+
     @staticmethod
     def create_mysql(
         host: str = "localhost",
@@ -3,6 +3,7 @@ from .permission_manager import PermissionManager, PermissionLevel, TablePermiss
 from .sensitive_filter import SensitiveDataFilter
 from .injection_detector import SQLInjectionDetector, InjectionIndicator
 from .audit_logger import AuditLogger
+from .cost_guard import QueryCostGuard, CostAction, CostDecision, PlanEstimate
 
 __all__ = [
     "SQLSecurityValidator",
@@ -15,4 +16,8 @@ __all__ = [
     "SQLInjectionDetector",
     "InjectionIndicator",
     "AuditLogger",
+    "QueryCostGuard",
+    "CostAction",
+    "CostDecision",
+    "PlanEstimate",
 ]
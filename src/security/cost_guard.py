@@ -0,0 +1,499 @@
+import json
+import logging
+import re
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from enum import Enum
+from threading import BoundedSemaphore, Lock, local
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import sqlparse
+from sqlalchemy import text
+from sqlparse import tokens as T
+
+from ..execution.result_cache import normalize_sql
+
+logger = logging.getLogger(__name__)
+
+_ROW_LIMIT_KEYWORDS = {"LIMIT", "FETCH", "TOP", "ROWNUM"}
+_AGGREGATES = {
+    "COUNT", "SUM", "AVG", "MIN", "MAX", "TOTAL", "GROUP_CONCAT", "STRING_AGG",
+    "ARRAY_AGG", "LISTAGG", "STDDEV", "VARIANCE",
+}
+
+
+class CostAction(Enum):
+    """代价守卫的处理动作"""
+    ALLOW = "allow"
+    REJECT = "reject"
+    LIMIT = "limit"
+    QUEUE = "queue"
+
+
+@dataclass
+class PlanEstimate:
+    """执行计划估算：代价、行数和全表扫描的表"""
+    dialect: str
+    cost: Optional[float] = None
+    rows: Optional[float] = None
+    full_scans: List[str] = field(default_factory=list)
+    plan: Any = None
+
+
+@dataclass
+class CostDecision:
+    """代价守卫的决定；sql 为实际应执行的语句（LIMIT 策略下已改写）"""
+    action: CostAction
+    sql: str
+    estimate: Optional[PlanEstimate] = None
+    reasons: List[str] = field(default_factory=list)
+    message: str = ""
+    cached: bool = False
+
+    @property
+    def rejected(self) -> bool:
+        return self.action == CostAction.REJECT
+
+    def summary(self) -> Dict[str, Any]:
+        summary = {
+            "action": self.action.value,
+            "reasons": self.reasons,
+            "plan_cached": self.cached,
+        }
+        if self.estimate is not None:
+            summary.update({
+                "cost": self.estimate.cost,
+                "rows": self.estimate.rows,
+                "full_scans": self.estimate.full_scans,
+            })
+        if self.action == CostAction.LIMIT:
+            summary["sql"] = self.sql
+        return summary
+
+
+class QueryCostGuard:
+    """执行前的代价守卫
+
+    按方言获取执行计划（SQLite: EXPLAIN QUERY PLAN；PostgreSQL: EXPLAIN (FORMAT JSON)；
+    MySQL: EXPLAIN FORMAT=JSON；Oracle: EXPLAIN PLAN + PLAN_TABLE），提取估算代价、
+    行数和全表扫描，超过阈值时按 policy 处理：
+
+    - reject: 拒绝执行
+    - limit: 给没有 LIMIT 的查询加上 LIMIT limit_rows；外层已有 LIMIT，或只返回一行
+      聚合结果（LIMIT 不减少扫描）的按 reject 处理
+    - queue: 放入容量为 queue_slots 的重查询通道排队执行，等待超过 queue_timeout 则拒绝
+
+    SQLite 的计划没有代价和行数，按扫描表的行数（sqlite_stat1 或 COUNT(*)）
+    粗略估算：同一层连接的嵌套循环相乘，子查询和复合查询的各部分相加。
+    计划按 SQL 指纹缓存 plan_ttl 秒。
+    """
+
+    POLICIES = ("reject", "limit", "queue")
+
+    def __init__(
+        self,
+        database: Any,
+        policy: str = "reject",
+        max_cost: Optional[float] = None,
+        max_rows: Optional[float] = None,
+        full_scan_rows: Optional[int] = None,
+        limit_rows: int = 1000,
+        queue_slots: int = 2,
+        queue_timeout: float = 30.0,
+        plan_ttl: float = 300.0,
+        max_plans: int = 1000
+    ):
+        """
+        初始化代价守卫
+
+        Args:
+            database: SQLDatabase 实例
+            policy: 超过阈值时的处理方式 reject / limit / queue
+            max_cost: 估算代价上限（数据库原生代价单位，SQLite 无代价）
+            max_rows: 估算扫描行数上限
+            full_scan_rows: 全表扫描行数超过该值的表视为昂贵
+            limit_rows: limit 策略追加的行数上限
+            queue_slots: queue 策略下同时执行的昂贵查询数
+            queue_timeout: queue 策略下等待执行的最长时间（秒）
+            plan_ttl: 计划缓存有效期（秒）
+            max_plans: 计划缓存条数上限
+        """
+        if policy not in self.POLICIES:
+            raise ValueError(f"不支持的代价策略: {policy}")
+        self.database = database
+        self.dialect = database._engine.dialect.name
+        self.policy = policy
+        self.max_cost = max_cost
+        self.max_rows = max_rows
+        self.full_scan_rows = full_scan_rows
+        self.limit_rows = limit_rows
+        self.queue_timeout = queue_timeout
+        self.plan_ttl = plan_ttl
+        self.max_plans = max_plans
+        self._slots = BoundedSemaphore(max(queue_slots, 1))
+        # 当前线程已占用的通道数：执行器重新估算修复后的 SQL 时嵌套 admit，不重复占用
+        self._held = local()
+        self._lock = Lock()
+        self._plans: "OrderedDict[str, Tuple[float, PlanEstimate]]" = OrderedDict()
+        self._table_rows: Dict[str, Tuple[float, int]] = {}
+        self._stats = {
+            "checks": 0,
+            "plan_cache_hits": 0,
+            "explain_errors": 0,
+            "allowed": 0,
+            "rejected": 0,
+            "limited": 0,
+            "queued": 0,
+            "queue_timeouts": 0,
+        }
+
+    def check(self, sql: str, parameters: Optional[Dict[str, Any]] = None) -> CostDecision:
+        """
+        估算查询代价并给出处理决定
+
+        Args:
+            sql: 已通过安全校验的 SQL
+            parameters: 绑定参数
+
+        Returns:
+            CostDecision: 处理决定；获取计划失败时放行
+        """
+        with self._lock:
+            self._stats["checks"] += 1
+
+        estimate, cached = self._estimate(sql, parameters)
+        if estimate is None:
+            return self._decide(CostDecision(action=CostAction.ALLOW, sql=sql))
+
+        reasons = self._reasons(estimate)
+        decision = CostDecision(action=CostAction.ALLOW, sql=sql, estimate=estimate, reasons=reasons, cached=cached)
+        if not reasons:
+            return self._decide(decision)
+
+        if self.policy == "limit":
+            limited = self._add_limit(sql)
+            if limited is not None:
+                decision.action = CostAction.LIMIT
+                decision.sql = limited
+                decision.message = f"查询代价较高，已限制为最多 {self.limit_rows} 行"
+                return self._decide(decision)
+        elif self.policy == "queue":
+            decision.action = CostAction.QUEUE
+            decision.message = "查询代价较高，进入重查询队列"
+            return self._decide(decision)
+
+        decision.action = CostAction.REJECT
+        decision.message = f"查询代价过高，已拒绝执行: {'; '.join(reasons)}"
+        return self._decide(decision)
+
+    @contextmanager
+    def admit(self, decision: Optional[CostDecision]) -> Iterator[bool]:
+        """
+        按决定准入执行；queue 决定需要占用重查询通道
+
+        Args:
+            decision: check() 的结果
+
+        Yields:
+            bool: 是否获准执行（排队超时为 False）
+        """
+        if decision is None or decision.action != CostAction.QUEUE:
+            yield True
+            return
+
+        if getattr(self._held, "slots", 0) > 0:
+            yield True
+            return
+
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            with self._lock:
+                self._stats["queue_timeouts"] += 1
+            logger.warning(f"昂贵查询排队超时 ({self.queue_timeout}s)")
+            yield False
+            return
+        self._held.slots = 1
+        try:
+            yield True
+        finally:
+            self._held.slots = 0
+            self._slots.release()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["cached_plans"] = len(self._plans)
+        stats["policy"] = self.policy
+        stats["dialect"] = self.dialect
+        return stats
+
+    def _decide(self, decision: CostDecision) -> CostDecision:
+        key = {
+            CostAction.ALLOW: "allowed",
+            CostAction.REJECT: "rejected",
+            CostAction.LIMIT: "limited",
+            CostAction.QUEUE: "queued",
+        }[decision.action]
+        with self._lock:
+            self._stats[key] += 1
+        if decision.action != CostAction.ALLOW:
+            logger.info(f"代价守卫: {decision.action.value} ({'; '.join(decision.reasons)})")
+        return decision
+
+    def _reasons(self, estimate: PlanEstimate) -> List[str]:
+        reasons = []
+        if self.max_cost and estimate.cost is not None and estimate.cost > self.max_cost:
+            reasons.append(f"估算代价 {estimate.cost:.0f} 超过 {self.max_cost:.0f}")
+        if self.max_rows and estimate.rows is not None and estimate.rows > self.max_rows:
+            reasons.append(f"估算行数 {estimate.rows:.0f} 超过 {self.max_rows:.0f}")
+        if self.full_scan_rows:
+            for table in estimate.full_scans:
+                rows = self._table_row_count(table)
+                if rows is not None and rows > self.full_scan_rows:
+                    reasons.append(f"全表扫描 {table} ({rows} 行)")
+        return reasons
+
+    def _estimate(
+        self,
+        sql: str,
+        parameters: Optional[Dict[str, Any]]
+    ) -> Tuple[Optional[PlanEstimate], bool]:
+        key = normalize_sql(sql)
+        now = time.time()
+        with self._lock:
+            entry = self._plans.get(key)
+            if entry is not None and now - entry[0] < self.plan_ttl:
+                self._plans.move_to_end(key)
+                self._stats["plan_cache_hits"] += 1
+                return entry[1], True
+
+        explainers = {
+            "sqlite": self._explain_sqlite,
+            "postgresql": self._explain_postgresql,
+            "mysql": self._explain_mysql,
+            "mariadb": self._explain_mysql,
+            "oracle": self._explain_oracle,
+        }
+        explainer = explainers.get(self.dialect)
+        if explainer is None:
+            return None, False
+
+        try:
+            with self.database._engine.connect() as conn:
+                estimate = explainer(conn, sql, parameters or {})
+        except Exception as e:
+            with self._lock:
+                self._stats["explain_errors"] += 1
+            logger.warning(f"获取执行计划失败，跳过代价检查: {e}")
+            return None, False
+
+        with self._lock:
+            self._plans[key] = (now, estimate)
+            self._plans.move_to_end(key)
+            while len(self._plans) > self.max_plans:
+                self._plans.popitem(last=False)
+        return estimate, False
+
+    def _explain_sqlite(self, conn: Any, sql: str, parameters: Dict[str, Any]) -> PlanEstimate:
+        rows = conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"), parameters).fetchall()
+        details = [row[-1] for row in rows]
+        nodes = {row[0]: (row[1], row[-1]) for row in rows}
+        # 新版 SQLite 的计划里用别名指代表
+        aliases = {
+            alias.lower(): table
+            for table, alias in re.findall(
+                r"(?:\bFROM|\bJOIN|,)\s*(\w+)(?:\s+AS)?\s+(?!(?:FROM|WHERE|JOIN|ON|GROUP|ORDER|LIMIT|LEFT|RIGHT|INNER|OUTER|CROSS|NATURAL|UNION|HAVING)\b)(\w+)",
+                sql,
+                re.IGNORECASE
+            )
+        }
+        full_scans = []
+        # 同一父节点下的 SCAN / SEARCH 是一次连接的各层循环，行数相乘
+        loops: Dict[int, float] = {}
+        for row in rows:
+            parent, detail = row[1], row[-1]
+            match = re.match(r"SCAN (?:TABLE )?(\w+)", detail)
+            if match and match.group(1).upper() not in ("CONSTANT", "SUBQUERY"):
+                table = aliases.get(match.group(1).lower(), match.group(1))
+                full_scans.append(table)
+                loops[parent] = loops.get(parent, 1.0) * max(self._table_row_count(table) or 1, 1)
+            elif detail.startswith("SEARCH"):
+                # 索引查找：主键/rowid 等值视为 1 行，其余按 10 行的扇出粗估
+                fanout = 1 if re.search(r"(INTEGER PRIMARY KEY|rowid)=", detail) else 10
+                loops[parent] = loops.get(parent, 1.0) * fanout
+
+        def repeats(node: int) -> float:
+            # 相关子查询对外层的每一行执行一次
+            times = 1.0
+            while node in nodes:
+                parent, detail = nodes[node]
+                if detail.startswith("CORRELATED"):
+                    times *= loops.get(parent, 1.0)
+                node = parent
+            return times
+
+        estimated = sum(count * repeats(parent) for parent, count in loops.items()) or 1.0
+        return PlanEstimate(dialect="sqlite", rows=estimated, full_scans=full_scans, plan=details)
+
+    def _explain_postgresql(self, conn: Any, sql: str, parameters: Dict[str, Any]) -> PlanEstimate:
+        raw = conn.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"), parameters).scalar()
+        plan = (json.loads(raw) if isinstance(raw, str) else raw)[0]["Plan"]
+        full_scans = []
+
+        def walk(node: Dict[str, Any]):
+            if node.get("Node Type") == "Seq Scan" and node.get("Relation Name"):
+                full_scans.append(node["Relation Name"])
+            for child in node.get("Plans", []):
+                walk(child)
+
+        walk(plan)
+        return PlanEstimate(
+            dialect="postgresql",
+            cost=float(plan.get("Total Cost", 0)),
+            rows=float(plan.get("Plan Rows", 0)),
+            full_scans=full_scans,
+            plan=plan
+        )
+
+    def _explain_mysql(self, conn: Any, sql: str, parameters: Dict[str, Any]) -> PlanEstimate:
+        raw = conn.execute(text(f"EXPLAIN FORMAT=JSON {sql}"), parameters).scalar()
+        plan = json.loads(raw)
+        block = plan.get("query_block", {})
+        full_scans = []
+        rows = 1.0
+
+        def walk(node: Any):
+            nonlocal rows
+            if isinstance(node, dict):
+                if "access_type" in node:
+                    rows *= float(node.get("rows_examined_per_scan", 1) or 1)
+                    if node["access_type"] == "ALL":
+                        full_scans.append(node.get("table_name", ""))
+                for value in node.values():
+                    walk(value)
+            elif isinstance(node, list):
+                for item in node:
+                    walk(item)
+
+        walk(block)
+        cost = block.get("cost_info", {}).get("query_cost")
+        return PlanEstimate(
+            dialect="mysql",
+            cost=float(cost) if cost is not None else None,
+            rows=rows,
+            full_scans=full_scans,
+            plan=plan
+        )
+
+    def _explain_oracle(self, conn: Any, sql: str, parameters: Dict[str, Any]) -> PlanEstimate:
+        # 每次取计划都用独立的 id，并发的相同语句不会读到或删掉彼此的计划行
+        statement_id = f"nl2sql_{uuid.uuid4().hex[:20]}"
+        conn.execute(text(f"EXPLAIN PLAN SET STATEMENT_ID = '{statement_id}' FOR {sql}"), parameters)
+        rows = conn.execute(
+            text(
+                "SELECT id, operation, options, object_name, cost, cardinality "
+                "FROM plan_table WHERE statement_id = :sid ORDER BY id"
+            ),
+            {"sid": statement_id}
+        ).fetchall()
+        conn.execute(text("DELETE FROM plan_table WHERE statement_id = :sid"), {"sid": statement_id})
+        conn.commit()
+
+        root = rows[0] if rows else None
+        full_scans = [
+            row[3] for row in rows
+            if row[1] == "TABLE ACCESS" and row[2] == "FULL" and row[3]
+        ]
+        return PlanEstimate(
+            dialect="oracle",
+            cost=float(root[4]) if root is not None and root[4] is not None else None,
+            rows=float(root[5]) if root is not None and root[5] is not None else None,
+            full_scans=full_scans,
+            plan=[tuple(row) for row in rows]
+        )
+
+    def _table_row_count(self, table: str) -> Optional[int]:
+        """表行数（缓存 plan_ttl 秒）；SQLite 优先读 sqlite_stat1"""
+        now = time.time()
+        with self._lock:
+            cached = self._table_rows.get(table)
+            if cached is not None and now - cached[0] < self.plan_ttl:
+                return cached[1]
+
+        count = None
+        try:
+            with self.database._engine.connect() as conn:
+                if self.dialect == "sqlite":
+                    try:
+                        stat = conn.execute(
+                            text("SELECT stat FROM sqlite_stat1 WHERE tbl = :t LIMIT 1"),
+                            {"t": table}
+                        ).scalar()
+                        if stat:
+                            count = int(str(stat).split()[0])
+                    except Exception:
+                        # 未执行过 ANALYZE 时没有 sqlite_stat1
+                        count = None
+                if count is None:
+                    quote = self.database._engine.dialect.identifier_preparer.quote
+                    count = conn.execute(text(f"SELECT COUNT(*) FROM {quote(table)}")).scalar()
+        except Exception as e:
+            logger.debug(f"读取表 {table} 行数失败: {e}")
+            return None
+
+        with self._lock:
+            self._table_rows[table] = (now, int(count))
+        return int(count)
+
+    def _add_limit(self, sql: str) -> Optional[str]:
+        stripped = sql.strip().rstrip(";").strip()
+        limited, aggregate_only = _outer_query_shape(stripped)
+        if limited or aggregate_only:
+            return None
+        if self.dialect == "oracle":
+            return f"{stripped} FETCH FIRST {self.limit_rows} ROWS ONLY"
+        return f"{stripped} LIMIT {self.limit_rows}"
+
+
+def _outer_query_shape(sql: str) -> Tuple[bool, bool]:
+    """
+    外层查询的形态；子查询和 CTE 中的 LIMIT、聚合不算
+
+    Returns:
+        Tuple[bool, bool]: (外层是否已限制行数, 是否为只返回一行的聚合查询)
+    """
+    tokens = [
+        t for statement in sqlparse.parse(sql) for t in statement.flatten()
+        if not t.is_whitespace and t.ttype not in T.Comment
+    ]
+    depth = 0
+    clause = None
+    limited = False
+    aggregate = False
+    multi_row = False
+    for i, token in enumerate(tokens):
+        if token.match(T.Punctuation, "("):
+            depth += 1
+            continue
+        if token.match(T.Punctuation, ")"):
+            depth -= 1
+            continue
+        if depth:
+            continue
+        word = " ".join(token.normalized.upper().split())
+        if word in _ROW_LIMIT_KEYWORDS:
+            limited = True
+        elif token.ttype is T.Keyword.DML:
+            clause = word
+        elif token.ttype in T.Keyword and word in ("FROM", "WHERE"):
+            clause = word
+        elif word in ("GROUP BY", "OVER") or word.startswith(("UNION", "INTERSECT", "EXCEPT")):
+            multi_row = True
+        elif (
+            clause == "SELECT" and word in _AGGREGATES
+            and i + 1 < len(tokens) and tokens[i + 1].match(T.Punctuation, "(")
+        ):
+            aggregate = True
+    return limited, aggregate and not multi_row
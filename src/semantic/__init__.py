@@ -1,5 +1,26 @@
-from src.semantic.semantic_mapper import SemanticMapper
-from src.semantic.time_parser import TimeParser
-from src.semantic.config_manager import SemanticConfigManager
+"""语义映射模块（导出的类在首次访问时才导入，语义缓存依赖 numpy）"""
+import importlib
+from typing import TYPE_CHECKING, Any
 
-__all__ = ["SemanticMapper", "TimeParser", "SemanticConfigManager"]
+if TYPE_CHECKING:
+    from src.semantic.semantic_mapper import SemanticMapper
+    from src.semantic.time_parser import TimeParser
+    from src.semantic.config_manager import SemanticConfigManager
+    from src.semantic.semantic_cache import SemanticCache
+
+_EXPORTS = {
+    "SemanticMapper": "src.semantic.semantic_mapper",
+    "TimeParser": "src.semantic.time_parser",
+    "SemanticConfigManager": "src.semantic.config_manager",
+    "SemanticCache": "src.semantic.semantic_cache",
+}
+
+__all__ = ["SemanticMapper", "TimeParser", "SemanticConfigManager", "SemanticCache"]
+
+
+def __getattr__(name: str) -> Any:
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name]), name)
+    globals()[name] = value
+    return value
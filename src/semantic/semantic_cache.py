@@ -0,0 +1,240 @@
+from collections import deque
+from dataclasses import dataclass
+from threading import Lock
+from typing import Any, Deque, Dict, List, Optional, Tuple
+import logging
+import random
+import time
+import unicodedata
+
+import numpy as np
+
+from ..generation.template_cache import TemplateCache
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(eq=False)
+class SemanticCacheEntry:
+    """缓存的已成功问题：归一化问题、向量、SQL 和结果"""
+    question: str
+    normalized: str
+    vector: np.ndarray
+    sql: str
+    result: Any
+    scope: str
+    latency: float
+    created_at: float
+    last_hit: float
+    literals: Tuple[Tuple[str, str], ...] = ()
+    hits: int = 0
+
+
+@dataclass
+class SemanticCacheHit:
+    """语义缓存命中；audit 为 True 表示该次命中被抽中做误命中审计"""
+    entry: SemanticCacheEntry
+    similarity: float
+    audit: bool = False
+
+
+class SemanticCache:
+    """基于问题向量相似度的答案缓存
+
+    问题先归一化（NFKC、小写、去空白和标点）再向量化，只在同一作用域
+    （schema 指纹 + 权限范围）内检索。相似度不低于 similarity_threshold
+    时复用缓存的 SQL。
+
+    只差一个字面量的问题（"上海的订单数" / "北京的订单数"、不同年份或阈值）
+    向量往往非常接近，但缓存的 SQL 里是旧的字面量。因此命中还要求两个问题
+    抽取出的字面量（TemplateCache.extract：引号字符串、日期、数字、列取值）
+    完全一致，字面量不同的相似条目记为 literal_mismatches 并跳过。
+
+    - 淘汰：超过 ttl 秒的条目失效；超过 max_entries 时淘汰最久未命中的条目
+    - 审计：按 audit_rate 抽样命中，由调用方重新走完整流程比对结果，
+      不一致时通过 record_audit(..., False) 记为误命中并删除该条目
+    """
+
+    def __init__(
+        self,
+        embeddings_model: Any,
+        similarity_threshold: float = 0.92,
+        max_entries: int = 1000,
+        ttl: float = 3600.0,
+        audit_rate: float = 0.05,
+        seed: Optional[int] = None,
+        literal_extractor: Optional[TemplateCache] = None
+    ):
+        self.embeddings_model = embeddings_model
+        # 带列取值字典的 TemplateCache 能识别不带引号的取值（如城市名）
+        self.literal_extractor = literal_extractor if literal_extractor is not None else TemplateCache()
+        self.similarity_threshold = similarity_threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.audit_rate = audit_rate
+        self._random = random.Random(seed)
+        self._lock = Lock()
+        self._entries: Dict[str, List[SemanticCacheEntry]] = {}
+        self._matrices: Dict[str, np.ndarray] = {}
+        self._audit_log: Deque[Dict[str, Any]] = deque(maxlen=100)
+        self._stats = {
+            "lookups": 0,
+            "hits": 0,
+            "stores": 0,
+            "evictions": 0,
+            "audits": 0,
+            "false_hits": 0,
+            "saved_latency": 0.0,
+            "literal_mismatches": 0,
+        }
+
+    @staticmethod
+    def normalize(question: str) -> str:
+        text = unicodedata.normalize("NFKC", question).lower()
+        return "".join(
+            ch for ch in text
+            if not ch.isspace() and not unicodedata.category(ch).startswith("P")
+        )
+
+    def _embed(self, normalized: str) -> np.ndarray:
+        vector = np.asarray(self.embeddings_model.embed_query(normalized), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _literals(self, question: str) -> Tuple[Tuple[str, str], ...]:
+        _, literals = self.literal_extractor.extract(question)
+        return tuple((literal.kind, literal.value) for literal in literals)
+
+    def lookup(self, question: str, scope: str) -> Optional[SemanticCacheHit]:
+        normalized = self.normalize(question)
+        vector = self._embed(normalized)
+        literals = self._literals(question)
+        now = time.time()
+
+        with self._lock:
+            self._stats["lookups"] += 1
+            self._expire(scope, now)
+            entries = self._entries.get(scope)
+            if not entries:
+                return None
+
+            matrix = self._matrices.get(scope)
+            if matrix is None:
+                matrix = np.vstack([entry.vector for entry in entries])
+                self._matrices[scope] = matrix
+            similarities = matrix @ vector
+            best = int(np.argmax(similarities))
+            if similarities[best] >= self.similarity_threshold and entries[best].literals != literals:
+                self._stats["literal_mismatches"] += 1
+                mismatched = np.array([entry.literals != literals for entry in entries])
+                similarities = np.where(mismatched, -np.inf, similarities)
+                best = int(np.argmax(similarities))
+            similarity = float(similarities[best])
+            if similarity < self.similarity_threshold:
+                return None
+
+            entry = entries[best]
+            entry.hits += 1
+            entry.last_hit = now
+            self._stats["hits"] += 1
+            audit = self._random.random() < self.audit_rate
+            if audit:
+                self._stats["audits"] += 1
+            return SemanticCacheHit(entry=entry, similarity=similarity, audit=audit)
+
+    def store(self, question: str, scope: str, sql: str, result: Any, latency: float) -> SemanticCacheEntry:
+        normalized = self.normalize(question)
+        vector = self._embed(normalized)
+        now = time.time()
+        entry = SemanticCacheEntry(
+            question=question,
+            normalized=normalized,
+            vector=vector,
+            sql=sql,
+            result=result,
+            scope=scope,
+            latency=latency,
+            created_at=now,
+            last_hit=now,
+            literals=self._literals(question)
+        )
+        with self._lock:
+            entries = self._entries.setdefault(scope, [])
+            # 同一归一化问题只保留最新的一条
+            entries[:] = [e for e in entries if e.normalized != normalized]
+            entries.append(entry)
+            self._matrices.pop(scope, None)
+            self._stats["stores"] += 1
+            self._evict_over_capacity()
+        return entry
+
+    def record_saved_latency(self, hit: SemanticCacheHit, latency: float):
+        with self._lock:
+            self._stats["saved_latency"] += max(hit.entry.latency - latency, 0.0)
+
+    def record_audit(self, hit: SemanticCacheHit, question: str, fresh_sql: str, matched: bool):
+        """记录审计结果；误命中的条目会被删除"""
+        with self._lock:
+            self._audit_log.append({
+                "question": question,
+                "cached_question": hit.entry.question,
+                "similarity": hit.similarity,
+                "cached_sql": hit.entry.sql,
+                "fresh_sql": fresh_sql,
+                "matched": matched,
+            })
+            if not matched:
+                self._stats["false_hits"] += 1
+                self._remove(hit.entry)
+        if not matched:
+            logger.warning(
+                f"语义缓存误命中: '{question}' ~ '{hit.entry.question}' (similarity={hit.similarity:.3f})"
+            )
+
+    def invalidate(self, scope: Optional[str] = None):
+        with self._lock:
+            if scope is None:
+                self._entries.clear()
+                self._matrices.clear()
+            else:
+                self._entries.pop(scope, None)
+                self._matrices.pop(scope, None)
+
+    def get_audit_log(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(self._audit_log)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = sum(len(entries) for entries in self._entries.values())
+        stats["hit_rate"] = stats["hits"] / stats["lookups"] * 100 if stats["lookups"] else 0.0
+        stats["false_hit_rate"] = stats["false_hits"] / stats["audits"] * 100 if stats["audits"] else 0.0
+        return stats
+
+    def _expire(self, scope: str, now: float):
+        entries = self._entries.get(scope)
+        if not entries or self.ttl <= 0:
+            return
+        alive = [e for e in entries if now - e.created_at < self.ttl]
+        if len(alive) != len(entries):
+            self._stats["evictions"] += len(entries) - len(alive)
+            self._entries[scope] = alive
+            self._matrices.pop(scope, None)
+
+    def _evict_over_capacity(self):
+        total = sum(len(entries) for entries in self._entries.values())
+        while total > self.max_entries:
+            oldest = min(
+                (e for entries in self._entries.values() for e in entries),
+                key=lambda e: e.last_hit
+            )
+            self._remove(oldest)
+            self._stats["evictions"] += 1
+            total -= 1
+
+    def _remove(self, entry: SemanticCacheEntry):
+        entries = self._entries.get(entry.scope, [])
+        if entry in entries:
+            entries.remove(entry)
+            self._matrices.pop(entry.scope, None)
@@ -69,6 +69,28 @@ class TestAPI:
         
         assert response.status_code in [404, 500]
 
+    def test_routing_metrics_endpoint(self):
+        """Test routing metrics endpoint."""
+        settings = Settings(database_uri="sqlite:///example.db")
+        app = create_app(settings)
+        client = TestClient(app)
+        
+        response = client.get("/metrics/routing")
+        
+        assert response.status_code == 200
+        assert "enabled" in response.json()
+
+    def test_llm_gateway_metrics_endpoint(self):
+        """Test LLM gateway metrics endpoint."""
+        settings = Settings(database_uri="sqlite:///example.db")
+        app = create_app(settings)
+        client = TestClient(app)
+        
+        response = client.get("/metrics/llm")
+        
+        assert response.status_code == 200
+        assert "providers" in response.json()
+
     def test_query_endpoint(self):
         """Test query endpoint."""
         settings = Settings(database_uri="sqlite:///example.db")
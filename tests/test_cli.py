@@ -1,4 +1,8 @@
 """Tests for CLI module."""
+import argparse
+import json
+import os
+import sqlite3
 import subprocess
 import sys
 from io import StringIO
@@ -7,7 +11,7 @@ from unittest.mock import patch
 import pytest
 
 from src.config import Settings
-from src.main import run_cli, create_orchestrator
+from src.main import run_batch, run_cli, run_repl, create_orchestrator
 
 
 class TestCLI:
@@ -51,6 +55,51 @@ class TestCLI:
         assert result.returncode == 0
         assert "Available tables:" in result.stdout
 
+    def test_cli_tables_lists_tables_without_orchestrator(self, tmp_path):
+        """Test that `cli tables` reads the configured database without loading the LLM stack."""
+        db_path = tmp_path / "cli.db"
+        conn = sqlite3.connect(db_path)
+        conn.execute("CREATE TABLE customers (id INTEGER PRIMARY KEY)")
+        conn.commit()
+        conn.close()
+        code = (
+            "import sys, runpy\n"
+            "sys.argv = ['src.main', 'cli', 'tables']\n"
+            "try:\n"
+            "    runpy.run_module('src.main', run_name='__main__')\n"
+            "finally:\n"
+            "    heavy = ('fastapi', 'langchain_openai', 'langchain_anthropic', 'src.core.orchestrator')\n"
+            "    print('LOADED:', [m for m in heavy if m in sys.modules])\n"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", code],
+            capture_output=True,
+            text=True,
+            cwd=".",
+            env={**os.environ, "DATABASE_URI": f"sqlite:///{db_path}"}
+        )
+
+        assert result.returncode == 0
+        assert "  - customers" in result.stdout
+        assert "LOADED: []" in result.stdout
+
+    def test_import_main_is_lightweight(self):
+        """Test that importing the entry point defers FastAPI, provider SDKs and the orchestrator."""
+        code = (
+            "import sys, src.main\n"
+            "heavy = ('fastapi', 'langchain_openai', 'langchain_anthropic', 'src.core.orchestrator', 'sqlalchemy')\n"
+            "print([m for m in heavy if m in sys.modules])\n"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", code],
+            capture_output=True,
+            text=True,
+            cwd="."
+        )
+
+        assert result.returncode == 0
+        assert result.stdout.strip() == "[]"
+
     def test_cli_schema_command(self):
         """Test CLI schema command."""
         result = subprocess.run(
@@ -109,3 +158,99 @@ class TestCreateOrchestrator:
         orch2 = create_orchestrator(settings)
         
         assert orch1 is orch2
+
+
+@pytest.fixture
+def warm_orchestrator(tmp_path):
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+    from src.core.orchestrator import NL2SQLOrchestrator
+    db_path = tmp_path / "batch.db"
+    conn = sqlite3.connect(db_path)
+    conn.executescript("""
+        CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT);
+        INSERT INTO users (name) VALUES ('Alice'), ('Bob');
+    """)
+    conn.close()
+    llm = FakeListChatModel(responses=["</thinking><sql>SELECT COUNT(*) FROM users</sql>"])
+    return NL2SQLOrchestrator(llm=llm, database_uri=f"sqlite:///{db_path}", config={"schema_doc_ttl": 60})
+
+
+class TestCLIBatch:
+    """Test the batch subcommand."""
+
+    def _args(self, input_path, output_path, resume=False):
+        return argparse.Namespace(input=str(input_path), output=str(output_path), concurrency=2, resume=resume)
+
+    def test_batch_writes_jsonl_and_summary(self, warm_orchestrator, tmp_path, capsys):
+        questions = tmp_path / "questions.txt"
+        questions.write_text("# nightly\n用户数量\n\n有多少用户\n", encoding="utf-8")
+        output = tmp_path / "out.jsonl"
+
+        run_batch(self._args(questions, output), warm_orchestrator, Settings())
+
+        records = [json.loads(line) for line in output.read_text(encoding="utf-8").splitlines()]
+        assert sorted(r["index"] for r in records) == [0, 1]
+        assert all(r["status"] == "success" for r in records)
+        assert records[0]["sql"] == "SELECT COUNT(*) FROM users"
+        assert "critical_path" in records[0]["timings"]
+        err = capsys.readouterr().err
+        assert "2 answered" in err and "p50=" in err
+
+    def test_batch_resumes_from_checkpoint(self, warm_orchestrator, tmp_path, capsys):
+        questions = tmp_path / "questions.txt"
+        questions.write_text("用户数量\n有多少用户\n", encoding="utf-8")
+        output = tmp_path / "out.jsonl"
+        output.write_text(
+            json.dumps({"index": 0, "question": "用户数量", "status": "success"}, ensure_ascii=False)
+            + "\n{\"index\": 1, \"quest",
+            encoding="utf-8"
+        )
+
+        run_batch(self._args(questions, output, resume=True), warm_orchestrator, Settings())
+
+        lines = output.read_text(encoding="utf-8").splitlines()
+        assert len(lines) == 2
+        assert json.loads(lines[-1])["index"] == 1
+        assert "1 skipped" in capsys.readouterr().err
+
+
+class TestCLIRepl:
+    """Test the interactive REPL."""
+
+    def _run(self, orchestrator, lines, tmp_path):
+        feed = iter(lines)
+
+        def fake_input(prompt):
+            try:
+                return next(feed)
+            except StopIteration:
+                raise EOFError
+
+        run_repl(orchestrator, history_path=str(tmp_path / "history"), input_fn=fake_input)
+
+    def test_repl_answers_and_shows_timing(self, warm_orchestrator, tmp_path, capsys):
+        self._run(warm_orchestrator, ["\\timing", "有多少用户", "\\sql off", "有多少用户"], tmp_path)
+
+        out = capsys.readouterr().out
+        assert "schema ready" in out
+        assert "Timing is on." in out
+        assert out.count("SQL: SELECT COUNT(*) FROM users") == 1
+        assert "critical path:" in out
+        assert out.count("Time:") == 2
+
+    def test_repl_commands(self, warm_orchestrator, tmp_path, capsys):
+        self._run(warm_orchestrator, ["\\tables", "\\bogus", "\\q", "never asked"], tmp_path)
+
+        out = capsys.readouterr().out
+        assert "  - users" in out
+        assert "Unknown command: \\bogus" in out
+        assert "never asked" not in out
+
+    def test_repl_reuses_schema_doc(self, warm_orchestrator, tmp_path):
+        calls = []
+        generate = warm_orchestrator.schema_doc_generator.generate_full_doc
+        warm_orchestrator.schema_doc_generator.generate_full_doc = lambda tables: calls.append(1) or generate(tables)
+
+        self._run(warm_orchestrator, ["有多少用户", "用户总数"], tmp_path)
+
+        assert calls == [1]
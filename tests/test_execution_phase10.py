@@ -0,0 +1,77 @@
+import pytest
+import os
+import sqlite3
+import tempfile
+import threading
+from langchain_community.utilities import SQLDatabase
+from src.execution.query_executor import QueryExecutor
+from src.execution.query_monitor import QueryMonitor, fingerprint_sql
+
+
+@pytest.fixture
+def test_db():
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT);
+        INSERT INTO users (name) VALUES ('Alice'), ('Bob');
+    """)
+    conn.close()
+    yield path
+    os.unlink(path)
+
+
+def test_history_is_bounded_summary(test_db):
+    executor = QueryExecutor(database=SQLDatabase.from_uri(f"sqlite:///{test_db}"), history_size=3)
+    for i in range(5):
+        executor.execute(f"SELECT name FROM users WHERE id > {i % 2}")
+
+    history = executor.get_history()
+    assert len(history) == 3
+    assert "result" not in history[-1]
+    assert history[-1]["row_count"] == 2
+    assert history[-1]["sql"] == "SELECT name FROM users WHERE id > 0"
+
+
+def test_fingerprint_strips_literals():
+    assert fingerprint_sql("SELECT * FROM t WHERE id = 42 AND name = 'O''Brien'") == \
+        "SELECT * FROM t WHERE id = ? AND name = ?"
+    assert fingerprint_sql("SELECT * FROM t WHERE id IN (1, 2,3)") == "SELECT * FROM t WHERE id IN (?)"
+    assert fingerprint_sql("SELECT col1, t2.x FROM t2 LIMIT 10") == "SELECT col1, t2.x FROM t2 LIMIT ?"
+
+
+def test_monitor_aggregates_by_fingerprint():
+    monitor = QueryMonitor()
+    monitor.record_query("SELECT * FROM users WHERE id = 1", 0.5, True)
+    monitor.record_query("SELECT  * FROM users WHERE id = 2;", 1.5, False)
+
+    assert list(monitor.get_all_stats()) == ["SELECT * FROM users WHERE id = ?"]
+    stats = monitor.get_query_stats("SELECT * FROM users WHERE id = 99")
+    assert stats["count"] == 2
+    assert monitor.get_average_duration("SELECT * FROM users WHERE id = 3") == 1.0
+
+
+def test_monitor_memory_stays_bounded():
+    monitor = QueryMonitor(max_fingerprints=32, shards=4)
+    for i in range(1000):
+        monitor.record_query(f"SELECT c{i} FROM t", 0.01, True)
+
+    assert len(monitor.query_stats) == 32
+    assert monitor.evictions == 1000 - 32
+
+
+def test_monitor_concurrent_updates():
+    monitor = QueryMonitor()
+
+    def worker():
+        for i in range(1000):
+            monitor.record_query(f"SELECT * FROM t WHERE id = {i}", 0.001, True)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert monitor.get_query_stats("SELECT * FROM t WHERE id = 0")["count"] == 8000
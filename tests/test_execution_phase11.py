@@ -0,0 +1,121 @@
+import pytest
+import json
+import os
+import sqlite3
+import tempfile
+from langchain_community.utilities import SQLDatabase
+from src.execution.query_executor import QueryExecutor
+from src.execution.query_monitor import LatencyHistogram, QueryMonitor, SlowQueryLog
+
+
+@pytest.fixture
+def test_db():
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT);
+        INSERT INTO users (name) VALUES ('Alice'), ('Bob');
+    """)
+    conn.close()
+    yield path
+    os.unlink(path)
+
+
+def test_histogram_percentiles_within_bucket_error():
+    histogram = LatencyHistogram()
+    for ms in range(1, 1001):
+        histogram.record(ms / 1000)
+
+    summary = histogram.summary()
+    assert summary["max"] == 1.0
+    for p, expected in ((50, 0.5), (90, 0.9), (99, 0.99)):
+        assert expected <= summary[f"p{p}"] <= expected * (1 + 1 / 16)
+    assert len(histogram.buckets) < 200
+
+
+def test_empty_histogram():
+    assert LatencyHistogram().summary() == {"p50": 0.0, "p90": 0.0, "p99": 0.0, "max": 0.0}
+
+
+def test_stats_expose_percentiles():
+    monitor = QueryMonitor()
+    for i in range(10):
+        monitor.record_query(f"SELECT * FROM t WHERE id = {i}", 0.01 * (i + 1), True)
+
+    stats = monitor.get_query_stats("SELECT * FROM t WHERE id = 99")
+    assert stats["count"] == 10
+    assert "histogram" not in stats
+    assert stats["max"] == pytest.approx(0.1)
+    assert 0.05 <= stats["p50"] <= 0.06
+
+
+def test_slow_query_log_file(tmp_path):
+    path = tmp_path / "logs" / "slow.log"
+    slow_log = SlowQueryLog(path=str(path), max_bytes=400, backup_count=2)
+    monitor = QueryMonitor(slow_query_threshold=0.5, slow_log=slow_log)
+
+    monitor.record_query("SELECT 1", 0.1, True, plan_loader=lambda: pytest.fail("fast query explained"))
+    for _ in range(5):
+        monitor.record_query(
+            "SELECT * FROM users", 1.5, True, row_count=2,
+            question="所有用户", plan_loader=lambda: ["SCAN users"]
+        )
+    slow_log.close()
+
+    entries = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert entries[-1]["question"] == "所有用户"
+    assert entries[-1]["plan"] == ["SCAN users"]
+    assert entries[-1]["row_count"] == 2
+    assert os.path.exists(f"{path}.1")
+    assert len(slow_log.recent) == 5
+
+
+def test_plan_loader_failure_is_tolerated():
+    monitor = QueryMonitor(slow_query_threshold=0.0)
+
+    def broken():
+        raise RuntimeError("no plan")
+
+    monitor.record_query("SELECT 1", 0.1, False, plan_loader=broken)
+    assert monitor.slow_log.recent[0]["plan"] is None
+
+
+def test_snapshot_and_export(tmp_path):
+    monitor = QueryMonitor(slow_query_threshold=1.0)
+    monitor.record_query("SELECT * FROM a", 0.2, True)
+    monitor.record_query("SELECT * FROM b", 2.0, True)
+    monitor.record_query("SELECT * FROM c", 0.1, True)
+
+    snapshot = monitor.snapshot(limit=2)
+    assert list(snapshot["fingerprints"]) == ["SELECT * FROM b", "SELECT * FROM a"]
+    assert [entry["sql"] for entry in snapshot["slow_queries"]] == ["SELECT * FROM b"]
+
+    path = tmp_path / "stats.json"
+    monitor.export(str(path))
+    exported = json.loads(path.read_text(encoding="utf-8"))
+    assert len(exported["fingerprints"]) == 3
+    assert not os.path.exists(f"{path}.tmp")
+
+
+def test_executor_logs_slow_query_with_plan(test_db):
+    monitor = QueryMonitor(slow_query_threshold=0.0)
+    executor = QueryExecutor(database=SQLDatabase.from_uri(f"sqlite:///{test_db}"), monitor=monitor)
+
+    executor.execute("SELECT name FROM users WHERE name = 'Alice'", question="Alice 是谁")
+
+    entry = monitor.slow_log.recent[-1]
+    assert entry["question"] == "Alice 是谁"
+    assert entry["row_count"] == 1
+    assert any("users" in line for line in entry["plan"])
+
+
+def test_stream_records_to_monitor(test_db):
+    monitor = QueryMonitor()
+    executor = QueryExecutor(database=SQLDatabase.from_uri(f"sqlite:///{test_db}"), monitor=monitor)
+
+    stream = executor.execute_stream("SELECT name FROM users", question="用户名")
+    assert [row for batch in stream for row in batch] == [("Alice",), ("Bob",)]
+
+    stats = monitor.get_query_stats("SELECT name FROM users")
+    assert stats["count"] == 1 and stats["success_count"] == 1
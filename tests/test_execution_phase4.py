@@ -0,0 +1,171 @@
+import pytest
+import os
+import sqlite3
+import tempfile
+import time
+from unittest.mock import MagicMock, PropertyMock, patch
+from langchain_community.utilities import SQLDatabase
+from src.execution.query_executor import QueryExecutor
+from src.execution.result_cache import ResultCache, normalize_sql, referenced_tables
+
+
+@pytest.fixture
+def test_db():
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT, age INTEGER);
+        INSERT INTO users (name, age) VALUES ('Alice', 25), ('Bob', 30);
+    """)
+    conn.close()
+    yield path
+    os.unlink(path)
+
+
+def _executor(path, **cache_options):
+    db = SQLDatabase.from_uri(f"sqlite:///{path}")
+    executor = QueryExecutor(database=db, result_cache=ResultCache(db, **cache_options))
+    executor._run = MagicMock(wraps=executor._run)
+    return executor
+
+
+def test_normalize_sql_keeps_string_literals():
+    assert normalize_sql("SELECT  *\n FROM users ;") == "SELECT * FROM users"
+    assert normalize_sql("SELECT * FROM t WHERE name = 'a  b'") == "SELECT * FROM t WHERE name = 'a  b'"
+    assert referenced_tables("SELECT * FROM Users u JOIN main.orders o ON u.id = o.uid") == {"users", "orders"}
+    assert referenced_tables("SELECT * FROM users u, \"order\" o WHERE u.id = o.uid") == {"users", "order"}
+
+
+def test_repeated_sql_served_from_cache(test_db):
+    executor = _executor(test_db)
+
+    first = executor.execute("SELECT COUNT(*) FROM users")
+    second = executor.execute("SELECT  COUNT(*)  FROM users;")
+
+    assert "cached" not in first
+    assert second["cached"] is True
+    assert second["result"] == first["result"]
+    assert executor._run.call_count == 1
+    assert executor.result_cache.get_stats()["version_source"] == "data_version"
+
+
+def test_external_write_invalidates(test_db):
+    executor = _executor(test_db)
+    executor.execute("SELECT COUNT(*) FROM users")
+
+    conn = sqlite3.connect(test_db)
+    conn.execute("INSERT INTO users (name, age) VALUES ('Carol', 35)")
+    conn.commit()
+    conn.close()
+
+    result = executor.execute("SELECT COUNT(*) FROM users")
+    assert "cached" not in result
+    assert result["result"].rows == [(3,)]
+    assert executor.result_cache.get_stats()["invalidations"] == 1
+
+
+def test_parameters_are_part_of_key(test_db):
+    executor = _executor(test_db)
+    sql = "SELECT name FROM users WHERE age > :age"
+    executor.execute(sql, {"age": 20})
+    assert "cached" not in executor.execute(sql, {"age": 26})
+    assert executor.execute(sql, {"age": 20})["cached"] is True
+
+
+def test_table_write_tracking_without_version_token():
+    db = MagicMock()
+    db._engine = None
+    cache = ResultCache(db)
+    assert cache.tracker.kind == "none"
+
+    cache.put("SELECT * FROM users", "[(1,)]")
+    cache.put("SELECT * FROM orders", "[(2,)]")
+    cache.record_write("UPDATE users SET age = 1")
+
+    assert cache.get("SELECT * FROM users") is None
+    assert cache.get("SELECT * FROM orders").result == "[(2,)]"
+
+    cache.record_write("DROP TABLE orders")
+    assert cache.get("SELECT * FROM orders") is None
+
+
+def test_write_to_comma_joined_table_invalidates():
+    db = MagicMock()
+    db._engine = None
+    cache = ResultCache(db)
+
+    cache.put("SELECT * FROM users, orders WHERE users.id = orders.uid", "[(1,)]")
+    cache.record_write("INSERT INTO orders (uid) VALUES (1)")
+
+    assert cache.get("SELECT * FROM users, orders WHERE users.id = orders.uid") is None
+
+
+def test_lru_eviction_and_compression():
+    db = MagicMock()
+    db._engine = None
+    cache = ResultCache(db, max_entries=2, compress_threshold=100)
+
+    big = "x" * 10_000
+    cache.put("SELECT 1", big)
+    cache.put("SELECT 2", "small")
+    cache.get("SELECT 1")
+    cache.put("SELECT 3", "small")
+
+    stats = cache.get_stats()
+    assert stats["entries"] == 2
+    assert stats["evictions"] == 1
+    assert stats["compressed"] == 1
+    assert stats["bytes"] < 1000
+    assert cache.get("SELECT 2") is None
+    assert cache.get("SELECT 1").result == big
+
+
+def test_stale_while_revalidate_refreshes_in_background():
+    db = MagicMock()
+    db._engine = None
+    cache = ResultCache(db, ttl=0.01, stale_while_revalidate=10)
+    cache.put("SELECT 1", "old")
+    time.sleep(0.02)
+
+    hit = cache.get("SELECT 1", loader=lambda: "new")
+    assert hit.result == "old"
+    assert hit.stale is True
+
+    for _ in range(100):
+        fresh = cache.get("SELECT 1")
+        if fresh is not None and fresh.result == "new":
+            break
+        time.sleep(0.01)
+    assert fresh.result == "new" and fresh.stale is False
+    assert cache.get_stats()["refreshes"] == 1
+
+
+def test_orchestrator_flags_cached_execution(test_db):
+    from src.core.orchestrator import NL2SQLOrchestrator
+    llm = MagicMock()
+    llm.return_value = "SELECT COUNT(*) FROM users"
+    orchestrator = NL2SQLOrchestrator(
+        llm=llm,
+        database_uri=f"sqlite:///{test_db}",
+        config={"result_cache_enabled": True}
+    )
+
+    first = orchestrator.ask("有多少用户")
+    second = orchestrator.ask("一共有几个用户")
+
+    assert first.execution.cached is False
+    assert second.execution.cached is True
+    assert second.execution.result == first.execution.result
+    assert orchestrator.get_cache_stats()["result"]["hits"] == 1
+
+
+def test_result_cache_defaults_to_sqlite_only(test_db):
+    from src.core.orchestrator import NL2SQLOrchestrator
+    config = {"result_cache_enabled": None}
+    orchestrator = NL2SQLOrchestrator(llm=MagicMock(), database_uri=f"sqlite:///{test_db}", config=config)
+    assert orchestrator.result_cache is not None
+
+    with patch.object(SQLDatabase, "dialect", new_callable=PropertyMock, return_value="postgresql"):
+        orchestrator = NL2SQLOrchestrator(llm=MagicMock(), database_uri=f"sqlite:///{test_db}", config=config)
+    assert orchestrator.result_cache is None
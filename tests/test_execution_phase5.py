@@ -0,0 +1,95 @@
+import pytest
+import json
+import os
+import sqlite3
+import tempfile
+from datetime import date
+from decimal import Decimal
+from langchain_community.utilities import SQLDatabase
+from src.execution.query_executor import QueryExecutor
+from src.execution.result_handler import ResultHandler
+from src.execution.result_set import ResultSet
+from src.explanation.result_explainer import ResultExplainer
+
+
+@pytest.fixture
+def test_db():
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT, score REAL, note TEXT);
+        INSERT INTO users (name, score, note) VALUES ('Alice', 9.5, NULL), ('Bob', 7.0, NULL);
+    """)
+    conn.close()
+    yield path
+    os.unlink(path)
+
+
+def test_executor_returns_columnar_result(test_db):
+    executor = QueryExecutor(database=SQLDatabase.from_uri(f"sqlite:///{test_db}"))
+    result = executor.execute("SELECT name, score, note FROM users ORDER BY id")["result"]
+
+    assert isinstance(result, ResultSet)
+    assert result.columns == ["name", "score", "note"]
+    assert result.types == ["str", "float", "null"]
+    assert result.rows == [("Alice", 9.5, None), ("Bob", 7.0, None)]
+    assert result.row_count == 2
+
+
+def test_executor_write_reports_affected_rows(test_db):
+    executor = QueryExecutor(database=SQLDatabase.from_uri(f"sqlite:///{test_db}"))
+    result = executor.execute("UPDATE users SET score = 0 WHERE name = 'Bob'")["result"]
+
+    assert result.columns == []
+    assert result.row_count == 1
+    check = executor.execute("SELECT score FROM users WHERE name = 'Bob'")["result"]
+    assert check.scalar == 0
+
+
+def test_to_dict_is_json_serializable():
+    result = ResultSet(
+        columns=["amount", "day"],
+        types=["Decimal", "date"],
+        rows=[(Decimal("1.50"), date(2024, 1, 2))]
+    )
+    payload = json.loads(json.dumps(result.to_dict()))
+    assert payload == {
+        "columns": ["amount", "day"],
+        "types": ["Decimal", "date"],
+        "rows": [[1.5, "2024-01-02"]],
+        "row_count": 1,
+        "truncated": False,
+    }
+
+
+def test_explainer_and_handler_use_column_names():
+    result = ResultSet(columns=["name", "age"], types=["str", "int"], rows=[("Alice", 25), ("Bob", 30)])
+
+    explainer = ResultExplainer(llm=None)
+    assert explainer._parse_result(result) == [{"name": "Alice", "age": 25}, {"name": "Bob", "age": 30}]
+    assert "name: Alice" in explainer.explain("列出用户", result)
+
+    table = ResultHandler().handle(result, "table")
+    assert table.splitlines()[0] == "name | age"
+
+    scalar = ResultSet(columns=["COUNT(*)"], types=["int"], rows=[(2,)])
+    assert explainer.explain("有多少用户", scalar) == "结果是 2 个"
+
+
+def test_stream_execution_event_carries_columns(test_db):
+    from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+    from langchain_core.messages import AIMessage
+    from src.core.orchestrator import NL2SQLOrchestrator
+    llm = GenericFakeChatModel(messages=iter([
+        AIMessage(content="</thinking><sql>SELECT name, score FROM users ORDER BY id</sql>"),
+        AIMessage(content="Alice 9.5 分，Bob 7 分"),
+    ]))
+    orchestrator = NL2SQLOrchestrator(llm=llm, database_uri=f"sqlite:///{test_db}")
+
+    events = list(orchestrator.ask_stream("列出用户分数"))
+    execution = next(e for e in events if e["stage"] == "execution")
+
+    assert execution["data"]["columns"] == ["name", "score"]
+    assert events[-1]["data"]["execution_result"]["rows"] == [["Alice", 9.5], ["Bob", 7.0]]
+    json.dumps(events[-1], ensure_ascii=False)
@@ -0,0 +1,114 @@
+import pytest
+import os
+import sqlite3
+import tempfile
+from unittest.mock import MagicMock
+from langchain_community.utilities import SQLDatabase
+from src.execution.query_executor import QueryExecutor
+from src.execution.result_cache import ResultCache
+
+
+@pytest.fixture
+def test_db():
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE orders (id INTEGER PRIMARY KEY, amount REAL, note TEXT)")
+    conn.executemany(
+        "INSERT INTO orders (amount, note) VALUES (?, ?)",
+        [(i, None if i < 6 else "n") for i in range(25)]
+    )
+    conn.commit()
+    conn.close()
+    yield path
+    os.unlink(path)
+
+
+def _executor(path, **kwargs):
+    return QueryExecutor(database=SQLDatabase.from_uri(f"sqlite:///{path}"), **kwargs)
+
+
+def test_execute_enforces_max_rows(test_db):
+    executor = _executor(test_db, max_rows=10, batch_size=4)
+    result = executor.execute("SELECT * FROM orders")["result"]
+
+    assert len(result.rows) == 10
+    assert result.row_count == 10
+    assert result.truncated is True
+    assert result.types == ["int", "float", "str"]
+
+
+def test_exact_max_rows_is_not_truncated(test_db):
+    executor = _executor(test_db, max_rows=25, batch_size=10)
+    result = executor.execute("SELECT * FROM orders")["result"]
+    assert len(result.rows) == 25
+    assert result.truncated is False
+
+
+def test_execute_stream_yields_batches(test_db):
+    executor = _executor(test_db, max_rows=10, batch_size=4)
+    stream = executor.execute_stream("SELECT id FROM orders ORDER BY id")
+    batches = list(stream)
+
+    assert [len(b) for b in batches] == [4, 4, 2]
+    assert batches[0][0] == (1,)
+    assert stream.success is True
+    assert stream.columns == ["id"]
+    assert stream.row_count == 10
+    assert stream.truncated is True
+
+
+def test_execute_stream_stops_early_and_releases_connection(test_db):
+    executor = _executor(test_db, batch_size=5)
+    stream = executor.execute_stream("SELECT id FROM orders")
+    iterator = iter(stream)
+    assert len(next(iterator)) == 5
+    iterator.close()
+    assert executor.database._engine.pool.checkedout() == 0
+
+
+def test_execute_stream_failure_fixed_by_llm(test_db):
+    llm = MagicMock()
+    llm.invoke.return_value = "SELECT id FROM orders WHERE id < 3"
+    executor = _executor(test_db, llm=llm)
+    stream = executor.execute_stream("SELECT id FROM missing")
+    rows = [row for batch in stream for row in batch]
+
+    assert rows == [(1,), (2,)]
+    assert stream.attempts == 2
+    assert stream.sql == "SELECT id FROM orders WHERE id < 3"
+
+
+def test_execute_stream_uses_result_cache(test_db):
+    db = SQLDatabase.from_uri(f"sqlite:///{test_db}")
+    executor = QueryExecutor(database=db, result_cache=ResultCache(db), batch_size=10)
+    list(executor.execute_stream("SELECT id FROM orders"))
+
+    stream = executor.execute_stream("SELECT id FROM orders")
+    assert [len(b) for b in stream] == [10, 10, 5]
+    assert stream.cached is True
+
+
+def test_ask_stream_forwards_row_batches(test_db):
+    from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+    from langchain_core.messages import AIMessage
+    from src.core.orchestrator import NL2SQLOrchestrator
+    llm = GenericFakeChatModel(messages=iter([
+        AIMessage(content="</thinking><sql>SELECT id FROM orders ORDER BY id</sql>"),
+        AIMessage(content="共 12 条"),
+    ]))
+    orchestrator = NL2SQLOrchestrator(
+        llm=llm,
+        database_uri=f"sqlite:///{test_db}",
+        config={"max_rows": 12, "fetch_batch_size": 5}
+    )
+
+    events = list(orchestrator.ask_stream("列出订单"))
+    row_events = [e for e in events if e["stage"] == "execution_rows"]
+    execution = next(e for e in events if e["stage"] == "execution")
+
+    assert [e["data"]["offset"] for e in row_events] == [0, 5, 10]
+    assert row_events[-1]["data"]["rows"] == [[11], [12]]
+    assert execution["data"]["row_count"] == 12
+    assert execution["data"]["truncated"] is True
+    assert events[-1]["data"]["execution_result"]["truncated"] is True
@@ -0,0 +1,166 @@
+import pytest
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from unittest.mock import MagicMock
+from langchain_community.utilities import SQLDatabase
+from src.core.single_flight import SingleFlight
+from src.execution.query_executor import QueryExecutor
+from src.execution.query_timeout import CancelToken, query_deadline
+
+# 递归 CTE 在 SQLite 中持续计算，用来模拟失控查询
+RUNAWAY_SQL = """
+WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n)
+SELECT COUNT(*) FROM n
+"""
+
+
+@pytest.fixture
+def test_db():
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT);
+        INSERT INTO users (name) VALUES ('Alice'), ('Bob');
+        CREATE TABLE nums (i INTEGER);
+    """)
+    conn.executemany("INSERT INTO nums VALUES (?)", [(i,) for i in range(1000)])
+    conn.commit()
+    conn.close()
+    yield path
+    os.unlink(path)
+
+
+def _executor(path, **kwargs):
+    return QueryExecutor(database=SQLDatabase.from_uri(f"sqlite:///{path}"), **kwargs)
+
+
+def test_query_timeout_interrupts_runaway_query(test_db):
+    llm = MagicMock()
+    executor = _executor(test_db, query_timeout=0.2, llm=llm)
+
+    start = time.monotonic()
+    result = executor.execute(RUNAWAY_SQL)
+
+    assert time.monotonic() - start < 2
+    assert result["success"] is False
+    assert result["timed_out"] is True
+    assert result["attempts"] == 1
+    llm.invoke.assert_not_called()
+    assert executor.execute("SELECT COUNT(*) FROM users")["success"] is True
+
+
+def test_cancel_token_interrupts_query(test_db):
+    executor = _executor(test_db)
+    cancel = CancelToken()
+    threading.Timer(0.2, cancel.cancel).start()
+
+    result = executor.execute(RUNAWAY_SQL, cancel=cancel)
+
+    assert result["cancelled"] is True
+    assert result["timed_out"] is False
+
+
+def test_execution_budget_covers_retries(test_db):
+    executor = _executor(test_db, execution_timeout=0.3)
+    result = executor.execute(RUNAWAY_SQL)
+    assert result["timed_out"] is True
+
+
+def test_execute_stream_reports_timeout(test_db):
+    executor = _executor(test_db, query_timeout=0.2)
+    stream = executor.execute_stream(RUNAWAY_SQL)
+    assert list(stream) == []
+    assert stream.success is False
+    assert stream.timed_out is True
+
+
+def test_cancel_token_callbacks():
+    token = CancelToken()
+    called = []
+    unregister = token.add_callback(lambda: called.append("a"))
+    token.add_callback(lambda: called.append("b"))
+    unregister()
+    token.cancel()
+    token.cancel()
+    assert called == ["b"]
+
+    token.add_callback(lambda: called.append("late"))
+    assert called == ["b", "late"]
+
+
+def test_single_flight_abandoned_when_all_subscribers_leave():
+    flight = SingleFlight()
+    abandoned = threading.Event()
+    release = threading.Event()
+
+    def events():
+        yield "a"
+        release.wait(2)
+        yield "b"
+
+    first_cancel, second_cancel = CancelToken(), CancelToken()
+    first = flight.stream("key", events, cancel=first_cancel, on_abandon=abandoned.set)
+    assert next(first) == "a"
+    second = flight.stream("key", events, cancel=second_cancel)
+    assert next(second) == "a"
+
+    first_cancel.cancel()
+    assert list(first) == []
+    assert not abandoned.is_set()
+
+    second_cancel.cancel()
+    assert list(second) == []
+    assert abandoned.is_set()
+    release.set()
+
+
+def test_orchestrator_reports_timeout_status(test_db):
+    from src.core.orchestrator import NL2SQLOrchestrator
+    llm = MagicMock()
+    llm.return_value = "SELECT COUNT(*) FROM nums a, nums b, nums c"
+    orchestrator = NL2SQLOrchestrator(
+        llm=llm,
+        database_uri=f"sqlite:///{test_db}",
+        config={"query_timeout": 0.2}
+    )
+
+    result = orchestrator.ask("数到无穷")
+
+    assert result.status.value == "execution_timeout"
+    assert result.execution.timed_out is True
+
+
+def _mysql_conn(is_mariadb=False):
+    conn = MagicMock()
+    conn.dialect.name = "mysql"
+    conn.dialect.is_mariadb = is_mariadb
+    conn.connection.dbapi_connection.thread_id.return_value = 42
+    return conn
+
+
+def test_mysql_deadline_sets_and_resets_session_timeout_only():
+    conn = _mysql_conn()
+    with query_deadline(conn, timeout=1.5):
+        pass
+
+    statements = [c.args[0] for c in conn.exec_driver_sql.call_args_list]
+    assert statements == [
+        "SET SESSION max_execution_time = 1500",
+        "SET SESSION max_execution_time = DEFAULT",
+    ]
+
+
+def test_mysql_cancel_kills_query_by_handshake_connection_id():
+    conn = _mysql_conn(is_mariadb=True)
+    cancel = CancelToken()
+    with query_deadline(conn, timeout=2, cancel=cancel):
+        cancel.cancel()
+
+    statements = [c.args[0] for c in conn.exec_driver_sql.call_args_list]
+    assert statements == ["SET SESSION max_statement_time = 2.000", "SET SESSION max_statement_time = DEFAULT"]
+    killer = conn.engine.connect.return_value.__enter__.return_value
+    killer.exec_driver_sql.assert_called_once_with("KILL QUERY 42")
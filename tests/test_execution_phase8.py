@@ -0,0 +1,123 @@
+import pytest
+import os
+import sqlite3
+import tempfile
+from unittest.mock import MagicMock
+from langchain_community.utilities import SQLDatabase
+from src.execution.query_executor import QueryExecutor
+from src.execution.schema_checker import SchemaChecker, edit_distance
+
+
+CATALOG = {
+    "users": ["id", "name", "age", "Email", "type"],
+    "order": ["id", "user_id", "amount"],
+    "categories": ["id", "title"],
+}
+
+
+@pytest.fixture
+def test_db():
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT, age INTEGER);
+        INSERT INTO users (name, age) VALUES ('Alice', 25), ('Bob', 30);
+    """)
+    conn.close()
+    yield path
+    os.unlink(path)
+
+
+def test_edit_distance_counts_transposition():
+    assert edit_distance("name", "naem") == 1
+    assert edit_distance("amont", "amount") == 1
+    assert edit_distance("cust_id", "customer_id") == 4
+
+
+@pytest.mark.parametrize("sql, expected", [
+    ("SELECT nme FROM users", "SELECT name FROM users"),
+    ("SELECT * FROM category", "SELECT * FROM categories"),
+    ("SELECT u.nme FROM user u", "SELECT u.name FROM users u"),
+    ("SELECT usr.name FROM users usr2", "SELECT usr2.name FROM users usr2"),
+    ('SELECT "email" FROM users', 'SELECT "Email" FROM users'),
+    (
+        "SELECT name FROM users WHERE id IN (SELECT user_id FROM order WHERE amont > 5)",
+        "SELECT name FROM users WHERE id IN (SELECT user_id FROM order WHERE amount > 5)",
+    ),
+])
+def test_near_miss_identifiers_fixed(sql, expected):
+    result = SchemaChecker(catalog=CATALOG).check(sql)
+    assert result.sql == expected
+    assert result.is_valid
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT u.name, COUNT(*) total FROM users u JOIN order o ON o.user_id = u.id GROUP  BY u.name ORDER BY total",
+    "SELECT type, rowid FROM users WHERE age > :age",
+    "SELECT x.a FROM (SELECT 1 AS a) x",
+    "SELECT CAST(age AS INTEGER) AS years FROM users",
+    'SELECT COUNT(*) FROM users WHERE name = "Alice"',
+    # 函数括号里的 FROM 不是表子句
+    "SELECT EXTRACT(YEAR FROM age) AS y, COUNT(*) FROM users GROUP BY y",
+    "SELECT SUBSTRING(name FROM age FOR 3) FROM users",
+    "SELECT TRIM(BOTH ' ' FROM name) FROM users WHERE id IN (SELECT user_id FROM order)",
+    "SELECT name FROM users WHERE id IN (SELECT EXTRACT(DAY FROM amount) FROM order)",
+])
+def test_valid_sql_untouched(sql):
+    result = SchemaChecker(catalog=CATALOG).check(sql)
+    assert result.sql == sql
+    assert result.fixes == [] and result.errors == []
+
+
+def test_ambiguous_or_distant_names_are_errors():
+    checker = SchemaChecker(catalog={"t": ["cost", "cast"]})
+    assert checker.check("SELECT cst FROM t").errors == ["未知列: cst"]
+    assert checker.check("SELECT customer_total FROM t").errors == ["未知列: customer_total"]
+    assert checker.check("SELECT * FROM nothing_like_it").errors == ["未知表: nothing_like_it"]
+
+
+def test_from_inside_function_still_checks_columns():
+    result = SchemaChecker(catalog=CATALOG).check("SELECT EXTRACT(YEAR FROM agee) FROM users")
+    assert result.sql == "SELECT EXTRACT(YEAR FROM age) FROM users"
+    assert [f.kind for f in result.fixes] == ["column"]
+
+
+def test_executor_fixes_locally_without_llm(test_db):
+    db = SQLDatabase.from_uri(f"sqlite:///{test_db}")
+    llm = MagicMock()
+    executor = QueryExecutor(database=db, llm=llm, schema_checker=SchemaChecker(database=db))
+
+    result = executor.execute("SELECT nme FROM user ORDER BY id")
+
+    assert result["success"] is True
+    assert result["sql"] == "SELECT name FROM users ORDER BY id"
+    assert result["result"].rows == [("Alice",), ("Bob",)]
+    assert result["attempts"] == 1
+    llm.invoke.assert_not_called()
+
+
+def test_executor_sends_hard_errors_to_llm_before_database(test_db):
+    db = SQLDatabase.from_uri(f"sqlite:///{test_db}")
+    llm = MagicMock()
+    llm.invoke.return_value = MagicMock(content="SELECT COUNT(*) FROM users")
+    executor = QueryExecutor(database=db, llm=llm, schema_checker=SchemaChecker(database=db))
+    executor._run = MagicMock(wraps=executor._run)
+
+    result = executor.execute("SELECT total_spend FROM users")
+
+    assert result["success"] is True
+    assert result["attempts"] == 2
+    assert "未知列: total_spend" in llm.invoke.call_args[0][0]
+    assert executor._run.call_count == 1
+
+
+def test_stream_applies_local_fixes(test_db):
+    db = SQLDatabase.from_uri(f"sqlite:///{test_db}")
+    executor = QueryExecutor(database=db, schema_checker=SchemaChecker(database=db))
+
+    stream = executor.execute_stream("SELECT nam FROM users ORDER BY id")
+    rows = [row for batch in stream for row in batch]
+
+    assert stream.success and stream.sql == "SELECT name FROM users ORDER BY id"
+    assert rows == [("Alice",), ("Bob",)]
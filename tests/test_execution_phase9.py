@@ -0,0 +1,175 @@
+import pytest
+import os
+import sqlite3
+import tempfile
+from unittest.mock import MagicMock, patch
+from langchain_community.utilities import SQLDatabase
+from src.execution.error_analyzer import ErrorAnalyzer, RetryConfig, RetryStrategy
+from src.execution.query_executor import QueryExecutor
+from src.execution.schema_checker import SchemaChecker
+
+
+@pytest.fixture
+def test_db():
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT UNIQUE, age INTEGER);
+        CREATE TABLE orders (id INTEGER PRIMARY KEY, user_id INTEGER, amount REAL);
+        INSERT INTO users (name, age) VALUES ('Alice', 25), ('Bob', 30);
+    """)
+    conn.close()
+    yield path
+    os.unlink(path)
+
+
+def _llm(*answers):
+    llm = MagicMock()
+    llm.invoke.side_effect = [MagicMock(content=answer) for answer in answers]
+    return llm
+
+
+@pytest.mark.parametrize("message, error_type", [
+    ("database is locked", "connection"),
+    ("(psycopg2.OperationalError) server closed the connection unexpectedly", "connection"),
+    ("attempt to write a readonly database", "permission"),
+    ('relation "usrs" does not exist', "no_table"),
+    ("Unknown column 'nme' in 'field list'", "no_column"),
+])
+def test_analyzer_classifies_more_errors(message, error_type):
+    assert ErrorAnalyzer().analyze(message)[0] == error_type
+
+
+def test_extract_identifier():
+    analyzer = ErrorAnalyzer()
+    assert analyzer.extract_identifier("no such column: u.nme") == "nme"
+    assert analyzer.extract_identifier('relation "usrs" does not exist') == "usrs"
+    assert analyzer.extract_identifier("Unknown column 'nme' in 'field list'") == "nme"
+
+
+def test_no_column_fixed_locally_from_database_error(test_db):
+    db = SQLDatabase.from_uri(f"sqlite:///{test_db}")
+    llm = _llm()
+    # 让预检放行，模拟预检识别不了、由数据库报出的缺失列
+    checker = SchemaChecker(catalog={"users": ["id", "name", "age"], "orders": ["id", "user_id", "amount"]})
+    executor = QueryExecutor(database=db, llm=llm, schema_checker=checker)
+    checker.check = MagicMock(side_effect=lambda sql: MagicMock(sql=sql, errors=[]))
+
+    result = executor.execute("SELECT nam FROM users ORDER BY id")
+
+    assert result["success"] is True
+    assert result["sql"] == "SELECT name FROM users ORDER BY id"
+    llm.invoke.assert_not_called()
+    assert executor.get_error_stats()["no_column"]["recovered"] == 1
+
+
+def test_llm_prompt_contains_only_relevant_ddl(test_db):
+    db = SQLDatabase.from_uri(f"sqlite:///{test_db}")
+    llm = _llm("SELECT COUNT(*) FROM users")
+    executor = QueryExecutor(database=db, llm=llm)
+
+    result = executor.execute("SELECT COUNT(* FROM users")
+
+    assert result["success"] is True
+    prompt = llm.invoke.call_args[0][0]
+    assert "SQL 语法错误" in prompt
+    assert "CREATE TABLE users" in prompt
+    assert "CREATE TABLE orders" not in prompt
+    stats = executor.get_error_stats()["syntax"]
+    assert (stats["errors"], stats["retries"], stats["recovered"]) == (1, 1, 1)
+    assert stats["avg_repair_time"] == stats["repair_time"]
+
+
+def test_constraint_errors_fail_fast(test_db):
+    db = SQLDatabase.from_uri(f"sqlite:///{test_db}")
+    llm = _llm("INSERT INTO users (name) VALUES ('Carol')")
+    executor = QueryExecutor(database=db, llm=llm)
+
+    result = executor.execute("INSERT INTO users (name) VALUES ('Alice')")
+
+    assert result["success"] is False
+    assert result["error_type"] == "constraint"
+    assert result["attempts"] == 1
+    llm.invoke.assert_not_called()
+
+
+def test_transient_errors_back_off_and_retry_same_sql(test_db):
+    db = SQLDatabase.from_uri(f"sqlite:///{test_db}")
+    llm = _llm()
+    executor = QueryExecutor(
+        database=db,
+        llm=llm,
+        retry_config=RetryConfig(max_retries=3, strategy=RetryStrategy.LINEAR, base_delay=0.5)
+    )
+    real_run = executor._run
+    calls = []
+
+    def flaky(sql, *args):
+        calls.append(sql)
+        if len(calls) < 3:
+            raise RuntimeError("database is locked")
+        return real_run(sql, *args)
+
+    executor._run = flaky
+    with patch("src.execution.query_executor.time.sleep") as sleep:
+        result = executor.execute("SELECT COUNT(*) FROM users")
+
+    assert result["success"] is True
+    assert calls == ["SELECT COUNT(*) FROM users"] * 3
+    assert [c.args[0] for c in sleep.call_args_list] == [0, 0.5]
+    llm.invoke.assert_not_called()
+    stats = executor.get_error_stats()["connection"]
+    assert stats["errors"] == 2 and stats["retries"] == 2 and stats["recovered"] == 1
+
+
+def test_llm_repair_is_revalidated_before_execution(test_db):
+    from src.security.sql_validator import SQLSecurityValidator
+    db = SQLDatabase.from_uri(f"sqlite:///{test_db}")
+    llm = _llm("DELETE FROM users")
+    executor = QueryExecutor(database=db, llm=llm, security_validator=SQLSecurityValidator())
+    executor._run = MagicMock(wraps=executor._run)
+
+    result = executor.execute("SELECT nme FROM users")
+
+    assert result["success"] is False
+    assert result["rejected"] is True
+    assert "安全校验" in result["error"]
+    # 只执行了原始 SQL，修复出的 DELETE 没有到达数据库
+    assert executor._run.call_count == 1
+    assert [row[0] for row in sqlite3.connect(test_db).execute("SELECT COUNT(*) FROM users")] == [2]
+
+
+def test_local_identifier_fix_is_revalidated(test_db):
+    from src.security.sql_validator import SQLSecurityValidator
+    db = SQLDatabase.from_uri(f"sqlite:///{test_db}")
+    checker = SchemaChecker(database=db)
+    executor = QueryExecutor(
+        database=db,
+        schema_checker=checker,
+        security_validator=SQLSecurityValidator(allowed_tables=["users"])
+    )
+
+    # 预检把 order 更正为 orders，但 orders 不在允许的表中
+    result = executor.execute("SELECT amount FROM order")
+    assert result["success"] is False and result["rejected"] is True
+
+    stream = executor.execute_stream("SELECT amount FROM order")
+    assert list(stream) == []
+    assert stream.rejected is True and stream.success is False
+
+
+def test_llm_repair_is_recosted_before_execution(test_db):
+    from src.security.cost_guard import QueryCostGuard
+    db = SQLDatabase.from_uri(f"sqlite:///{test_db}")
+    llm = _llm("SELECT * FROM users a, users b, users c")
+    guard = QueryCostGuard(database=db, policy="reject", max_rows=5)
+    executor = QueryExecutor(database=db, llm=llm, cost_guard=guard)
+    executor._run = MagicMock(wraps=executor._run)
+
+    result = executor.execute("SELECT nme FROM users")
+
+    assert result["success"] is False
+    assert result["rejected"] is True
+    assert result["cost_guard"]["action"] == "reject"
+    assert executor._run.call_count == 1
@@ -0,0 +1,174 @@
+import pytest
+import os
+import sqlite3
+import tempfile
+from unittest.mock import MagicMock
+from src.generation.template_cache import TemplateCache, distinct_values_query, load_column_values
+
+
+@pytest.fixture
+def test_db():
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE orders (id INTEGER PRIMARY KEY, city TEXT, amount REAL, created_at TEXT);
+        INSERT INTO orders (city, amount, created_at) VALUES
+            ('上海', 100, '2024-01-05'), ('上海', 200, '2024-02-01'), ('北京', 50, '2024-01-09');
+    """)
+    conn.close()
+    yield path
+    os.unlink(path)
+
+
+CITIES = {"上海": "orders.city", "北京": "orders.city"}
+
+
+def test_extract_literals_into_slots():
+    cache = TemplateCache(value_dictionary=CITIES)
+    key, literals = cache.extract("上海 2024年1月 金额大于100的订单数")
+    assert key == "{value:orders.city} {month} 金额大于{number}的订单数"
+    assert [(l.kind, l.value) for l in literals] == [
+        ("value:orders.city", "上海"),
+        ("month", "2024-01"),
+        ("number", "100"),
+    ]
+
+
+def test_same_shape_different_literals_share_key():
+    cache = TemplateCache(value_dictionary=CITIES)
+    assert cache.extract("上海的订单数")[0] == cache.extract("北京的订单数")[0]
+    assert cache.extract("'张三'的订单")[0] == cache.extract("“李四”的订单")[0]
+
+
+def test_store_and_bind_new_literals():
+    cache = TemplateCache(value_dictionary=CITIES)
+    template = cache.store("上海的订单数", "SELECT COUNT(*) FROM orders WHERE city = '上海'")
+    assert template.sql == "SELECT COUNT(*) FROM orders WHERE city = :p0"
+
+    match = cache.lookup("北京的订单数")
+    assert match.parameters == {"p0": "北京"}
+    assert match.display_sql == "SELECT COUNT(*) FROM orders WHERE city = '北京'"
+
+
+def test_store_keeps_like_affixes_and_numeric_types():
+    cache = TemplateCache()
+    cache.store(
+        "金额大于100且名字含'王'的订单",
+        "SELECT * FROM orders WHERE amount > 100 AND name LIKE '%王%' LIMIT 10"
+    )
+    match = cache.lookup("金额大于250.5且名字含'李'的订单")
+    assert match.parameters == {"p0": 250.5, "p1": "%李%"}
+    assert "LIMIT 10" in match.template.sql
+
+
+def test_store_rejects_literal_not_found_in_sql():
+    cache = TemplateCache(value_dictionary=CITIES)
+    assert cache.store("上海的订单数", "SELECT COUNT(*) FROM orders WHERE city = 'Shanghai'") is None
+    assert cache.get_stats()["rejected"] == 1
+    assert cache.lookup("北京的订单数") is None
+
+
+def test_store_rejects_ambiguous_literal():
+    cache = TemplateCache()
+    assert cache.store("金额为10的订单", "SELECT * FROM orders WHERE amount = 10 LIMIT 10") is None
+
+
+def test_low_confidence_template_not_used():
+    cache = TemplateCache(value_dictionary=CITIES, confidence_threshold=0.8)
+    cache.store("上海的订单数", "SELECT COUNT(*) FROM orders WHERE city = '上海'")
+    match = cache.lookup("北京的订单数")
+    cache.record_failure(match)
+
+    assert cache.lookup("北京的订单数") is None
+    assert cache.get_stats()["low_confidence"] == 1
+
+
+def test_lru_eviction():
+    cache = TemplateCache(max_entries=2)
+    cache.store("问题一", "SELECT 1")
+    cache.store("问题二", "SELECT 2")
+    cache.lookup("问题一")
+    cache.store("问题三", "SELECT 3")
+    assert len(cache) == 2
+    assert cache.lookup("问题二") is None
+    assert cache.lookup("问题一") is not None
+
+
+def test_load_column_values(test_db):
+    from langchain_community.utilities import SQLDatabase
+    db = SQLDatabase.from_uri(f"sqlite:///{test_db}")
+    values = load_column_values(db, max_values=2)
+    assert values["上海"] == "orders.city"
+    assert "2024-01-05" not in values
+
+
+def test_value_dictionary_loaded_on_first_use():
+    loader = MagicMock(return_value=CITIES)
+    cache = TemplateCache(value_loader=loader)
+    loader.assert_not_called()
+
+    assert cache.extract("北京的订单数")[0] == "{value:orders.city}的订单数"
+    cache.extract("上海的订单数")
+    loader.assert_called_once()
+
+
+@pytest.mark.parametrize("dialect, identifiers, limit", [
+    ("mysql", "`Order`.`Group`", "LIMIT"),
+    ("mssql", "[Order].[Group]", "TOP"),
+    ("oracle", '"Order"."Group"', "FETCH FIRST"),
+])
+def test_distinct_values_query_uses_dialect_syntax(dialect, identifiers, limit):
+    from sqlalchemy.dialects import registry
+    compiled = str(distinct_values_query("Order", "Group", 3).compile(dialect=registry.load(dialect)()))
+    assert identifiers in compiled
+    assert limit in compiled
+
+
+def test_orchestrator_answers_from_template_without_llm(test_db):
+    from src.core.orchestrator import NL2SQLOrchestrator
+    llm = MagicMock()
+    llm.return_value = "SELECT COUNT(*) FROM orders WHERE city = '上海'"
+    orchestrator = NL2SQLOrchestrator(
+        llm=llm,
+        database_uri=f"sqlite:///{test_db}",
+        config={"template_cache_enabled": True}
+    )
+    orchestrator.sql_generator.generate = MagicMock(wraps=orchestrator.sql_generator.generate)
+
+    first = orchestrator.ask("上海的订单数")
+    assert first.status.value == "success"
+    assert "template_cache" not in first.metadata
+
+    second = orchestrator.ask("北京的订单数")
+    assert second.status.value == "success"
+    assert second.metadata["template_cache"]["hit"] is True
+    assert second.execution.result.rows == [(1,)]
+    assert second.sql == "SELECT COUNT(*) FROM orders WHERE city = '北京'"
+    assert orchestrator.sql_generator.generate.call_count == 1
+    assert orchestrator.get_cache_stats()["template"]["hits"] == 1
+
+
+def test_ask_stream_answers_from_template(test_db):
+    from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+    from langchain_core.messages import AIMessage
+    from src.core.orchestrator import NL2SQLOrchestrator
+    llm = GenericFakeChatModel(messages=iter([
+        AIMessage(content="</thinking><sql>SELECT COUNT(*) FROM orders WHERE city = '上海'</sql>"),
+    ]))
+    orchestrator = NL2SQLOrchestrator(
+        llm=llm,
+        database_uri=f"sqlite:///{test_db}",
+        config={"template_cache_enabled": True}
+    )
+
+    assert orchestrator.ask("上海的订单数").status.value == "success"
+    events = list(orchestrator.ask_stream("北京的订单数"))
+
+    stages = [e["stage"] for e in events]
+    assert stages[0] == "cache" and events[0]["data"]["template"]
+    assert "thinking" not in stages and "mapping" not in stages
+    assert events[-1]["status"] == "success"
+    assert events[-1]["data"]["sql"] == "SELECT COUNT(*) FROM orders WHERE city = '北京'"
+    assert events[-1]["data"]["execution_result"]["rows"] == [[1]]
+    assert events[-1]["data"]["explanation"]
@@ -0,0 +1,153 @@
+import pytest
+from unittest.mock import MagicMock
+from src.generation.stream_parser import ThinkingStreamParser, NativeThinkingStreamParser
+from src.generation.sql_generator import SQLGenerator
+
+
+def _collect(parser, chunks):
+    events = []
+    for chunk in chunks:
+        events.extend(parser.feed(chunk))
+    events.extend(parser.finish())
+    result = {}
+    for event in events:
+        result[event["type"]] = result.get(event["type"], "") + event["content"]
+    return events, result
+
+
+def _split_every(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+OUTPUT = "<thinking>先统计 users 表</thinking>\n<sql>\nSELECT COUNT(*) FROM users;\n</sql>\n说明文字"
+
+
+def test_thinking_parser_single_chunk():
+    _, result = _collect(ThinkingStreamParser(), [OUTPUT])
+    assert result["thinking"] == "先统计 users 表"
+    assert result["sql"].strip() == "SELECT COUNT(*) FROM users;"
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 5, 7])
+def test_thinking_parser_tags_split_across_chunks(size):
+    parser = ThinkingStreamParser()
+    _, result = _collect(parser, _split_every(OUTPUT, size))
+    assert result["thinking"] == "先统计 users 表"
+    assert result["sql"].strip() == "SELECT COUNT(*) FROM users;"
+    assert parser.done is True
+
+
+def test_thinking_parser_emits_deltas_not_accumulated_content():
+    parser = ThinkingStreamParser()
+    events, _ = _collect(parser, _split_every(OUTPUT, 4))
+    emitted = sum(len(e["content"]) for e in events)
+    assert emitted <= len(OUTPUT)
+
+
+def test_thinking_parser_primed_prompt_without_open_tag():
+    parser = ThinkingStreamParser(initial_state="thinking")
+    _, result = _collect(parser, ["分析问题", "</thin", "king><sql>SELECT 1</sql>"])
+    assert result["thinking"] == "分析问题"
+    assert result["sql"] == "SELECT 1"
+
+
+def test_thinking_parser_drops_repeated_open_tag():
+    parser = ThinkingStreamParser(initial_state="thinking")
+    _, result = _collect(parser, ["\n<THINKING>思考</thinking><sql>SELECT 1</sql>"])
+    assert "<THINKING>" not in result["thinking"]
+    assert result["thinking"].strip() == "思考"
+
+
+def test_thinking_parser_ignores_text_after_sql():
+    parser = ThinkingStreamParser()
+    _, result = _collect(parser, [OUTPUT, "更多内容"])
+    assert "说明文字" not in result["sql"]
+    assert parser.discarded_chars > 0
+
+
+def test_native_parser_select_keeps_keyword():
+    parser = NativeThinkingStreamParser()
+    _, result = _collect(parser, _split_every("我来查询用户数量。\nSELECT COUNT(*) FROM users", 3))
+    assert result["thinking"].strip() == "我来查询用户数量。"
+    assert result["sql"] == "SELECT COUNT(*) FROM users"
+
+
+def test_native_parser_code_fence():
+    parser = NativeThinkingStreamParser()
+    _, result = _collect(parser, _split_every("分析\n```sql\nSELECT 1\n```\n结束", 2))
+    assert result["sql"].strip() == "SELECT 1"
+    assert parser.done is True
+
+
+def test_native_parser_select_requires_word_boundary():
+    parser = NativeThinkingStreamParser()
+    _, result = _collect(parser, ["preselect values\nselect 1"])
+    assert result["thinking"].strip() == "preselect values"
+    assert result["sql"] == "select 1"
+
+
+def test_generate_with_thinking_stream_yields_deltas():
+    llm = MagicMock()
+    llm.return_value = "推理</thinking><sql>SELECT * FROM users</sql>"
+    generator = SQLGenerator(llm=llm)
+
+    items = list(generator.generate_with_thinking_stream("schema", "问题"))
+    thinking = "".join(i["content"] for i in items if i["type"] == "thinking")
+    sql = "".join(i["content"] for i in items if i["type"] == "sql")
+    assert thinking == "推理"
+    assert sql == "SELECT * FROM users"
+
+
+def test_generate_with_native_thinking_stream():
+    llm = MagicMock()
+    llm.return_value = "SELECT * FROM users"
+    generator = SQLGenerator(llm=llm)
+
+    items = list(generator.generate_with_native_thinking_stream("schema", "问题"))
+    sql = "".join(i["content"] for i in items if i["type"] == "sql")
+    assert sql == "SELECT * FROM users"
+    assert items[-1] == {"type": "thinking", "content": ""}
+
+
+def _fake_chat_model(text):
+    from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+    from langchain_core.messages import AIMessage
+    return GenericFakeChatModel(messages=iter([AIMessage(content=text)]))
+
+
+STREAMED = "推理 过程</thinking>\n<sql>SELECT 1</sql> 之后 还有 很多 无用 的 内容"
+
+
+def test_generate_with_thinking_stream_early_stop():
+    generator = SQLGenerator(llm=_fake_chat_model(STREAMED))
+
+    items = list(generator.generate_with_thinking_stream("schema", "问题"))
+    stats = items[-1]
+    sql = "".join(i["content"] for i in items if i["type"] == "sql")
+    assert sql == "SELECT 1"
+    assert stats["type"] == "stats"
+    assert stats["data"]["early_stopped"] is True
+    assert stats["data"]["chunks_after_sql"] == 0
+    assert stats["data"]["stop_sequences"] == ["</sql>"]
+
+
+def test_generate_with_thinking_stream_without_early_stop_reports_trailing_chunks():
+    generator = SQLGenerator(llm=_fake_chat_model(STREAMED), early_stop=False)
+
+    items = list(generator.generate_with_thinking_stream("schema", "问题"))
+    stats = items[-1]["data"]
+    assert stats["early_stopped"] is False
+    assert stats["chunks_after_sql"] > 0
+    assert stats["chars_after_sql"] > 0
+    assert stats["sql_closed_at"] <= stats["elapsed"]
+
+
+def test_stop_sequences_not_bound_for_plain_callables():
+    llm = MagicMock()
+    generator = SQLGenerator(llm=llm)
+    assert generator._llm_with_stop() is llm
+
+
+def test_clean_sql_without_closing_tag():
+    generator = SQLGenerator(llm=MagicMock())
+    assert generator._clean_sql("思考</thinking>\n<sql>\nSELECT 1\n") == "SELECT 1"
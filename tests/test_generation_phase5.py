@@ -0,0 +1,186 @@
+import pytest
+import os
+import time
+import sqlite3
+import tempfile
+from unittest.mock import MagicMock
+from src.core.types import ExecutionResult
+from src.execution.error_analyzer import RetryConfig
+from src.execution.query_executor import QueryExecutor
+from src.generation.candidate_voter import CandidateVoter
+from src.security.sql_validator import SQLSecurityValidator
+
+
+@pytest.fixture
+def test_db():
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT, age INTEGER);
+        INSERT INTO users (name, age) VALUES ('Alice', 25), ('Bob', 30), ('Carol', 35);
+    """)
+    conn.close()
+    yield path
+    os.unlink(path)
+
+
+def _execute_with(executor):
+    def execute(sql, cancel=None, question=None):
+        outcome = executor.execute(sql, cancel=cancel, question=question)
+        return ExecutionResult(
+            success=outcome["success"],
+            result=outcome.get("result"),
+            error=outcome.get("error", ""),
+            timed_out=outcome.get("timed_out", False),
+            cancelled=outcome.get("cancelled", False)
+        )
+    return execute
+
+
+def _voter(test_db, sqls, execution_timeout=10.0, **kwargs):
+    from langchain_community.utilities import SQLDatabase
+    db = SQLDatabase.from_uri(f"sqlite:///{test_db}")
+    generator = MagicMock()
+    generator.generate.side_effect = list(sqls)
+    executor = QueryExecutor(
+        database=db,
+        execution_timeout=execution_timeout,
+        retry_config=RetryConfig(max_retries=1),
+        **kwargs
+    )
+    voter = CandidateVoter(
+        sql_generator=generator,
+        security_validator=SQLSecurityValidator(),
+        execute=_execute_with(executor),
+        candidate_count=len(sqls),
+        execution_timeout=execution_timeout
+    )
+    return voter, executor
+
+
+def test_candidate_voter_majority_wins(test_db):
+    voter, _ = _voter(test_db, [
+        "SELECT COUNT(*) FROM users WHERE age > 26",
+        "SELECT COUNT(*) FROM users",
+        "SELECT COUNT(id) AS total FROM users",
+    ])
+    vote = voter.generate_and_vote("schema", "有多少用户?")
+
+    assert vote.has_winner is True
+    assert vote.rows == [(3,)]
+    assert vote.votes == 2
+    assert vote.sql == "SELECT COUNT(*) FROM users"
+
+
+def test_candidate_voter_skips_invalid_and_failing(test_db):
+    voter, _ = _voter(test_db, [
+        "DROP TABLE users",
+        "SELECT * FROM missing_table",
+        "SELECT name FROM users WHERE age = 30",
+    ])
+    vote = voter.generate_and_vote("schema", "问题")
+
+    assert vote.sql == "SELECT name FROM users WHERE age = 30"
+    assert vote.rows == [("Bob",)]
+    summary = vote.summary()
+    assert summary["candidate_count"] == 3
+    assert summary["valid_count"] == 2
+    assert summary["executed_count"] == 1
+
+
+def test_candidate_voter_result_order_ignored(test_db):
+    voter, _ = _voter(test_db, [
+        "SELECT name FROM users ORDER BY age DESC",
+        "SELECT name FROM users ORDER BY age ASC",
+        "SELECT name FROM users WHERE age > 100",
+    ])
+    vote = voter.generate_and_vote("schema", "问题")
+
+    assert vote.votes == 2
+    assert vote.candidates[0].cluster == vote.candidates[1].cluster
+
+
+def test_candidate_voter_no_winner_falls_back_to_first_valid(test_db):
+    voter, _ = _voter(test_db, ["DELETE FROM users", "SELECT * FROM missing_table"])
+    vote = voter.generate_and_vote("schema", "问题")
+
+    assert vote.has_winner is False
+    assert vote.sql == "SELECT * FROM missing_table"
+
+
+# 三表笛卡尔积约 10 亿行，只能被超时或取消中止
+_SLOW_SQL = "SELECT COUNT(*) FROM numbers a, numbers b, numbers c"
+
+
+@pytest.fixture
+def slow_db(test_db):
+    conn = sqlite3.connect(test_db)
+    conn.execute("CREATE TABLE numbers (n INTEGER)")
+    conn.executemany("INSERT INTO numbers VALUES (?)", [(i,) for i in range(1000)])
+    conn.commit()
+    conn.close()
+    return test_db
+
+
+def test_candidate_voter_times_out_slow_candidate_in_database(slow_db):
+    voter, executor = _voter(slow_db, [
+        "SELECT COUNT(*) FROM users",
+        _SLOW_SQL,
+    ], execution_timeout=0.3)
+
+    started = time.monotonic()
+    vote = voter.generate_and_vote("schema", "问题")
+
+    assert time.monotonic() - started < 5
+    assert vote.sql == "SELECT COUNT(*) FROM users"
+    assert vote.candidates[1].is_valid is True
+    assert vote.candidates[1].executed is False
+    # 慢语句被数据库中止，而不是在后台继续占用连接
+    time.sleep(0.5)
+    assert any(not h["success"] and h["sql"] == _SLOW_SQL for h in executor.execution_history)
+
+
+def test_candidate_voter_cancels_losers_once_majority_decided(slow_db):
+    voter, executor = _voter(slow_db, [
+        "SELECT COUNT(*) FROM users",
+        "SELECT COUNT(id) FROM users",
+        _SLOW_SQL,
+    ], execution_timeout=30)
+
+    started = time.monotonic()
+    vote = voter.generate_and_vote("schema", "问题")
+
+    # 两票一致后第三个候选无法改变结果，立即取消而不是等到 30 秒超时
+    assert time.monotonic() - started < 5
+    assert vote.votes == 2
+    assert vote.candidates[2].executed is False
+    assert "取消" in vote.candidates[2].error
+    time.sleep(0.5)
+    assert any(not h["success"] and h["sql"] == _SLOW_SQL for h in executor.execution_history)
+
+
+def test_candidate_voter_decided():
+    assert CandidateVoter._decided({("a",): 2}, 1) is True
+    assert CandidateVoter._decided({("a",): 2, ("b",): 1}, 1) is False
+    assert CandidateVoter._decided({("a",): 1}, 1) is False
+    assert CandidateVoter._decided({}, 0) is False
+
+
+def test_orchestrator_uses_candidate_voting(test_db):
+    from src.core.orchestrator import NL2SQLOrchestrator
+    llm = MagicMock()
+    llm.return_value = "SELECT COUNT(*) FROM users"
+    orchestrator = NL2SQLOrchestrator(
+        llm=llm,
+        database_uri=f"sqlite:///{test_db}",
+        config={"candidate_count": 3}
+    )
+
+    result = orchestrator.ask("有多少用户?")
+
+    assert result.status.value == "success"
+    assert result.execution.result.rows == [(3,)]
+    assert result.metadata["candidates"]["votes"] == 3
+    assert result.execution.attempts == 1
+    assert orchestrator.candidate_executor.max_retries == 1
@@ -0,0 +1,102 @@
+import pytest
+import os
+import sqlite3
+import tempfile
+from unittest.mock import MagicMock
+from src.generation.model_router import ModelRouter, FAST_ROUTE, STRONG_ROUTE
+
+
+@pytest.fixture
+def router():
+    fast = MagicMock()
+    fast.generate.return_value = "SELECT COUNT(*) FROM orders"
+    strong = MagicMock()
+    strong.generate.return_value = "SELECT u.name, SUM(o.amount) FROM users u JOIN orders o ON u.id = o.user_id GROUP BY u.name"
+    return ModelRouter(fast, strong, table_names=["users", "orders", "products"])
+
+
+def test_router_simple_question_goes_fast(router):
+    decision = router.route("how many orders")
+    assert decision.route == FAST_ROUTE
+    assert decision.features["tables"] == ["orders"]
+
+
+def test_router_multi_table_comparison_goes_strong(router):
+    decision = router.route("对比每个 user 的 orders 总额和上月相比的增长")
+    assert decision.route == STRONG_ROUTE
+    assert decision.features["comparison"] >= 1
+    assert len(decision.features["tables"]) == 2
+
+
+def test_router_uses_field_mapping_tables(router):
+    score, features = router.score("销售额", field_mappings=[
+        {"term": "销售额", "fields": ["sales.amount", "orders.total_amount"]}
+    ])
+    assert "sales" in features["tables"]
+    assert score >= 1.0
+
+
+def test_router_generate_records_latency(router):
+    decision = router.route("how many orders")
+    sql = router.generate("schema", "how many orders", decision)
+    router.record_outcome(decision.route, True)
+
+    stats = router.get_stats()
+    assert sql == "SELECT COUNT(*) FROM orders"
+    assert stats[FAST_ROUTE]["calls"] == 1
+    assert stats[FAST_ROUTE]["success"] == 1
+    assert stats[FAST_ROUTE]["success_rate"] == 100.0
+    assert stats[STRONG_ROUTE]["calls"] == 0
+
+
+def test_router_escalate_uses_strong_model(router):
+    decision = router.route("how many orders")
+    sql, escalated = router.escalate("schema", "how many orders", decision)
+
+    assert escalated.route == STRONG_ROUTE
+    assert "JOIN" in sql
+    assert router.get_stats()[FAST_ROUTE]["escalations"] == 1
+
+
+@pytest.fixture
+def test_db():
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT);
+        INSERT INTO users (name) VALUES ('Alice'), ('Bob');
+    """)
+    conn.close()
+    yield path
+    os.unlink(path)
+
+
+def test_orchestrator_escalates_on_execution_failure(test_db):
+    from src.core.orchestrator import NL2SQLOrchestrator
+    fast_llm = MagicMock()
+    fast_llm.return_value = "SELECT * FROM missing_table"
+    strong_llm = MagicMock()
+    strong_llm.return_value = "SELECT COUNT(*) FROM users"
+    strong_llm.invoke.return_value = "SELECT * FROM missing_table"
+
+    orchestrator = NL2SQLOrchestrator(
+        llm=strong_llm,
+        database_uri=f"sqlite:///{test_db}",
+        config={"max_retries": 1},
+        fast_llm=fast_llm
+    )
+    result = orchestrator.ask("有多少 users?")
+
+    assert result.status.value == "success"
+    assert result.sql == "SELECT COUNT(*) FROM users"
+    assert result.metadata["escalated"] is True
+    stats = orchestrator.get_routing_stats()["routes"]
+    assert stats[FAST_ROUTE]["failure"] == 1
+    assert stats[STRONG_ROUTE]["success"] == 1
+
+
+def test_orchestrator_routing_disabled_by_default(test_db):
+    from src.core.orchestrator import NL2SQLOrchestrator
+    orchestrator = NL2SQLOrchestrator(llm=MagicMock(), database_uri=f"sqlite:///{test_db}")
+    assert orchestrator.get_routing_stats() == {"enabled": False}
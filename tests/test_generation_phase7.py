@@ -0,0 +1,252 @@
+import asyncio
+import pytest
+import threading
+import time
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models import BaseLanguageModel
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+from unittest.mock import patch
+from src.generation.llm_gateway import (
+    TokenBucket,
+    ProviderGateway,
+    GatewayChatModel,
+    GatewayTimeoutError,
+    with_gateway,
+)
+from src.generation.llm_factory import _shared_http_clients
+from src.generation.sql_generator import SQLGenerator
+
+
+def _fake_chat_model(*texts):
+    return GenericFakeChatModel(messages=iter([AIMessage(content=t) for t in texts]))
+
+
+def test_token_bucket_unlimited():
+    bucket = TokenBucket(0)
+    assert bucket.time_until(10 ** 9) == 0.0
+
+
+def test_token_bucket_waits_after_burst():
+    bucket = TokenBucket(60)
+    assert bucket.time_until(60) == 0.0
+    bucket.consume(60)
+    assert bucket.time_until(1) == pytest.approx(1.0, abs=0.05)
+
+
+def test_gateway_limits_in_flight():
+    gateway = ProviderGateway("test", max_in_flight=2, queue_timeout=5)
+    peak = []
+    active = [0]
+    lock = threading.Lock()
+
+    def call():
+        gateway.acquire()
+        with lock:
+            active[0] += 1
+            peak.append(active[0])
+        time.sleep(0.02)
+        with lock:
+            active[0] -= 1
+        gateway.release()
+
+    threads = [threading.Thread(target=call) for _ in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    metrics = gateway.get_metrics()
+    assert max(peak) <= 2
+    assert metrics["requests"] == 6
+    assert metrics["in_flight"] == 0
+    assert metrics["max_queue_depth"] >= 2
+
+
+def test_gateway_queue_timeout():
+    gateway = ProviderGateway("test", max_in_flight=1, queue_timeout=0.05)
+    gateway.acquire()
+    with pytest.raises(GatewayTimeoutError):
+        gateway.acquire()
+    assert gateway.get_metrics()["timeouts"] == 1
+
+
+def test_gateway_request_rate_limit():
+    gateway = ProviderGateway("test", requests_per_minute=1, queue_timeout=0.05)
+    gateway.acquire()
+    gateway.release()
+    with pytest.raises(GatewayTimeoutError):
+        gateway.acquire()
+
+
+def test_gateway_charges_actual_token_usage():
+    gateway = ProviderGateway("test", tokens_per_minute=100)
+    gateway.acquire(estimated_tokens=10)
+    gateway.release(estimated_tokens=10, actual_tokens=100)
+    # 预估 10 已扣，实际 100 补扣 90，桶已空，下一个 50 token 的请求需等约 30 秒
+    assert gateway.token_bucket.time_until(50) == pytest.approx(30.0, abs=0.5)
+    assert gateway.get_metrics()["tokens_used"] == 100
+
+
+def test_gateway_chat_model_invoke_and_stream():
+    gateway = ProviderGateway("test")
+    llm = GatewayChatModel(inner=_fake_chat_model("hello world", "a b c"), gateway=gateway)
+
+    assert llm.invoke("hi").content == "hello world"
+    assert "".join(c.content for c in llm.stream("hi")) == "a b c"
+
+    metrics = gateway.get_metrics()
+    assert metrics["requests"] == 2
+    assert metrics["in_flight"] == 0
+
+
+def test_gateway_chat_model_releases_slot_when_stream_closed_early():
+    gateway = ProviderGateway("test", max_in_flight=1)
+    llm = GatewayChatModel(inner=_fake_chat_model("a b c d"), gateway=gateway)
+
+    stream = llm.stream("hi")
+    next(stream)
+    assert gateway.get_metrics()["in_flight"] == 1
+    stream.close()
+    assert gateway.get_metrics()["in_flight"] == 0
+
+
+def test_gateway_chat_model_retries_after_rate_limit():
+    class RateLimitError(Exception):
+        status_code = 429
+
+    class FlakyModel(GenericFakeChatModel):
+        def _generate(self, *args, **kwargs):
+            if not getattr(self, "_failed", False):
+                object.__setattr__(self, "_failed", True)
+                raise RateLimitError("too many requests")
+            return super()._generate(*args, **kwargs)
+
+    gateway = ProviderGateway("test", queue_timeout=5)
+    inner = FlakyModel(messages=iter([AIMessage(content="ok")]))
+    llm = GatewayChatModel(inner=inner, gateway=gateway)
+
+    assert llm.invoke("hi").content == "ok"
+    assert gateway.get_metrics()["rate_limited"] == 1
+
+
+def test_gateway_chat_model_runs_inner_model_as_child_run():
+    class Recorder(BaseCallbackHandler):
+        def __init__(self):
+            self.starts = []
+
+        def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, **kwargs):
+            self.starts.append((run_id, parent_run_id))
+
+    outer_handler, inner_handler = Recorder(), Recorder()
+    inner = GenericFakeChatModel(messages=iter([AIMessage(content="ok")]), callbacks=[inner_handler])
+    llm = GatewayChatModel(inner=inner, gateway=ProviderGateway("test"))
+
+    assert llm.invoke("hi", config={"callbacks": [outer_handler]}).content == "ok"
+
+    # 内层模型自己的回调照常触发，且其运行挂在网关运行之下
+    (outer_run, _), (inner_run, parent) = outer_handler.starts
+    assert parent == outer_run
+    assert inner_handler.starts == [(inner_run, outer_run)]
+
+
+def test_shared_async_http_client_uses_one_pool_per_event_loop():
+    _, client = _shared_http_clients("http://pool.test", 4)
+
+    async def pools():
+        return client._loop_client(), client._loop_client()
+
+    first, again = asyncio.run(pools())
+    second, _ = asyncio.run(pools())
+    assert first is again
+    assert first is not second
+
+
+def test_with_gateway_keeps_stop_sequences_working():
+    gateway = ProviderGateway("test")
+    llm = with_gateway(_fake_chat_model("x"), gateway)
+    assert isinstance(llm, BaseLanguageModel)
+    generator = SQLGenerator(llm=llm)
+    assert generator._supports_stop() is True
+
+
+def test_with_gateway_passes_through_non_chat_models():
+    sentinel = object()
+    assert with_gateway(sentinel, ProviderGateway("test")) is sentinel
+
+
+def test_gateway_async_acquire_cancelled_while_queued_keeps_no_slot():
+    gateway = ProviderGateway("test", max_in_flight=1, queue_timeout=5)
+
+    async def main():
+        gateway.acquire()
+        waiter = asyncio.ensure_future(gateway.acquire_async())
+        await asyncio.sleep(0.02)
+        assert gateway.get_metrics()["queue_depth"] == 1
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        gateway.release()
+        metrics = gateway.get_metrics()
+        assert metrics["in_flight"] == 0
+        assert metrics["queue_depth"] == 0
+        # 名额已归还，下一个请求立即拿到
+        await asyncio.wait_for(gateway.acquire_async(), timeout=1)
+        gateway.release()
+
+    asyncio.run(main())
+
+
+def test_gateway_async_acquire_woken_by_release_from_thread():
+    gateway = ProviderGateway("test", max_in_flight=1, queue_timeout=5)
+    gateway.acquire()
+    threading.Timer(0.05, gateway.release).start()
+
+    async def main():
+        return await gateway.acquire_async()
+
+    waited = asyncio.run(main())
+    assert 0.03 < waited < 1
+    assert gateway.get_metrics()["in_flight"] == 1
+
+
+def test_gateway_chat_model_ainvoke_cancelled_in_queue_releases_nothing():
+    gateway = ProviderGateway("test", max_in_flight=1, queue_timeout=5)
+    llm = GatewayChatModel(inner=_fake_chat_model("ok", "again"), gateway=gateway)
+
+    async def main():
+        gateway.acquire()
+        task = asyncio.ensure_future(llm.ainvoke("hi"))
+        await asyncio.sleep(0.02)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        gateway.release()
+        assert gateway.get_metrics()["in_flight"] == 0
+        return (await llm.ainvoke("hi")).content
+
+    assert asyncio.run(main()) == "ok"
+    assert gateway.get_metrics()["in_flight"] == 0
+
+
+def test_gateway_chat_model_async_retries_after_rate_limit():
+    class RateLimitError(Exception):
+        status_code = 429
+
+    class FlakyModel(GenericFakeChatModel):
+        def _generate(self, *args, **kwargs):
+            if not getattr(self, "_failed", False):
+                object.__setattr__(self, "_failed", True)
+                raise RateLimitError("too many requests")
+            return super()._generate(*args, **kwargs)
+
+    gateway = ProviderGateway("test", queue_timeout=5)
+    inner = FlakyModel(messages=iter([AIMessage(content="ok")]))
+    llm = GatewayChatModel(inner=inner, gateway=gateway)
+
+    with patch("src.generation.llm_gateway._retry_after", return_value=0.01):
+        result = asyncio.run(llm.ainvoke("hi"))
+    assert result.content == "ok"
+    metrics = gateway.get_metrics()
+    assert metrics["rate_limited"] == 1
+    assert metrics["in_flight"] == 0
@@ -0,0 +1,194 @@
+import pytest
+import asyncio
+import time
+from typing import Any, Iterator, List
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from src.generation.llm_hedging import CircuitBreaker, HedgedChatModel
+
+
+class ScriptedChatModel(BaseChatModel):
+    """按固定延迟返回固定文本的测试模型，可设置为总是失败"""
+
+    text: str = "ok"
+    delay: float = 0.0
+    fail: bool = False
+    calls: int = 0
+    cancelled: bool = False
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError(f"{self.text} failed")
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.text))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError(f"{self.text} failed")
+        for word in self.text.split(" "):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word))
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if self.fail:
+            raise RuntimeError(f"{self.text} failed")
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.text))])
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if self.fail:
+            raise RuntimeError(f"{self.text} failed")
+        for word in self.text.split(" "):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word))
+
+
+def _hedged(*providers, **kwargs):
+    kwargs.setdefault("initial_hedge_delay", 0.05)
+    return HedgedChatModel(
+        providers=list(providers),
+        provider_names=[p.text for p in providers],
+        **kwargs
+    )
+
+
+def test_circuit_breaker_opens_and_half_opens():
+    breaker = CircuitBreaker(failure_threshold=2, cooldown=0.05)
+    breaker.record_failure()
+    assert breaker.allow() is True
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.allow() is False
+
+    time.sleep(0.06)
+    assert breaker.allow() is True
+    assert breaker.allow() is False
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_hedged_fast_primary_no_hedge():
+    primary = ScriptedChatModel(text="primary")
+    secondary = ScriptedChatModel(text="secondary")
+    llm = _hedged(primary, secondary)
+
+    assert llm.invoke("hi").content == "primary"
+    assert secondary.calls == 0
+
+
+def test_hedged_slow_primary_uses_secondary():
+    primary = ScriptedChatModel(text="primary", delay=0.5)
+    secondary = ScriptedChatModel(text="secondary")
+    llm = _hedged(primary, secondary)
+
+    start = time.time()
+    assert llm.invoke("hi").content == "secondary"
+    assert time.time() - start < 0.4
+
+    stats = llm.get_stats()["providers"]
+    assert stats["secondary"]["hedges"] == 1
+    assert stats["secondary"]["wins"] == 1
+    assert stats["primary"]["cancelled"] == 1
+
+
+def test_hedged_stream_takes_first_to_produce_token():
+    primary = ScriptedChatModel(text="slow answer", delay=0.5)
+    secondary = ScriptedChatModel(text="fast answer")
+    llm = _hedged(primary, secondary)
+
+    assert "".join(c.content for c in llm.stream("hi")) == "fastanswer"
+
+
+def test_hedged_failover_on_error():
+    primary = ScriptedChatModel(text="primary", fail=True)
+    secondary = ScriptedChatModel(text="secondary")
+    llm = _hedged(primary, secondary, initial_hedge_delay=5.0)
+
+    start = time.time()
+    assert llm.invoke("hi").content == "secondary"
+    assert time.time() - start < 1.0
+    assert llm.get_stats()["providers"]["primary"]["failures"] == 1
+
+
+def test_hedged_breaker_sidelines_failing_provider():
+    primary = ScriptedChatModel(text="primary", fail=True)
+    secondary = ScriptedChatModel(text="secondary")
+    llm = _hedged(primary, secondary, failure_threshold=2, cooldown=60)
+
+    for _ in range(4):
+        assert llm.invoke("hi").content == "secondary"
+
+    assert primary.calls == 2
+    stats = llm.get_stats()["providers"]["primary"]
+    assert stats["state"] == CircuitBreaker.OPEN
+    assert stats["skipped"] == 2
+
+
+def test_hedged_all_providers_fail():
+    llm = _hedged(
+        ScriptedChatModel(text="a", fail=True),
+        ScriptedChatModel(text="b", fail=True)
+    )
+    with pytest.raises(RuntimeError):
+        llm.invoke("hi")
+
+
+def test_hedge_delay_uses_latency_percentile():
+    primary = ScriptedChatModel(text="primary")
+    llm = _hedged(primary, ScriptedChatModel(text="secondary"), min_samples=3, min_hedge_delay=0.0)
+    llm._first_token_latencies[0].extend([0.1, 0.2, 0.3, 0.4, 1.0])
+    assert llm.hedge_delay() == pytest.approx(0.4)
+    assert llm.hedge_delay(streaming=False) == pytest.approx(0.05)
+
+
+def test_invoke_latency_not_counted_as_first_token():
+    llm = _hedged(ScriptedChatModel(text="primary", delay=0.02), ScriptedChatModel(text="secondary"))
+    llm.invoke("hi")
+    list(llm.stream("hi"))
+
+    assert len(llm._completion_latencies[0]) == 2
+    assert len(llm._first_token_latencies[0]) == 1
+
+
+def test_ainvoke_hedges_and_cancels_slow_primary():
+    primary = ScriptedChatModel(text="primary", delay=5.0)
+    secondary = ScriptedChatModel(text="secondary")
+    llm = _hedged(primary, secondary)
+
+    start = time.time()
+    assert asyncio.run(llm.ainvoke("hi")).content == "secondary"
+    assert time.time() - start < 1.0
+    assert primary.cancelled is True
+
+    stats = llm.get_stats()["providers"]
+    assert stats["secondary"]["hedges"] == 1 and stats["secondary"]["wins"] == 1
+    assert stats["primary"]["cancelled"] == 1
+
+
+def test_astream_fails_over_and_streams_winner():
+    primary = ScriptedChatModel(text="primary", fail=True)
+    secondary = ScriptedChatModel(text="fast answer")
+    llm = _hedged(primary, secondary, initial_hedge_delay=5.0)
+
+    async def collect():
+        return "".join([chunk.content async for chunk in llm.astream("hi")])
+
+    assert asyncio.run(collect()) == "fastanswer"
+    assert llm.get_stats()["providers"]["primary"]["failures"] == 1
@@ -0,0 +1,119 @@
+import pytest
+import json
+import os
+import time
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+from src.generation.llm_replay import (
+    Cassette,
+    CassetteMissError,
+    RecordingChatModel,
+    ReplayChatModel,
+)
+from src.generation.sql_generator import SQLGenerator
+
+
+def _fake_chat_model(*texts):
+    return GenericFakeChatModel(messages=iter([AIMessage(content=t) for t in texts]))
+
+
+@pytest.fixture
+def cassette_path(tmp_path):
+    return str(tmp_path / "cassettes" / "llm.jsonl")
+
+
+def test_cassette_key_depends_on_prompt_and_stop():
+    messages = [HumanMessage(content="问题")]
+    assert Cassette.key(messages) == Cassette.key([HumanMessage(content="问题")])
+    assert Cassette.key(messages) != Cassette.key([HumanMessage(content="另一个问题")])
+    assert Cassette.key(messages) != Cassette.key(messages, stop=["</sql>"])
+
+
+def test_record_then_replay_stream(cassette_path):
+    recorder = RecordingChatModel(inner=_fake_chat_model("SELECT * FROM users"), cassette=Cassette(cassette_path))
+    recorded = [c.content for c in recorder.stream("问题")]
+
+    with open(cassette_path, encoding="utf-8") as f:
+        lines = [json.loads(line) for line in f]
+    assert lines[0] == {"version": Cassette.VERSION}
+    assert len(lines) == 2
+
+    replay = ReplayChatModel(cassette=Cassette(cassette_path), speed=0)
+    replayed = [c.content for c in replay.stream("问题")]
+    assert "".join(replayed) == "".join(recorded) == "SELECT * FROM users"
+    assert [c for c in replayed if c] == [c for c in recorded if c]
+
+
+def test_cassette_appends_one_line_per_call(cassette_path):
+    cassette = Cassette(cassette_path)
+    key = Cassette.key([HumanMessage(content="hi")])
+    cassette.add(key, ["a"], [0.0])
+    size = os.path.getsize(cassette_path)
+    cassette.add(key, ["b"], [0.0])
+
+    # 追加写入：已有内容不会被重写
+    with open(cassette_path, encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    assert len(lines) == 3
+    assert os.path.getsize(cassette_path) - size == len(lines[2].encode("utf-8")) + 1
+    cassette.close()
+
+    reopened = Cassette(cassette_path)
+    reopened.add(key, ["c"], [0.0])
+    assert len(Cassette(cassette_path)) == 3
+
+
+def test_cassette_skips_truncated_last_line(cassette_path):
+    cassette = Cassette(cassette_path)
+    key = Cassette.key([HumanMessage(content="hi")])
+    cassette.add(key, ["a"], [0.0])
+    cassette.close()
+    with open(cassette_path, "a", encoding="utf-8") as f:
+        f.write('{"key": "')
+
+    assert len(Cassette(cassette_path)) == 1
+
+
+def test_replay_invoke_merges_chunks(cassette_path):
+    cassette = Cassette(cassette_path)
+    cassette.add(Cassette.key([HumanMessage(content="hi")]), ["SELECT", " 1"], [0.0, 0.0])
+
+    replay = ReplayChatModel(cassette=cassette, speed=0)
+    assert replay.invoke("hi").content == "SELECT 1"
+
+
+def test_replay_reproduces_scaled_timing(cassette_path):
+    cassette = Cassette(cassette_path)
+    cassette.add(Cassette.key([HumanMessage(content="hi")]), ["a", "b", "c"], [0.1, 0.1, 0.1])
+
+    start = time.time()
+    list(ReplayChatModel(cassette=cassette, speed=2.0).stream("hi"))
+    elapsed = time.time() - start
+    assert 0.13 <= elapsed < 0.5
+
+
+def test_replay_rotates_multiple_recordings(cassette_path):
+    cassette = Cassette(cassette_path)
+    key = Cassette.key([HumanMessage(content="hi")])
+    cassette.add(key, ["first"], [0.0])
+    cassette.add(key, ["second"], [0.0])
+
+    replay = ReplayChatModel(cassette=cassette, speed=0)
+    assert [replay.invoke("hi").content for _ in range(3)] == ["first", "second", "first"]
+
+
+def test_replay_miss_raises(cassette_path):
+    replay = ReplayChatModel(cassette=Cassette(cassette_path), speed=0)
+    with pytest.raises(CassetteMissError):
+        replay.invoke("没有录制")
+
+
+def test_sql_generator_round_trip_with_stop_sequences(cassette_path):
+    recorder = RecordingChatModel(
+        inner=_fake_chat_model("<sql>SELECT 1</sql>"),
+        cassette=Cassette(cassette_path)
+    )
+    assert SQLGenerator(llm=recorder).generate("schema", "问题") == "SELECT 1"
+
+    replay = ReplayChatModel(cassette=Cassette(cassette_path), speed=0)
+    assert SQLGenerator(llm=replay).generate("schema", "问题") == "SELECT 1"
@@ -0,0 +1,140 @@
+import pytest
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from unittest.mock import MagicMock
+from src.core.single_flight import SingleFlight
+
+
+def test_single_flight_shares_result():
+    flight = SingleFlight()
+    calls = []
+    started = threading.Event()
+
+    def slow():
+        calls.append(1)
+        started.set()
+        time.sleep(0.1)
+        return "answer"
+
+    results = []
+
+    def worker():
+        results.append(flight.do("key", slow))
+
+    leader = threading.Thread(target=worker)
+    leader.start()
+    started.wait()
+    followers = [threading.Thread(target=worker) for _ in range(4)]
+    for t in followers:
+        t.start()
+    for t in [leader] + followers:
+        t.join()
+
+    assert len(calls) == 1
+    assert sorted(shared for _, shared in results) == [False, True, True, True, True]
+    assert all(value == "answer" for value, _ in results)
+    assert flight.get_stats()["coalesced_calls"] == 4
+
+
+def test_single_flight_propagates_error_and_resets():
+    flight = SingleFlight()
+
+    def boom():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        flight.do("key", boom)
+    assert flight.do("key", lambda: 1) == (1, False)
+
+
+def test_single_flight_stream_replays_then_tails():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def events():
+        yield 1
+        yield 2
+        release.wait()
+        yield 3
+
+    first = flight.stream("key", events)
+    assert next(first) == 1
+    assert next(first) == 2
+
+    second = flight.stream("key", events)
+    release.set()
+    assert list(second) == [1, 2, 3]
+    assert list(first) == [3]
+    assert flight.get_stats()["coalesced_streams"] == 1
+
+
+def test_single_flight_stream_survives_subscriber_disconnect():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def events():
+        yield "a"
+        release.wait()
+        yield "b"
+
+    first = flight.stream("key", events)
+    assert next(first) == "a"
+    second = flight.stream("key", events)
+    first.close()
+    release.set()
+    assert list(second) == ["a", "b"]
+
+
+@pytest.fixture
+def test_db():
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT, age INTEGER);
+        INSERT INTO users (name, age) VALUES ('Alice', 25), ('Bob', 30);
+    """)
+    conn.close()
+    yield path
+    os.unlink(path)
+
+
+def test_orchestrator_coalesces_identical_questions(test_db):
+    from src.core.orchestrator import NL2SQLOrchestrator
+    llm = MagicMock()
+    llm.return_value = "SELECT COUNT(*) FROM users"
+    orchestrator = NL2SQLOrchestrator(llm=llm, database_uri=f"sqlite:///{test_db}")
+
+    generate = orchestrator.sql_generator.generate
+
+    def slow_generate(*args, **kwargs):
+        time.sleep(0.2)
+        return generate(*args, **kwargs)
+
+    orchestrator.sql_generator.generate = MagicMock(side_effect=slow_generate)
+
+    results = []
+    questions = ["有多少用户?", "有多少用户？", " 有多少用户 ?"]
+    threads = [threading.Thread(target=lambda q=q: results.append(orchestrator.ask(q))) for q in questions]
+    for t in threads:
+        t.start()
+        time.sleep(0.02)
+    for t in threads:
+        t.join()
+
+    assert orchestrator.sql_generator.generate.call_count == 1
+    assert all(r.status.value == "success" for r in results)
+    assert sum(1 for r in results if r.metadata.get("coalesced")) == 2
+    assert sorted(r.question for r in results) == sorted(questions)
+
+
+def test_orchestrator_does_not_coalesce_different_scopes(test_db):
+    from src.core.orchestrator import NL2SQLOrchestrator
+    llm = MagicMock()
+    llm.return_value = "SELECT COUNT(*) FROM users"
+    orchestrator = NL2SQLOrchestrator(llm=llm, database_uri=f"sqlite:///{test_db}")
+    assert orchestrator._flight_key("问题", "a") != orchestrator._flight_key("问题", "b")
+    assert orchestrator._flight_key("问题?", "a") == orchestrator._flight_key("问题 ？", "a")
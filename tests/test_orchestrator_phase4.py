@@ -0,0 +1,275 @@
+import pytest
+import asyncio
+import os
+import sqlite3
+import tempfile
+import time
+from typing import Any, List, Optional
+from langchain_core.language_models import BaseChatModel
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from src.core.orchestrator import NL2SQLOrchestrator
+from src.core.single_flight import SingleFlight
+from src.core.types import QueryStatus
+from src.execution.query_timeout import CancelToken
+
+
+class SlowChatModel(BaseChatModel):
+    """ainvoke 等待 delay 秒后返回固定 SQL；同步调用会阻塞线程"""
+
+    delay: float = 0.2
+    content: str = "</thinking><sql>SELECT name FROM users ORDER BY id</sql>"
+
+    @property
+    def _llm_type(self) -> str:
+        return "slow-fake"
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        time.sleep(self.delay)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.content))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self.delay)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.content))])
+
+
+@pytest.fixture
+def test_db():
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT);
+        INSERT INTO users (name) VALUES ('Alice'), ('Bob'), ('Carol');
+    """)
+    conn.close()
+    yield path
+    os.unlink(path)
+
+
+def _fake_llm(sql: str, explanation: str = "三位用户") -> GenericFakeChatModel:
+    return GenericFakeChatModel(messages=iter([
+        AIMessage(content=f"</thinking><sql>{sql}</sql>"),
+        AIMessage(content=explanation),
+    ]))
+
+
+def test_do_async_shares_one_task():
+    flight = SingleFlight()
+    calls = []
+
+    async def slow():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "answer"
+
+    async def main():
+        return await asyncio.gather(*(flight.do_async("key", slow) for _ in range(5)))
+
+    results = asyncio.run(main())
+    assert len(calls) == 1
+    assert sorted(shared for _, shared in results) == [False, True, True, True, True]
+    assert flight.get_stats()["in_flight"] == 0
+
+
+def test_do_async_survives_cancelled_waiter():
+    flight = SingleFlight()
+
+    async def slow():
+        await asyncio.sleep(0.05)
+        return 42
+
+    async def main():
+        leader = asyncio.ensure_future(flight.do_async("key", slow))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flight.do_async("key", slow))
+        await asyncio.sleep(0)
+        leader.cancel()
+        return await follower
+
+    assert asyncio.run(main()) == (42, True)
+
+
+def test_astream_abandon_cancels_shared_task():
+    flight = SingleFlight()
+    abandoned = []
+    finished = []
+
+    async def events():
+        try:
+            yield 1
+            await asyncio.sleep(10)
+            yield 2
+        finally:
+            finished.append(True)
+
+    async def main():
+        cancel = CancelToken()
+        received = []
+        async for event in flight.astream("key", events, cancel=cancel, on_abandon=lambda: abandoned.append(True)):
+            received.append(event)
+            cancel.cancel()
+        await asyncio.sleep(0.01)
+        return received
+
+    assert asyncio.run(main()) == [1]
+    assert abandoned == [True] and finished == [True]
+    assert flight.get_stats()["in_flight"] == 0
+
+
+def test_ask_async_runs_pipeline(test_db):
+    orchestrator = NL2SQLOrchestrator(
+        llm=_fake_llm("SELECT name FROM users ORDER BY id"),
+        database_uri=f"sqlite:///{test_db}"
+    )
+
+    result = asyncio.run(orchestrator.ask_async("列出用户"))
+
+    assert result.status == QueryStatus.SUCCESS
+    assert result.sql == "SELECT name FROM users ORDER BY id"
+    assert result.execution.result.rows == [("Alice",), ("Bob",), ("Carol",)]
+    assert result.explanation == "三位用户"
+
+
+def test_ask_async_rejects_unsafe_sql(test_db):
+    orchestrator = NL2SQLOrchestrator(
+        llm=_fake_llm("DROP TABLE users"),
+        database_uri=f"sqlite:///{test_db}"
+    )
+
+    result = asyncio.run(orchestrator.ask_async("删除用户表"))
+
+    assert result.status == QueryStatus.SECURITY_REJECTED
+    assert result.execution is None
+
+
+def test_ask_async_does_not_block_event_loop(test_db):
+    orchestrator = NL2SQLOrchestrator(
+        llm=SlowChatModel(delay=0.2),
+        database_uri=f"sqlite:///{test_db}"
+    )
+
+    async def main():
+        return await asyncio.gather(*(orchestrator.ask_async(f"用户 {i}") for i in range(20)))
+
+    started = time.monotonic()
+    results = asyncio.run(main())
+    elapsed = time.monotonic() - started
+
+    assert all(r.status == QueryStatus.SUCCESS for r in results)
+    # 20 次生成串行需要 4 秒；并发执行时接近单次延迟
+    assert elapsed < 2.0
+
+
+@pytest.mark.parametrize("config, fast_llm", [
+    ({"async_workers": 2, "template_cache_enabled": True}, SlowChatModel(delay=0.2)),
+    ({"async_workers": 2, "candidate_count": 3}, None),
+])
+def test_ask_async_stays_async_with_optional_components(test_db, config, fast_llm):
+    orchestrator = NL2SQLOrchestrator(
+        llm=SlowChatModel(delay=0.2),
+        database_uri=f"sqlite:///{test_db}",
+        config=config,
+        fast_llm=fast_llm
+    )
+
+    async def main():
+        return await asyncio.gather(*(orchestrator.ask_async(f"用户 {i}") for i in range(20)))
+
+    started = time.monotonic()
+    results = asyncio.run(main())
+    elapsed = time.monotonic() - started
+
+    assert all(r.status == QueryStatus.SUCCESS for r in results)
+    assert all(r.execution.result.rows == [("Alice",), ("Bob",), ("Carol",)] for r in results)
+    # 模型等待若占用阻塞线程池（2 个线程），20 次请求至少需要 4 秒
+    assert elapsed < 2.0
+
+
+def test_ask_async_escalates_to_strong_model(test_db):
+    orchestrator = NL2SQLOrchestrator(
+        llm=SlowChatModel(delay=0.01),
+        database_uri=f"sqlite:///{test_db}",
+        fast_llm=SlowChatModel(delay=0.01, content="</thinking><sql>DROP TABLE users</sql>")
+    )
+
+    result = asyncio.run(orchestrator.ask_async("列出用户"))
+
+    assert result.status == QueryStatus.SUCCESS
+    assert result.sql == "SELECT name FROM users ORDER BY id"
+    assert result.metadata["escalated"] is True
+    stats = orchestrator.get_routing_stats()["routes"]
+    assert stats["fast"]["failure"] == 1 and stats["strong"]["success"] == 1
+
+
+def test_astream_matches_sync_events(test_db):
+    async def collect(orchestrator):
+        return [event async for event in orchestrator.astream("列出用户")]
+
+    sql = "SELECT name FROM users ORDER BY id"
+    sync_events = list(NL2SQLOrchestrator(
+        llm=_fake_llm(sql), database_uri=f"sqlite:///{test_db}", config={"fetch_batch_size": 2}
+    ).ask_stream("列出用户"))
+    async_events = asyncio.run(collect(NL2SQLOrchestrator(
+        llm=_fake_llm(sql), database_uri=f"sqlite:///{test_db}", config={"fetch_batch_size": 2}
+    )))
+
+    assert [(e["stage"], e["status"]) for e in async_events] == [(e["stage"], e["status"]) for e in sync_events]
+    rows = [e["data"]["rows"] for e in async_events if e["stage"] == "execution_rows"]
+    assert rows == [[["Alice"], ["Bob"]], [["Carol"]]]
+    assert async_events[-1]["data"]["explanation"] == "三位用户"
+
+
+def test_astream_coalesces_identical_questions(test_db):
+    orchestrator = NL2SQLOrchestrator(
+        llm=SlowChatModel(delay=0.1),
+        database_uri=f"sqlite:///{test_db}"
+    )
+
+    async def collect():
+        return [event async for event in orchestrator.astream("列出用户")]
+
+    async def main():
+        return await asyncio.gather(collect(), collect())
+
+    first, second = asyncio.run(main())
+    assert first == second
+    assert first[-1]["stage"] == "done"
+    assert orchestrator.get_cache_stats()["coalescing"]["coalesced_streams"] == 1
+
+
+def test_astream_escalates_routed_fast_model(test_db):
+    orchestrator = NL2SQLOrchestrator(
+        llm=SlowChatModel(delay=0.01),
+        database_uri=f"sqlite:///{test_db}",
+        fast_llm=SlowChatModel(delay=0.01, content="</thinking><sql>DROP TABLE users</sql>")
+    )
+
+    async def collect():
+        return [event async for event in orchestrator.astream("列出用户")]
+
+    events = asyncio.run(collect())
+    generated = [e["data"] for e in events if e["stage"] == "sql_generated"]
+
+    assert generated[0]["route"] == "fast" and generated[0]["sql"] == "DROP TABLE users"
+    assert generated[1] == {"sql": "SELECT name FROM users ORDER BY id", "route": "strong", "escalated": True}
+    assert events[-1]["status"] == "success"
+    stats = orchestrator.get_routing_stats()["routes"]
+    assert stats["fast"]["failure"] == 1 and stats["strong"]["success"] == 1
+
+
+def test_ask_stream_votes_between_candidates(test_db):
+    orchestrator = NL2SQLOrchestrator(
+        llm=SlowChatModel(delay=0.01),
+        database_uri=f"sqlite:///{test_db}",
+        config={"candidate_count": 3}
+    )
+
+    events = list(orchestrator.ask_stream("列出用户"))
+    candidates = next(e for e in events if e["stage"] == "candidates")
+
+    assert candidates["data"]["votes"] >= 2
+    assert "thinking" not in [e["stage"] for e in events]
+    assert events[-1]["status"] == "success"
+    assert events[-1]["data"]["execution_result"]["rows"] == [["Alice"], ["Bob"], ["Carol"]]
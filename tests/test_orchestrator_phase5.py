@@ -0,0 +1,119 @@
+import pytest
+import os
+import sqlite3
+import tempfile
+import time
+from unittest.mock import MagicMock
+from src.core.orchestrator import NL2SQLOrchestrator
+from src.core.stage_timer import StageTimer
+from src.core.types import QueryStatus
+
+
+@pytest.fixture
+def test_db():
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT);
+        INSERT INTO users (name) VALUES ('Alice'), ('Bob');
+    """)
+    conn.close()
+    yield path
+    os.unlink(path)
+
+
+def _slow(fn, delay):
+    def wrapper(*args, **kwargs):
+        time.sleep(delay)
+        return fn(*args, **kwargs)
+    return wrapper
+
+
+def test_stage_timer_critical_path():
+    timer = StageTimer()
+    timer._spans = [
+        ("mapping", 0.0, 0.05),
+        ("schema", 0.0, 0.2),
+        ("generation", 0.2, 0.5),
+        ("execution", 0.5, 0.6),
+        ("cache_store", 0.6, 0.65),
+        ("explanation", 0.6, 0.9),
+    ]
+
+    summary = timer.summary()
+    assert summary["critical_path"] == ["schema", "generation", "execution", "explanation"]
+    assert [stage["stage"] for stage in summary["stages"]][:2] == ["mapping", "schema"]
+
+
+def test_stage_timer_records_exceptions():
+    timer = StageTimer()
+    with pytest.raises(ValueError):
+        with timer.stage("boom"):
+            raise ValueError("boom")
+    assert timer.critical_path() == ["boom"]
+    assert StageTimer().critical_path() == []
+
+
+def test_schema_prepared_while_mapping(test_db):
+    llm = MagicMock(return_value="SELECT name FROM users ORDER BY id")
+    orchestrator = NL2SQLOrchestrator(llm=llm, database_uri=f"sqlite:///{test_db}")
+    orchestrator._prepare_schema = _slow(orchestrator._prepare_schema, 0.2)
+    orchestrator._semantic_mapping = _slow(orchestrator._semantic_mapping, 0.2)
+
+    started = time.monotonic()
+    result = orchestrator.ask("列出用户")
+    elapsed = time.monotonic() - started
+
+    assert result.status == QueryStatus.SUCCESS
+    assert elapsed < 0.35
+    stages = {stage["stage"]: stage for stage in result.metadata["timings"]["stages"]}
+    assert stages["schema"]["start"] < stages["mapping"]["end"]
+    assert result.metadata["timings"]["critical_path"][-1] == "explanation"
+
+
+def test_explanation_overlaps_cache_store(test_db):
+    llm = MagicMock(return_value="SELECT name FROM users ORDER BY id")
+    orchestrator = NL2SQLOrchestrator(
+        llm=llm,
+        database_uri=f"sqlite:///{test_db}",
+        config={"template_cache_enabled": True}
+    )
+    orchestrator.template_cache.store = _slow(orchestrator.template_cache.store, 0.2)
+    orchestrator._explain_result = _slow(lambda question, result: "两位用户", 0.2)
+
+    started = time.monotonic()
+    result = orchestrator.ask("列出用户")
+    elapsed = time.monotonic() - started
+
+    assert result.explanation == "两位用户"
+    assert elapsed < 0.35
+    stages = {stage["stage"]: stage for stage in result.metadata["timings"]["stages"]}
+    assert stages["explanation"]["start"] < stages["cache_store"]["end"]
+
+
+def test_explanation_error_still_reported(test_db):
+    llm = MagicMock(return_value="SELECT name FROM users")
+    orchestrator = NL2SQLOrchestrator(llm=llm, database_uri=f"sqlite:///{test_db}")
+
+    def fail(question, result):
+        raise RuntimeError("explainer down")
+
+    orchestrator._explain_result = fail
+    result = orchestrator.ask("列出用户")
+
+    assert result.status == QueryStatus.GENERATION_ERROR
+    assert result.error_message == "explainer down"
+    assert "timings" in result.metadata
+
+
+def test_ask_stream_cancels_schema_when_mapping_fails(test_db):
+    orchestrator = NL2SQLOrchestrator(llm=MagicMock(), database_uri=f"sqlite:///{test_db}")
+    handle = MagicMock()
+    orchestrator._sync_runner.spawn = MagicMock(return_value=handle)
+    orchestrator._semantic_mapping = MagicMock(side_effect=RuntimeError("mapping failed"))
+
+    events = list(orchestrator.ask_stream("列出用户"))
+
+    assert events == [{"stage": "mapping", "status": "error", "error": "mapping failed"}]
+    handle.cancel.assert_called_once()
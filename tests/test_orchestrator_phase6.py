@@ -0,0 +1,122 @@
+import pytest
+import asyncio
+import json
+import os
+import sqlite3
+import tempfile
+from typing import Any, List, Optional
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from src.core.orchestrator import NL2SQLOrchestrator
+from src.core.types import QueryStatus
+
+
+class EchoSQLModel(BaseChatModel):
+    """按问题中的数字生成 SQL；记录并发调用数"""
+
+    delay: float = 0.05
+    active: int = 0
+    peak: int = 0
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "echo-sql"
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        raise NotImplementedError
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        self.calls += 1
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            text = messages[-1].content
+            await asyncio.sleep(self.delay * (3 if "慢" in text else 1))
+            if "数据库结构" not in text and "用户问题" not in text:
+                content = "解释"
+            elif "坏" in text:
+                content = "</thinking><sql>SELECT nothing FROM nowhere</sql>"
+            else:
+                digits = "".join(ch for ch in text.split("用户问题")[-1] if ch.isdigit()) or "0"
+                content = f"</thinking><sql>SELECT name FROM users WHERE id > {digits} ORDER BY id</sql>"
+        finally:
+            self.active -= 1
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=content))])
+
+
+@pytest.fixture
+def test_db():
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT);
+        INSERT INTO users (name) VALUES ('Alice'), ('Bob'), ('Carol');
+    """)
+    conn.close()
+    yield path
+    os.unlink(path)
+
+
+def _collect(batch):
+    async def main():
+        return [item async for item in batch]
+    return asyncio.run(main())
+
+
+def test_ask_many_dedupes_and_prepares_schema_once(test_db):
+    llm = EchoSQLModel()
+    orchestrator = NL2SQLOrchestrator(llm=llm, database_uri=f"sqlite:///{test_db}", config={"max_retries": 1})
+    prepared = []
+    prepare = orchestrator._prepare_schema
+    orchestrator._prepare_schema = lambda: prepared.append(1) or prepare()
+
+    questions = ["用户 1", "用户 1 ", "用户 2", "坏问题", "用户 1？"]
+    batch = orchestrator.ask_many(questions, concurrency=2)
+    items = _collect(batch)
+
+    assert prepared == [1]
+    assert sorted(item.index for item in items) == [0, 1, 2, 3, 4]
+    by_index = {item.index: item for item in items}
+    assert by_index[1].duplicate and by_index[4].duplicate
+    assert by_index[4].result.question == "用户 1？"
+    assert by_index[0].result.execution.result.rows == [("Bob",), ("Carol",)]
+    assert by_index[3].result.status == QueryStatus.EXECUTION_ERROR
+
+    summary = batch.summary()
+    assert summary["total"] == 5 and summary["unique"] == 3
+    assert summary["succeeded"] == 4
+    assert summary["statuses"] == {"success": 4, "execution_error": 1}
+    assert summary["throughput"] > 0
+
+
+def test_ask_many_bounds_concurrency_and_yields_in_completion_order(test_db):
+    llm = EchoSQLModel()
+    orchestrator = NL2SQLOrchestrator(llm=llm, database_uri=f"sqlite:///{test_db}")
+
+    questions = ["慢 用户 0"] + [f"用户 {i}" for i in range(1, 9)]
+    items = _collect(orchestrator.ask_many(questions, concurrency=3))
+
+    assert llm.peak <= 3
+    assert items[0].index != 0
+    assert [item.result.status for item in items] == [QueryStatus.SUCCESS] * 9
+
+
+def test_batch_endpoint_streams_ndjson(test_db, monkeypatch):
+    from fastapi.testclient import TestClient
+    import src.main as main
+    from src.config import Settings
+
+    orchestrator = NL2SQLOrchestrator(llm=EchoSQLModel(), database_uri=f"sqlite:///{test_db}")
+    monkeypatch.setattr(main, "_orchestrator_instance", orchestrator)
+    client = TestClient(main.create_app(Settings(database_uri=f"sqlite:///{test_db}")))
+
+    response = client.post("/query/batch", json={"questions": ["用户 1", "用户 2", "用户 1"], "include_sql": True})
+
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted(line["index"] for line in lines[:-1]) == [0, 1, 2]
+    assert all(line["status"] == "success" and line["sql"] for line in lines[:-1])
+    assert lines[-1]["summary"]["unique"] == 2
@@ -0,0 +1,202 @@
+import pytest
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+from unittest.mock import MagicMock
+from langchain_community.utilities import SQLDatabase
+from src.security.cost_guard import QueryCostGuard, CostAction
+
+
+@pytest.fixture
+def test_db():
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT, age INTEGER);
+        CREATE TABLE orders (id INTEGER PRIMARY KEY, user_id INTEGER, amount REAL);
+    """)
+    conn.executemany("INSERT INTO users (name, age) VALUES (?, ?)", [(f"u{i}", i % 60) for i in range(200)])
+    conn.executemany("INSERT INTO orders (user_id, amount) VALUES (?, ?)", [(i % 200, i) for i in range(400)])
+    conn.commit()
+    conn.close()
+    yield path
+    os.unlink(path)
+
+
+def _guard(path, **options):
+    return QueryCostGuard(SQLDatabase.from_uri(f"sqlite:///{path}"), **options)
+
+
+def test_sqlite_plan_estimate(test_db):
+    guard = _guard(test_db, max_rows=1000)
+
+    cheap = guard.check("SELECT name FROM users WHERE id = 3")
+    assert cheap.action == CostAction.ALLOW
+    assert cheap.estimate.full_scans == []
+
+    indexed = guard.check("SELECT * FROM users u JOIN orders o ON o.user_id = u.id")
+    assert indexed.action == CostAction.ALLOW
+    assert indexed.estimate.full_scans == ["orders"]
+
+    cross = guard.check("SELECT * FROM users u, orders o WHERE u.age > o.amount")
+    assert cross.action == CostAction.REJECT
+    assert cross.estimate.rows == 200 * 400
+    assert set(cross.estimate.full_scans) == {"users", "orders"}
+
+
+def test_limit_policy_rewrites_query(test_db):
+    guard = _guard(test_db, policy="limit", full_scan_rows=100, limit_rows=50)
+
+    decision = guard.check("SELECT * FROM orders ORDER BY amount;")
+    assert decision.action == CostAction.LIMIT
+    assert decision.sql == "SELECT * FROM orders ORDER BY amount LIMIT 50"
+    assert decision.summary()["full_scans"] == ["orders"]
+
+    # 已有 LIMIT 的查询无法再收紧，直接拒绝
+    assert guard.check("SELECT * FROM orders LIMIT 10 OFFSET 5").rejected
+
+    # 只有子查询 / CTE 里有 LIMIT 时仍给外层加上
+    nested = guard.check("SELECT * FROM orders WHERE user_id IN (SELECT id FROM users LIMIT 5)")
+    assert nested.action == CostAction.LIMIT
+    assert nested.sql.endswith(") LIMIT 50")
+
+    # 只返回一行的聚合查询加 LIMIT 不减少扫描，直接拒绝
+    assert guard.check("SELECT COUNT(*) FROM orders").rejected
+    grouped = guard.check("SELECT user_id, SUM(amount) FROM orders GROUP BY user_id")
+    assert grouped.action == CostAction.LIMIT
+
+
+def test_sqlite_estimate_adds_subqueries_instead_of_multiplying(test_db):
+    guard = _guard(test_db, max_rows=10000)
+
+    subquery = guard.check("SELECT * FROM users WHERE id IN (SELECT user_id FROM orders)")
+    assert subquery.action == CostAction.ALLOW
+    assert subquery.estimate.rows == 1 + 400
+
+    union = guard.check("SELECT name FROM users UNION SELECT CAST(amount AS TEXT) FROM orders")
+    assert union.estimate.rows == 200 + 400
+
+    # 相关子查询对外层每一行各执行一次
+    correlated = guard.check(
+        "SELECT name, (SELECT SUM(amount) FROM orders o WHERE o.user_id = u.id) FROM users u"
+    )
+    assert correlated.rejected
+    assert correlated.estimate.rows == 200 + 200 * 400
+
+
+def test_plans_cached_by_fingerprint(test_db):
+    guard = _guard(test_db, full_scan_rows=1000)
+    guard.check("SELECT * FROM users")
+    second = guard.check("SELECT  *  FROM users ;")
+
+    assert second.cached is True
+    stats = guard.get_stats()
+    assert stats["plan_cache_hits"] == 1
+    assert stats["cached_plans"] == 1
+
+
+def test_queue_policy_limits_concurrency(test_db):
+    guard = _guard(test_db, policy="queue", full_scan_rows=100, queue_slots=1, queue_timeout=0.05)
+    decision = guard.check("SELECT * FROM orders")
+    assert decision.action == CostAction.QUEUE
+
+    with guard.admit(decision) as first:
+        assert first is True
+        result = []
+        worker = threading.Thread(target=lambda: result.append(guard.admit(decision).__enter__()))
+        worker.start()
+        worker.join()
+        assert result == [False]
+
+    with guard.admit(decision) as again:
+        assert again is True
+    assert guard.get_stats()["queue_timeouts"] == 1
+
+
+def test_queue_admission_is_reentrant_on_same_thread(test_db):
+    guard = _guard(test_db, policy="queue", full_scan_rows=100, queue_slots=1, queue_timeout=0.05)
+    decision = guard.check("SELECT * FROM orders")
+
+    # 执行器对修复后的 SQL 再次 admit 时不应等待自己已占用的通道
+    with guard.admit(decision) as outer:
+        with guard.admit(decision) as inner:
+            assert outer is True and inner is True
+    assert guard.get_stats()["queue_timeouts"] == 0
+    with guard.admit(decision) as again:
+        assert again is True
+
+
+def test_postgres_json_plan_parsing():
+    guard = QueryCostGuard.__new__(QueryCostGuard)
+    plan = [{"Plan": {
+        "Node Type": "Hash Join", "Total Cost": 12345.6, "Plan Rows": 50000,
+        "Plans": [
+            {"Node Type": "Seq Scan", "Relation Name": "orders"},
+            {"Node Type": "Index Scan", "Relation Name": "users"},
+        ],
+    }}]
+    conn = MagicMock()
+    conn.execute.return_value.scalar.return_value = json.dumps(plan)
+
+    estimate = guard._explain_postgresql(conn, "SELECT 1", {})
+    assert estimate.cost == 12345.6
+    assert estimate.rows == 50000
+    assert estimate.full_scans == ["orders"]
+
+
+def test_oracle_statement_ids_are_unique():
+    guard = QueryCostGuard.__new__(QueryCostGuard)
+    conn = MagicMock()
+    conn.execute.return_value.fetchall.return_value = []
+
+    guard._explain_oracle(conn, "SELECT * FROM t", {})
+    guard._explain_oracle(conn, "SELECT * FROM t", {})
+
+    ids = {c.args[1]["sid"] for c in conn.execute.call_args_list if c.args[1] and "sid" in c.args[1]}
+    assert len(ids) == 2
+
+
+def test_unsupported_dialect_is_allowed():
+    db = MagicMock()
+    db._engine.dialect.name = "duckdb"
+    guard = QueryCostGuard(db, max_rows=1)
+    assert guard.check("SELECT * FROM t").action == CostAction.ALLOW
+
+
+def test_orchestrator_rejects_expensive_query(test_db):
+    from src.core.orchestrator import NL2SQLOrchestrator
+    from src.core.types import QueryStatus
+    llm = MagicMock()
+    llm.return_value = "SELECT * FROM users, orders"
+    orchestrator = NL2SQLOrchestrator(
+        llm=llm,
+        database_uri=f"sqlite:///{test_db}",
+        config={"cost_guard_enabled": True, "cost_guard_policy": "reject", "cost_guard_max_rows": 10000}
+    )
+
+    result = orchestrator.ask("列出所有用户和订单的组合")
+
+    assert result.status == QueryStatus.SECURITY_REJECTED
+    assert result.metadata["cost_guard"]["action"] == "reject"
+    assert result.execution.attempts == 0
+
+
+def test_orchestrator_limits_expensive_query(test_db):
+    from src.core.orchestrator import NL2SQLOrchestrator
+    llm = MagicMock()
+    llm.return_value = "SELECT * FROM orders"
+    orchestrator = NL2SQLOrchestrator(
+        llm=llm,
+        database_uri=f"sqlite:///{test_db}",
+        config={"cost_guard_enabled": True, "cost_guard_full_scan_rows": 100, "cost_guard_limit_rows": 20}
+    )
+
+    result = orchestrator.ask("列出所有订单")
+
+    assert result.execution.success
+    assert result.execution.result.row_count == 20
+    assert result.metadata["cost_guard"]["action"] == "limit"
+    assert orchestrator.get_cache_stats()["cost_guard"]["limited"] == 1
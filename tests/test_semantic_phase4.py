@@ -0,0 +1,201 @@
+import pytest
+import os
+import sqlite3
+import tempfile
+import time
+from unittest.mock import MagicMock
+from src.generation.template_cache import TemplateCache
+from src.semantic.semantic_cache import SemanticCache
+
+
+class FakeEmbeddings:
+    """按预设表返回向量，未登记的文本返回与其他文本正交的向量"""
+
+    def __init__(self, table):
+        self.table = table
+        self.calls = 0
+
+    def embed_query(self, text):
+        self.calls += 1
+        if text in self.table:
+            return self.table[text]
+        vector = [0.0] * 8
+        vector[7] = 1.0
+        return vector
+
+
+EMBEDDINGS = {
+    "本月销售额": [1.0, 0.0, 0.0, 0.0, 0, 0, 0, 0],
+    "这个月卖了多少钱": [0.98, 0.2, 0.0, 0.0, 0, 0, 0, 0],
+    "上月销售额": [0.0, 1.0, 0.0, 0.0, 0, 0, 0, 0],
+    # 只差一个字面量的问题，向量几乎相同
+    "上海的订单数": [0.0, 0.0, 1.0, 0.0, 0, 0, 0, 0],
+    "北京的订单数": [0.0, 0.0, 0.99, 0.1, 0, 0, 0, 0],
+    "2023年销售额": [0.0, 0.0, 0.0, 1.0, 0, 0, 0, 0],
+    "2024年销售额": [0.0, 0.0, 0.1, 0.99, 0, 0, 0, 0],
+    "2024年的销售额": [0.0, 0.0, 0.01, 1.0, 0, 0, 0, 0],
+}
+
+
+@pytest.fixture
+def cache():
+    return SemanticCache(FakeEmbeddings(EMBEDDINGS), similarity_threshold=0.95, audit_rate=0.0)
+
+
+def test_normalize_strips_punctuation_and_width():
+    assert SemanticCache.normalize(" 本月 销售额？ ") == "本月销售额"
+    assert SemanticCache.normalize("ＡＢＣ，abc!") == "abcabc"
+
+
+def test_paraphrase_hits_within_scope(cache):
+    cache.store("本月销售额?", "scope", "SELECT SUM(amount) FROM orders", "[(100,)]", 2.0)
+
+    hit = cache.lookup("这个月卖了多少钱", "scope")
+    assert hit is not None
+    assert hit.entry.sql == "SELECT SUM(amount) FROM orders"
+    assert hit.similarity > 0.95
+
+
+def test_different_question_misses(cache):
+    cache.store("本月销售额", "scope", "SELECT 1", "[(1,)]", 1.0)
+    assert cache.lookup("上月销售额", "scope") is None
+
+
+def test_other_scope_misses(cache):
+    cache.store("本月销售额", "schema-a", "SELECT 1", "[(1,)]", 1.0)
+    assert cache.lookup("本月销售额", "schema-b") is None
+
+
+def test_different_number_or_date_literal_misses(cache):
+    cache.store("2023年销售额", "scope", "SELECT 2023", "", 1.0)
+    assert cache.lookup("2024年销售额", "scope") is None
+    assert cache.get_stats()["literal_mismatches"] == 1
+
+
+def test_different_column_value_misses():
+    extractor = TemplateCache(value_dictionary={"上海": "orders.city", "北京": "orders.city"})
+    cache = SemanticCache(
+        FakeEmbeddings(EMBEDDINGS), similarity_threshold=0.95, audit_rate=0.0, literal_extractor=extractor
+    )
+    cache.store("上海的订单数", "scope", "SELECT COUNT(*) FROM orders WHERE city = '上海'", "", 1.0)
+    assert cache.lookup("北京的订单数", "scope") is None
+    assert cache.lookup("上海的订单数", "scope") is not None
+
+
+def test_literal_mismatch_falls_back_to_matching_entry(cache):
+    cache.store("2024年销售额", "scope", "SELECT 2024", "", 1.0)
+    cache.store("2023年销售额", "scope", "SELECT 2023", "", 1.0)
+
+    # 2023 年的条目向量更接近，但字面量不同；改用字面量一致的 2024 年条目
+    hit = cache.lookup("2024年的销售额", "scope")
+    assert hit is not None
+    assert hit.entry.sql == "SELECT 2024"
+
+
+def test_eviction_by_capacity_and_ttl():
+    cache = SemanticCache(FakeEmbeddings(EMBEDDINGS), max_entries=1, audit_rate=0.0)
+    cache.store("本月销售额", "scope", "SELECT 1", "", 1.0)
+    cache.store("上月销售额", "scope", "SELECT 2", "", 1.0)
+    assert cache.get_stats()["entries"] == 1
+    assert cache.lookup("本月销售额", "scope") is None
+
+    expiring = SemanticCache(FakeEmbeddings(EMBEDDINGS), ttl=0.001, audit_rate=0.0)
+    expiring.store("本月销售额", "scope", "SELECT 1", "", 1.0)
+    time.sleep(0.01)
+    assert expiring.lookup("本月销售额", "scope") is None
+    assert expiring.get_stats()["evictions"] == 1
+
+
+def test_audit_false_hit_removes_entry():
+    cache = SemanticCache(FakeEmbeddings(EMBEDDINGS), similarity_threshold=0.95, audit_rate=1.0)
+    cache.store("本月销售额", "scope", "SELECT 1", "", 1.0)
+    hit = cache.lookup("这个月卖了多少钱", "scope")
+    assert hit.audit is True
+
+    cache.record_audit(hit, "这个月卖了多少钱", "SELECT 2", matched=False)
+    stats = cache.get_stats()
+    assert stats["false_hits"] == 1
+    assert stats["false_hit_rate"] == 100.0
+    assert stats["entries"] == 0
+    assert cache.get_audit_log()[0]["fresh_sql"] == "SELECT 2"
+
+
+@pytest.fixture
+def test_db():
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE orders (id INTEGER PRIMARY KEY, amount REAL);
+        INSERT INTO orders (amount) VALUES (100), (50);
+    """)
+    conn.close()
+    yield path
+    os.unlink(path)
+
+
+def _orchestrator(test_db, **config):
+    from src.core.orchestrator import NL2SQLOrchestrator
+    llm = MagicMock()
+    llm.return_value = "SELECT SUM(amount) FROM orders"
+    orchestrator = NL2SQLOrchestrator(
+        llm=llm,
+        database_uri=f"sqlite:///{test_db}",
+        config={"semantic_cache_enabled": True, "semantic_cache_threshold": 0.95, **config},
+        embeddings=FakeEmbeddings(EMBEDDINGS)
+    )
+    orchestrator.sql_generator.generate = MagicMock(wraps=orchestrator.sql_generator.generate)
+    return orchestrator
+
+
+def test_orchestrator_reuses_sql_for_paraphrase(test_db):
+    orchestrator = _orchestrator(test_db, semantic_cache_audit_rate=0.0)
+
+    orchestrator.ask("本月销售额")
+    result = orchestrator.ask("这个月卖了多少钱")
+
+    assert result.status.value == "success"
+    assert result.metadata["semantic_cache"]["cached_question"] == "本月销售额"
+    assert result.execution.result.rows == [(150.0,)]
+    assert orchestrator.sql_generator.generate.call_count == 1
+    assert orchestrator.get_cache_stats()["semantic"]["hits"] == 1
+
+
+def test_orchestrator_scope_separates_cache(test_db):
+    orchestrator = _orchestrator(test_db, semantic_cache_audit_rate=0.0)
+
+    orchestrator.ask("本月销售额", scope="tenant-a")
+    result = orchestrator.ask("本月销售额", scope="tenant-b")
+
+    assert "semantic_cache" not in result.metadata
+    assert orchestrator.sql_generator.generate.call_count == 2
+
+
+def test_orchestrator_audited_hit_runs_full_pipeline(test_db):
+    orchestrator = _orchestrator(test_db, semantic_cache_audit_rate=1.0)
+
+    orchestrator.ask("本月销售额")
+    result = orchestrator.ask("这个月卖了多少钱")
+
+    assert "semantic_cache" not in result.metadata
+    assert orchestrator.sql_generator.generate.call_count == 2
+    stats = orchestrator.get_cache_stats()["semantic"]
+    assert stats["audits"] == 1
+    assert stats["false_hits"] == 0
+
+
+def test_orchestrator_does_not_reuse_sql_for_other_column_value(test_db):
+    conn = sqlite3.connect(test_db)
+    conn.executescript("""
+        CREATE TABLE shops (id INTEGER PRIMARY KEY, city TEXT);
+        INSERT INTO shops (city) VALUES ('上海'), ('北京');
+    """)
+    conn.close()
+    orchestrator = _orchestrator(test_db, semantic_cache_audit_rate=0.0)
+
+    orchestrator.ask("上海的订单数")
+    result = orchestrator.ask("北京的订单数")
+
+    assert "semantic_cache" not in result.metadata
+    assert orchestrator.sql_generator.generate.call_count == 2
+    assert orchestrator.get_cache_stats()["semantic"]["literal_mismatches"] == 1